@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Stand-in Batch API Server
+
+Local HTTP server implementing the subset of the Anthropic Message Batches
+and OpenAI Batch APIs that src/api/batch.py uses, so the submit/poll/collect
+flow of --batch-api can be run offline without API keys or cost.
+
+Anthropic (point ANTHROPIC_BASE_URL at http://127.0.0.1:<port>):
+  POST /v1/messages/batches              create batch
+  GET  /v1/messages/batches/<id>         retrieve batch status
+  GET  /v1/messages/batches/<id>/results results JSONL
+
+OpenAI (point OPENAI_BASE_URL at http://127.0.0.1:<port>/v1):
+  POST /v1/files                         upload batch input (multipart)
+  POST /v1/batches                       create batch
+  GET  /v1/batches/<id>                  retrieve batch status
+  GET  /v1/files/<id>/content            download output JSONL
+
+Batches stay in progress for --delay seconds after creation, then end with
+one canned assessment per request. Requests whose prompt contains
+FAIL_REQUEST end as errored, to exercise per-request error handling.
+
+Usage:
+  python3 dev/batch_stub_server.py --port 8089 --delay 2
+  ANTHROPIC_BASE_URL=http://127.0.0.1:8089 ANTHROPIC_API_KEY=stub \\
+      ./mark_structured.sh assignments/lab1 --api-model claude-haiku-4-5 --batch-api
+
+  # Run the full flow for both providers against an in-process server
+  python3 dev/batch_stub_server.py --check
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+RESPONSE_TEXT = """### Summary
+Stand-in batch response for request {custom_id}.
+
+### Mistakes Found
+None identified.
+
+### Positive Points
+1. The student attempted the activity.
+   - Quality: Good
+   - Location: Activity cells
+"""
+
+_ids = itertools.count(1)
+
+
+def _usage(prompt: str) -> tuple[int, int]:
+    # Rough 4-characters-per-token estimate
+    return max(1, len(prompt) // 4), len(RESPONSE_TEXT) // 4
+
+
+class BatchStore:
+    """In-memory state shared by all handler threads."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.files = {}      # file id -> bytes
+        self.batches = {}    # batch id -> dict(kind, created, requests, ...)
+
+    def finished(self, batch: dict) -> bool:
+        return time.time() - batch['created'] >= self.delay
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    store: BatchStore = None
+
+    # ---------------------------------------------------------------- helpers
+
+    def send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, body: bytes, content_type: str = 'application/binary'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------------------------------------- Anthropic
+
+    def anthropic_batch(self, batch_id: str) -> dict:
+        batch = self.store.batches[batch_id]
+        ended = self.store.finished(batch)
+        failed = sum(1 for r in batch['requests'] if 'FAIL_REQUEST' in json.dumps(r))
+        total = len(batch['requests'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else total,
+                'succeeded': total - failed if ended else 0,
+                'errored': failed if ended else 0,
+                'canceled': 0,
+                'expired': 0,
+            },
+            'created_at': '2025-01-01T00:00:00Z',
+            'expires_at': '2025-01-02T00:00:00Z',
+            'ended_at': '2025-01-01T00:01:00Z' if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': f"{self.base_url()}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def anthropic_results(self, batch_id: str) -> bytes:
+        lines = []
+        for request in self.store.batches[batch_id]['requests']:
+            params = request['params']
+            prompt = json.dumps(params.get('messages', [])) + json.dumps(params.get('system', ''))
+            if 'FAIL_REQUEST' in prompt:
+                result = {'type': 'errored',
+                          'error': {'type': 'error', 'error': {'type': 'invalid_request_error',
+                                                               'message': 'Stand-in failure'}}}
+            else:
+                input_tokens, output_tokens = _usage(prompt)
+                result = {'type': 'succeeded', 'message': {
+                    'id': f"msg_{next(_ids)}",
+                    'type': 'message',
+                    'role': 'assistant',
+                    'model': params.get('model', 'stub'),
+                    'content': [{'type': 'text',
+                                 'text': RESPONSE_TEXT.format(custom_id=request['custom_id'])}],
+                    'stop_reason': 'end_turn',
+                    'stop_sequence': None,
+                    'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+                }}
+            lines.append(json.dumps({'custom_id': request['custom_id'], 'result': result}))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    # ---------------------------------------------------------------- OpenAI
+
+    def openai_upload(self) -> dict:
+        body = self.read_body()
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8')
+        message = BytesParser(policy=default_policy).parsebytes(header + body)
+
+        content = b''
+        for part in message.iter_parts():
+            if part.get_param('name', header='content-disposition') == 'file':
+                content = part.get_payload(decode=True)
+
+        file_id = f"file-{next(_ids)}"
+        with self.store.lock:
+            self.store.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': 'batch_input.jsonl', 'purpose': 'batch', 'status': 'processed'}
+
+    def openai_batch(self, batch_id: str) -> dict:
+        batch = self.store.batches[batch_id]
+        ended = self.store.finished(batch)
+        total = len(batch['requests'])
+
+        if ended and 'output_file_id' not in batch:
+            output, errors = [], []
+            for request in batch['requests']:
+                messages = request['body']['messages']
+                prompt = json.dumps(messages)
+                if 'FAIL_REQUEST' in prompt:
+                    errors.append({'id': f"req_{next(_ids)}", 'custom_id': request['custom_id'],
+                                   'response': {'status_code': 400, 'body': {'error': {'message': 'Stand-in failure'}}},
+                                   'error': None})
+                    continue
+                input_tokens, output_tokens = _usage(prompt)
+                output.append({'id': f"req_{next(_ids)}", 'custom_id': request['custom_id'], 'error': None,
+                               'response': {'status_code': 200, 'body': {
+                                   'id': f"chatcmpl-{next(_ids)}",
+                                   'object': 'chat.completion',
+                                   'created': int(time.time()),
+                                   'model': request['body'].get('model', 'stub'),
+                                   'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {
+                                       'role': 'assistant',
+                                       'content': RESPONSE_TEXT.format(custom_id=request['custom_id'])}}],
+                                   'usage': {'prompt_tokens': input_tokens, 'completion_tokens': output_tokens,
+                                             'total_tokens': input_tokens + output_tokens},
+                               }}})
+            with self.store.lock:
+                batch['output_file_id'] = f"file-{next(_ids)}"
+                self.store.files[batch['output_file_id']] = '\n'.join(json.dumps(o) for o in output).encode('utf-8')
+                batch['error_file_id'] = None
+                if errors:
+                    batch['error_file_id'] = f"file-{next(_ids)}"
+                    self.store.files[batch['error_file_id']] = '\n'.join(json.dumps(e) for e in errors).encode('utf-8')
+                batch['failed'] = len(errors)
+
+        return {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': '/v1/chat/completions',
+            'input_file_id': batch['input_file_id'],
+            'completion_window': '24h',
+            'status': 'completed' if ended else 'in_progress',
+            'created_at': int(batch['created']),
+            'output_file_id': batch.get('output_file_id'),
+            'error_file_id': batch.get('error_file_id'),
+            'errors': None,
+            'request_counts': {
+                'total': total,
+                'completed': total - batch.get('failed', 0) if ended else 0,
+                'failed': batch.get('failed', 0),
+            },
+        }
+
+    # --------------------------------------------------------------- routing
+
+    def do_POST(self):
+        if self.path == '/v1/messages/batches':
+            request = json.loads(self.read_body() or b'{}')
+            batch_id = f"msgbatch_{next(_ids)}"
+            with self.store.lock:
+                self.store.batches[batch_id] = {'created': time.time(), 'requests': request['requests']}
+            self.send_json(self.anthropic_batch(batch_id))
+
+        elif self.path == '/v1/files':
+            self.send_json(self.openai_upload())
+
+        elif self.path == '/v1/batches':
+            request = json.loads(self.read_body() or b'{}')
+            lines = self.store.files.get(request['input_file_id'], b'').decode('utf-8').splitlines()
+            batch_id = f"batch_{next(_ids)}"
+            with self.store.lock:
+                self.store.batches[batch_id] = {
+                    'created': time.time(),
+                    'input_file_id': request['input_file_id'],
+                    'requests': [json.loads(line) for line in lines if line.strip()],
+                }
+            self.send_json(self.openai_batch(batch_id))
+
+        else:
+            self.send_json({'error': {'message': f"Unknown path {self.path}"}}, status=404)
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+
+        if parts[:3] == ['v1', 'messages', 'batches'] and len(parts) == 4:
+            self.send_json(self.anthropic_batch(parts[3]))
+        elif parts[:3] == ['v1', 'messages', 'batches'] and parts[-1] == 'results':
+            self.send_bytes(self.anthropic_results(parts[3]))
+        elif parts[:2] == ['v1', 'batches'] and len(parts) == 3:
+            self.send_json(self.openai_batch(parts[2]))
+        elif parts[:2] == ['v1', 'files'] and parts[-1] == 'content':
+            self.send_bytes(self.store.files.get(parts[2], b''))
+        else:
+            self.send_json({'error': {'message': f"Unknown path {self.path}"}}, status=404)
+
+
+def start_server(port: int, delay: float) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread."""
+    BatchStubHandler.store = BatchStore(delay)
+    server = ThreadingHTTPServer(('127.0.0.1', port), BatchStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_check(server: ThreadingHTTPServer) -> bool:
+    """Run submit/poll/collect for both providers and report the outcome."""
+    from api.batch import run_batch
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['ANTHROPIC_BASE_URL'] = base_url
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'stub-key')
+    os.environ.setdefault('OPENAI_API_KEY', 'stub-key')
+
+    requests = [
+        {'custom_id': 'Alice-A1', 'prompt': "Evaluate Alice's work for Activity A1."},
+        {'custom_id': 'Bob-A1', 'prompt': "Evaluate Bob's work for Activity A1.", 'system_prompt': 'Rubric'},
+        {'custom_id': 'Carol-A1', 'prompt': 'FAIL_REQUEST'},
+    ]
+
+    ok = True
+    for provider, model in [('claude', 'claude-haiku-4-5'), ('openai', 'gpt-5-mini')]:
+        results = run_batch(model, requests, provider=provider, poll_interval=0.5,
+                            on_status=lambda batch_id, status: print(f"    {batch_id}: {status}"))
+        succeeded = [cid for cid, r in results.items() if isinstance(r, tuple)]
+        errored = [cid for cid, r in results.items() if not isinstance(r, tuple)]
+
+        passed = sorted(succeeded) == ['Alice-A1', 'Bob-A1'] and errored == ['Carol-A1']
+        ok = ok and passed
+        mark = '✓' if passed else '✗'
+        print(f"  {mark} {provider}: {len(succeeded)} succeeded, {len(errored)} errored")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in Anthropic/OpenAI batch API server')
+    parser.add_argument('--port', type=int, default=8089, help='Port to listen on (default: 8089)')
+    parser.add_argument('--delay', type=float, default=2.0,
+                        help='Seconds a batch stays in progress (default: 2)')
+    parser.add_argument('--check', action='store_true',
+                        help='Run the batch flow for both providers against an in-process server and exit')
+    args = parser.parse_args()
+
+    if args.check:
+        server = start_server(0, min(args.delay, 1.0))
+        print("Checking batch submit/poll/collect against stand-in server...")
+        ok = run_check(server)
+        server.shutdown()
+        sys.exit(0 if ok else 1)
+
+    server = start_server(args.port, args.delay)
+    print(f"Stand-in batch server listening on http://127.0.0.1:{args.port}")
+    print(f"  export ANTHROPIC_BASE_URL=http://127.0.0.1:{args.port}")
+    print(f"  export OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
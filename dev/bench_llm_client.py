@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-task overhead of the LLM call path
+
+Compares the old per-task process chain used in API mode
+(llm_caller.sh → python3 api/caller.py, one SDK import and one HTTP client
+per call) against the same chain handing its call to the LLM broker
+(api/broker.py: no SDK import per task, the broker's pooled connection is
+reused) and the in-process client in api/client.py (one SDK import and one
+pooled HTTP client for the whole process).
+
+Both paths talk to a local Anthropic-compatible stub server, so the numbers
+measure only the fixed overhead, not provider latency, and no API key or
+network access is needed; the stub speaks plain HTTP, so the TLS handshakes
+the pooled paths also save against a real provider are not included.
+Requires the anthropic SDK (pip install anthropic).
+
+Usage:
+  python3 dev/bench_llm_client.py
+  python3 dev/bench_llm_client.py --calls 50 --model claude-haiku-4-5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+RESPONSE_TEXT = "### Summary\nThe student completed the activity.\n"
+
+
+class AnthropicStubHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/messages with a fixed Anthropic Messages response."""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        body = json.dumps({
+            'id': 'msg_bench',
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'stub'),
+            'content': [{'type': 'text', 'text': RESPONSE_TEXT}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': 100, 'output_tokens': 20},
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_process_chain(model: str, prompt: str, calls: int, env: dict) -> list[float]:
+    """Time the llm_caller.sh → api/caller.py chain, one process pair per call."""
+    llm_caller = PROJECT_ROOT / "src" / "llm_caller.sh"
+    timings = []
+
+    for _ in range(calls):
+        start = time.perf_counter()
+        result = subprocess.run(
+            ['bash', str(llm_caller), '--mode', 'headless', '--provider', 'claude',
+             '--api-model', model, '--prompt', prompt],
+            capture_output=True, text=True, env=env
+        )
+        timings.append(time.perf_counter() - start)
+
+        if result.returncode != 0:
+            raise RuntimeError(f"Process chain call failed: {result.stderr}")
+
+    return timings
+
+
+def time_in_process(model: str, prompt: str, calls: int) -> list[float]:
+    """Time calls through the shared in-process client."""
+    from api.client import complete
+
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        complete(model, prompt)
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def summarize(label: str, timings: list[float]):
+    print(f"  {label:22s}  mean {statistics.mean(timings) * 1000:8.1f} ms  |  "
+          f"median {statistics.median(timings) * 1000:8.1f} ms  |  "
+          f"first {timings[0] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LLM call path overhead')
+    parser.add_argument('--calls', type=int, default=20, help='Calls per path (default: 20)')
+    parser.add_argument('--model', default='claude-haiku-4-5',
+                        help='API model listed in configs/models.yaml (default: claude-haiku-4-5)')
+    parser.add_argument('--tasks', type=int, default=224 * 8,
+                        help='Task count to extrapolate savings for (default: 224 x 8)')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AnthropicStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Both paths pick these up: the SDK reads ANTHROPIC_BASE_URL natively
+    os.environ['ANTHROPIC_BASE_URL'] = base_url
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'bench-key')
+    env = dict(os.environ)
+
+    prompt = "Evaluate the student's work for Activity A1."
+
+    print(f"Benchmarking {args.calls} calls per path against stub at {base_url}")
+    print()
+
+    chain = time_process_chain(args.model, prompt, args.calls, env)
+
+    from api.broker import start_daemon, stop
+    broker_socket = os.path.join(tempfile.mkdtemp(), 'broker.sock')
+    if start_daemon(broker_socket, warm_model=args.model) is None:
+        raise RuntimeError("LLM broker did not start")
+    try:
+        brokered = time_process_chain(args.model, prompt, args.calls,
+                                      dict(env, LLM_BROKER_SOCKET=broker_socket))
+    finally:
+        stop(broker_socket)
+
+    in_process = time_in_process(args.model, prompt, args.calls)
+
+    server.shutdown()
+
+    print("Per-call latency (stub server, no provider latency):")
+    summarize("llm_caller.sh chain", chain)
+    summarize("chain via LLM broker", brokered)
+    summarize("in-process client", in_process)
+    print()
+
+    saved = statistics.mean(chain) - statistics.mean(in_process)
+    print(f"Overhead saved per task: {saved * 1000:.1f} ms")
+    print(f"Projected for {args.tasks} tasks: {saved * args.tasks:.1f} s of process/handshake overhead")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark: model/provider resolution per LLM call
+
+Every llm_caller.sh call resolves the provider for its model, the provider's
+default model and whether the model is expensive; the Python agents resolve
+providers through system_config.py and api/client.py. This compares, over a
+run of N calls (default 1000):
+
+  bash    the old while-read scans of models.yaml (tr/xargs per matched
+          line) vs the compiled shell table (configs/.models.compiled.sh)
+  python  yaml.safe_load of models.yaml per lookup (old system_config.py)
+          vs the compiled table (utils/model_table.py)
+  cold    a fresh python3 process resolving one model: import yaml and
+          parse models.yaml vs read the JSON snapshot
+
+Usage:
+  python3 dev/bench_model_resolution.py
+  python3 dev/bench_model_resolution.py --calls 200 --model gpt-5.1
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src" / "utils"))
+
+from model_table import MODELS_CONFIG, load_model_table, provider_for_model, snapshot_paths
+
+# The resolution functions llm_caller.sh used before the compiled table
+OLD_BASH = r'''
+resolve_provider_from_model() {
+    local model_name="$1"
+    local section="${2:-}"
+    if [[ ! -f "$MODELS_CONFIG" ]]; then
+        return 1
+    fi
+    local sections_to_check
+    if [[ -n "$section" ]]; then
+        sections_to_check="$section"
+    else
+        sections_to_check="api_models cli_models"
+    fi
+    for sec in $sections_to_check; do
+        local in_section=false
+        while IFS= read -r line; do
+            if [[ "$line" =~ ^${sec}: ]]; then
+                in_section=true
+            elif [[ "$in_section" == true && "$line" =~ ^[a-z_]+: && ! "$line" =~ ^[[:space:]] ]]; then
+                in_section=false
+            elif [[ "$in_section" == true && "$line" =~ ^[[:space:]]+${model_name}:[[:space:]]*(.+) ]]; then
+                local provider="${BASH_REMATCH[1]}"
+                provider=$(echo "$provider" | tr -d '"' | tr -d "'" | xargs)
+                echo "$provider"
+                return 0
+            fi
+        done < "$MODELS_CONFIG"
+    done
+    return 1
+}
+
+get_default_model_for_provider() {
+    local provider="$1"
+    if [[ -f "$MODELS_CONFIG" ]]; then
+        local in_defaults=false
+        while IFS= read -r line; do
+            if [[ "$line" =~ ^defaults: ]]; then
+                in_defaults=true
+            elif [[ "$in_defaults" == true && "$line" =~ ^[[:space:]]+${provider}: ]]; then
+                local model
+                model=$(echo "$line" | sed "s/.*${provider}:[[:space:]]*//" | tr -d '"' | tr -d "'")
+                if [[ -n "$model" ]]; then
+                    echo "$model"
+                fi
+                return 0
+            elif [[ "$in_defaults" == true && "$line" =~ ^[a-z]+: ]]; then
+                break
+            fi
+        done < "$MODELS_CONFIG"
+    fi
+}
+
+is_expensive_model() {
+    local model_name="$1"
+    if [[ -z "$model_name" || ! -f "$MODELS_CONFIG" ]]; then
+        return 1
+    fi
+    local in_expensive=false
+    while IFS= read -r line; do
+        if [[ "$line" =~ ^expensive: ]]; then
+            in_expensive=true
+        elif [[ "$in_expensive" == true && "$line" =~ ^[[:space:]]+-[[:space:]]*(.+) ]]; then
+            local expensive_model="${BASH_REMATCH[1]}"
+            expensive_model=$(echo "$expensive_model" | tr -d '"' | tr -d "'" | xargs)
+            if [[ "$expensive_model" == "$model_name" ]]; then
+                return 0
+            fi
+        elif [[ "$in_expensive" == true && "$line" =~ ^[a-z]+: ]]; then
+            break
+        fi
+    done < "$MODELS_CONFIG"
+    return 1
+}
+'''
+
+# The same functions on top of the compiled table (as in llm_caller.sh)
+NEW_BASH = r'''
+source "$MODEL_TABLE"
+
+resolve_provider_from_model() {
+    case "${2:-}" in
+        api_models) model_table_api_provider "$1" ;;
+        cli_models) model_table_cli_provider "$1" ;;
+        *) model_table_api_provider "$1" || model_table_cli_provider "$1" ;;
+    esac
+}
+
+get_default_model_for_provider() {
+    model_table_default_model "$1"
+}
+
+is_expensive_model() {
+    [[ -n "$1" ]] && model_table_is_expensive "$1"
+}
+'''
+
+# One llm_caller.sh call's worth of lookups, repeated
+BASH_LOOP = r'''
+for ((i = 0; i < CALLS; i++)); do
+    provider=$(resolve_provider_from_model "$MODEL")
+    default_model=$(get_default_model_for_provider "$provider")
+    is_expensive_model "$MODEL" || true
+done
+echo "$provider|$default_model"
+'''
+
+
+def run_bash(functions: str, model: str, calls: int) -> tuple[float, str]:
+    script = (f'MODELS_CONFIG="{MODELS_CONFIG}"\n'
+              f'MODEL_TABLE="{snapshot_paths()[1]}"\n'
+              f'MODEL="{model}"\nCALLS={calls}\n' + functions + BASH_LOOP)
+    start = time.perf_counter()
+    result = subprocess.run(['bash', '-c', script], capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout.strip()
+
+
+def old_python_lookup(model: str) -> str | None:
+    """system_config.resolve_provider_from_model before the compiled table."""
+    import yaml
+    with open(MODELS_CONFIG, 'r') as f:
+        config = yaml.safe_load(f) or {}
+    for section in ('api_models', 'cli_models'):
+        if model in (config.get(section) or {}):
+            return config[section][model]
+    return None
+
+
+def time_calls(func, model: str, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(model)
+    return time.perf_counter() - start
+
+
+def time_cold(code: str, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+    return (time.perf_counter() - start) / runs
+
+
+def report(label: str, before: float, after: float, unit_calls: int):
+    per_before = before / unit_calls * 1000
+    per_after = after / unit_calls * 1000
+    speedup = per_before / per_after if per_after else float('inf')
+    print(f"  {label:<8} before {per_before:9.3f} ms/call   after {per_after:8.3f} ms/call   "
+          f"({speedup:,.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model/provider resolution")
+    parser.add_argument('--calls', type=int, default=1000, help='Resolutions per run (default: 1000)')
+    parser.add_argument('--cold-runs', type=int, default=20,
+                        help='Fresh processes for the cold-start comparison (default: 20)')
+    parser.add_argument('--model', default='gpt-5.1-codex',
+                        help='Model to resolve (default: one near the end of models.yaml)')
+    args = parser.parse_args()
+
+    load_model_table()  # Make sure the snapshots are current
+
+    print(f"Resolving '{args.model}' {args.calls} times (models.yaml: {MODELS_CONFIG})\n")
+
+    old_time, old_out = run_bash(OLD_BASH, args.model, args.calls)
+    new_time, new_out = run_bash(NEW_BASH, args.model, args.calls)
+    print(f"  bash results: before {old_out!r}, after {new_out!r}")
+
+    old_py = time_calls(old_python_lookup, args.model, args.calls)
+    new_py = time_calls(provider_for_model, args.model, args.calls)
+    if old_python_lookup(args.model) != provider_for_model(args.model):
+        print("✗ Python lookups disagree")
+        sys.exit(1)
+
+    utils_dir = PROJECT_ROOT / "src" / "utils"
+    old_cold = time_cold(
+        f"import yaml; c = yaml.safe_load(open({str(MODELS_CONFIG)!r})); "
+        f"c['api_models'].get({args.model!r}) or c['cli_models'].get({args.model!r})",
+        args.cold_runs)
+    new_cold = time_cold(
+        f"import sys; sys.path.insert(0, {str(utils_dir)!r}); "
+        f"from model_table import provider_for_model; provider_for_model({args.model!r})",
+        args.cold_runs)
+    baseline = time_cold("pass", args.cold_runs)
+
+    print()
+    report('bash', old_time, new_time, args.calls)
+    report('python', old_py, new_py, args.calls)
+    print(f"  {'cold':<8} before {(old_cold - baseline) * 1000:9.3f} ms/proc   "
+          f"after {(new_cold - baseline) * 1000:8.3f} ms/proc   (interpreter start-up excluded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reading large notebooks
+
+Submissions with many plots approach the 50 MB limit, almost all of it
+base64 images in cell outputs. The submission finder, the activity
+extractor, the marker, the unifier and create_overview.py used to json.load
+the whole file; they now use the streaming reader (utils/notebook_reader.py),
+which keeps only each cell's cell_type and source. This compares, on one
+notebook:
+
+  time    seconds per read (best of --runs)
+  memory  peak Python allocation during one read (tracemalloc)
+
+By default the notebook is generated: --cells code cells, each with a PNG
+output, padded to --size-mb.
+
+Usage:
+  python3 dev/bench_notebook_reader.py
+  python3 dev/bench_notebook_reader.py --size-mb 10 --cells 50
+  python3 dev/bench_notebook_reader.py --notebook path/to/submission.ipynb
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src" / "utils"))
+
+from notebook_reader import read_notebook
+
+
+def make_notebook(path: str, size_mb: float, cells: int):
+    """Write a notebook whose outputs bring it to about size_mb."""
+    image_bytes = max(1, int(size_mb * 1024 * 1024 * 3 / 4 / cells))
+    notebook_cells = []
+    for i in range(cells):
+        image = base64.b64encode(os.urandom(image_bytes)).decode('ascii')
+        notebook_cells.append({
+            'cell_type': 'markdown',
+            'metadata': {},
+            'source': [f"**[A{i + 1}]** Plot the results\n", "*Start student input* ↓"],
+        })
+        notebook_cells.append({
+            'cell_type': 'code',
+            'execution_count': i + 1,
+            'metadata': {'tags': []},
+            'source': ["import matplotlib.pyplot as plt\n", f"plt.plot(range({i + 10}))\n", "plt.show()"],
+            'outputs': [
+                {'output_type': 'stream', 'name': 'stdout', 'text': [f"step {n}\n" for n in range(20)]},
+                {'output_type': 'display_data', 'metadata': {},
+                 'data': {'image/png': image, 'text/plain': ["<Figure size 640x480 with 1 Axes>"]}},
+            ],
+        })
+    notebook = {'cells': notebook_cells, 'metadata': {'kernelspec': {'name': 'python3'}},
+                'nbformat': 4, 'nbformat_minor': 5}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(notebook, f, indent=1)
+
+
+def json_load(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def best_time(func, path: str, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func, path: str) -> int:
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs streaming notebook reads")
+    parser.add_argument('--notebook', help='Notebook to read (default: generate one)')
+    parser.add_argument('--size-mb', type=float, default=40, help='Generated notebook size (default: 40)')
+    parser.add_argument('--cells', type=int, default=100, help='Generated code cells with plots (default: 100)')
+    parser.add_argument('--runs', type=int, default=3, help='Reads per method; the best is reported (default: 3)')
+    args = parser.parse_args()
+
+    temp_dir = None
+    path = args.notebook
+    if not path:
+        temp_dir = tempfile.TemporaryDirectory()
+        path = str(Path(temp_dir.name) / 'bench.ipynb')
+        make_notebook(path, args.size_mb, args.cells)
+
+    size = os.path.getsize(path) / 1024 / 1024
+    full = json_load(path)
+    streamed = read_notebook(path)
+    expected = [{key: cell[key] for key in ('cell_type', 'source') if key in cell} for cell in full['cells']]
+    if streamed['cells'] != expected:
+        print("✗ Streamed cells differ from json.load")
+        sys.exit(1)
+    del full, streamed
+    print(f"Reading {path} ({size:.1f} MB, {len(expected)} cells)\n")
+
+    for label, func in (('json.load', json_load), ('streaming', read_notebook)):
+        seconds = best_time(func, path, args.runs)
+        peak = peak_memory(func, path) / 1024 / 1024
+        print(f"  {label:<10} {seconds:7.3f} s/read   peak {peak:8.1f} MB")
+
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Regression check: multi-megabyte prompts reach the provider intact
+
+Prompts travel from the agents to the provider as files and stdin, never as
+command-line arguments (Linux caps a single argument at 128 KiB and the
+whole argv at ARG_MAX). This check sends a prompt of several MB, with a
+system prompt, through every headless path and verifies the provider
+received it byte for byte:
+
+  - api/client.run_llm → llm_caller.sh → claude / gemini / codex CLI, with
+    and without stats tracking (JSON output through extract_llm_stats.py)
+  - llm_caller.sh --prompt-file - (stdin) and --api-model → api/caller.py →
+    a local Anthropic-compatible stub server
+
+The provider CLIs are replaced by a fake executable on PATH that records
+what it received and answers with its SHA-256, so no API key or network
+access is needed. The API path requires the anthropic SDK.
+
+Usage:
+  python3 dev/check_large_prompts.py
+  python3 dev/check_large_prompts.py --size-mb 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+sys.path.insert(0, str(PROJECT_ROOT / "src" / "utils"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+LLM_CALLER = PROJECT_ROOT / "src" / "llm_caller.sh"
+
+# Stands in for claude, gemini and codex: records stdin and argv, answers with
+# the SHA-256 of what it received in the provider's output format
+FAKE_CLI = r'''#!/usr/bin/env python3
+import hashlib, json, os, sys
+name = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+record = os.environ['FAKE_CLI_RECORD']
+data = sys.stdin.buffer.read()
+system = b''
+if '--append-system-prompt-file' in args:
+    with open(args[args.index('--append-system-prompt-file') + 1], 'rb') as f:
+        system = f.read()
+with open(record, 'wb') as f:
+    f.write(data)
+with open(record + '.json', 'w') as f:
+    json.dump({'argv_bytes': sum(len(a.encode()) + 1 for a in sys.argv), 'system': system.decode()}, f)
+text = 'sha256:' + hashlib.sha256(data).hexdigest()
+usage = {'input_tokens': len(data) // 4, 'output_tokens': 10}
+if name == 'claude' and 'stream-json' in args:
+    for event in ({'type': 'stream_event', 'event': {'type': 'content_block_delta',
+                   'delta': {'type': 'text_delta', 'text': text}}},
+                  {'type': 'result', 'result': text, 'usage': usage}):
+        print(json.dumps(event))
+elif name == 'claude' and 'json' in args:
+    print(json.dumps({'result': text, 'usage': usage}))
+elif name == 'gemini' and 'json' in args:
+    print(json.dumps({'response': text, 'stats': {'models': {'fake': {'tokens': {'prompt': usage['input_tokens'], 'candidates': 10}}}}}))
+elif name == 'codex' and '--json' in args:
+    print(json.dumps({'type': 'item.completed', 'item': {'type': 'agent_message', 'text': text}}))
+    print(json.dumps({'type': 'turn.completed', 'usage': usage}))
+elif name == 'codex' and '-o' in args:
+    with open(args[args.index('-o') + 1], 'w') as f:
+        f.write(text)
+else:
+    print(text, end='')
+'''
+
+
+def make_prompt(size_mb: float) -> str:
+    """Multi-line prompt with code, non-ASCII text and shell metacharacters."""
+    block = ("## Student answer\n```python\nprint(\"héllo $HOME `id` 'quoted'\")\n```\n"
+             "Résumé — naïve ∑ café. Backslash \\n and %s %d literals.\n")
+    count = int(size_mb * 1024 * 1024 / len(block.encode('utf-8'))) + 1
+    return block * count + "End of prompt.\n\n"
+
+
+def sha(data: bytes) -> str:
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+def check(label: str, ok: bool, detail: str = '') -> bool:
+    print(f"  {'✓' if ok else '✗'} {label}" + (f" ({detail})" if detail else ''))
+    return ok
+
+
+def check_cli_paths(prompt: str, system_prompt: str, workdir: Path) -> bool:
+    """run_llm → llm_caller.sh → fake CLI for each provider, with and without stats."""
+    from api.client import run_llm
+
+    bin_dir = workdir / 'bin'
+    bin_dir.mkdir()
+    for name in ('claude', 'gemini', 'codex'):
+        path = bin_dir / name
+        path.write_text(FAKE_CLI)
+        path.chmod(0o755)
+
+    record = workdir / 'received'
+    os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    os.environ['FAKE_CLI_RECORD'] = str(record)
+    os.environ.pop('LLM_CACHE_DIR', None)
+
+    ok = True
+    for provider in ('claude', 'gemini', 'codex'):
+        # Gemini and Codex have no system prompt option: the prefix is prepended
+        if provider == 'claude':
+            expected = prompt.encode('utf-8')
+        else:
+            expected = f"{system_prompt}\n\n{prompt}".encode('utf-8')
+
+        for stats in (False, True):
+            stats_file = workdir / f'{provider}_stats.jsonl' if stats else None
+            output = workdir / f'{provider}_{stats}.md'
+            text = run_llm(prompt, provider, model='fake-model', system_prompt=system_prompt,
+                           stats_file=str(stats_file) if stats_file else None,
+                           stats_stage='check', output_file=str(output))
+
+            received = record.read_bytes()
+            meta = json.loads((record.with_name(record.name + '.json')).read_text())
+            label = f"{provider} CLI{' with stats' if stats else ''}"
+            ok &= check(f"{label}: prompt delivered intact", received == expected,
+                        f"{len(received):,} of {len(expected):,} bytes")
+            ok &= check(f"{label}: response matches", text.strip() == sha(expected)
+                        and output.read_text().strip() == sha(expected))
+            ok &= check(f"{label}: argv stays small", meta['argv_bytes'] < 64 * 1024,
+                        f"{meta['argv_bytes']:,} bytes")
+            if provider == 'claude':
+                ok &= check(f"{label}: system prompt passed as a file",
+                            meta['system'] == system_prompt)
+            if stats:
+                ok &= check(f"{label}: stats record written",
+                            stats_file.exists() and len(stats_file.read_text().splitlines()) == 1)
+    return ok
+
+
+def check_api_path(prompt: str, system_prompt: str, workdir: Path) -> bool:
+    """llm_caller.sh --prompt-file - --api-model → api/caller.py → stub server."""
+    try:
+        import anthropic  # noqa: F401
+    except ImportError:
+        print("  - API path skipped (anthropic SDK not installed)")
+        return True
+
+    from bench_llm_client import AnthropicStubHandler
+
+    received = {}
+
+    class RecordingHandler(AnthropicStubHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+            request = json.loads(body)
+            content = request['messages'][0]['content']
+            received['prompt'] = content if isinstance(content, str) else content[0]['text']
+            system = request.get('system', '')
+            received['system'] = system if isinstance(system, str) else system[0]['text']
+            # Replay the body for the stub's own response
+            self.rfile = __import__('io').BytesIO(body)
+            super().do_POST()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    system_file = workdir / 'system.txt'
+    system_file.write_text(system_prompt, encoding='utf-8')
+    env = dict(os.environ,
+               ANTHROPIC_API_KEY='stub',
+               ANTHROPIC_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}")
+    cmd = ['bash', str(LLM_CALLER), '--mode', 'headless', '--api-model', 'claude-haiku-4-5',
+           '--prompt-file', '-', '--system-prompt-file', str(system_file)]
+    try:
+        result = subprocess.run(cmd, input=prompt.encode('utf-8'), capture_output=True, env=env)
+    finally:
+        server.shutdown()
+
+    ok = check("API mode: call succeeded", result.returncode == 0,
+               result.stderr.decode('utf-8', 'replace').strip()[-200:])
+    ok &= check("API mode: prompt delivered intact (stdin → caller.py)",
+                received.get('prompt') == prompt,
+                f"{len(received.get('prompt', '')):,} of {len(prompt):,} chars")
+    ok &= check("API mode: system prompt delivered intact", received.get('system') == system_prompt)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that multi-MB prompts reach the provider intact")
+    parser.add_argument('--size-mb', type=float, default=4, help='Prompt size in MB (default: 4)')
+    args = parser.parse_args()
+
+    prompt = make_prompt(args.size_mb)
+    system_prompt = "You are a marking assistant.\n" + "Rubric line.\n" * 2000
+    print(f"Prompt: {len(prompt.encode('utf-8')):,} bytes, system prompt: "
+          f"{len(system_prompt.encode('utf-8')):,} bytes")
+
+    # The old transport: the same prompt as a single argument
+    try:
+        subprocess.run(['true', prompt])
+        print("  - Prompt fits in a single argument on this system")
+    except OSError as e:
+        print(f"  - As a command-line argument the prompt fails: {e}")
+
+    # The prompt is larger than the context windows in models.yaml; this
+    # checks the transport, so send it unchanged (see api/tokens.py)
+    os.environ['LLM_CONTEXT_FIT'] = 'off'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print("\nCLI mode:")
+        ok = check_cli_paths(prompt, system_prompt, workdir)
+        print("\nAPI mode:")
+        ok &= check_api_path(prompt, system_prompt, workdir)
+
+    print()
+    if not ok:
+        print("✗ Large prompt check failed")
+        sys.exit(1)
+    print("✓ Large prompts delivered intact on every path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,795 @@
+#!/usr/bin/env python3
+"""
+Stand-in LLM API Server
+
+Deterministic local HTTP server answering the three provider APIs used by
+src/api/client.py (and so api/caller.py and llm_caller.sh --api-model), so
+mark_structured.sh and mark_freeform.sh can be run end to end in API mode
+without API keys, network access or cost, and the parallel stages can be
+load-tested against controlled latency and rate limits.
+
+Anthropic (ANTHROPIC_BASE_URL=http://127.0.0.1:<port>):
+  POST /v1/messages                                  JSON or SSE (stream: true)
+OpenAI (OPENAI_BASE_URL=http://127.0.0.1:<port>/v1):
+  POST /v1/chat/completions                          JSON or SSE (stream: true)
+Gemini (GEMINI_BASE_URL=http://127.0.0.1:<port>):
+  POST /v1beta/models/<model>:generateContent        JSON
+  POST /v1beta/models/<model>:streamGenerateContent  SSE (alt=sse)
+Stand-in server state:
+  GET  /stats                                        request, 429 and token counters
+
+The batch routes of dev/batch_stub_server.py are served as well.
+
+Responses are chosen from the agent named in the prompt and follow the
+output formats of src/prompts/ closely enough for the downstream parsers:
+
+  Marker Agent      ### Summary / Mistakes Found / Positive Points / ...,
+                    one <<<BEGIN key>>> ... <<<END key>>> section per key
+                    for packed prompts (src/utils/packing.py)
+  Normalizer Agent  Mistakes and Positive Points tables in the column layout
+                    combine_normalized.py parses, per-student mappings for
+                    every "## Student N: Name" in the input
+  Unifier Agent     Mark breakdown from the approved scheme's activity_marks,
+                    a Student Feedback Card with the exact student name and
+                    "Total Mark: X / Y" (as aggregate_grades.py expects)
+  anything else     a short generic reply
+
+The same prompt always gets the same response (seeded from its SHA-256 and
+--seed), so two runs over the same submissions produce identical markings.
+
+Load shaping:
+  --latency fixed|uniform|normal|lognormal with --latency-mean/--latency-spread
+      time before the first byte; streamed responses are then paced at
+      --tokens-per-second
+  --error-rate P   answer 429 for a fraction P of calls (deterministic per
+      prompt and attempt; at most --max-429s consecutive 429s per prompt)
+  --rpm N          answer 429 once more than N requests arrive within 60 s
+  --chars-per-token N   token counts reported in usage (default: 4); system
+      prompts seen before are reported as cache reads
+
+Stages that create files through CLI tools (pattern designer, name resolver)
+are not served: for an offline run, prepare processed/rubric.md and the
+activity criteria once (or reuse them from a real run) and use --resume.
+
+Usage:
+  python3 dev/llm_stub_server.py --port 8090 --latency lognormal --latency-mean 2
+  ANTHROPIC_BASE_URL=http://127.0.0.1:8090 ANTHROPIC_API_KEY=stub \\
+      ./mark_structured.sh assignments/lab1 --api-model claude-haiku-4-5 --resume
+
+  # Check every provider route through api/client.py and exit
+  python3 dev/llm_stub_server.py --check
+
+  # Throughput of N marker calls at a given concurrency, with 429 injection
+  python3 dev/llm_stub_server.py --bench 200 --concurrency 16 --error-rate 0.1
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).parent))
+from batch_stub_server import PROJECT_ROOT, BatchStore, BatchStubHandler
+
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+AGENT_PATTERN = re.compile(r'You are an? \*\*(Marker|Normalizer|Unifier) Agent\*\*')
+FREEFORM_PATTERN = re.compile(r'# (?:Marker|Normalizer) Agent - Free-form')
+PACKED_SECTION_PATTERN = re.compile(r'^<<<BEGIN (\S+)>>>$', re.MULTILINE)
+PACKED_STUDENT_PATTERN = re.compile(r'^### (S\d+): (.*?)(?=^### S\d+: |\Z)', re.MULTILINE | re.DOTALL)
+CONFIDENCE_PATTERN = re.compile(r'^### Confidence$', re.MULTILINE)
+STUDENT_NAME_PATTERN = re.compile(r'\*\*Student Name\*\*:\s*(.+)')
+ACTIVITY_PATTERN = re.compile(r'Agent - Activity (A?\d+)')
+NORMALIZER_STUDENT_PATTERN = re.compile(r'^## Student (\d+): (.+)$', re.MULTILINE)
+
+MISTAKES = [
+    "The student did not set a random seed, so results are not reproducible.",
+    "The student used the test set during model selection.",
+    "The student did not explain the choice of evaluation metric.",
+    "The student left an unused variable in the final cell.",
+    "The student did not handle missing values before training.",
+    "The student compared results without reporting their scale.",
+]
+
+POSITIVES = [
+    "The student structured the code into small, well-named steps.",
+    "The student checked intermediate results with clear printouts.",
+    "The student explained the outcome in their own words.",
+    "The student went beyond the requirements with an extra comparison.",
+]
+
+
+def _rng(text: str, seed: int) -> random.Random:
+    digest = hashlib.sha256(f"{seed}\0{text}".encode('utf-8')).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _pick(rng: random.Random, items: list, low: int, high: int) -> list:
+    return rng.sample(range(len(items)), rng.randint(low, min(high, len(items))))
+
+
+# ------------------------------------------------------------------ responses
+
+def marker_response(prompt: str, rng: random.Random, freeform: bool) -> str:
+    match = STUDENT_NAME_PATTERN.search(prompt)
+    student = match.group(1).strip() if match else 'the student'
+    match = ACTIVITY_PATTERN.search(prompt)
+    scope = f"Activity {match.group(1)}" if match and not freeform else 'the assignment'
+
+    lines = [
+        "### Summary",
+        f"Stand-in assessment of {student}'s work for {scope}. The work is mostly "
+        "complete, with a few issues noted below.",
+        "",
+        "### Requirements Checklist" if freeform else "### Completeness",
+        f"- [✓] Item 1: {scope} was attempted.",
+        f"- [{'✓' if rng.random() < 0.7 else '✗'}] Item 2: The expected result is produced.",
+        "",
+        "### Mistakes Found",
+    ]
+    mistakes = _pick(rng, MISTAKES, 0, 3)
+    for n, index in enumerate(mistakes, 1):
+        lines += [f"{n}. {MISTAKES[index]}",
+                  f"   - Severity: {rng.choice(['Minor', 'Moderate', 'Severe'])}",
+                  f"   - Location: Cell {rng.randint(1, 12)}",
+                  "   - Impact: Weakens the reliability of the result."]
+    if not mistakes:
+        lines.append("None identified.")
+
+    lines += ["", "### Positive Points"]
+    for n, index in enumerate(_pick(rng, POSITIVES, 1, 2), 1):
+        lines += [f"{n}. {POSITIVES[index]}",
+                  f"   - Quality: {rng.choice(['Good', 'Very Good', 'Excellent'])}",
+                  f"   - Location: Cell {rng.randint(1, 12)}"]
+
+    if freeform:
+        lines += ["", "### Code Quality Analysis",
+                  "**Organization**: Adequate", "**Readability**: Good",
+                  "**Efficiency**: Adequate", "**Best Practices**: Mostly followed"]
+    lines += [
+        "",
+        "### Understanding Assessment",
+        "The student shows a working understanding of the main ideas.",
+        "",
+        "### Potential Academic Integrity Concerns",
+        "No concerns identified",
+        "",
+    ]
+    if freeform:
+        lines += ["### Innovation and Extras", "None noted.", "",
+                  "### Overall Recommendation"]
+    else:
+        lines.append("### Recommendation")
+    lines.append("Keep the clear structure and address the mistakes listed above.")
+    if CONFIDENCE_PATTERN.search(prompt):
+        # Model cascade: self-reported confidence and verdict
+        confidence = rng.randint(40, 98)
+        lines += ["", "### Confidence", f"Confidence: {confidence}",
+                  f"Verdict: {'Minor issues' if confidence >= 60 else 'Unclear'}"]
+    return '\n'.join(lines) + '\n'
+
+
+def normalizer_response(prompt: str, rng: random.Random, freeform: bool) -> str:
+    students = NORMALIZER_STUDENT_PATTERN.findall(prompt)
+    total = len(students) or 1
+    match = ACTIVITY_PATTERN.search(prompt)
+    activity = match.group(1) if match else None
+
+    # Mistake/positive ids per student, then the tables from their frequencies
+    width = 3 if freeform else 1
+    mistake_ids = [f"M{n + 1:0{width}d}" for n in range(len(MISTAKES))]
+    positive_ids = [f"P{n + 1:0{width}d}" for n in range(len(POSITIVES))]
+    assigned = []
+    for _, name in students:
+        student_rng = _rng(name, rng.randint(0, 2**31))
+        assigned.append((sorted(_pick(student_rng, MISTAKES, 0, 3)),
+                         sorted(_pick(student_rng, POSITIVES, 1, 2))))
+
+    lines = ["### Mistakes Table", "",
+             "| Mistake ID | Description | Frequency | Severity (1-10) | Suggested Deduction | Notes |",
+             "|------------|-------------|-----------|-----------------|---------------------|-------|"]
+    for index, description in enumerate(MISTAKES):
+        count = sum(1 for m, _ in assigned if index in m)
+        severity = 2 + index
+        lines.append(f"| {mistake_ids[index]} | {description} | {count}/{total} students | "
+                     f"{severity} | {max(0.5, severity / 4):g} marks | Stand-in |")
+
+    lines += ["", "### Positive Points Table", "",
+              "| Positive ID | Description | Frequency | Quality (1-10) | Suggested Bonus | Notes |",
+              "|-------------|-------------|-----------|----------------|-----------------|-------|"]
+    for index, description in enumerate(POSITIVES):
+        count = sum(1 for _, p in assigned if index in p)
+        lines.append(f"| {positive_ids[index]} | {description} | {count}/{total} students | "
+                     f"{6 + index} | 0 marks | Stand-in |")
+
+    def ids(labels, indexes):
+        return ', '.join(labels[i] for i in indexes) or 'None'
+
+    lines.append("")
+    if freeform:
+        lines.append("### Per-Student Mapping")
+        for (number, name), (mistakes, positives) in zip(students, assigned):
+            lines += ["", f"### Student {number}: {name.strip()}",
+                      f"- **Mistakes**: {ids(mistake_ids, mistakes)}",
+                      f"- **Positives**: {ids(positive_ids, positives)}"]
+    else:
+        lines.append("### Per-Student Mistake/Positive Mapping")
+        for (number, name), (mistakes, positives) in zip(students, assigned):
+            lines.append(f"*   **Student {number} ({name.strip()})**: Mistakes: "
+                         f"{ids(mistake_ids, mistakes)}; Positives: {ids(positive_ids, positives)}")
+        lines += ["", "### Marking Recommendations", "",
+                  f"**Total Marks Available for Activity {activity}**: From rubric"]
+    return '\n'.join(lines) + '\n'
+
+
+def _scheme_marks(text: str) -> tuple[dict, float]:
+    """activity_marks and total_marks from the approved scheme JSON in a unifier prompt."""
+    activity_marks = {}
+    match = re.search(r'"activity_marks":\s*\{([^}]*)\}', text)
+    if match:
+        for activity, marks in re.findall(r'"(A?\d+)":\s*([\d.]+)', match.group(1)):
+            activity_marks[activity] = float(marks)
+    match = re.search(r'"total_marks":\s*([\d.]+)', text)
+    total = float(match.group(1)) if match else sum(activity_marks.values()) or 100.0
+    return activity_marks, total
+
+
+def unifier_response(prompt: str, rng: random.Random) -> str:
+    match = STUDENT_NAME_PATTERN.search(prompt)
+    student = match.group(1).strip() if match else 'Student'
+    activity_marks, total = _scheme_marks(prompt)
+
+    breakdown = []
+    if activity_marks:
+        awarded = 0.0
+        for activity, marks in sorted(activity_marks.items(), key=lambda a: int(a[0].lstrip('A'))):
+            mark = round(marks * rng.uniform(0.5, 1.0) * 2) / 2
+            awarded += mark
+            breakdown.append(f"Activity {activity.lstrip('A')}: {mark:g} / {marks:g}")
+    else:
+        awarded = round(total * rng.uniform(0.5, 1.0) * 2) / 2
+        breakdown.append(f"Component 1: {awarded:g} / {total:g}")
+
+    return '\n'.join([
+        "### Mark Breakdown",
+        "",
+        *(f"- {line}" for line in breakdown),
+        "",
+        f"**Total Mark**: {awarded:g} / {total:g}",
+        "",
+        "### Calculation Details",
+        "Deductions from the approved scheme applied to the marker findings.",
+        "",
+        "### Student Feedback Card",
+        "",
+        "```",
+        f"ASSIGNMENT FEEDBACK - {student}",
+        "",
+        f"Total Mark: {awarded:g} / {total:g}",
+        "",
+        *breakdown,
+        "",
+        "OVERALL COMMENTS:",
+        "Your work is well organised and mostly correct. Review the points below",
+        "to strengthen the reliability of your results.",
+        "",
+        "STRENGTHS:",
+        "• Clear structure",
+        "",
+        "AREAS FOR IMPROVEMENT:",
+        "• Make results reproducible",
+        "```",
+    ]) + '\n'
+
+
+def generate_response(system: str, prompt: str, seed: int) -> tuple[str, str]:
+    """
+    Deterministic response for a request.
+
+    Returns:
+        Tuple of (stage, text): stage is marker, normalizer, unifier or generic
+    """
+    text = f"{system}\n\n{prompt}" if system else prompt
+    rng = _rng(text, seed)
+    match = AGENT_PATTERN.search(text)
+    if not match:
+        return 'generic', f"Stand-in response ({hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}).\n"
+
+    stage = match.group(1).lower()
+    freeform = bool(FREEFORM_PATTERN.search(text))
+    if stage == 'normalizer':
+        return stage, normalizer_response(text, rng, freeform)
+
+    def respond(part: str) -> str:
+        if stage == 'marker':
+            return marker_response(part, rng, freeform)
+        return unifier_response(part, rng)
+
+    keys = list(dict.fromkeys(PACKED_SECTION_PATTERN.findall(text)))
+    if not keys:
+        return stage, respond(text)
+
+    # Packed prompt: answer each student's block (### S<n>: Name) on its own
+    blocks = dict(PACKED_STUDENT_PATTERN.findall(prompt))
+    sections = []
+    for key in keys:
+        part = system + "\n\n" + blocks[key] if key in blocks else text
+        sections.append(f"<<<BEGIN {key}>>>\n{respond(part)}<<<END {key}>>>\n")
+    return stage, '\n'.join(sections)
+
+
+# ---------------------------------------------------------------- load shaping
+
+class StubState:
+    """Configuration and counters shared by all handler threads."""
+
+    def __init__(self, args):
+        self.seed = args.seed
+        self.latency = args.latency
+        self.latency_mean = args.latency_mean
+        self.latency_spread = args.latency_spread
+        self.tokens_per_second = args.tokens_per_second
+        self.error_rate = args.error_rate
+        self.max_429s = args.max_429s
+        self.rpm = args.rpm
+        self.retry_after = args.retry_after
+        self.chars_per_token = args.chars_per_token
+
+        self.lock = threading.Lock()
+        self.latency_rng = random.Random(args.seed)
+        self.attempts = {}          # prompt hash -> consecutive 429s
+        self.systems_seen = set()
+        self.window = deque()       # arrival times for --rpm
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'responses': 0, 'rate_limited': 0, 'peak_in_flight': 0,
+                         'input_tokens': 0, 'output_tokens': 0, 'cache_read_tokens': 0,
+                         'by_stage': {}, 'by_provider': {}}
+
+    def tokens(self, text: str) -> int:
+        return max(1, math.ceil(len(text) / self.chars_per_token)) if text else 0
+
+    def sample_latency(self) -> float:
+        mean, spread = self.latency_mean, self.latency_spread
+        with self.lock:
+            if self.latency == 'uniform':
+                value = self.latency_rng.uniform(mean - spread, mean + spread)
+            elif self.latency == 'normal':
+                value = self.latency_rng.gauss(mean, spread)
+            elif self.latency == 'lognormal' and mean > 0:
+                # spread is the standard deviation of the resulting latency
+                sigma = math.sqrt(math.log(1 + (spread / mean) ** 2))
+                value = self.latency_rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+            else:
+                value = mean
+        return max(0.0, value)
+
+    def admit(self, key: str) -> bool:
+        """Record an arriving request; False if it should be answered with 429."""
+        now = time.time()
+        with self.lock:
+            self.counters['requests'] += 1
+            if self.rpm:
+                while self.window and now - self.window[0] > 60:
+                    self.window.popleft()
+                if len(self.window) >= self.rpm:
+                    self.counters['rate_limited'] += 1
+                    return False
+                self.window.append(now)
+
+            attempt = self.attempts.get(key, 0)
+            draw = _rng(f"{key}:{attempt}", self.seed).random()
+            if self.error_rate and attempt < self.max_429s and draw < self.error_rate:
+                self.attempts[key] = attempt + 1
+                self.counters['rate_limited'] += 1
+                return False
+            self.attempts.pop(key, None)
+
+            self.in_flight += 1
+            self.counters['peak_in_flight'] = max(self.counters['peak_in_flight'], self.in_flight)
+            return True
+
+    def usage(self, system: str, prompt: str, text: str) -> tuple[int, int, int]:
+        """(uncached input, output, cache read) tokens; repeated system prompts are cache reads."""
+        system_tokens = self.tokens(system)
+        with self.lock:
+            key = hashlib.sha256(system.encode('utf-8')).hexdigest() if system else None
+            cached = system_tokens if key in self.systems_seen else 0
+            if key:
+                self.systems_seen.add(key)
+        return system_tokens - cached + self.tokens(prompt), self.tokens(text), cached
+
+    def finish(self, provider: str, stage: str, usage: tuple[int, int, int]):
+        with self.lock:
+            self.in_flight -= 1
+            counters = self.counters
+            counters['responses'] += 1
+            counters['input_tokens'] += usage[0]
+            counters['output_tokens'] += usage[1]
+            counters['cache_read_tokens'] += usage[2]
+            counters['by_stage'][stage] = counters['by_stage'].get(stage, 0) + 1
+            counters['by_provider'][provider] = counters['by_provider'].get(provider, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return json.loads(json.dumps(dict(self.counters, in_flight=self.in_flight)))
+
+
+def _chunks(text: str, size: int = 64) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+
+def _text(content) -> str:
+    """Text of a message content (string or list of content blocks/parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        content = content.get('parts', [content])
+    return ''.join(part.get('text', '') for part in content or [] if isinstance(part, dict))
+
+
+# ---------------------------------------------------------------- handler
+
+class LLMStubHandler(BatchStubHandler):
+    state: StubState = None
+
+    def send_sse(self, events: list, pace: float):
+        """Send (event name or None, payload) pairs as server-sent events."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        for name, payload in events:
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            frame = (f"event: {name}\n" if name else '') + f"data: {data}\n\n"
+            self.wfile.write(frame.encode('utf-8'))
+            self.wfile.flush()
+            if pace:
+                time.sleep(pace)
+
+    def send_rate_limited(self, provider: str):
+        retry_after = self.state.retry_after
+        if provider == 'claude':
+            payload = {'type': 'error', 'error': {'type': 'rate_limit_error',
+                                                  'message': 'Stand-in rate limit exceeded'}}
+        elif provider == 'openai':
+            payload = {'error': {'message': 'Stand-in rate limit exceeded', 'type': 'requests',
+                                 'code': 'rate_limit_exceeded'}}
+        else:
+            payload = {'error': {'code': 429, 'message': 'Stand-in quota exceeded',
+                                 'status': 'RESOURCE_EXHAUSTED'}}
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(429)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('retry-after', str(max(1, math.ceil(retry_after))))
+        self.send_header('retry-after-ms', str(int(retry_after * 1000)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_completion(self, provider: str, model: str, system: str, prompt: str, stream: bool):
+        state = self.state
+        key = hashlib.sha256(f"{provider}\0{model}\0{system}\0{prompt}".encode('utf-8')).hexdigest()
+        if not state.admit(key):
+            self.send_rate_limited(provider)
+            return
+
+        stage, text = generate_response(system, prompt, state.seed)
+        usage = state.usage(system, prompt, text)
+        try:
+            time.sleep(state.sample_latency())
+            chunks = _chunks(text)
+            pace = 0.0
+            if stream and state.tokens_per_second:
+                pace = usage[1] / state.tokens_per_second / len(chunks)
+            render = {'claude': self.anthropic_reply, 'openai': self.openai_reply,
+                      'gemini': self.gemini_reply}[provider]
+            render(model, text, chunks, usage, stream, pace)
+        finally:
+            state.finish(provider, stage, usage)
+
+    def anthropic_reply(self, model, text, chunks, usage, stream, pace):
+        input_tokens, output_tokens, cached = usage
+        message = {'id': f"msg_stub_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}",
+                   'type': 'message', 'role': 'assistant', 'model': model,
+                   'stop_reason': 'end_turn', 'stop_sequence': None}
+        usage_block = {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                       'cache_creation_input_tokens': 0, 'cache_read_input_tokens': cached}
+        if not stream:
+            self.send_json(dict(message, content=[{'type': 'text', 'text': text}], usage=usage_block))
+            return
+
+        start = dict(message, content=[], stop_reason=None, usage=dict(usage_block, output_tokens=1))
+        events = [('message_start', {'type': 'message_start', 'message': start}),
+                  ('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                           'content_block': {'type': 'text', 'text': ''}})]
+        events += [('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                             'delta': {'type': 'text_delta', 'text': chunk}})
+                   for chunk in chunks]
+        events += [('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+                   ('message_delta', {'type': 'message_delta',
+                                      'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                      'usage': {'output_tokens': output_tokens}}),
+                   ('message_stop', {'type': 'message_stop'})]
+        self.send_sse(events, pace)
+
+    def openai_reply(self, model, text, chunks, usage, stream, pace):
+        input_tokens, output_tokens, cached = usage
+        prompt_tokens = input_tokens + cached
+        usage_block = {'prompt_tokens': prompt_tokens, 'completion_tokens': output_tokens,
+                       'total_tokens': prompt_tokens + output_tokens,
+                       'prompt_tokens_details': {'cached_tokens': cached}}
+        base = {'id': f"chatcmpl-stub{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}",
+                'created': int(time.time()), 'model': model}
+        if not stream:
+            self.send_json(dict(base, object='chat.completion', usage=usage_block, choices=[
+                {'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': text}}]))
+            return
+
+        def chunk(delta, finish=None):
+            return (None, dict(base, object='chat.completion.chunk',
+                               choices=[{'index': 0, 'delta': delta, 'finish_reason': finish}]))
+
+        events = [chunk({'role': 'assistant', 'content': ''})]
+        events += [chunk({'content': piece}) for piece in chunks]
+        events.append(chunk({}, 'stop'))
+        if self.request_json.get('stream_options', {}).get('include_usage'):
+            events.append((None, dict(base, object='chat.completion.chunk', choices=[], usage=usage_block)))
+        events.append((None, '[DONE]'))
+        self.send_sse(events, pace)
+
+    def gemini_reply(self, model, text, chunks, usage, stream, pace):
+        input_tokens, output_tokens, cached = usage
+
+        def response(piece, final):
+            candidate = {'content': {'role': 'model', 'parts': [{'text': piece}]}, 'index': 0}
+            if final:
+                candidate['finishReason'] = 'STOP'
+            return {'candidates': [candidate], 'modelVersion': model, 'usageMetadata': {
+                'promptTokenCount': input_tokens + cached,
+                'candidatesTokenCount': output_tokens if final else 0,
+                'totalTokenCount': input_tokens + cached + (output_tokens if final else 0),
+                'cachedContentTokenCount': cached}}
+
+        if not stream:
+            self.send_json(response(text, True))
+            return
+        self.send_sse([(None, response(piece, n == len(chunks) - 1)) for n, piece in enumerate(chunks)], pace)
+
+    # --------------------------------------------------------------- routing
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path not in ('/v1/messages', '/v1/chat/completions') and not path.startswith('/v1beta/models/'):
+            super().do_POST()
+            return
+
+        self.request_json = request = json.loads(self.read_body() or b'{}')
+        if path == '/v1/messages':
+            system = _text(request.get('system', ''))
+            prompt = '\n'.join(_text(m.get('content')) for m in request.get('messages', []))
+            self.handle_completion('claude', request.get('model', 'stub'), system, prompt,
+                                   bool(request.get('stream')))
+
+        elif path == '/v1/chat/completions':
+            messages = request.get('messages', [])
+            system = '\n'.join(_text(m.get('content')) for m in messages
+                               if m.get('role') in ('system', 'developer'))
+            prompt = '\n'.join(_text(m.get('content')) for m in messages
+                               if m.get('role') not in ('system', 'developer'))
+            self.handle_completion('openai', request.get('model', 'stub'), system, prompt,
+                                   bool(request.get('stream')))
+
+        else:
+            model, _, method = path[len('/v1beta/models/'):].partition(':')
+            system = _text(request.get('systemInstruction') or request.get('system_instruction') or '')
+            prompt = '\n'.join(_text(c) for c in request.get('contents', []))
+            self.handle_completion('gemini', model, system, prompt, method == 'streamGenerateContent')
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self.send_json(self.state.snapshot())
+            return
+        super().do_GET()
+
+
+def start_server(args, port: int | None = None) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread."""
+    LLMStubHandler.store = BatchStore(args.batch_delay)
+    LLMStubHandler.state = StubState(args)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port if port is None else port), LLMStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def point_sdks_at(server: ThreadingHTTPServer):
+    """Point the provider SDKs used by api/client.py at the server."""
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['ANTHROPIC_BASE_URL'] = base_url
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ['GEMINI_BASE_URL'] = base_url
+    for var in ('ANTHROPIC_API_KEY', 'OPENAI_API_KEY', 'GEMINI_API_KEY'):
+        os.environ.setdefault(var, 'stub-key')
+    os.environ.pop('LLM_CACHE_DIR', None)
+
+
+# ---------------------------------------------------------------- check / bench
+
+CHECK_PROMPTS = {
+    'marker': ("# Marker Agent - Activity A2\n\nYou are a **Marker Agent** evaluating student work "
+               "for **Activity A2**.",
+               "**Student Name**: Ada Lovelace\n\n## Student's Work for Activity A2\nprint(1)"),
+    'normalizer': ("# Normalizer Agent - Activity A2\n\nYou are a **Normalizer Agent**.",
+                   "## Student 1: Ada Lovelace\n\n### Summary\n...\n\n## Student 2: Alan Turing\n\n"
+                   "### Summary\n..."),
+    'unifier': ("# Unifier Agent - Student Assessment\n\nYou are a **Unifier Agent**.\n\n"
+                '{"activity_marks": {"A1": 10, "A2": 15}, "total_marks": 25}',
+                "**Student Name**: Ada Lovelace"),
+}
+
+
+def run_check(server: ThreadingHTTPServer) -> bool:
+    """Call every stage through api/client.py for each provider whose SDK is installed."""
+    from api.client import complete
+    from api.streaming import StreamSink, feedback_card_validator
+
+    point_sdks_at(server)
+    ok = True
+    for provider, module, model in [('claude', 'anthropic', 'claude-haiku-4-5'),
+                                    ('openai', 'openai', 'gpt-5-mini'),
+                                    ('gemini', 'google.generativeai', 'gemini-2.5-flash')]:
+        try:
+            __import__(module)
+        except ImportError:
+            print(f"  - {provider}: skipped ({module} not installed)")
+            continue
+
+        for stage, (system, prompt) in CHECK_PROMPTS.items():
+            try:
+                text, stats = complete(model, prompt, system_prompt=system, provider=provider)
+                again, _ = complete(model, prompt, system_prompt=system, provider=provider)
+            except Exception as e:
+                ok = False
+                print(f"  ✗ {provider} {stage}: {e}")
+                continue
+
+            expected = generate_response(system, prompt, server.RequestHandlerClass.state.seed)[1]
+            checks = [text == expected == again, stats['input_tokens'] > 0, stats['output_tokens'] > 0]
+            if stage == 'normalizer':
+                checks.append('**Student 2 (Alan Turing)**' in text)
+            if stage == 'unifier':
+                checks += ['ASSIGNMENT FEEDBACK - Ada Lovelace' in text, ' / 25\n' in text]
+                checks.append(feedback_card_validator().check(text, final=True) is None)
+            passed = all(checks)
+            ok &= passed
+            print(f"  {'✓' if passed else '✗'} {provider} {stage}: {stats['input_tokens']} in / "
+                  f"{stats['output_tokens']} out, cache read {stats['cache_read_tokens']}")
+
+        # Streamed through the same route
+        try:
+            sink = StreamSink(validator=feedback_card_validator())
+            text, _ = complete(model, CHECK_PROMPTS['unifier'][1], system_prompt=CHECK_PROMPTS['unifier'][0],
+                               provider=provider, sink=sink)
+            passed = sink.text == text and 'Total Mark:' in text
+        except Exception as e:
+            passed = False
+            print(f"    {e}")
+        ok &= passed
+        print(f"  {'✓' if passed else '✗'} {provider} streaming")
+
+    stats = server.RequestHandlerClass.state.snapshot()
+    print(f"  Server: {stats['responses']} responses, {stats['rate_limited']} rate limited")
+    return ok
+
+
+def run_bench(server: ThreadingHTTPServer, calls: int, concurrency: int, model: str, provider: str) -> bool:
+    """Send marker-shaped calls through api/client.py from a thread pool and report throughput."""
+    from api.client import complete
+
+    point_sdks_at(server)
+    system = CHECK_PROMPTS['marker'][0] + "\n\n" + "Marking criteria line.\n" * 200
+    latencies, retries, failures = [], [], []
+
+    def one(n: int):
+        prompt = f"**Student Name**: Student {n}\n\n## Student's Work for Activity A2\nprint({n})"
+        start = time.perf_counter()
+        try:
+            _, stats = complete(model, prompt, system_prompt=system, provider=provider)
+        except Exception as e:
+            failures.append(str(e))
+            return
+        latencies.append(time.perf_counter() - start)
+        retries.append(stats.get('retries', 0))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+
+    stats = server.RequestHandlerClass.state.snapshot()
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    print(f"  {len(latencies)}/{calls} calls in {elapsed:.1f} s ({len(latencies) / elapsed:.1f} calls/s), "
+          f"concurrency {concurrency}, peak at server {stats['peak_in_flight']}")
+    print(f"  Latency p50 {percentile(0.5):.2f} s, p95 {percentile(0.95):.2f} s, max {percentile(1.0):.2f} s")
+    print(f"  429s served {stats['rate_limited']}, retries {sum(retries)}, failed calls {len(failures)}")
+    print(f"  Tokens: {stats['input_tokens']:,} in, {stats['output_tokens']:,} out, "
+          f"{stats['cache_read_tokens']:,} cache read")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deterministic stand-in LLM API server')
+    parser.add_argument('--port', type=int, default=8090, help='Port to listen on (default: 8090)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for responses and latency (default: 0)')
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'normal', 'lognormal'], default='fixed',
+                        help='Latency distribution before the first byte (default: fixed)')
+    parser.add_argument('--latency-mean', type=float, default=0.0, help='Mean latency in seconds (default: 0)')
+    parser.add_argument('--latency-spread', type=float, default=0.0,
+                        help='Half-width (uniform) or standard deviation (normal, lognormal) in seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0,
+                        help='Pace streamed output at this rate (default: unpaced)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with 429')
+    parser.add_argument('--max-429s', type=int, default=2,
+                        help='Most consecutive injected 429s for one prompt (default: 2)')
+    parser.add_argument('--rpm', type=int, default=0, help='Answer 429 above this many requests per minute')
+    parser.add_argument('--retry-after', type=float, default=0.5,
+                        help='Retry-After sent with 429s, in seconds (default: 0.5)')
+    parser.add_argument('--chars-per-token', type=float, default=4.0,
+                        help='Characters per reported token (default: 4)')
+    parser.add_argument('--batch-delay', type=float, default=2.0,
+                        help='Seconds a batch stays in progress (default: 2)')
+    parser.add_argument('--check', action='store_true',
+                        help='Call every stage for each provider against an in-process server and exit')
+    parser.add_argument('--bench', type=int, metavar='CALLS',
+                        help='Send CALLS marker calls against an in-process server and report throughput')
+    parser.add_argument('--concurrency', type=int, default=8, help='Parallel calls for --bench (default: 8)')
+    parser.add_argument('--model', default='claude-haiku-4-5', help='API model for --bench')
+    parser.add_argument('--provider', default='claude', choices=['claude', 'openai', 'gemini'],
+                        help='Provider for --bench (default: claude)')
+    args = parser.parse_args()
+
+    if args.check:
+        server = start_server(args, port=0)
+        print("Checking provider routes against stand-in server...")
+        ok = run_check(server)
+        server.shutdown()
+        sys.exit(0 if ok else 1)
+
+    if args.bench:
+        server = start_server(args, port=0)
+        print(f"Benchmarking {args.bench} {args.provider} calls against stand-in server...")
+        ok = run_bench(server, args.bench, args.concurrency, args.model, args.provider)
+        server.shutdown()
+        sys.exit(0 if ok else 1)
+
+    server = start_server(args)
+    print(f"Stand-in LLM server listening on http://127.0.0.1:{args.port}")
+    print(f"  export ANTHROPIC_BASE_URL=http://127.0.0.1:{args.port}")
+    print(f"  export OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    print(f"  export GEMINI_BASE_URL=http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -50,6 +50,11 @@ FORCE_COMPLETE=false
 PROVIDER_OVERRIDE=""
 MODEL_OVERRIDE=""
 API_MODEL=""  # When set, use direct API calls instead of CLI for headless stages
+BATCH_API=false  # Submit marker/unifier calls as provider batch jobs (API mode)
+USE_CACHE=true  # Answer byte-identical LLM prompts from <assignment>/.llm_cache
+USE_BROKER=false  # Route API calls through one long-lived LLM broker process
+HEDGE_MODEL=""  # Duplicate API calls slower than the stage p95 to this model ("same" = --api-model)
+BUDGET=""  # Stop dispatching LLM tasks once this run has spent this many USD
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -87,6 +92,10 @@ while [[ $# -gt 0 ]]; do
             FORCE_COMPLETE=true
             shift
             ;;
+        --budget)
+            BUDGET="$2"
+            shift 2
+            ;;
         --provider)
             PROVIDER_OVERRIDE="$2"
             shift 2
@@ -99,6 +108,22 @@ while [[ $# -gt 0 ]]; do
             API_MODEL="$2"
             shift 2
             ;;
+        --batch-api)
+            BATCH_API=true
+            shift
+            ;;
+        --no-cache)
+            USE_CACHE=false
+            shift
+            ;;
+        --broker)
+            USE_BROKER=true
+            shift
+            ;;
+        --hedge)
+            HEDGE_MODEL="$2"
+            shift 2
+            ;;
         -*)
             echo "Unknown option: $1" >&2
             echo "Usage: $0 <assignment_directory> [OPTIONS]" >&2
@@ -126,9 +151,14 @@ if [[ -z "${ASSIGNMENT_DIR:-}" ]]; then
     echo "  --parallel N          Override max parallel tasks (default from config)"
     echo "  --auto-approve        Skip interactive stages (pattern design, dashboard approval)"
     echo "  --force-complete      Generate zero-mark feedback for failed students and continue"
+    echo "  --budget USD          Stop dispatching LLM tasks once the run's cost would exceed USD"
     echo "  --provider NAME       Override LLM provider (claude, gemini, or codex)"
     echo "  --model NAME          Override model name (for CLI calls)"
     echo "  --api-model NAME      Use direct API calls for headless stages (requires API key)"
+    echo "  --batch-api           Submit marker/unifier calls as provider batch jobs (with --api-model)"
+    echo "  --no-cache            Bypass the LLM response cache (always call the provider)"
+    echo "  --broker              Keep provider connections warm in one broker process (with --api-model)"
+    echo "  --hedge MODEL         Resend API calls slower than the stage p95 to MODEL (or 'same')"
     exit 1
 fi
 
@@ -250,6 +280,13 @@ log_info "  Default model: ${DEFAULT_MODEL:-default}${MODEL_OVERRIDE:+ (overridd
 if [[ -n "$API_MODEL" ]]; then
     log_info "  API model: $API_MODEL (headless stages will use direct API calls)"
 fi
+if [[ "$BATCH_API" == true ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_error "--batch-api requires --api-model"
+        exit 1
+    fi
+    log_info "  Batch API: ENABLED (marker/unifier calls submitted as provider batch jobs)"
+fi
 if [[ "$AUTO_APPROVE" == true ]]; then
     log_info "  Auto-approve: ENABLED (skipping interactive stages)"
 fi
@@ -267,6 +304,9 @@ else
 fi
 
 log_info "  Total marks: $TOTAL_MARKS"
+if [[ -n "$BUDGET" ]]; then
+    log_info "  Budget: \$$BUDGET (no new LLM tasks once spent plus projected cost exceeds it)"
+fi
 
 # Function to get model for a specific stage
 # Priority: stage-specific > assignment default > none (use provider default)
@@ -312,8 +352,33 @@ SESSIONS_DIR="$PROCESSED_DIR/sessions"
 STATS_DIR="$PROCESSED_DIR/stats"
 STATS_FILE="$STATS_DIR/token_usage.jsonl"
 
+# Stats records written from now on count against --budget
+RUN_STARTED="$(date +%Y-%m-%dT%H:%M:%S)"
+
+# Stop the run (keeping completed outputs for resume) once the budget is spent
+check_budget() {
+    if [[ -z "$BUDGET" ]]; then
+        return 0
+    fi
+
+    local budget_status
+    if ! budget_status=$(python3 "$SRC_DIR/utils/budget.py" check --budget "$BUDGET" \
+            --since "$RUN_STARTED" --stats-file "$STATS_FILE"); then
+        log_error "$budget_status"
+        log_info "Completed outputs are kept. Re-run with a higher --budget to resume."
+        exit 1
+    fi
+}
+
 mkdir -p "$MARKINGS_DIR" "$NORMALIZED_DIR" "$FINAL_DIR" "$LOGS_DIR" "$SESSIONS_DIR" "$STATS_DIR"
 
+# Persistent LLM response cache (outside processed/ so --clean keeps it)
+if [[ "$USE_CACHE" == true ]]; then
+    export LLM_CACHE_DIR="${LLM_CACHE_DIR:-$ASSIGNMENT_DIR/.llm_cache}"
+else
+    unset LLM_CACHE_DIR
+fi
+
 # Clean mode: remove processed directory
 if [[ "${CLEAN_MODE:-false}" == true ]]; then
     log_warning "Clean mode: Removing processed directory..."
@@ -329,6 +394,37 @@ if [[ $RESUME == true ]]; then
     log_info "Resume mode: Will skip completed stages and tasks"
 fi
 
+# Optional hedging: an API call still unanswered after the p95 latency of its
+# stage is duplicated to HEDGE_MODEL and the first valid response is used
+if [[ -n "$HEDGE_MODEL" ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_warning "--hedge only applies to API mode (--api-model); ignoring"
+    else
+        export LLM_HEDGE_MODEL="$HEDGE_MODEL"
+        log_info "Hedging: calls slower than their stage's p95 are duplicated to ${HEDGE_MODEL/#same/$API_MODEL}"
+    fi
+fi
+
+# Optional LLM broker: one long-lived process makes every API call of this run
+# over warm provider connections (rate limiting, retries and stats writes in
+# one place); task processes reach it through LLM_BROKER_SOCKET
+if [[ "$USE_BROKER" == true ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_warning "--broker only applies to API mode (--api-model); ignoring"
+    else
+        LLM_BROKER_SOCKET="${TMPDIR:-/tmp}/llm_broker_$$.sock"
+        if python3 "$SRC_DIR/api/broker.py" start --socket "$LLM_BROKER_SOCKET" \
+                --log "$LOGS_DIR/llm_broker.log" --parent-pid $$ --model "$API_MODEL" >/dev/null; then
+            export LLM_BROKER_SOCKET
+            trap 'python3 "$SRC_DIR/api/broker.py" stop --socket "$LLM_BROKER_SOCKET" >/dev/null 2>&1 || true' EXIT
+            log_success "LLM broker started ($LLM_BROKER_SOCKET)"
+        else
+            unset LLM_BROKER_SOCKET
+            log_warning "LLM broker did not start (see $LOGS_DIR/llm_broker.log); tasks will call the API directly"
+        fi
+    fi
+fi
+
 # ============================================================================
 # STAGE 1: Find Submissions
 # ============================================================================
@@ -454,9 +550,40 @@ if [[ -d "$LOGS_DIR/marker_logs" ]]; then
     rm -rf "$LOGS_DIR/marker_logs"
 fi
 
+# Run a JSONL task list through the async engine (API mode only)
+run_async_engine() {
+    local tasks_file="$1"
+    local log_dir="$2"
+
+    local engine_args=(
+        --tasks "$tasks_file"
+        --api-model "$API_MODEL"
+        --concurrency "$MAX_PARALLEL"
+        --stats-file "$STATS_FILE"
+        --log-dir "$log_dir"
+    )
+
+    if [[ $RESUME == false ]]; then
+        engine_args+=(--no-resume)
+    fi
+
+    if [[ "$BATCH_API" == true ]]; then
+        engine_args+=(--batch-api)
+    fi
+
+    if [[ -n "$BUDGET" ]]; then
+        engine_args+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+    fi
+
+    python3 "$SRC_DIR/api/engine.py" "${engine_args[@]}"
+}
+
 # Create task list for parallel execution
+# In API mode the same tasks are also written as JSONL for the async engine
 MARKER_TASKS="$PROCESSED_DIR/marker_tasks.txt"
+MARKER_TASKS_JSONL="$PROCESSED_DIR/marker_tasks.jsonl"
 > "$MARKER_TASKS"
+> "$MARKER_TASKS_JSONL"
 
 # Generate marker tasks (one per student for free-form)
 # In resume mode, skip tasks where output file already exists
@@ -476,6 +603,19 @@ jq -r '.submissions[] | .path + "|" + .student_name' "$SUBMISSIONS_MANIFEST" | w
         fi
 
         echo "$task_cmd" >> "$MARKER_TASKS"
+
+        if [[ -n "$API_MODEL" ]]; then
+            problem_context=""
+            if [[ "$DIFFERENT_PROBLEMS" == "true" && -f "$PROBLEM_CONTEXTS" ]]; then
+                problem_context="$PROBLEM_CONTEXTS"
+            fi
+            jq -n -c --arg student "$student_name" --arg submission "$submission_path" \
+                --arg criteria "$PROCESSED_DIR/marking_criteria.md" --arg problem_context "$problem_context" \
+                --arg output "$output_file" \
+                '{agent: "marker", student: $student, submission: $submission, criteria: $criteria, type: "freeform", output: $output}
+                 + (if $problem_context != "" then {problem_context: $problem_context} else {} end)' \
+                >> "$MARKER_TASKS_JSONL"
+        fi
     fi
 done
 
@@ -492,19 +632,31 @@ else
         log_info "Generated $TASKS_TO_RUN marker tasks"
     fi
 
+    check_budget
+
     # Run markers in parallel
-    PARALLEL_ARGS=(
-        --tasks "$MARKER_TASKS"
-        --concurrency "$MAX_PARALLEL"
-        --output-dir "$LOGS_DIR/marker_logs"
-        --verbose
-    )
+    if [[ -n "$API_MODEL" ]]; then
+        # API mode: one process, concurrent requests over pooled connections
+        run_async_engine "$MARKER_TASKS_JSONL" "$LOGS_DIR/marker_logs" || true
+    else
+        PARALLEL_ARGS=(
+            --tasks "$MARKER_TASKS"
+            --concurrency "$MAX_PARALLEL"
+            --output-dir "$LOGS_DIR/marker_logs"
+            --provider "$DEFAULT_PROVIDER"
+            --verbose
+        )
 
-    if [[ $FORCE_XARGS == true ]]; then
-        PARALLEL_ARGS+=(--force-xargs)
-    fi
+        if [[ $FORCE_XARGS == true ]]; then
+            PARALLEL_ARGS+=(--force-xargs)
+        fi
 
-    "$SRC_DIR/parallel_runner.sh" "${PARALLEL_ARGS[@]}" || true
+        if [[ -n "$BUDGET" ]]; then
+            PARALLEL_ARGS+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+        fi
+
+        "$SRC_DIR/parallel_runner.sh" "${PARALLEL_ARGS[@]}" || true
+    fi
 
     log_success "Marker agents completed"
 fi
@@ -518,6 +670,9 @@ MISSING_MARKINGS=$((TOTAL_STUDENTS - EXISTING_MARKINGS))
 if [[ $MISSING_MARKINGS -gt 0 ]]; then
     log_warning "Found $MISSING_MARKINGS missing marking file(s) out of $TOTAL_STUDENTS students"
 
+    # A spent budget stops the run here instead of force-completing the rest
+    check_budget
+
     if [[ "$FORCE_COMPLETE" == true ]]; then
         log_info "Creating placeholder markings for failed tasks (--force-complete)..."
 
@@ -577,6 +732,7 @@ if [[ $RESUME == true && -f "$SCORING_OUTPUT" ]]; then
     log_info "Stage 4: Skipping (scoring already exists)"
     log_success "Normalization complete"
 else
+    check_budget
     log_info "Stage 4: Running Normalizer Agent..."
 
     python3 "$SRC_DIR/agents/normalizer.py" \
@@ -675,7 +831,9 @@ log_info "Stage 6: Running Unifier Agents (Parallel)..."
 
 # Create task list
 UNIFIER_TASKS="$PROCESSED_DIR/unifier_tasks.txt"
+UNIFIER_TASKS_JSONL="$PROCESSED_DIR/unifier_tasks.jsonl"
 > "$UNIFIER_TASKS"
+> "$UNIFIER_TASKS_JSONL"
 
 # Generate unifier tasks (one per student)
 # In resume mode, skip tasks where output file already exists
@@ -688,6 +846,13 @@ jq -r '.submissions[] | .path + "|" + .student_name' "$SUBMISSIONS_MANIFEST" | w
     else
         # Add task to list
         echo "python3 '$SRC_DIR/agents/unifier.py' --student '$student_name' --submission '$submission_path' --scheme '$APPROVED_SCHEME' --markings-dir '$MARKINGS_DIR' --output '$output_file' --type freeform --provider '$DEFAULT_PROVIDER' ${MODEL_UNIFIER:+--model '$MODEL_UNIFIER'} ${API_MODEL:+--api-model '$API_MODEL'} --stats-file '$STATS_FILE'" >> "$UNIFIER_TASKS"
+
+        if [[ -n "$API_MODEL" ]]; then
+            jq -n -c --arg student "$student_name" --arg submission "$submission_path" \
+                --arg scheme "$APPROVED_SCHEME" --arg markings_dir "$MARKINGS_DIR" --arg output "$output_file" \
+                '{agent: "unifier", student: $student, submission: $submission, scheme: $scheme, markings_dir: $markings_dir, type: "freeform", output: $output}' \
+                >> "$UNIFIER_TASKS_JSONL"
+        fi
     fi
 done
 
@@ -708,18 +873,29 @@ else
         log_info "Generated $UNIFIER_TASKS_TO_RUN unifier tasks"
     fi
 
-    UNIFIER_ARGS=(
-        --tasks "$UNIFIER_TASKS"
-        --concurrency "$MAX_PARALLEL"
-        --output-dir "$LOGS_DIR/unifier_logs"
-        --verbose
-    )
+    check_budget
 
-    if [[ $FORCE_XARGS == true ]]; then
-        UNIFIER_ARGS+=(--force-xargs)
-    fi
+    if [[ -n "$API_MODEL" ]]; then
+        run_async_engine "$UNIFIER_TASKS_JSONL" "$LOGS_DIR/unifier_logs" || true
+    else
+        UNIFIER_ARGS=(
+            --tasks "$UNIFIER_TASKS"
+            --concurrency "$MAX_PARALLEL"
+            --output-dir "$LOGS_DIR/unifier_logs"
+            --provider "$DEFAULT_PROVIDER"
+            --verbose
+        )
 
-    "$SRC_DIR/parallel_runner.sh" "${UNIFIER_ARGS[@]}" || true
+        if [[ $FORCE_XARGS == true ]]; then
+            UNIFIER_ARGS+=(--force-xargs)
+        fi
+
+        if [[ -n "$BUDGET" ]]; then
+            UNIFIER_ARGS+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+        fi
+
+        "$SRC_DIR/parallel_runner.sh" "${UNIFIER_ARGS[@]}" || true
+    fi
 
     log_success "Unifier agents completed"
 fi
@@ -730,6 +906,9 @@ if [[ $FEEDBACK_COUNT -lt $NUM_STUDENTS ]]; then
     MISSING_COUNT=$((NUM_STUDENTS - FEEDBACK_COUNT))
     log_warning "$MISSING_COUNT student(s) missing feedback files"
 
+    # A spent budget stops the run here instead of force-completing the rest
+    check_budget
+
     if [[ "$FORCE_COMPLETE" == true ]]; then
         log_info "Force-completing: generating zero-mark feedback for failed students..."
 
@@ -806,6 +985,7 @@ if [[ $RESUME == true && -f "$GRADES_CSV" ]]; then
     log_info "Stage 7: Skipping (grades already generated)"
     log_success "Grades CSV: $GRADES_CSV"
 else
+    check_budget
     log_info "Stage 7: Aggregating grades..."
 
     python3 "$SRC_DIR/aggregate_grades.py" \
@@ -48,6 +48,21 @@ PARALLEL_OVERRIDE=""
 PROVIDER_OVERRIDE=""
 MODEL_OVERRIDE=""
 API_MODEL=""  # When set, use direct API calls instead of CLI for headless stages
+BATCH_API=false  # Submit marker/unifier calls as provider batch jobs (API mode)
+USE_CACHE=true  # Answer byte-identical LLM prompts from <assignment>/.llm_cache
+USE_BROKER=false  # Route API calls through one long-lived LLM broker process
+HEDGE_MODEL=""  # Duplicate API calls slower than the stage p95 to this model ("same" = --api-model)
+BUDGET=""  # Stop dispatching LLM tasks once this run has spent this many USD
+SKIP_UNATTEMPTED=true  # Write "no attempt" markings for blank/unchanged answers without an LLM call
+DEDUP_ANSWERS=true  # Mark identical (normalized) answers once and copy the marking
+CLUSTER_ANSWERS=true  # Mark one answer per near-duplicate cluster, verify the others against it
+VERIFY_MODEL=""  # Model for verifying near-duplicate answers (default: stage_models.verifier, else the marker model)
+PACK_ACTIVITIES=false  # Mark all of a student's activities in one marker call
+CASCADE_MODEL=""  # Cheaper model that marks activities first (default: stage_models.cascade); escalates to the marker model
+CASCADE_CONFIDENCE=70  # Lowest cascade confidence (0-100) kept without escalation
+PACK_STUDENTS=false  # Mark one activity of several students (and unify several students) per call
+PACK_BUDGET=8000  # Most estimated student-work tokens per student pack
+MINIMIZE_PROMPTS=true  # Collapse data blobs, whitespace and template markdown in student work before prompting
 AUTO_APPROVE=false  # Auto-approve LLM proposals without instructor interaction
 FORCE_COMPLETE=false  # Force complete by generating zero-mark feedback for failed students
 
@@ -95,6 +110,62 @@ while [[ $# -gt 0 ]]; do
             API_MODEL="$2"
             shift 2
             ;;
+        --batch-api)
+            BATCH_API=true
+            shift
+            ;;
+        --no-cache)
+            USE_CACHE=false
+            shift
+            ;;
+        --broker)
+            USE_BROKER=true
+            shift
+            ;;
+        --hedge)
+            HEDGE_MODEL="$2"
+            shift 2
+            ;;
+        --mark-unattempted)
+            SKIP_UNATTEMPTED=false
+            shift
+            ;;
+        --no-dedup)
+            DEDUP_ANSWERS=false
+            shift
+            ;;
+        --no-clusters)
+            CLUSTER_ANSWERS=false
+            shift
+            ;;
+        --no-minimize)
+            MINIMIZE_PROMPTS=false
+            shift
+            ;;
+        --verify-model)
+            VERIFY_MODEL="$2"
+            shift 2
+            ;;
+        --pack-activities)
+            PACK_ACTIVITIES=true
+            shift
+            ;;
+        --pack-students)
+            PACK_STUDENTS=true
+            shift
+            ;;
+        --cascade-model)
+            CASCADE_MODEL="$2"
+            shift 2
+            ;;
+        --cascade-confidence)
+            CASCADE_CONFIDENCE="$2"
+            shift 2
+            ;;
+        --pack-budget)
+            PACK_BUDGET="$2"
+            shift 2
+            ;;
         --auto-approve)
             AUTO_APPROVE=true
             shift
@@ -103,6 +174,10 @@ while [[ $# -gt 0 ]]; do
             FORCE_COMPLETE=true
             shift
             ;;
+        --budget)
+            BUDGET="$2"
+            shift 2
+            ;;
         -*)
             echo "Unknown option: $1" >&2
             echo "Usage: $0 <assignment_directory> [OPTIONS]" >&2
@@ -125,6 +200,20 @@ if [[ -z "${ASSIGNMENT_DIR:-}" ]]; then
     echo "  --provider NAME         Override default_provider from overview.md"
     echo "  --model NAME            Override default_model from overview.md (for CLI calls)"
     echo "  --api-model NAME        Use direct API calls for headless stages (requires API key)"
+    echo "  --batch-api             Submit marker/unifier calls as provider batch jobs (with --api-model)"
+    echo "  --no-cache              Bypass the LLM response cache (always call the provider)"
+    echo "  --broker                Keep provider connections warm in one broker process (with --api-model)"
+    echo "  --hedge MODEL           Resend API calls slower than the stage p95 to MODEL (or 'same')"
+    echo "  --mark-unattempted      Send blank/unchanged activity answers to the marker too"
+    echo "  --no-dedup              Mark identical answers separately instead of once per answer"
+    echo "  --no-clusters           Fully mark near-duplicate answers instead of verifying them"
+    echo "  --verify-model NAME     Model that verifies near-duplicate answers against their cluster's marking"
+    echo "  --pack-activities       Mark all of a student's activities in one marker call"
+    echo "  --cascade-model NAME    Mark activities with NAME first; re-mark with the marker model on low confidence"
+    echo "  --cascade-confidence N  Lowest cascade confidence (0-100) kept without escalation (default: 70)"
+    echo "  --pack-students         Mark one activity of several students (and unify several students) per call"
+    echo "  --pack-budget TOKENS    Most estimated student-work tokens per student pack (default: 8000)"
+    echo "  --no-minimize           Put student work into prompts verbatim (no blob, whitespace or template stripping)"
     echo "  --force-xargs           Force use of xargs instead of GNU parallel"
     echo "  --resume                Resume from last checkpoint (default)"
     echo "  --no-resume             Start from scratch, don't resume"
@@ -134,6 +223,7 @@ if [[ -z "${ASSIGNMENT_DIR:-}" ]]; then
     echo "  --parallel N            Override max_parallel setting"
     echo "  --auto-approve          Auto-approve LLM proposals (no instructor interaction)"
     echo "  --force-complete        Generate zero-mark feedback for failed students and continue"
+    echo "  --budget USD            Stop dispatching LLM tasks once the run's cost would exceed USD"
     exit 1
 fi
 
@@ -221,6 +311,8 @@ if [[ -n "$MODEL_OVERRIDE" ]]; then
     unset STAGE_MODEL_NORMALIZER
     unset STAGE_MODEL_UNIFIER
     unset STAGE_MODEL_AGGREGATOR
+    unset STAGE_MODEL_VERIFIER
+    unset STAGE_MODEL_CASCADE
 
     # When --model is provided but --provider is not, always resolve provider from model
     # This overrides any default_provider from overview.md to avoid mismatches
@@ -255,6 +347,13 @@ log_info "  Default model: ${DEFAULT_MODEL:-default}${MODEL_OVERRIDE:+ (overridd
 if [[ -n "$API_MODEL" ]]; then
     log_info "  API model: $API_MODEL (headless stages will use direct API calls)"
 fi
+if [[ "$BATCH_API" == true ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_error "--batch-api requires --api-model"
+        exit 1
+    fi
+    log_info "  Batch API: ENABLED (marker/unifier calls submitted as provider batch jobs)"
+fi
 
 # Override MAX_PARALLEL if --parallel flag provided, or use API_MAX_PARALLEL for API mode
 if [[ -n "$PARALLEL_OVERRIDE" ]]; then
@@ -269,6 +368,9 @@ else
 fi
 
 log_info "  Total marks: $TOTAL_MARKS"
+if [[ -n "$BUDGET" ]]; then
+    log_info "  Budget: \$$BUDGET (no new LLM tasks once spent plus projected cost exceeds it)"
+fi
 
 # Function to get model for a specific stage
 # Priority: stage-specific > assignment default > none (use provider default)
@@ -293,6 +395,25 @@ MODEL_NORMALIZER=$(get_stage_model "normalizer")
 MODEL_UNIFIER=$(get_stage_model "unifier")
 MODEL_AGGREGATOR=$(get_stage_model "aggregator")
 
+# Near-duplicate answers are verified by a (usually cheaper) model of their own;
+# in API mode it replaces --api-model for those calls only
+MODEL_VERIFIER="${VERIFY_MODEL:-${STAGE_MODEL_VERIFIER:-$MODEL_MARKER}}"
+API_MODEL_VERIFIER=""
+if [[ -n "$API_MODEL" ]]; then
+    API_MODEL_VERIFIER="${VERIFY_MODEL:-${STAGE_MODEL_VERIFIER:-$API_MODEL}}"
+fi
+VERIFIER_PROVIDER="$DEFAULT_PROVIDER"
+if [[ -n "$MODEL_VERIFIER" ]]; then
+    VERIFIER_PROVIDER=$(resolve_provider_from_model "$MODEL_VERIFIER" || echo "$DEFAULT_PROVIDER")
+fi
+
+# Model cascade: activities are marked by the cascade model first and
+# re-marked by the marker model only when its marking is not kept
+CASCADE_MODEL="${CASCADE_MODEL:-${STAGE_MODEL_CASCADE:-}}"
+if [[ -n "$CASCADE_MODEL" ]]; then
+    log_info "  Model cascade: $CASCADE_MODEL first, escalating below confidence $CASCADE_CONFIDENCE"
+fi
+
 # Log stage-specific models if any are set
 if [[ -n "$MODEL_PATTERN_DESIGNER" || -n "$MODEL_MARKER" || -n "$MODEL_NORMALIZER" || -n "$MODEL_UNIFIER" || -n "$MODEL_AGGREGATOR" ]]; then
     log_info "Stage-specific models:"
@@ -316,8 +437,33 @@ SESSIONS_DIR="$PROCESSED_DIR/sessions"
 STATS_DIR="$PROCESSED_DIR/stats"
 STATS_FILE="$STATS_DIR/token_usage.jsonl"
 
+# Stats records written from now on count against --budget
+RUN_STARTED="$(date +%Y-%m-%dT%H:%M:%S)"
+
+# Stop the run (keeping completed outputs for resume) once the budget is spent
+check_budget() {
+    if [[ -z "$BUDGET" ]]; then
+        return 0
+    fi
+
+    local budget_status
+    if ! budget_status=$(python3 "$SRC_DIR/utils/budget.py" check --budget "$BUDGET" \
+            --since "$RUN_STARTED" --stats-file "$STATS_FILE"); then
+        log_error "$budget_status"
+        log_info "Completed outputs are kept. Re-run with a higher --budget to resume."
+        exit 1
+    fi
+}
+
 mkdir -p "$ACTIVITIES_DIR" "$MARKINGS_DIR" "$NORMALIZED_DIR" "$FINAL_DIR" "$LOGS_DIR" "$SESSIONS_DIR" "$STATS_DIR"
 
+# Persistent LLM response cache (outside processed/ so --clean keeps it)
+if [[ "$USE_CACHE" == true ]]; then
+    export LLM_CACHE_DIR="${LLM_CACHE_DIR:-$ASSIGNMENT_DIR/.llm_cache}"
+else
+    unset LLM_CACHE_DIR
+fi
+
 # Clean mode: remove processed directory
 if [[ "${CLEAN_MODE:-false}" == true ]]; then
     log_warning "Clean mode: Removing processed directory..."
@@ -333,6 +479,37 @@ if [[ $RESUME == true ]]; then
     log_info "Resume mode: Will skip completed stages and tasks"
 fi
 
+# Optional hedging: an API call still unanswered after the p95 latency of its
+# stage is duplicated to HEDGE_MODEL and the first valid response is used
+if [[ -n "$HEDGE_MODEL" ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_warning "--hedge only applies to API mode (--api-model); ignoring"
+    else
+        export LLM_HEDGE_MODEL="$HEDGE_MODEL"
+        log_info "Hedging: calls slower than their stage's p95 are duplicated to ${HEDGE_MODEL/#same/$API_MODEL}"
+    fi
+fi
+
+# Optional LLM broker: one long-lived process makes every API call of this run
+# over warm provider connections (rate limiting, retries and stats writes in
+# one place); task processes reach it through LLM_BROKER_SOCKET
+if [[ "$USE_BROKER" == true ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_warning "--broker only applies to API mode (--api-model); ignoring"
+    else
+        LLM_BROKER_SOCKET="${TMPDIR:-/tmp}/llm_broker_$$.sock"
+        if python3 "$SRC_DIR/api/broker.py" start --socket "$LLM_BROKER_SOCKET" \
+                --log "$LOGS_DIR/llm_broker.log" --parent-pid $$ --model "$API_MODEL" >/dev/null; then
+            export LLM_BROKER_SOCKET
+            trap 'python3 "$SRC_DIR/api/broker.py" stop --socket "$LLM_BROKER_SOCKET" >/dev/null 2>&1 || true' EXIT
+            log_success "LLM broker started ($LLM_BROKER_SOCKET)"
+        else
+            unset LLM_BROKER_SOCKET
+            log_warning "LLM broker did not start (see $LOGS_DIR/llm_broker.log); tasks will call the API directly"
+        fi
+    fi
+fi
+
 # ============================================================================
 # STAGE 1: Find Submissions
 # ============================================================================
@@ -420,6 +597,37 @@ if [[ "$STOP_AFTER_STAGE" == "2" ]]; then
     exit 0
 fi
 
+# ============================================================================
+# STAGE 2.5: Pre-extract Student Activities
+# ============================================================================
+
+# Parse every submission once (in a process pool) into a per-student bundle;
+# the marker, unifier and Stage 4 planners read the bundles instead of
+# re-parsing the notebook for every task. The rendered work is minimised
+# (prompt_minimize in configs/config.yaml) unless --no-minimize
+BUNDLES_DIR="$PROCESSED_DIR/bundles"
+log_info "Stage 2.5: Pre-extracting student activities..."
+BUNDLE_ARGS=(
+    --manifest "$SUBMISSIONS_MANIFEST"
+    --output-dir "$BUNDLES_DIR"
+    --base-notebook "$BASE_NOTEBOOK"
+    --report "$STATS_DIR/prompt_minimize.json"
+)
+if [[ $MINIMIZE_PROMPTS == false ]]; then
+    BUNDLE_ARGS+=(--no-minimize)
+fi
+if [[ $RESUME == false ]]; then
+    BUNDLE_ARGS+=(--no-resume)
+fi
+if BUNDLE_SUMMARY=$(python3 "$SRC_DIR/activity_bundles.py" "${BUNDLE_ARGS[@]}"); then
+    while IFS= read -r line; do
+        log_success "${line#✓ }"
+    done <<< "$BUNDLE_SUMMARY"
+    export ACTIVITY_BUNDLES_DIR="$BUNDLES_DIR"
+else
+    log_warning "Could not pre-extract activities; each task will parse its notebook"
+fi
+
 # ============================================================================
 # STAGE 3: Marking Pattern Designer (Interactive)
 # ============================================================================
@@ -556,8 +764,11 @@ log_info "Stage 4: Running Marker Agents (Parallel)..."
 log_info "This will process $NUM_ACTIVITIES activities × $NUM_STUDENTS students = $((NUM_ACTIVITIES * NUM_STUDENTS)) marking tasks"
 
 # Create task list for parallel execution
+# In API mode the same tasks are also written as JSONL for the async engine
 MARKER_TASKS="$PROCESSED_DIR/marker_tasks.txt"
+MARKER_TASKS_JSONL="$PROCESSED_DIR/marker_tasks.jsonl"
 > "$MARKER_TASKS"
+> "$MARKER_TASKS_JSONL"
 
 # Helper function to get canonical name (from name_mapping if available, else original)
 get_canonical_name() {
@@ -576,65 +787,326 @@ get_canonical_name() {
     echo "$original_name"
 }
 
-# Generate marker tasks (one per activity per student)
+# Run a JSONL task list through the async engine (API mode only)
+run_async_engine() {
+    local tasks_file="$1"
+    local log_dir="$2"
+    local api_model="${3:-$API_MODEL}"
+
+    local engine_args=(
+        --tasks "$tasks_file"
+        --api-model "$api_model"
+        --concurrency "$MAX_PARALLEL"
+        --stats-file "$STATS_FILE"
+        --log-dir "$log_dir"
+    )
+
+    if [[ $RESUME == false ]]; then
+        engine_args+=(--no-resume)
+    fi
+
+    if [[ "$BATCH_API" == true ]]; then
+        engine_args+=(--batch-api)
+    fi
+
+    if [[ -n "$BUDGET" ]]; then
+        engine_args+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+    fi
+
+    python3 "$SRC_DIR/api/engine.py" "${engine_args[@]}"
+}
+
+# Blank answers and answers unchanged from the base notebook get a "no attempt"
+# marking straight away instead of a marker call
+UNATTEMPTED_LIST="$PROCESSED_DIR/unattempted.txt"
+> "$UNATTEMPTED_LIST"
+if [[ "$SKIP_UNATTEMPTED" == true ]]; then
+    UNATTEMPTED_ARGS=(
+        --base-notebook "$BASE_NOTEBOOK"
+        --manifest "$SUBMISSIONS_MANIFEST"
+        --name-mapping "$NAME_MAPPING_FILE"
+        --markings-dir "$MARKINGS_DIR"
+        --num-activities "$NUM_ACTIVITIES"
+        --skip-list "$UNATTEMPTED_LIST"
+        --report "$PROCESSED_DIR/unattempted.json"
+    )
+    if [[ $RESUME == false ]]; then
+        UNATTEMPTED_ARGS+=(--no-resume)
+    fi
+    if UNATTEMPTED_SUMMARY=$(python3 "$SRC_DIR/skip_unattempted.py" "${UNATTEMPTED_ARGS[@]}"); then
+        log_info "${UNATTEMPTED_SUMMARY#✓ }"
+    else
+        > "$UNATTEMPTED_LIST"
+        log_warning "Could not check for unattempted activities; marking all tasks"
+    fi
+fi
+
+# Identical answers (same code up to comments/formatting, same text up to
+# whitespace/case) are marked once; the marking is copied to the other
+# students after the marker run (the marked answers are prompted without the
+# student's name, so the copied marking names no student)
+DUPLICATES_LIST="$PROCESSED_DIR/answer_duplicates.txt"
+REPRESENTATIVES_LIST="$PROCESSED_DIR/answer_representatives.txt"
+ANSWER_GROUPS="$PROCESSED_DIR/answer_groups.json"
+> "$DUPLICATES_LIST"
+> "$REPRESENTATIVES_LIST"
+echo "[]" > "$ANSWER_GROUPS"
+if [[ "$DEDUP_ANSWERS" == true ]]; then
+    DEDUP_ARGS=(
+        plan
+        --manifest "$SUBMISSIONS_MANIFEST"
+        --name-mapping "$NAME_MAPPING_FILE"
+        --num-activities "$NUM_ACTIVITIES"
+        --markings-dir "$MARKINGS_DIR"
+        --exclude "$UNATTEMPTED_LIST"
+        --skip-list "$DUPLICATES_LIST"
+        --representatives "$REPRESENTATIVES_LIST"
+        --groups "$ANSWER_GROUPS"
+        --report "$STATS_DIR/answer_dedup.json"
+    )
+    if [[ $RESUME == false ]]; then
+        DEDUP_ARGS+=(--no-resume)
+    fi
+    if DEDUP_SUMMARY=$(python3 "$SRC_DIR/dedup_answers.py" "${DEDUP_ARGS[@]}"); then
+        while IFS= read -r line; do
+            log_info "${line#✓ }"
+        done <<< "$DEDUP_SUMMARY"
+    else
+        > "$DUPLICATES_LIST"
+        > "$REPRESENTATIVES_LIST"
+        echo "[]" > "$ANSWER_GROUPS"
+        log_warning "Could not group identical answers; marking every answer"
+    fi
+fi
+
+# Near-duplicate answers (not identical, but similar above a threshold) are
+# clustered; one answer per cluster is marked in full and the others are
+# verified against its marking after the marker run
+CLUSTER_MEMBERS="$PROCESSED_DIR/cluster_members.txt"
+VERIFY_TASKS="$PROCESSED_DIR/verify_tasks.txt"
+VERIFY_TASKS_JSONL="$PROCESSED_DIR/verify_tasks.jsonl"
+> "$CLUSTER_MEMBERS"
+> "$VERIFY_TASKS"
+> "$VERIFY_TASKS_JSONL"
+if [[ "$CLUSTER_ANSWERS" == true ]]; then
+    CLUSTER_ARGS=(
+        --base-notebook "$BASE_NOTEBOOK"
+        --manifest "$SUBMISSIONS_MANIFEST"
+        --name-mapping "$NAME_MAPPING_FILE"
+        --num-activities "$NUM_ACTIVITIES"
+        --markings-dir "$MARKINGS_DIR"
+        --exclude "$UNATTEMPTED_LIST"
+        --exclude "$DUPLICATES_LIST"
+        --members "$CLUSTER_MEMBERS"
+        --clusters "$PROCESSED_DIR/answer_clusters.json"
+    )
+    if [[ $RESUME == false ]]; then
+        CLUSTER_ARGS+=(--no-resume)
+    fi
+    if CLUSTER_SUMMARY=$(python3 "$SRC_DIR/cluster_answers.py" "${CLUSTER_ARGS[@]}"); then
+        log_info "${CLUSTER_SUMMARY#✓ }"
+    else
+        > "$CLUSTER_MEMBERS"
+        log_warning "Could not cluster near-duplicate answers; marking every answer in full"
+    fi
+fi
+
+# Whether any of the given activities of the student is marked for students
+# with an identical answer (prompted without the student's name)
+is_representative() {
+    local activity
+    for activity in "$@"; do
+        grep -qxF "$canonical_name|A$activity" "$REPRESENTATIVES_LIST" && return 0
+    done
+    return 1
+}
+
+# Add one marker task (a single activity) to the task lists
+add_marker_task() {
+    local activity="$1"
+    local output_file="$MARKINGS_DIR/${canonical_name}_A${activity}.md"
+    local anonymous=""
+    is_representative "$activity" && anonymous=true
+
+    echo "python3 '$SRC_DIR/agents/marker.py' --activity A$activity --student '$canonical_name' --submission '$submission_path' --output '$output_file' --provider '$DEFAULT_PROVIDER' ${MODEL_MARKER:+--model '$MODEL_MARKER'} ${API_MODEL:+--api-model '$API_MODEL'} ${CASCADE_MODEL:+--cascade-model '$CASCADE_MODEL' --cascade-confidence $CASCADE_CONFIDENCE} ${anonymous:+--anonymous} --stats-file '$STATS_FILE'" >> "$MARKER_TASKS"
+
+    if [[ -n "$API_MODEL" || "$PACK_STUDENTS" == true ]]; then
+        jq -n -c --arg student "$canonical_name" --arg submission "$submission_path" \
+            --arg activity "A$activity" --arg output "$output_file" \
+            --arg cascade "$CASCADE_MODEL" --argjson confidence "$CASCADE_CONFIDENCE" \
+            --argjson anonymous "${anonymous:-false}" \
+            '{agent: "marker", student: $student, submission: $submission, activity: $activity, type: "structured", output: $output}
+             + (if $cascade != "" then {cascade_model: $cascade, cascade_min_confidence: $confidence} else {} end)
+             + (if $anonymous then {anonymous: true} else {} end)' \
+            >> "$MARKER_TASKS_JSONL"
+    fi
+}
+
+# Add one packed marker task (several activities of a student in one call);
+# the raw response goes to <student>_packed.txt and is split into the markings
+add_packed_marker_task() {
+    local activities
+    activities=$(printf 'A%s,' "$@")
+    activities="${activities%,}"
+    local output_file="$MARKINGS_DIR/${canonical_name}_packed.txt"
+    local anonymous=""
+    is_representative "$@" && anonymous=true
+
+    echo "python3 '$SRC_DIR/agents/marker.py' --activities $activities --student '$canonical_name' --submission '$submission_path' --output '$output_file' --provider '$DEFAULT_PROVIDER' ${MODEL_MARKER:+--model '$MODEL_MARKER'} ${API_MODEL:+--api-model '$API_MODEL'} ${anonymous:+--anonymous} --stats-file '$STATS_FILE'" >> "$MARKER_TASKS"
+
+    if [[ -n "$API_MODEL" || "$PACK_STUDENTS" == true ]]; then
+        jq -n -c --arg student "$canonical_name" --arg submission "$submission_path" \
+            --arg activities "$activities" --arg output "$output_file" --argjson anonymous "${anonymous:-false}" \
+            '{agent: "marker", student: $student, submission: $submission, activities: ($activities | split(",")), type: "structured", output: $output}
+             + (if $anonymous then {anonymous: true} else {} end)' \
+            >> "$MARKER_TASKS_JSONL"
+    fi
+}
+
+# Generate marker tasks (one per activity per student, or one per student
+# with --pack-activities)
 # In resume mode, skip tasks where output file already exists
 jq -r '.submissions[] | .path + "|" + .student_name' "$SUBMISSIONS_MANIFEST" | while IFS='|' read -r submission_path student_name; do
     # Get canonical name from name mapping (if available)
     canonical_name=$(get_canonical_name "$submission_path" "$student_name")
+    to_mark=()
     for activity in $(seq 1 $NUM_ACTIVITIES); do
         output_file="$MARKINGS_DIR/${canonical_name}_A${activity}.md"
 
         if [[ $RESUME == true && -f "$output_file" ]]; then
             # Skip this task - output already exists
             :
+        elif grep -qxF "$canonical_name|A$activity" "$UNATTEMPTED_LIST"; then
+            # Not attempted - "no attempt" marking already written
+            :
+        elif grep -qxF "$canonical_name|A$activity" "$DUPLICATES_LIST"; then
+            # Same answer as another student - marking copied after the run
+            :
+        elif member=$(awk -F'|' -v s="$canonical_name" -v a="A$activity" '$1 == s && $2 == a { print; exit }' "$CLUSTER_MEMBERS") && [[ -n "$member" ]]; then
+            # Near-duplicate of another student's answer - verified against its marking
+            IFS='|' read -r _ _ reference reference_path <<< "$member"
+            reference_marking="$MARKINGS_DIR/${reference}_A${activity}.md"
+            anonymous=""
+            is_representative "$activity" && anonymous=true
+            echo "python3 '$SRC_DIR/agents/marker.py' --activity A$activity --student '$canonical_name' --submission '$submission_path' --reference-student '$reference' --reference-submission '$reference_path' --reference-marking '$reference_marking' --output '$output_file' --provider '$VERIFIER_PROVIDER' ${MODEL_VERIFIER:+--model '$MODEL_VERIFIER'} ${API_MODEL_VERIFIER:+--api-model '$API_MODEL_VERIFIER'} ${anonymous:+--anonymous} --stats-file '$STATS_FILE'" >> "$VERIFY_TASKS"
+
+            if [[ -n "$API_MODEL" ]]; then
+                jq -n -c --arg student "$canonical_name" --arg submission "$submission_path" \
+                    --arg activity "A$activity" --arg output "$output_file" \
+                    --arg reference "$reference" --arg reference_submission "$reference_path" \
+                    --arg reference_marking "$reference_marking" --argjson anonymous "${anonymous:-false}" \
+                    '{agent: "verifier", student: $student, submission: $submission, activity: $activity, reference_student: $reference, reference_submission: $reference_submission, reference_marking: $reference_marking, type: "structured", output: $output}
+                     + (if $anonymous then {anonymous: true} else {} end)' \
+                    >> "$VERIFY_TASKS_JSONL"
+            fi
         else
-            # Add task to list (use canonical_name for student identification)
-            echo "python3 '$SRC_DIR/agents/marker.py' --activity A$activity --student '$canonical_name' --submission '$submission_path' --output '$output_file' --provider '$DEFAULT_PROVIDER' ${MODEL_MARKER:+--model '$MODEL_MARKER'} ${API_MODEL:+--api-model '$API_MODEL'} --stats-file '$STATS_FILE'" >> "$MARKER_TASKS"
+            # Needs a full marking (tasks use canonical_name for student identification)
+            to_mark+=("$activity")
         fi
     done
+
+    if [[ "$PACK_ACTIVITIES" == true && ${#to_mark[@]} -gt 1 ]]; then
+        add_packed_marker_task "${to_mark[@]}"
+    else
+        for activity in "${to_mark[@]}"; do
+            add_marker_task "$activity"
+        done
+    fi
 done
 
-# Count tasks and report
-TASKS_TO_RUN=$(wc -l < "$MARKER_TASKS" | tr -d ' ')
+# Count tasks and report (a packed task counts once per activity)
+TASKS_TO_RUN=$( (grep -o -- "--activit[a-z]* [A0-9,]*" "$MARKER_TASKS" || true) | tr ',' '\n' | wc -l | tr -d ' ')
+VERIFY_TO_RUN=$(wc -l < "$VERIFY_TASKS" | tr -d ' ')
 EXPECTED_TOTAL=$((NUM_ACTIVITIES * NUM_STUDENTS))
 
-if [[ $TASKS_TO_RUN -eq 0 ]]; then
+if [[ $TASKS_TO_RUN -eq 0 && $VERIFY_TO_RUN -eq 0 ]]; then
     log_success "All $EXPECTED_TOTAL marker tasks already completed"
 else
+    UNATTEMPTED_COUNT=$(wc -l < "$UNATTEMPTED_LIST" | tr -d ' ')
+    DUPLICATES_COUNT=$(wc -l < "$DUPLICATES_LIST" | tr -d ' ')
     if [[ $RESUME == true ]]; then
-        SKIPPED=$((EXPECTED_TOTAL - TASKS_TO_RUN))
-        log_info "Generated $TASKS_TO_RUN marker tasks (skipped $SKIPPED already completed)"
+        SKIPPED=$((EXPECTED_TOTAL - TASKS_TO_RUN - VERIFY_TO_RUN - UNATTEMPTED_COUNT - DUPLICATES_COUNT))
+        log_info "Generated $TASKS_TO_RUN marker tasks and $VERIFY_TO_RUN verification tasks (skipped $SKIPPED already completed, $UNATTEMPTED_COUNT not attempted, $DUPLICATES_COUNT identical answers)"
     else
-        log_info "Generated $TASKS_TO_RUN marker tasks"
+        log_info "Generated $TASKS_TO_RUN marker tasks and $VERIFY_TO_RUN verification tasks (skipped $UNATTEMPTED_COUNT not attempted, $DUPLICATES_COUNT identical answers)"
+    fi
+    if [[ "$PACK_ACTIVITIES" == true && $TASKS_TO_RUN -gt 0 ]]; then
+        log_info "Packing: $TASKS_TO_RUN marker tasks in $(wc -l < "$MARKER_TASKS" | tr -d ' ') calls (one per student)"
     fi
 fi
 
-# Run markers in parallel
-if [[ $TASKS_TO_RUN -gt 0 ]]; then
-    # Clear marker_logs to avoid counting old stdout files in progress calculation
+# Several students per call: group each activity's marker tasks into packs
+# within the token budget (both task lists are rewritten)
+if [[ "$PACK_STUDENTS" == true && $TASKS_TO_RUN -gt 1 ]]; then
+    PACK_SUMMARY=$(python3 "$SRC_DIR/pack_tasks.py" --tasks "$MARKER_TASKS_JSONL" --commands "$MARKER_TASKS" \
+        --command "python3 '$SRC_DIR/agents/marker.py' --provider '$DEFAULT_PROVIDER' ${MODEL_MARKER:+--model '$MODEL_MARKER'} ${API_MODEL:+--api-model '$API_MODEL'} --stats-file '$STATS_FILE'" \
+        --packs-dir "$PROCESSED_DIR/packs" --budget "$PACK_BUDGET" --provider "$DEFAULT_PROVIDER") \
+        && log_info "Packing: ${PACK_SUMMARY#✓ }" \
+        || log_warning "Could not pack students; marking one student per call"
+fi
+
+# Run one marker task list: the async engine in API mode, parallel_runner.sh otherwise
+run_marker_tasks() {
+    local tasks_file="$1"
+    local tasks_jsonl="$2"
+    local log_dir="$3"
+    local api_model="${4:-$API_MODEL}"
+
+    check_budget
+
+    # Clear the logs to avoid counting old stdout files in progress calculation
     if [[ $RESUME == true ]]; then
-        rm -rf "$LOGS_DIR/marker_logs"
-        mkdir -p "$LOGS_DIR/marker_logs"
+        rm -rf "$log_dir"
     fi
+    mkdir -p "$log_dir"
 
-    PARALLEL_ARGS=(
-        --tasks "$MARKER_TASKS"
-        --concurrency "$MAX_PARALLEL"
-        --output-dir "$LOGS_DIR/marker_logs"
-        --verbose
-    )
+    if [[ -n "$API_MODEL" ]]; then
+        # API mode: one process, concurrent requests over pooled connections
+        run_async_engine "$tasks_jsonl" "$log_dir" "$api_model" || true
+    else
+        PARALLEL_ARGS=(
+            --tasks "$tasks_file"
+            --concurrency "$MAX_PARALLEL"
+            --output-dir "$log_dir"
+            --provider "$DEFAULT_PROVIDER"
+            --verbose
+        )
 
-    if [[ $FORCE_XARGS == true ]]; then
-        PARALLEL_ARGS+=(--force-xargs)
-    fi
+        if [[ $FORCE_XARGS == true ]]; then
+            PARALLEL_ARGS+=(--force-xargs)
+        fi
+
+        if [[ -n "$BUDGET" ]]; then
+            PARALLEL_ARGS+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+        fi
 
-    "$SRC_DIR/parallel_runner.sh" "${PARALLEL_ARGS[@]}" || true
+        "$SRC_DIR/parallel_runner.sh" "${PARALLEL_ARGS[@]}" || true
+    fi
+}
 
+# Run markers in parallel
+if [[ $TASKS_TO_RUN -gt 0 ]]; then
+    run_marker_tasks "$MARKER_TASKS" "$MARKER_TASKS_JSONL" "$LOGS_DIR/marker_logs"
     log_success "Marker agents completed"
 else
     log_info "No marker tasks to run"
 fi
 
+# Verify near-duplicate answers against their representative's marking
+# (members whose representative failed are marked in full instead)
+if [[ $VERIFY_TO_RUN -gt 0 ]]; then
+    log_info "Verifying $VERIFY_TO_RUN near-duplicate answers${MODEL_VERIFIER:+ with ${API_MODEL_VERIFIER:-$MODEL_VERIFIER}}..."
+    run_marker_tasks "$VERIFY_TASKS" "$VERIFY_TASKS_JSONL" "$LOGS_DIR/verifier_logs" "$API_MODEL_VERIFIER"
+    log_success "Verification completed"
+fi
+
+# Copy each marked answer's marking to the students with the same answer
+if [[ -s "$DUPLICATES_LIST" ]]; then
+    FANOUT_SUMMARY=$(python3 "$SRC_DIR/dedup_answers.py" fanout --groups "$ANSWER_GROUPS" --markings-dir "$MARKINGS_DIR") \
+        && log_success "${FANOUT_SUMMARY#✓ }" \
+        || log_warning "Could not copy markings to identical answers"
+fi
+
 # Check for missing marker outputs (more reliable than checking stderr files which may be stale)
 TOTAL_STUDENTS=$(jq -r '.submissions | length' "$SUBMISSIONS_MANIFEST")
 EXPECTED_MARKINGS=$((TOTAL_STUDENTS * NUM_ACTIVITIES))
@@ -644,6 +1116,9 @@ MISSING_MARKINGS=$((EXPECTED_MARKINGS - EXISTING_MARKINGS))
 if [[ $MISSING_MARKINGS -gt 0 ]]; then
     log_warning "Found $MISSING_MARKINGS missing marking file(s) out of $EXPECTED_MARKINGS expected"
 
+    # A spent budget stops the run here instead of force-completing the rest
+    check_budget
+
     if [[ "$FORCE_COMPLETE" == true ]]; then
         log_info "Creating placeholder markings for failed tasks (--force-complete)..."
 
@@ -709,6 +1184,7 @@ for activity in $(seq 1 $NUM_ACTIVITIES); do
     if [[ $RESUME == true && -f "$SCORING_OUTPUT" ]]; then
         log_info "Activity $activity: Skipping (scoring already exists)"
     else
+        check_budget
         log_info "Normalizing Activity $activity..."
 
         # Call normalizer agent to aggregate all markings for this activity
@@ -810,7 +1286,9 @@ log_info "Stage 7: Running Unifier Agents (Parallel)..."
 
 # Create task list
 UNIFIER_TASKS="$PROCESSED_DIR/unifier_tasks.txt"
+UNIFIER_TASKS_JSONL="$PROCESSED_DIR/unifier_tasks.jsonl"
 > "$UNIFIER_TASKS"
+> "$UNIFIER_TASKS_JSONL"
 
 # Generate unifier tasks (one per student)
 # In resume mode, skip tasks where output file already exists
@@ -825,6 +1303,13 @@ jq -r '.submissions[] | .path + "|" + .student_name' "$SUBMISSIONS_MANIFEST" | w
     else
         # Add task to list (use canonical_name for student identification)
         echo "python3 '$SRC_DIR/agents/unifier.py' --student '$canonical_name' --submission '$submission_path' --scheme '$APPROVED_SCHEME' --markings-dir '$MARKINGS_DIR' --output '$output_file' --type structured --provider '$DEFAULT_PROVIDER' ${MODEL_UNIFIER:+--model '$MODEL_UNIFIER'} ${API_MODEL:+--api-model '$API_MODEL'} --stats-file '$STATS_FILE'" >> "$UNIFIER_TASKS"
+
+        if [[ -n "$API_MODEL" || "$PACK_STUDENTS" == true ]]; then
+            jq -n -c --arg student "$canonical_name" --arg submission "$submission_path" \
+                --arg scheme "$APPROVED_SCHEME" --arg markings_dir "$MARKINGS_DIR" --arg output "$output_file" \
+                '{agent: "unifier", student: $student, submission: $submission, scheme: $scheme, markings_dir: $markings_dir, type: "structured", output: $output}' \
+                >> "$UNIFIER_TASKS_JSONL"
+        fi
     fi
 done
 
@@ -845,18 +1330,37 @@ else
         log_info "Generated $UNIFIER_TASKS_TO_RUN unifier tasks"
     fi
 
-    UNIFIER_ARGS=(
-        --tasks "$UNIFIER_TASKS"
-        --concurrency "$MAX_PARALLEL"
-        --output-dir "$LOGS_DIR/unifier_logs"
-        --verbose
-    )
-
-    if [[ $FORCE_XARGS == true ]]; then
-        UNIFIER_ARGS+=(--force-xargs)
+    if [[ "$PACK_STUDENTS" == true && $UNIFIER_TASKS_TO_RUN -gt 1 ]]; then
+        PACK_SUMMARY=$(python3 "$SRC_DIR/pack_tasks.py" --tasks "$UNIFIER_TASKS_JSONL" --commands "$UNIFIER_TASKS" \
+            --command "python3 '$SRC_DIR/agents/unifier.py' --type structured --provider '$DEFAULT_PROVIDER' ${MODEL_UNIFIER:+--model '$MODEL_UNIFIER'} ${API_MODEL:+--api-model '$API_MODEL'} --stats-file '$STATS_FILE'" \
+            --packs-dir "$PROCESSED_DIR/packs" --budget "$PACK_BUDGET" --provider "$DEFAULT_PROVIDER") \
+            && log_info "Packing: ${PACK_SUMMARY#✓ }" \
+            || log_warning "Could not pack students; running one student per call"
     fi
 
-    "$SRC_DIR/parallel_runner.sh" "${UNIFIER_ARGS[@]}" || true
+    check_budget
+
+    if [[ -n "$API_MODEL" ]]; then
+        run_async_engine "$UNIFIER_TASKS_JSONL" "$LOGS_DIR/unifier_logs" || true
+    else
+        UNIFIER_ARGS=(
+            --tasks "$UNIFIER_TASKS"
+            --concurrency "$MAX_PARALLEL"
+            --output-dir "$LOGS_DIR/unifier_logs"
+            --provider "$DEFAULT_PROVIDER"
+            --verbose
+        )
+
+        if [[ $FORCE_XARGS == true ]]; then
+            UNIFIER_ARGS+=(--force-xargs)
+        fi
+
+        if [[ -n "$BUDGET" ]]; then
+            UNIFIER_ARGS+=(--budget "$BUDGET" --budget-since "$RUN_STARTED" --budget-stats-file "$STATS_FILE")
+        fi
+
+        "$SRC_DIR/parallel_runner.sh" "${UNIFIER_ARGS[@]}" || true
+    fi
 
     log_success "Unifier agents completed"
 fi
@@ -867,6 +1371,9 @@ if [[ $FEEDBACK_COUNT -lt $NUM_STUDENTS ]]; then
     MISSING_COUNT=$((NUM_STUDENTS - FEEDBACK_COUNT))
     log_warning "$MISSING_COUNT student(s) missing feedback files"
 
+    # A spent budget stops the run here instead of force-completing the rest
+    check_budget
+
     if [[ "$FORCE_COMPLETE" == true ]]; then
         log_info "Force-completing: generating zero-mark feedback for failed students..."
 
@@ -943,6 +1450,7 @@ if [[ $RESUME == true && -f "$GRADES_CSV" ]]; then
     log_info "Stage 8: Skipping (grades already generated)"
     log_success "Grades CSV: $GRADES_CSV"
 else
+    check_budget
     log_info "Stage 8: Aggregating grades..."
 
     python3 "$SRC_DIR/aggregate_grades.py" \
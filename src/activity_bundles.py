@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Per-student activity bundles (Stage 2.5, structured assignments).
+
+Every submission is parsed once, in a process pool, and written as a compact
+bundle under processed/bundles/:
+
+  activities      student input cells per activity (as ActivityExtractor
+                  returns them)
+  activity_text   each activity's cells rendered for the marker prompt
+  notebook_text   the whole notebook rendered for the unifier prompt
+
+The rendered texts are minimised first (utils/prompt_minimizer.py: encoded
+data, pasted tables and long commented-out blocks collapsed, whitespace
+trimmed, base-notebook markdown reduced to its first line, long cells
+capped), and the estimated tokens before and after each step are summed per
+stage (marker, unifier) into the --report file.
+
+Bundles are keyed by a hash of the submission's absolute path and record the
+notebook's size and modification time and the minimisation options; a bundle
+that no longer matches its notebook is ignored, and one built with other
+options is rebuilt. The marker, unifier and the Stage 4 planners
+(skip_unattempted.py, dedup_answers.py, cluster_answers.py) read a bundle
+when ACTIVITY_BUNDLES_DIR points at the bundles directory (mark_structured.sh
+exports it) and parse the notebook themselves otherwise, so every tool still
+works on its own (with the work unminimised).
+
+Usage:
+  python3 activity_bundles.py --manifest processed/submissions_manifest.json \\
+      --output-dir processed/bundles --base-notebook assignment.ipynb \\
+      --report processed/stats/prompt_minimize.json [--workers 8] [--no-minimize] [--no-resume]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent))
+from extract_activities import ActivityExtractor
+from notebook_reader import read_notebook
+from prompt_minimizer import STEPS, load_options, minimize_steps, template_texts
+from api.tokens import count_tokens
+
+BUNDLES_DIR_ENV = "ACTIVITY_BUNDLES_DIR"
+
+# Bundles already read by this process, by path (with the stat they match)
+_loaded: Dict[str, tuple] = {}
+
+
+def cell_source(cell: Dict) -> str:
+    source = cell.get('source', '')
+    return ''.join(source) if isinstance(source, list) else source
+
+
+def render_activity(cells: List[Dict]) -> str:
+    """Format an activity's student input cells for display."""
+    return "\n".join(f"[{cell['cell_type']}]\n{cell['source']}\n" for cell in cells)
+
+
+def render_notebook(cells: List[Dict]) -> str:
+    """Format every cell of a notebook for display."""
+    return "\n".join(f"Cell {i} [{cell.get('cell_type', 'unknown')}]:\n{cell_source(cell)}\n"
+                     for i, cell in enumerate(cells))
+
+
+def bundle_path(bundles_dir: Path, submission: str) -> Path:
+    """Bundle file of a submission."""
+    key = hashlib.sha256(str(Path(submission).resolve()).encode('utf-8')).hexdigest()[:16]
+    return bundles_dir / f"{key}.json"
+
+
+def _stat(submission: str) -> tuple[int, int]:
+    stat = os.stat(submission)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_bundle(submission: str) -> Optional[Dict]:
+    """
+    Bundle of a submission, if ACTIVITY_BUNDLES_DIR is set and has an
+    up-to-date bundle for it.
+    """
+    bundles_dir = os.environ.get(BUNDLES_DIR_ENV)
+    if not bundles_dir:
+        return None
+    try:
+        stat = _stat(submission)
+    except OSError:
+        return None
+
+    cached = _loaded.get(submission)
+    if cached and cached[0] == stat:
+        return cached[1]
+    try:
+        with open(bundle_path(Path(bundles_dir), submission), 'r', encoding='utf-8') as f:
+            bundle = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (bundle.get('size'), bundle.get('mtime_ns')) != stat:
+        return None
+    _loaded[submission] = (stat, bundle)
+    return bundle
+
+
+def load_activities(submission: str) -> Optional[Dict[str, List[Dict]]]:
+    """Student input cells per activity, or None if the notebook cannot be read."""
+    bundle = load_bundle(submission)
+    if bundle:
+        return bundle['activities']
+    extractor = ActivityExtractor(submission)
+    if not extractor.load_notebook():
+        return None
+    return extractor.extract_activities()
+
+
+def minimize_text(cells: List[Dict], render: Callable[[List[Dict]], str], options: Dict,
+                  template: Set[str]) -> tuple[str, Dict[str, int]]:
+    """
+    Render cells after minimisation.
+
+    Returns:
+        Tuple of (text, estimated tokens 'before', after each applied step,
+        and 'after')
+    """
+    tokens = {'before': count_tokens(render(cells))}
+    for step, cells in minimize_steps(cells, options, template):
+        tokens[step] = count_tokens(render(cells))
+    text = render(cells)
+    tokens['after'] = count_tokens(text)
+    return text, tokens
+
+
+def add_tokens(total: Dict[str, int], tokens: Dict[str, int]):
+    for key, count in tokens.items():
+        total[key] = total.get(key, 0) + count
+
+
+def build_bundle(submission: str, output: str, options: Dict,
+                 template: Set[str]) -> tuple[str, Optional[Dict], Optional[str]]:
+    """
+    Parse one submission and write its bundle (runs in a worker process).
+
+    Returns:
+        Tuple of (submission, token estimates per stage, error or None)
+    """
+    try:
+        size, mtime_ns = _stat(submission)
+    except OSError as e:
+        return submission, None, str(e)
+    extractor = ActivityExtractor(submission)
+    if not extractor.load_notebook():
+        return submission, None, '; '.join(extractor.get_errors())
+    activities = extractor.extract_activities()
+
+    activity_text, marker_tokens = {}, {}
+    for activity, cells in activities.items():
+        activity_text[activity], tokens = minimize_text(cells, render_activity, options, template)
+        add_tokens(marker_tokens, tokens)
+    notebook_text, unifier_tokens = minimize_text(extractor.cells, render_notebook, options, template)
+    minimized = {'marker': marker_tokens, 'unifier': unifier_tokens}
+
+    bundle = {
+        'submission': submission,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'options': options,
+        'activities': activities,
+        'activity_text': activity_text,
+        'notebook_text': notebook_text,
+        'minimized_tokens': minimized,
+        'warnings': extractor.get_errors(),
+    }
+    temp = Path(f"{output}.tmp")
+    temp.write_text(json.dumps(bundle, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    temp.replace(output)
+    return submission, minimized, None
+
+
+def current_bundle(submission: str, output: Path, options: Dict) -> Optional[Dict]:
+    """The bundle, if it exists and matches its notebook and options (resume)."""
+    try:
+        with open(output, 'r', encoding='utf-8') as f:
+            bundle = json.load(f)
+        if (bundle.get('size'), bundle.get('mtime_ns')) == _stat(submission) and bundle.get('options') == options:
+            return bundle
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def minimize_options(no_minimize: bool, base_notebook: Optional[str]) -> tuple[Dict, Set[str]]:
+    """Minimisation options (with a digest of the template they strip) and the template texts."""
+    options = load_options({'enabled': False} if no_minimize else None)
+    template = set()
+    if options['enabled'] and base_notebook:
+        template = template_texts(read_notebook(base_notebook)['cells'])
+    digest = hashlib.sha256('\0'.join(sorted(template)).encode('utf-8')).hexdigest()[:16]
+    return {**options, 'template': digest if template else None}, template
+
+
+def write_report(report_path: str, totals: Dict[str, Dict[str, int]], options: Dict):
+    """Write the per-stage token estimates before and after minimisation."""
+    report = {'options': options}
+    for stage, tokens in totals.items():
+        steps = [step for step in STEPS if step in tokens]
+        report[stage] = {
+            'before': tokens.get('before', 0),
+            'after': tokens.get('after', 0),
+            'saved': tokens.get('before', 0) - tokens.get('after', 0),
+            # Tokens each step removed from what the previous steps left
+            'steps': {step: previous - tokens[step]
+                      for step, previous in zip(steps, [tokens.get('before', 0)] + [tokens[s] for s in steps])},
+        }
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse every submission once into per-student activity bundles")
+    parser.add_argument("--manifest", required=True, help="Submissions manifest JSON")
+    parser.add_argument("--output-dir", required=True, help="Bundles directory (e.g. processed/bundles)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--base-notebook", help="Base notebook, whose markdown is stripped from student work")
+    parser.add_argument("--report", help="Write token estimates before and after minimisation per stage (JSON)")
+    parser.add_argument("--no-minimize", action="store_true",
+                        help="Render student work verbatim (no prompt minimisation)")
+    parser.add_argument("--no-resume", action="store_true", help="Rebuild bundles that are up to date")
+
+    args = parser.parse_args()
+    started = time.monotonic()
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    submissions = list(dict.fromkeys(s['path'] for s in manifest.get('submissions', [])))
+
+    options, template = minimize_options(args.no_minimize, args.base_notebook)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    totals = {}
+    jobs = []
+    for path in submissions:
+        output = bundle_path(output_dir, path)
+        bundle = None if args.no_resume else current_bundle(path, output, options)
+        if bundle:
+            for stage, tokens in bundle.get('minimized_tokens', {}).items():
+                add_tokens(totals.setdefault(stage, {}), tokens)
+        else:
+            jobs.append((path, output))
+
+    failed = []
+    if jobs:
+        workers = max(1, min(args.workers, len(jobs)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(build_bundle, [path for path, _ in jobs], [str(output) for _, output in jobs],
+                               repeat(options), repeat(template), chunksize=max(1, len(jobs) // (workers * 4)))
+            for submission, minimized, error in results:
+                if error:
+                    failed.append((submission, error))
+                    continue
+                for stage, tokens in minimized.items():
+                    add_tokens(totals.setdefault(stage, {}), tokens)
+
+    for submission, error in failed:
+        print(f"  ✗ {submission}: {error}", file=sys.stderr)
+    up_to_date = len(submissions) - len(jobs)
+    print(f"✓ Bundled {len(jobs) - len(failed)} submissions in {time.monotonic() - started:.1f}s "
+          f"({up_to_date} up to date, {len(failed)} unreadable)")
+
+    if args.report:
+        write_report(args.report, totals, options)
+    if options['enabled']:
+        for stage, tokens in totals.items():
+            before, after = tokens.get('before', 0), tokens.get('after', 0)
+            if before:
+                print(f"✓ Minimised {stage} work: ~{before:,} -> ~{after:,} tokens "
+                      f"({(before - after) / before:.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()
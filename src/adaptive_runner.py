@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Adaptive Task Runner
+
+Runs the lines of a task file as shell commands with an AIMD-controlled
+concurrency limit (see utils/concurrency.py). Used by parallel_runner.sh in
+place of a fixed GNU parallel/xargs job count.
+
+- Starts at --concurrency and grows by one per round of successful tasks
+  (up to --max-concurrency)
+- Halves the limit when a task fails with a rate-limit signal (429/529,
+  "overloaded", "rate limit", ...) and re-queues that task with a short delay
+- Stops dispatching when a hard quota is hit (daily caps, "resets 3am"),
+  since every remaining task would fail the same way
+- With --budget, stops dispatching once spent plus projected cost would
+  exceed the run budget (see utils/budget.py)
+
+Per-task stdout/stderr are written in GNU parallel's --results layout
+(<output-dir>/1/<task>/stdout|stderr), so error_summary.py, review_errors.sh
+and force_complete.py read them unchanged. The concurrency curve and
+throughput are appended to <output-dir>/concurrency.jsonl.
+
+Usage:
+  python3 adaptive_runner.py --tasks tasks.txt --concurrency 8 --output-dir logs/marker_logs
+  python3 adaptive_runner.py --tasks ids.txt --concurrency 4 --command "process.sh {}"
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+from budget import add_budget_args, budget_from_args
+from concurrency import DEFAULT_MAX_REQUEUE, AIMDController, requeue_delay
+from quota_detector import is_hard_quota, is_rate_limit_signal
+
+# Longest task directory name (filesystem limit is 255 bytes)
+MAX_DIR_NAME_BYTES = 250
+
+POLL_INTERVAL = 0.2
+
+
+def task_dir_name(task: str) -> str:
+    """Directory name for a task, following GNU parallel's --results naming."""
+    name = task.replace('/', '_').replace('\0', '_')
+    encoded = name.encode('utf-8')[:MAX_DIR_NAME_BYTES]
+    return encoded.decode('utf-8', errors='ignore')
+
+
+class AdaptiveRunner:
+    """Dispatches shell tasks under an AIMD concurrency limit."""
+
+    def __init__(self, tasks: list[str], controller: AIMDController, output_dir: Path | None,
+                 command: str | None, provider: str, max_requeue: int, verbose: bool,
+                 budget=None):
+        self.queue = deque((task, 0, 0.0) for task in tasks)
+        self.total = len(tasks)
+        self.controller = controller
+        self.output_dir = output_dir
+        self.command = command
+        self.provider = provider
+        self.max_requeue = max_requeue
+        self.verbose = verbose
+        self.budget = budget
+
+        self.running = []
+        self.succeeded = 0
+        self.failed = 0
+        self.requeued = 0
+        self.hard_quota_output = None
+        self.budget_reached = False
+
+    def build_command(self, task: str) -> str:
+        if self.command:
+            return self.command.replace('{}', task)
+        return task
+
+    def start(self, task: str, attempt: int):
+        if self.output_dir:
+            task_dir = self.output_dir / "1" / task_dir_name(task)
+            task_dir.mkdir(parents=True, exist_ok=True)
+            stdout = open(task_dir / "stdout", 'w')
+            stderr = open(task_dir / "stderr", 'w')
+        else:
+            task_dir = None
+            stdout = subprocess.PIPE
+            stderr = subprocess.PIPE
+
+        process = subprocess.Popen(['bash', '-c', self.build_command(task)],
+                                   stdout=stdout, stderr=stderr, text=True)
+        started_at = self.controller.on_start()
+        self.running.append((process, task, attempt, started_at, task_dir, stdout, stderr))
+
+    def task_output(self, process, task_dir, stdout, stderr) -> str:
+        if task_dir is None:
+            out, err = process.communicate()
+            if self.verbose or process.returncode != 0:
+                sys.stdout.write(out or '')
+                sys.stderr.write(err or '')
+            return (err or '') + (out or '')
+
+        stdout.close()
+        stderr.close()
+        return ((task_dir / "stderr").read_text(errors='replace') +
+                (task_dir / "stdout").read_text(errors='replace'))
+
+    def finish(self, entry):
+        process, task, attempt, started_at, task_dir, stdout, stderr = entry
+        output = self.task_output(process, task_dir, stdout, stderr)
+
+        if process.returncode == 0:
+            self.controller.on_success()
+            self.succeeded += 1
+            return
+
+        if is_hard_quota(output):
+            self.controller.on_failure()
+            self.failed += 1
+            if self.hard_quota_output is None:
+                self.hard_quota_output = output
+            return
+
+        if is_rate_limit_signal(output, self.provider):
+            retry = attempt < self.max_requeue
+            self.controller.on_rate_limit(started_at, requeued=retry)
+            if retry:
+                self.requeued += 1
+                self.queue.append((task, attempt + 1, time.monotonic() + requeue_delay(attempt)))
+            else:
+                self.failed += 1
+            return
+
+        self.controller.on_failure()
+        self.failed += 1
+
+    def next_ready(self):
+        """Pop the first queued task whose re-queue delay has passed."""
+        now = time.monotonic()
+        for i, (task, attempt, not_before) in enumerate(self.queue):
+            if not_before <= now:
+                del self.queue[i]
+                return task, attempt
+        return None
+
+    def print_progress(self):
+        if not self.verbose:
+            return
+        done = self.succeeded + self.failed
+        message = f"[{done * 100 // self.total}%] {done}/{self.total} tasks"
+        if self.failed:
+            message += f" ({self.failed} errors)"
+        message += f" | concurrency {self.controller.concurrency}"
+        print(f"\r\033[K{message}", end='', file=sys.stderr, flush=True)
+
+    def stopped(self) -> bool:
+        """True once no new tasks may be dispatched (hard quota or budget)."""
+        return self.hard_quota_output is not None or self.budget_reached
+
+    def run(self):
+        self.print_progress()
+        while self.running or (self.queue and not self.stopped()):
+            # Dispatch up to the current limit (nothing new after a hard quota
+            # or once the budget is spent)
+            while not self.stopped() and self.controller.has_capacity():
+                if self.budget and not self.budget.allows(len(self.running)):
+                    self.budget_reached = True
+                    break
+                ready = self.next_ready()
+                if ready is None:
+                    break
+                self.start(*ready)
+
+            time.sleep(POLL_INTERVAL)
+
+            still_running = []
+            for entry in self.running:
+                if entry[0].poll() is None:
+                    still_running.append(entry)
+                else:
+                    self.finish(entry)
+            self.running = still_running
+            self.print_progress()
+
+        self.controller.finish()
+        if self.verbose:
+            print(file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run shell tasks with adaptive (AIMD) concurrency"
+    )
+    parser.add_argument(
+        "--tasks",
+        required=True,
+        help="File with one shell command (or argument for --command) per line"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Target concurrency to start at (default: 4)"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Ceiling for additive increase (default: 2 x --concurrency)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Directory for per-task stdout/stderr (GNU parallel --results layout)"
+    )
+    parser.add_argument(
+        "--command",
+        help="Command template; {} is replaced by each task line"
+    )
+    parser.add_argument(
+        "--provider",
+        default="",
+        help="LLM provider, for provider-specific quota messages"
+    )
+    parser.add_argument(
+        "--max-requeue",
+        type=int,
+        default=DEFAULT_MAX_REQUEUE,
+        help=f"Times a rate-limited task is re-queued before it counts as failed (default: {DEFAULT_MAX_REQUEUE})"
+    )
+    parser.add_argument(
+        "--curve-log",
+        help="JSONL file for the concurrency curve (default: <output-dir>/concurrency.jsonl)"
+    )
+    parser.add_argument(
+        "--verbose", "-v",
+        action="store_true",
+        help="Show progress and summary"
+    )
+    add_budget_args(parser)
+
+    args = parser.parse_args()
+
+    tasks_file = Path(args.tasks)
+    if not tasks_file.exists():
+        print(f"Error: Tasks file not found: {tasks_file}", file=sys.stderr)
+        sys.exit(1)
+
+    tasks = [line.rstrip('\n') for line in tasks_file.read_text().splitlines() if line.strip()]
+    if not tasks:
+        return
+
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    curve_log = args.curve_log
+    if not curve_log and output_dir:
+        curve_log = output_dir / "concurrency.jsonl"
+
+    controller = AIMDController(args.concurrency, args.max_concurrency, log_file=curve_log)
+    runner = AdaptiveRunner(tasks, controller, output_dir, args.command, args.provider,
+                            args.max_requeue, args.verbose, budget_from_args(args))
+    runner.run()
+
+    not_run = len(runner.queue)
+
+    if args.verbose:
+        print("")
+        print("====================")
+        if runner.failed == 0 and not_run == 0:
+            print(f"✓ All {runner.total} tasks completed successfully")
+        else:
+            print(f"✗ Some tasks failed")
+        print(f"Successful: {runner.succeeded}")
+        print(f"Failed: {runner.failed}")
+        if not_run:
+            reason = "budget reached" if runner.budget_reached else "hard quota reached"
+            print(f"Not run ({reason}): {not_run}")
+        if runner.requeued:
+            print(f"Re-queued after rate limits: {runner.requeued}")
+        print(controller.summary())
+        if curve_log:
+            print(f"Concurrency curve: {curve_log}")
+        if output_dir:
+            print(f"Logs saved to: {output_dir}")
+
+    if runner.budget_reached:
+        print(f"✗ Budget reached ({runner.budget.summary()}): {not_run} task(s) not started; re-run to resume")
+
+    if runner.hard_quota_output is not None:
+        from quota_detector import print_quota_warning
+        print_quota_warning(args.provider or "unknown", runner.hard_quota_output)
+
+    if runner.failed or not_run:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Interactive agent that creates final CSV from all feedback cards.
 """
 
 import argparse
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -13,6 +14,7 @@ from pathlib import Path
 # Import utilities
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
 from system_config import get_default_provider, get_default_model
+from prompt_sections import write_prompt_file
 
 
 def load_prompt_template() -> str:
@@ -170,9 +172,10 @@ def main():
         # Call LLM via unified caller in INTERACTIVE mode
         llm_caller = Path(__file__).parent.parent / "llm_caller.sh"
 
+        prompt_file = write_prompt_file(prompt)
         cmd = [
             str(llm_caller),
-            "--prompt", prompt,
+            "--prompt-file", prompt_file,
             "--mode", "interactive",
             "--provider", args.provider,
             "--output", args.session_log
@@ -182,7 +185,10 @@ def main():
             cmd.extend(["--model", args.model])
 
         # Inherit stdin/stdout/stderr to preserve TTY access for interactive CLI
-        result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+        try:
+            result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+        finally:
+            os.unlink(prompt_file)
 
         if result.returncode != 0:
             print(f"\n✗ Aggregation session ended with errors", file=sys.stderr)
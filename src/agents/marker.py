@@ -3,18 +3,62 @@
 Marker Agent Wrapper
 
 Loads student work, applies marker prompt, and saves assessment.
+
+With --reference-marking (near-duplicate answers, see cluster_answers.py)
+the student is assessed with a short prompt that confirms or adjusts the
+reference student's marking, given the differences between the answers.
+
+With --activities A1,A2,... (packed mode, structured only) all listed
+activities of the student are assessed in one call, which pays for the
+marker instructions once instead of once per activity. The delimited
+response (utils/packing.py) is split into the usual <student>_A<n>.md files
+next to --output, which keeps the raw packed response. Activities whose
+section is missing or malformed are marked with separate calls.
+
+With --pack-file (student packing, see pack_tasks.py) one activity of
+several students is assessed in one call. The pack file lists the students'
+marker tasks; each student's section is written to that task's output and
+students without a usable section are marked with separate calls.
+
+With --cascade-model (model cascade, see utils/cascade.py) an activity is
+first marked by the cheaper cascade model with a self-reported confidence;
+the marking is re-made with --model/--api-model when the answer is long,
+the confidence is low or the cascade response is malformed.
+
+With --anonymous (an answer whose marking is copied to students with an
+identical answer, see dedup_answers.py) the prompt gives ANONYMOUS_STUDENT
+instead of the student's name, so the shared marking names no student.
 """
 
 import argparse
+import difflib
 import json
-import subprocess
 import sys
 from pathlib import Path
 
 # Import utilities
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
 from quota_detector import is_quota_error, print_quota_warning
 from system_config import get_default_provider, get_default_model, resolve_provider_from_model
+from prompt_sections import join_prompt, render_prompt
+from packing import format_instructions, packed_context, split_sections, student_key, unpack_students
+from cascade import (CASCADE_STAGE, DEFAULT_MAX_ANSWER_TOKENS, DEFAULT_MIN_CONFIDENCE, cascade_prompt,
+                     check_marking, record_decision, strip_verdict)
+from extract_activities import ActivityExtractor
+from activity_bundles import load_bundle, render_activity, render_notebook
+from notebook_reader import read_notebook
+from api.client import LLMError, run_llm
+from api.streaming import StreamSink, StreamValidator
+from api.tokens import count_tokens
+
+# Student name given in the prompt of an anonymous task
+ANONYMOUS_STUDENT = 'Withheld (refer to them only as "the student")'
+
+
+def prompt_student(task: dict) -> str:
+    """Name of a task's student as given in its prompt."""
+    return ANONYMOUS_STUDENT if task.get('anonymous') else task['student']
 
 
 def load_prompt_template(assignment_type: str) -> str:
@@ -30,9 +74,33 @@ def load_prompt_template(assignment_type: str) -> str:
 
 
 def load_notebook(notebook_path: str) -> dict:
-    """Load and return notebook JSON."""
-    with open(notebook_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load a notebook's cells (without outputs)."""
+    return read_notebook(notebook_path)
+
+
+def format_activity_cells(cells: list) -> str:
+    """Format an activity's student input cells for display."""
+    return render_activity(cells)
+
+
+def load_activities_work(notebook_path: str) -> dict:
+    """Formatted student input cells of every activity (from the bundle, or extracted in-process)."""
+    bundle = load_bundle(notebook_path)
+    if bundle:
+        return bundle['activity_text']
+    extractor = ActivityExtractor(notebook_path)
+    if not extractor.load_notebook():
+        raise RuntimeError(f"Activity extraction failed: {'; '.join(extractor.get_errors())}")
+    return {activity: format_activity_cells(cells)
+            for activity, cells in extractor.extract_activities().items()}
+
+
+def load_activity_work(notebook_path: str, activity_id: str) -> str:
+    """Formatted student input cells of one activity, extracted in-process."""
+    activities = load_activities_work(notebook_path)
+    if activity_id not in activities:
+        raise FileNotFoundError(f"Activity {activity_id} not found in submission")
+    return activities[activity_id]
 
 
 def extract_student_work(notebook_path: str, activity_id: str = None) -> str:
@@ -42,45 +110,14 @@ def extract_student_work(notebook_path: str, activity_id: str = None) -> str:
     For structured assignments with activity_id, extracts only that activity.
     For free-form, returns entire notebook.
     """
-    notebook = load_notebook(notebook_path)
-
     if activity_id:
-        # Use activity extractor for structured assignments
-        extractor_path = Path(__file__).parent.parent / "extract_activities.py"
-        result = subprocess.run([
-            sys.executable,
-            str(extractor_path),
-            notebook_path,
-            "--output", "/tmp/extracted_activities"
-        ], capture_output=True, text=True)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"Activity extraction failed: {result.stderr}")
-
-        # Load extracted activity
-        activity_file = Path(f"/tmp/extracted_activities/{activity_id}.json")
-        if activity_file.exists():
-            with open(activity_file, 'r') as f:
-                activity_data = json.load(f)
-                # Format cells for display
-                cells_text = []
-                for cell in activity_data['cells']:
-                    cell_type = cell['cell_type']
-                    source = cell['source']
-                    cells_text.append(f"[{cell_type}]\n{source}\n")
-                return "\n".join(cells_text)
-        else:
-            raise FileNotFoundError(f"Activity {activity_id} not found in submission")
-    else:
-        # Return entire notebook formatted for display
-        cells_text = []
-        for i, cell in enumerate(notebook.get('cells', [])):
-            cell_type = cell.get('cell_type', 'unknown')
-            source = cell.get('source', '')
-            if isinstance(source, list):
-                source = ''.join(source)
-            cells_text.append(f"Cell {i} [{cell_type}]:\n{source}\n")
-        return "\n".join(cells_text)
+        return load_activity_work(notebook_path, activity_id)
+
+    # Return entire notebook formatted for display
+    bundle = load_bundle(notebook_path)
+    if bundle:
+        return bundle['notebook_text']
+    return render_notebook(load_notebook(notebook_path).get('cells', []))
 
 
 def load_marking_criteria(criteria_path: str) -> str:
@@ -140,6 +177,217 @@ def load_problem_context(problem_contexts_path: str, student_name: str) -> str:
         return ""
 
 
+def find_marking_criteria(submission: str, activity: str = None, criteria_path: str = None) -> str:
+    """Marking criteria from criteria_path, or the activity's criteria file under processed/."""
+    if criteria_path and Path(criteria_path).exists():
+        return load_marking_criteria(criteria_path)
+
+    # Try to find criteria file based on activity
+    if activity:
+        processed_dir = Path(submission).parent.parent / "processed"
+        criteria_file = processed_dir / "activities" / f"{activity}_criteria.md"
+        if criteria_file.exists():
+            return load_marking_criteria(str(criteria_file))
+        return f"No criteria file found for {activity}"
+    return "No marking criteria provided."
+
+
+def build_marker_prompt(student: str, submission: str, activity: str = None,
+                        criteria_path: str = None, assignment_type: str = "structured",
+                        problem_context_path: str = None) -> tuple[str, str]:
+    """
+    Build the marker prompt for one student (and activity).
+
+    Args:
+        student: Student name
+        submission: Path to student submission notebook
+        activity: Activity ID (e.g., A1) for structured assignments
+        criteria_path: Path to marking criteria file
+        assignment_type: structured or freeform
+        problem_context_path: Path to problem_contexts.json (different-problem assignments)
+
+    Returns:
+        Tuple of (system_prompt, prompt): the instructions and criteria shared
+        by every student of the activity, and the student-specific part
+    """
+    # Load prompt template
+    prompt_template = load_prompt_template(assignment_type)
+
+    # Extract student work
+    student_work = extract_student_work(submission, activity)
+
+    criteria = find_marking_criteria(submission, activity, criteria_path)
+
+    # Load problem context for different-problem assignments
+    problem_context = ""
+    if problem_context_path:
+        problem_context = load_problem_context(problem_context_path, student)
+
+    # Substitute variables and split into cacheable prefix and student suffix
+    return render_prompt(
+        prompt_template,
+        activity_id=activity or "N/A",
+        student_name=student,
+        submission_path=submission,
+        student_work=student_work,
+        marking_criteria=criteria,
+        problem_context=problem_context
+    )
+
+
+def build_packed_marker_prompt(student: str, submission: str, activities: list,
+                               criteria_path: str = None) -> tuple[str, str]:
+    """
+    Build one marker prompt covering several activities of a student.
+
+    Activities missing from the submission are left out of the prompt, so
+    their sections are missing from the response and they fall back to
+    separate calls (which report the problem).
+
+    Args:
+        student: Student name
+        submission: Path to student submission notebook
+        activities: Activity IDs (e.g., ['A1', 'A2'])
+        criteria_path: Path to marking criteria file (used for every activity)
+
+    Returns:
+        Tuple of (system_prompt, prompt), as for build_marker_prompt()
+    """
+    prompt_template = load_prompt_template("structured_packed")
+
+    work = load_activities_work(submission)
+    present = [activity for activity in activities if activity in work]
+    if not present:
+        raise FileNotFoundError(f"None of {', '.join(activities)} found in submission")
+
+    criteria = "\n\n".join(
+        f"### Activity {activity}\n\n{find_marking_criteria(submission, activity, criteria_path)}"
+        for activity in present)
+    student_work = "\n\n".join(f"### Activity {activity}\n\n{work[activity]}" for activity in present)
+
+    return render_prompt(
+        prompt_template,
+        activity_list=", ".join(present),
+        marking_criteria=criteria,
+        section_format=format_instructions(present),
+        student_name=student,
+        submission_path=submission,
+        student_work=student_work
+    )
+
+
+def build_students_packed_prompt(activity: str, members: list, criteria_path: str = None) -> tuple[str, str]:
+    """
+    Build one marker prompt covering an activity of several students.
+
+    The system prompt is the one build_marker_prompt() produces for the
+    activity, so packed and single calls share the provider's prompt cache.
+    Students whose submission lacks the activity are left out of the prompt;
+    their sections are missing from the response and they fall back to
+    separate calls.
+
+    Args:
+        activity: Activity ID (e.g., A1)
+        members: Marker tasks of the pack ('student', 'submission'), in order
+        criteria_path: Path to marking criteria file
+
+    Returns:
+        Tuple of (system_prompt, prompt), as for build_marker_prompt()
+    """
+    system_prompt, _ = render_prompt(
+        load_prompt_template("structured"),
+        activity_id=activity,
+        student_name="",
+        submission_path="",
+        student_work="",
+        marking_criteria=find_marking_criteria(members[0]['submission'], activity, criteria_path),
+        problem_context=""
+    )
+
+    keys, blocks = [], []
+    for index, member in enumerate(members):
+        work = load_activities_work(member['submission'])
+        if activity not in work:
+            continue
+        key = student_key(index)
+        keys.append(key)
+        name = prompt_student(member)
+        blocks.append(f"### {key}: {name}\n\n"
+                      f"**Student Name**: {name}\n"
+                      f"**Submission Path** (for reference only): {member['submission']}\n\n"
+                      f"{work[activity]}")
+    if not keys:
+        raise FileNotFoundError(f"Activity {activity} not found in any submission of the pack")
+
+    _, prompt = render_prompt(
+        load_prompt_template("structured_students"),
+        student_count=len(keys),
+        activity_id=activity,
+        section_format=format_instructions(keys),
+        students_work="\n\n".join(blocks)
+    )
+    return system_prompt, prompt
+
+
+def activity_output(output: str, student: str, activity: str) -> Path:
+    """Per-activity marking file next to a packed response file."""
+    return Path(output).parent / f"{student}_{activity}.md"
+
+
+def unpack_marking(text: str, student: str, activities: list, output: str) -> list:
+    """
+    Write the sections of a packed response to per-activity marking files.
+
+    Returns:
+        Activities without a valid section (to be marked separately)
+    """
+    sections = split_sections(text, activities)
+    for activity, section in sections.items():
+        activity_output(output, student, activity).write_text(section, encoding='utf-8')
+    return [activity for activity in activities if activity not in sections]
+
+
+def build_verify_prompt(student: str, submission: str, activity: str,
+                        reference_student: str, reference_submission: str,
+                        reference_marking: str, criteria_path: str = None) -> tuple[str, str]:
+    """
+    Build the short "confirm or adjust" prompt for a near-duplicate answer.
+
+    Args:
+        student: Student name
+        submission: Path to student submission notebook
+        activity: Activity ID (e.g., A1)
+        reference_student: Student whose answer represents the cluster
+        reference_submission: Path to the reference student's notebook
+        reference_marking: Path to the reference student's marking
+        criteria_path: Path to marking criteria file
+
+    Returns:
+        Tuple of (system_prompt, prompt), as for build_marker_prompt()
+    """
+    prompt_template = load_prompt_template("verify")
+
+    student_work = load_activity_work(submission, activity)
+    reference_work = load_activity_work(reference_submission, activity)
+    diff = difflib.unified_diff(reference_work.splitlines(), student_work.splitlines(),
+                                fromfile=reference_student, tofile=student, lineterm='', n=2)
+    answer_diff = "\n".join(diff) or "(no differences)"
+
+    with open(reference_marking, 'r', encoding='utf-8') as f:
+        marking = f.read().strip()
+
+    return render_prompt(
+        prompt_template,
+        activity_id=activity,
+        student_name=student,
+        submission_path=submission,
+        marking_criteria=find_marking_criteria(submission, activity, criteria_path),
+        reference_student=reference_student,
+        reference_marking=marking,
+        answer_diff=answer_diff
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Marker agent for evaluating student submissions"
@@ -150,13 +398,11 @@ def main():
     )
     parser.add_argument(
         "--student",
-        required=True,
-        help="Student name"
+        help="Student name (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--submission",
-        required=True,
-        help="Path to student submission notebook"
+        help="Path to student submission notebook (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--criteria",
@@ -198,119 +444,289 @@ def main():
         "--api-model",
         help="Model for direct API calls (uses API instead of CLI for headless)"
     )
+    parser.add_argument(
+        "--reference-student",
+        help="Student whose near-identical answer was marked in full (verification)"
+    )
+    parser.add_argument(
+        "--reference-submission",
+        help="Path to the reference student's notebook"
+    )
+    parser.add_argument(
+        "--reference-marking",
+        help="Reference student's marking; confirmed or adjusted instead of a full "
+             "marking (a full marking is made if it does not exist)"
+    )
+
+    parser.add_argument(
+        "--activities",
+        help="Comma-separated activity IDs to mark in one packed call (structured; "
+             "--output receives the raw response, markings are written next to it)"
+    )
+    parser.add_argument(
+        "--cascade-model",
+        help="Cheaper model that marks the activity first; the main model re-marks "
+             "only on low confidence, long answers or malformed output"
+    )
+    parser.add_argument(
+        "--cascade-confidence",
+        type=int,
+        default=DEFAULT_MIN_CONFIDENCE,
+        help=f"Lowest cascade confidence (0-100) kept without escalation (default: {DEFAULT_MIN_CONFIDENCE})"
+    )
+    parser.add_argument(
+        "--anonymous",
+        action="store_true",
+        help="Leave the student's name out of the prompt (marking shared with identical answers)"
+    )
+    parser.add_argument(
+        "--pack-file",
+        help="Pack of students' marker tasks for one activity (from pack_tasks.py); "
+             "--output receives the raw response, markings go to the tasks' outputs"
+    )
 
     args = parser.parse_args()
+    if not args.pack_file and not (args.student and args.submission):
+        parser.error("--student and --submission are required unless --pack-file is given")
+    student = prompt_student(vars(args)) if args.student else None
 
     try:
-        # Load prompt template
-        prompt_template = load_prompt_template(args.type)
-
-        # Extract student work
-        student_work = extract_student_work(args.submission, args.activity)
-
-        # Load marking criteria if provided
-        if args.criteria and Path(args.criteria).exists():
-            criteria = load_marking_criteria(args.criteria)
+        if args.pack_file:
+            with open(args.pack_file, 'r', encoding='utf-8') as f:
+                pack = json.load(f)
+            members = pack['pack']
+            missing = mark_students_packed(args, pack)
+            for member in missing:
+                system_prompt, prompt = build_marker_prompt(
+                    student=prompt_student(member),
+                    submission=member['submission'],
+                    activity=member['activity'],
+                    criteria_path=member.get('criteria'),
+                    assignment_type=member.get('type', 'structured')
+                )
+                call_marker(args, system_prompt, prompt, member['output'],
+                            f"{member['student']}/{member['activity']}")
+            print(f"✓ Marking complete for {pack['activity']} of {len(members)} students "
+                  f"({len(members) - len(missing)} packed, {len(missing)} marked separately)")
+            print(f"  Output: {args.output}")
+            return
+
+        if args.activities:
+            activities = [a.strip() for a in args.activities.split(',') if a.strip()]
+            missing = mark_packed(args, activities)
+            for activity in missing:
+                output = activity_output(args.output, args.student, activity)
+                system_prompt, prompt = build_marker_prompt(
+                    student=student,
+                    submission=args.submission,
+                    activity=activity,
+                    criteria_path=args.criteria,
+                    assignment_type=args.type,
+                    problem_context_path=args.problem_context
+                )
+                call_marker(args, system_prompt, prompt, str(output), f"{args.student}/{activity}")
+            print(f"✓ Marking complete for {args.student} ({', '.join(activities)}; "
+                  f"{len(activities) - len(missing)} packed, {len(missing)} marked separately)")
+            print(f"  Output: {Path(args.output).parent}")
+            return
+
+        verify = bool(args.activity and args.reference_marking and Path(args.reference_marking).exists())
+        if verify:
+            system_prompt, prompt = build_verify_prompt(
+                student=student,
+                submission=args.submission,
+                activity=args.activity,
+                reference_student=args.reference_student,
+                reference_submission=args.reference_submission,
+                reference_marking=args.reference_marking,
+                criteria_path=args.criteria
+            )
         else:
-            # Try to find criteria file based on activity
-            if args.activity:
-                processed_dir = Path(args.submission).parent.parent / "processed"
-                criteria_file = processed_dir / "activities" / f"{args.activity}_criteria.md"
-                if criteria_file.exists():
-                    criteria = load_marking_criteria(str(criteria_file))
-                else:
-                    criteria = f"No criteria file found for {args.activity}"
-            else:
-                criteria = "No marking criteria provided."
-
-        # Load problem context for different-problem assignments
-        problem_context = ""
-        if args.problem_context:
-            problem_context = load_problem_context(args.problem_context, args.student)
-
-        # Substitute variables in prompt
-        prompt = prompt_template.format(
-            activity_id=args.activity or "N/A",
-            student_name=args.student,
-            submission_path=args.submission,
-            student_work=student_work,
-            marking_criteria=criteria,
-            problem_context=problem_context
-        )
-
-        # Save prompt for debugging
-        prompt_debug_file = Path(args.output).with_suffix('.prompt.txt')
-        with open(prompt_debug_file, 'w') as f:
-            f.write(prompt)
-
-        # Call LLM via unified caller
-        llm_caller = Path(__file__).parent.parent / "llm_caller.sh"
-
-        cmd = [
-            str(llm_caller),
-            "--prompt", prompt,
-            "--mode", "headless",
-            "--provider", args.provider,
-            "--auto-approve"  # Skip permission prompts for automated marking
-        ]
-
-        if args.model:
-            cmd.extend(["--model", args.model])
-
-        if args.api_model:
-            cmd.extend(["--api-model", args.api_model])
-
-        if args.stats_file:
-            context = f"{args.student}"
-            if args.activity:
-                context += f"/{args.activity}"
-            cmd.extend([
-                "--stats-file", args.stats_file,
-                "--stats-stage", "marker",
-                "--stats-context", context
-            ])
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            # Check if this is a quota/rate limit error
-            error_output = result.stderr + result.stdout
-
-            # Determine the actual provider used for error reporting
-            # When --api-model is set, resolve provider from the model name
-            effective_provider = args.provider
-            if args.api_model:
-                resolved = resolve_provider_from_model(args.api_model)
-                if resolved:
-                    # Normalize provider name for quota detection
-                    if resolved in ('codex', 'openai'):
-                        effective_provider = 'codex'
-                    elif resolved in ('claude', 'anthropic'):
-                        effective_provider = 'claude'
-                    elif resolved in ('gemini', 'google'):
-                        effective_provider = 'gemini'
-                    else:
-                        effective_provider = resolved
-
-            quota_detected = is_quota_error(error_output, effective_provider)
-
-            if quota_detected:
-                print_quota_warning(effective_provider, error_output)
-            else:
-                print(f"Error: LLM call failed: {result.stderr}", file=sys.stderr)
-            sys.exit(1)
-
-        # Write output to file (Python handles file writing since shell redirection is unreliable)
-        with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(result.stdout)
+            system_prompt, prompt = build_marker_prompt(
+                student=student,
+                submission=args.submission,
+                activity=args.activity,
+                criteria_path=args.criteria,
+                assignment_type=args.type,
+                problem_context_path=args.problem_context
+            )
+
+        context = f"{args.student}"
+        if args.activity:
+            context += f"/{args.activity}"
+        if args.cascade_model and args.activity and not verify and mark_cascade(args, system_prompt, prompt, context):
+            print(f"✓ Marking complete for {args.student} ({args.activity}, {args.cascade_model})")
+            print(f"  Output: {args.output}")
+            return
+        call_marker(args, system_prompt, prompt, args.output, context,
+                    stage="verifier" if verify else "marker")
 
         print(f"✓ Marking complete for {args.student} ({args.activity or 'full submission'})")
         print(f"  Output: {args.output}")
 
+    except LLMError as e:
+        report_llm_error(args, e)
+        sys.exit(1)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
 
+def call_marker(args, system_prompt: str, prompt: str, output: str, context: str,
+                stage: str = "marker") -> str:
+    """Save the debug prompt and make the marker call, streaming to output."""
+    # Save prompt for debugging
+    with open(Path(output).with_suffix('.prompt.txt'), 'w') as f:
+        f.write(join_prompt(system_prompt, prompt))
+
+    # Call LLM (in-process for API models, llm_caller.sh for CLI tools);
+    # the response is streamed to <output>.partial and renamed when complete
+    return run_llm(
+        prompt,
+        system_prompt=system_prompt,
+        provider=args.provider,
+        model=args.model,
+        api_model=args.api_model,
+        stats_file=args.stats_file,
+        stats_stage=stage,
+        stats_context=context,
+        output_file=output,
+        validator=StreamValidator()
+    )
+
+
+def mark_cascade(args, system_prompt: str, prompt: str, context: str) -> bool:
+    """
+    Try a marking on the cascade model and record the decision.
+
+    Returns:
+        True if the cascade marking was kept (written to --output), False if
+        the main model has to mark the activity (quota errors are raised)
+    """
+    cascade_provider = resolve_provider_from_model(args.cascade_model) or args.provider
+    answer_tokens = count_tokens(prompt, cascade_provider)
+    confidence = verdict = None
+    if answer_tokens > DEFAULT_MAX_ANSWER_TOKENS:
+        reason = 'long_answer'
+    else:
+        try:
+            text = run_llm(
+                cascade_prompt(prompt),
+                system_prompt=system_prompt,
+                provider=cascade_provider,
+                model=None if args.api_model else args.cascade_model,
+                api_model=args.cascade_model if args.api_model else None,
+                stats_file=args.stats_file,
+                stats_stage=CASCADE_STAGE,
+                stats_context=context,
+                validator=StreamValidator()
+            )
+        except LLMError as e:
+            if is_quota_error(str(e), cascade_provider):
+                raise
+            print(f"Warning: cascade marking failed ({e})", file=sys.stderr)
+            reason = 'error'
+        else:
+            reason, confidence, verdict = check_marking(text, args.cascade_confidence)
+            if reason is None:
+                # Through <output>.partial, so resume never sees a truncated marking
+                StreamSink(args.output).finish(strip_verdict(text))
+
+    record_decision(args.stats_file, args.student, args.activity, args.cascade_model,
+                    answer_tokens, reason, confidence, verdict)
+    if reason:
+        print(f"Escalating {context} from {args.cascade_model} ({reason.replace('_', ' ')})")
+    return reason is None
+
+
+def call_packed(args, build, context: str, items: str) -> str | None:
+    """
+    Build and make a packed marker call.
+
+    Returns:
+        The packed response, or None if the call could not be made (quota
+        errors are raised)
+    """
+    try:
+        system_prompt, prompt = build()
+        return call_marker(args, system_prompt, prompt, args.output, context)
+    except LLMError as e:
+        if is_quota_error(str(e), effective_provider(args)):
+            raise
+        print(f"Warning: packed marking failed ({e}); marking {items} separately", file=sys.stderr)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"Warning: {e}; marking {items} separately", file=sys.stderr)
+    return None
+
+
+def mark_packed(args, activities: list) -> list:
+    """
+    Mark several activities in one call and split the response.
+
+    Returns:
+        Activities still to be marked separately (all of them if the packed
+        call could not be made, except on quota errors, which are raised)
+    """
+    text = call_packed(
+        args, lambda: build_packed_marker_prompt(prompt_student(vars(args)), args.submission, activities,
+                                                 args.criteria),
+        packed_context(args.student, activities), "activities")
+    if text is None:
+        return activities
+
+    missing = unpack_marking(text, args.student, activities, args.output)
+    if missing:
+        print(f"Warning: no usable section for {', '.join(missing)} in the packed response; "
+              f"marking separately", file=sys.stderr)
+    return missing
+
+
+def mark_students_packed(args, pack: dict) -> list:
+    """
+    Mark one activity of several students in one call and split the response.
+
+    Returns:
+        Marker tasks of the students still to be marked separately
+    """
+    members = pack['pack']
+    text = call_packed(
+        args, lambda: build_students_packed_prompt(pack['activity'], members, pack.get('criteria')),
+        packed_context(pack['activity'], [m['student'] for m in members]), "students")
+    if text is None:
+        return members
+
+    missing = unpack_students(text, members)
+    if missing:
+        print(f"Warning: no usable section for {', '.join(m['student'] for m in missing)} in the "
+              f"packed response; marking separately", file=sys.stderr)
+    return missing
+
+
+def effective_provider(args) -> str:
+    """Provider actually called, for quota detection (resolved from --api-model if set)."""
+    if args.api_model:
+        resolved = resolve_provider_from_model(args.api_model)
+        if resolved:
+            # Normalize provider name for quota detection
+            if resolved in ('codex', 'openai'):
+                return 'codex'
+            elif resolved in ('claude', 'anthropic'):
+                return 'claude'
+            elif resolved in ('gemini', 'google'):
+                return 'gemini'
+            return resolved
+    return args.provider
+
+
+def report_llm_error(args, error: LLMError):
+    """Print a quota warning or the LLM error."""
+    error_output = str(error)
+    provider = effective_provider(args)
+    if is_quota_error(error_output, provider):
+        print_quota_warning(provider, error_output)
+    else:
+        print(f"Error: LLM call failed: {error_output}", file=sys.stderr)
+
+
 if __name__ == "__main__":
     main()
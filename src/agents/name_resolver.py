@@ -23,6 +23,7 @@ from typing import Dict, List, Optional
 
 # Add src/utils to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent / 'utils'))
+from prompt_sections import write_prompt_file
 
 
 class NameResolver:
@@ -200,7 +201,8 @@ No gradebook was provided, so use the clearest form of the name you can extract
             cmd.extend(['--provider', provider])
 
         # Interactive mode so the LLM can use tools
-        cmd.extend(['--mode', 'interactive', '--prompt', prompt])
+        prompt_file = write_prompt_file(prompt)
+        cmd.extend(['--mode', 'interactive', '--prompt-file', prompt_file])
 
         try:
             # Run in interactive mode
@@ -217,6 +219,8 @@ No gradebook was provided, so use the clearest form of the name you can extract
         except Exception as e:
             print(f"LLM call error: {e}")
             return False
+        finally:
+            os.unlink(prompt_file)
 
     def get_summary(self) -> dict:
         """Get resolution summary."""
@@ -7,14 +7,16 @@ Aggregates marker assessments and creates unified scoring scheme.
 
 import argparse
 import json
-import subprocess
 import sys
 from pathlib import Path
 from typing import List, Dict
 
 # Import utilities
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
 from system_config import get_default_provider, get_default_model
+from prompt_sections import join_prompt, render_prompt
+from api.client import LLMError, run_llm
 
 
 def load_prompt_template(assignment_type: str) -> str:
@@ -156,8 +158,9 @@ def main():
         processed_dir = Path(args.processed_dir)
         rubric = load_rubric(processed_dir, args.activity)
 
-        # Substitute variables in prompt
-        prompt = prompt_template.format(
+        # Substitute variables and split into cacheable prefix and assessments
+        system_prompt, prompt = render_prompt(
+            prompt_template,
             activity_id=args.activity or "N/A",
             num_students=len(assessments),
             marker_assessments=marker_assessments,
@@ -168,43 +171,29 @@ def main():
         # Save prompt for debugging
         prompt_debug_file = Path(args.output).with_suffix('.prompt.txt')
         with open(prompt_debug_file, 'w') as f:
-            f.write(prompt)
+            f.write(join_prompt(system_prompt, prompt))
 
         print(f"Normalizing assessments for {args.activity or 'entire assignment'}...")
 
-        # Call LLM via unified caller
-        llm_caller = Path(__file__).parent.parent / "llm_caller.sh"
-
-        cmd = [
-            str(llm_caller),
-            "--prompt", prompt,
-            "--mode", "headless",
-            "--provider", args.provider,
-            "--auto-approve"  # Skip permission prompts for automated operation
-        ]
-
-        if args.model:
-            cmd.extend(["--model", args.model])
-
-        if args.api_model:
-            cmd.extend(["--api-model", args.api_model])
-
-        if args.stats_file:
-            cmd.extend([
-                "--stats-file", args.stats_file,
-                "--stats-stage", "normalizer",
-                "--stats-context", args.activity or "full"
-            ])
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            print(f"✗ Normalization failed: {result.stderr}", file=sys.stderr)
+        # Call LLM (in-process for API models, llm_caller.sh for CLI tools)
+        try:
+            response = run_llm(
+                prompt,
+                system_prompt=system_prompt,
+                provider=args.provider,
+                model=args.model,
+                api_model=args.api_model,
+                stats_file=args.stats_file,
+                stats_stage="normalizer",
+                stats_context=args.activity or "full"
+            )
+        except LLMError as e:
+            print(f"✗ Normalization failed: {e}", file=sys.stderr)
             sys.exit(1)
 
         # Write output to file (Python handles file writing since shell redirection is unreliable)
         with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(result.stdout)
+            f.write(response)
 
         print(f"✓ Normalization complete for {args.activity or 'assignment'}")
         print(f"  Output: {args.output}")
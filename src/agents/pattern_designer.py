@@ -6,6 +6,7 @@ Interactive agent that creates marking criteria and rubric.
 """
 
 import argparse
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -13,6 +14,7 @@ from pathlib import Path
 # Import utilities
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
 from system_config import get_default_provider, get_default_model
+from prompt_sections import write_prompt_file
 
 
 def load_prompt_template(assignment_type: str) -> str:
@@ -197,9 +199,10 @@ The marker agents will receive each group's specific problem description along w
         # Call LLM via unified caller
         llm_caller = Path(__file__).parent.parent / "llm_caller.sh"
 
+        prompt_file = write_prompt_file(prompt)
         cmd = [
             str(llm_caller),
-            "--prompt", prompt,
+            "--prompt-file", prompt_file,
             "--mode", mode,
             "--provider", args.provider,
             "--output", args.session_log
@@ -217,7 +220,10 @@ The marker agents will receive each group's specific problem description along w
             cmd.extend(["--auto-approve"])
 
         # Always use interactive TTY (pattern designer needs Write tools)
-        result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+        try:
+            result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+        finally:
+            os.unlink(prompt_file)
 
         if result.returncode != 0:
             print(f"\n✗ Pattern design session ended with errors", file=sys.stderr)
@@ -15,6 +15,7 @@ from pathlib import Path
 # Add src/utils to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent / 'utils'))
 from system_config import resolve_provider_from_model, format_available_models
+from prompt_sections import write_prompt_file
 
 
 def read_csv_content(csv_path: str, max_lines: int = None) -> str:
@@ -263,7 +264,7 @@ def run_translator(assignment_name: str, total_marks: int, assignment_type: str,
         cmd = [
             'bash',
             str(llm_caller),
-            '--prompt', prompt,
+            '--prompt-file', '-',  # Prompt on stdin
             '--mode', 'headless',
             '--api-model', api_model,
             '--provider', provider  # Fallback provider
@@ -272,7 +273,7 @@ def run_translator(assignment_name: str, total_marks: int, assignment_type: str,
             cmd.extend(['--model', model])
 
         # Run headless API call
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = subprocess.run(cmd, input=prompt, capture_output=True, text=True)
 
         if result.returncode != 0:
             print(f"\nError: Translator API call failed: {result.stderr}")
@@ -338,10 +339,11 @@ def run_translator(assignment_name: str, total_marks: int, assignment_type: str,
         return True
 
     # Interactive mode (original behavior)
+    prompt_file = write_prompt_file(prompt)
     cmd = [
         'bash',
         str(llm_caller),
-        '--prompt', prompt,
+        '--prompt-file', prompt_file,
         '--mode', 'interactive',
         '--provider', provider,
         '--output', str(session_log)
@@ -351,7 +353,10 @@ def run_translator(assignment_name: str, total_marks: int, assignment_type: str,
         cmd.extend(['--model', model])
 
     # Run the interactive agent session - inherit stdin/stdout/stderr for TTY access
-    result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+    try:
+        result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr)
+    finally:
+        os.unlink(prompt_file)
 
     if result.returncode != 0:
         print(f"\nError: Translator agent failed with exit code {result.returncode}")
@@ -3,24 +3,36 @@
 Unifier Agent Wrapper
 
 Applies approved marking scheme and creates final feedback for a student.
+
+With --pack-file (student packing, see pack_tasks.py) several students'
+feedback is created in one call. Each student's section is written to that
+student's output; students without a section containing a feedback card are
+run as separate calls.
 """
 
 import argparse
 import json
-import subprocess
 import sys
 from pathlib import Path
 from typing import Dict, List
 
 # Import utilities
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
 from system_config import get_default_provider, get_default_model
+from prompt_sections import join_prompt, render_prompt
+from activity_bundles import load_bundle, render_notebook
+from notebook_reader import read_notebook
+from packing import format_instructions, packed_context, student_key, unpack_students
+from quota_detector import is_quota_error
+from api.client import LLMError, run_llm
+from api.streaming import FEEDBACK_CARD_LINE, StreamValidator, feedback_card_validator
 
 
-def load_prompt_template() -> str:
-    """Load the unifier prompt template."""
+def load_prompt_template(name: str = "unifier") -> str:
+    """Load the unifier prompt template (unifier_students for packed calls)."""
     prompts_dir = Path(__file__).parent.parent / "prompts"
-    prompt_file = prompts_dir / "unifier.md"
+    prompt_file = prompts_dir / f"{name}.md"
 
     if not prompt_file.exists():
         raise FileNotFoundError(f"Prompt template not found: {prompt_file}")
@@ -57,19 +69,188 @@ def load_previous_assessments(markings_dir: Path, student_name: str, assignment_
 
 
 def load_student_notebook(notebook_path: str) -> str:
-    """Load and format student's complete notebook."""
-    with open(notebook_path, 'r') as f:
-        notebook = json.load(f)
+    """Load and format student's complete notebook (from its bundle when there is one)."""
+    bundle = load_bundle(notebook_path)
+    if bundle:
+        return bundle['notebook_text']
+
+    return render_notebook(read_notebook(notebook_path)['cells'])
+
+
+def build_unifier_prompt(student: str, submission: str, scheme_path: str,
+                         markings_dir: str, assignment_type: str = "structured") -> tuple[str, str]:
+    """
+    Build the unifier prompt for one student.
+
+    Args:
+        student: Student name
+        submission: Path to student submission notebook
+        scheme_path: Path to approved marking scheme JSON
+        markings_dir: Directory containing previous assessments
+        assignment_type: structured or freeform
+
+    Returns:
+        Tuple of (system_prompt, prompt): the instructions and approved scheme
+        shared by every student, and the student-specific part
+    """
+    # Load prompt template
+    prompt_template = load_prompt_template()
+
+    # Load previous assessments
+    markings_dir = Path(markings_dir)
+    previous_assessments = load_previous_assessments(markings_dir, student, assignment_type)
+
+    # Load student's complete notebook
+    student_notebook = load_student_notebook(submission)
+
+    # Substitute variables and split into cacheable prefix and student suffix
+    return render_prompt(
+        prompt_template,
+        student_name=student,
+        submission_path=submission,
+        previous_assessments=previous_assessments,
+        student_notebook=student_notebook,
+        **scheme_values(scheme_path, assignment_type)
+    )
+
+
+def build_packed_unifier_prompt(members: list, scheme_path: str, markings_dir: str,
+                                assignment_type: str = "structured") -> tuple[str, str]:
+    """
+    Build one unifier prompt covering several students.
+
+    The system prompt is the one build_unifier_prompt() produces, so packed
+    and single calls share the provider's prompt cache.
+
+    Args:
+        members: Unifier tasks of the pack ('student', 'submission'), in order
+        scheme_path: Path to approved marking scheme JSON
+        markings_dir: Directory containing previous assessments
+        assignment_type: structured or freeform
+
+    Returns:
+        Tuple of (system_prompt, prompt), as for build_unifier_prompt()
+    """
+    values = scheme_values(scheme_path, assignment_type)
+    system_prompt, _ = render_prompt(
+        load_prompt_template(),
+        student_name="",
+        submission_path="",
+        previous_assessments="",
+        student_notebook="",
+        **values
+    )
+
+    keys = [student_key(index) for index in range(len(members))]
+    blocks = []
+    for key, member in zip(keys, members):
+        previous_assessments = load_previous_assessments(Path(markings_dir), member['student'], assignment_type)
+        blocks.append(f"### {key}: {member['student']}\n\n"
+                      f"**Student Name**: {member['student']}\n"
+                      f"**Submission**: {member['submission']}\n\n"
+                      f"#### Previous Assessments\n\n{previous_assessments}\n\n"
+                      f"#### Complete Notebook\n\n{load_student_notebook(member['submission'])}")
+
+    _, prompt = render_prompt(
+        load_prompt_template("unifier_students"),
+        student_count=len(members),
+        section_format=format_instructions(keys),
+        students_work="\n\n".join(blocks)
+    )
+    return system_prompt, prompt
+
+
+def scheme_values(scheme_path: str, assignment_type: str) -> dict:
+    """Template values shared by every student: the approved scheme and output formats."""
+    # Load approved marking scheme
+    approved_scheme = load_approved_scheme(scheme_path)
+    scheme_text = json.dumps(approved_scheme, indent=2)
+
+    # Determine assignment-specific calculation format
+    if assignment_type == "structured":
+        calculation_format = """
+Activity 1: [marks] / [total]
+Activity 2: [marks] / [total]
+...
+Total: [sum] / [total_available]
+"""
+        structured_output = """
+**Activity Breakdown**:
+- Activity 1: [X] / [Total]
+- Activity 2: [X] / [Total]
+...
+"""
+    else:
+        calculation_format = """
+Component 1: [marks] / [total]
+Component 2: [marks] / [total]
+...
+Total: [sum] / [total_available]
+"""
+        structured_output = """
+**Component Breakdown**:
+- Component 1: [X] / [Total]
+- Component 2: [X] / [Total]
+...
+"""
 
-    cells_text = []
-    for i, cell in enumerate(notebook.get('cells', [])):
-        cell_type = cell.get('cell_type', 'unknown')
-        source = cell.get('source', '')
-        if isinstance(source, list):
-            source = ''.join(source)
-        cells_text.append(f"Cell {i} [{cell_type}]:\n{source}\n")
+    return {
+        'approved_scheme': scheme_text,
+        'assignment_type_specific_calculation': calculation_format,
+        'structured_output': structured_output,
+        'marks_breakdown': "[Activity/Component marks listed here]",
+    }
+
+
+def call_unifier(args, system_prompt: str, prompt: str, output: str, context: str,
+                 validator: StreamValidator) -> str:
+    """Save the debug prompt and make the unifier call, streaming to output."""
+    # Save prompt for debugging
+    with open(Path(output).with_suffix('.prompt.txt'), 'w') as f:
+        f.write(join_prompt(system_prompt, prompt))
+
+    # Call LLM (in-process for API models, llm_caller.sh for CLI tools);
+    # the response is streamed to <output>.partial and renamed when complete
+    return run_llm(
+        prompt,
+        system_prompt=system_prompt,
+        provider=args.provider,
+        model=args.model,
+        api_model=args.api_model,
+        stats_file=args.stats_file,
+        stats_stage="unifier",
+        stats_context=context,
+        output_file=output,
+        validator=validator
+    )
 
-    return "\n".join(cells_text)
+
+def unify_packed(args, pack: dict) -> list:
+    """
+    Create several students' feedback in one call and split the response.
+
+    Returns:
+        Unifier tasks of the students still to be run separately (all of
+        them if the packed call failed, except on quota errors, which are
+        raised)
+    """
+    members = pack['pack']
+    try:
+        system_prompt, prompt = build_packed_unifier_prompt(
+            members, pack['scheme'], pack['markings_dir'], pack.get('type', 'structured'))
+        text = call_unifier(args, system_prompt, prompt, args.output,
+                            packed_context(None, [m['student'] for m in members]), StreamValidator())
+    except LLMError as e:
+        if is_quota_error(str(e), args.provider):
+            raise
+        print(f"Warning: packed unifier call failed ({e}); running students separately", file=sys.stderr)
+        return members
+
+    missing = unpack_students(text, members, FEEDBACK_CARD_LINE)
+    if missing:
+        print(f"Warning: no usable section for {', '.join(m['student'] for m in missing)} in the "
+              f"packed response; running separately", file=sys.stderr)
+    return missing
 
 
 def main():
@@ -78,23 +259,19 @@ def main():
     )
     parser.add_argument(
         "--student",
-        required=True,
-        help="Student name"
+        help="Student name (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--submission",
-        required=True,
-        help="Path to student submission notebook"
+        help="Path to student submission notebook (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--scheme",
-        required=True,
-        help="Path to approved marking scheme JSON"
+        help="Path to approved marking scheme JSON (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--markings-dir",
-        required=True,
-        help="Directory containing previous assessments"
+        help="Directory containing previous assessments (required unless --pack-file is given)"
     )
     parser.add_argument(
         "--output",
@@ -128,105 +305,59 @@ def main():
         "--api-model",
         help="Model for direct API calls (uses API instead of CLI for headless)"
     )
+    parser.add_argument(
+        "--pack-file",
+        help="Pack of students' unifier tasks (from pack_tasks.py); --output receives "
+             "the raw response, feedback goes to the tasks' outputs"
+    )
 
     args = parser.parse_args()
+    if not args.pack_file and not (args.student and args.submission and args.scheme and args.markings_dir):
+        parser.error("--student, --submission, --scheme and --markings-dir are required "
+                     "unless --pack-file is given")
 
     try:
-        # Load prompt template
-        prompt_template = load_prompt_template()
-
-        # Load approved marking scheme
-        approved_scheme = load_approved_scheme(args.scheme)
-        scheme_text = json.dumps(approved_scheme, indent=2)
-
-        # Load previous assessments
-        markings_dir = Path(args.markings_dir)
-        previous_assessments = load_previous_assessments(markings_dir, args.student, args.type)
-
-        # Load student's complete notebook
-        student_notebook = load_student_notebook(args.submission)
-
-        # Determine assignment-specific calculation format
-        if args.type == "structured":
-            calculation_format = """
-Activity 1: [marks] / [total]
-Activity 2: [marks] / [total]
-...
-Total: [sum] / [total_available]
-"""
-            structured_output = """
-**Activity Breakdown**:
-- Activity 1: [X] / [Total]
-- Activity 2: [X] / [Total]
-...
-"""
-        else:
-            calculation_format = """
-Component 1: [marks] / [total]
-Component 2: [marks] / [total]
-...
-Total: [sum] / [total_available]
-"""
-            structured_output = """
-**Component Breakdown**:
-- Component 1: [X] / [Total]
-- Component 2: [X] / [Total]
-...
-"""
-
-        # Substitute variables in prompt
-        prompt = prompt_template.format(
-            student_name=args.student,
-            submission_path=args.submission,
-            approved_scheme=scheme_text,
-            previous_assessments=previous_assessments,
-            student_notebook=student_notebook,
-            assignment_type_specific_calculation=calculation_format,
-            structured_output=structured_output,
-            marks_breakdown="[Activity/Component marks listed here]"
+        if args.pack_file:
+            with open(args.pack_file, 'r', encoding='utf-8') as f:
+                pack = json.load(f)
+            members = pack['pack']
+            try:
+                missing = unify_packed(args, pack)
+                for member in missing:
+                    system_prompt, prompt = build_unifier_prompt(
+                        student=member['student'],
+                        submission=member['submission'],
+                        scheme_path=member['scheme'],
+                        markings_dir=member['markings_dir'],
+                        assignment_type=member.get('type', 'structured')
+                    )
+                    call_unifier(args, system_prompt, prompt, member['output'], member['student'],
+                                 feedback_card_validator())
+            except LLMError as e:
+                print(f"✗ Unifier failed: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(f"✓ Final feedback created for {len(members)} students "
+                  f"({len(members) - len(missing)} packed, {len(missing)} run separately)")
+            print(f"  Output: {args.output}")
+            return
+
+        system_prompt, prompt = build_unifier_prompt(
+            student=args.student,
+            submission=args.submission,
+            scheme_path=args.scheme,
+            markings_dir=args.markings_dir,
+            assignment_type=args.type
         )
 
-        # Save prompt for debugging
-        prompt_debug_file = Path(args.output).with_suffix('.prompt.txt')
-        with open(prompt_debug_file, 'w') as f:
-            f.write(prompt)
-
         print(f"Creating final feedback for {args.student}...")
 
-        # Call LLM via unified caller
-        llm_caller = Path(__file__).parent.parent / "llm_caller.sh"
-
-        cmd = [
-            str(llm_caller),
-            "--prompt", prompt,
-            "--mode", "headless",
-            "--provider", args.provider,
-            "--auto-approve"  # Skip permission prompts for automated operation
-        ]
-
-        if args.model:
-            cmd.extend(["--model", args.model])
-
-        if args.api_model:
-            cmd.extend(["--api-model", args.api_model])
-
-        if args.stats_file:
-            cmd.extend([
-                "--stats-file", args.stats_file,
-                "--stats-stage", "unifier",
-                "--stats-context", args.student
-            ])
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            print(f"✗ Unifier failed: {result.stderr}", file=sys.stderr)
+        try:
+            call_unifier(args, system_prompt, prompt, args.output, args.student,
+                         feedback_card_validator())
+        except LLMError as e:
+            print(f"✗ Unifier failed: {e}", file=sys.stderr)
             sys.exit(1)
 
-        # Write output to file (Python handles file writing since shell redirection is unreliable)
-        with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(result.stdout)
-
         print(f"✓ Final feedback created for {args.student}")
         print(f"  Output: {args.output}")
 
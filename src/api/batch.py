@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Provider Batch API
+
+Submits many independent prompts as one provider batch job, polls until the
+job ends, and collects the results. Used for headless stages when nothing
+is waiting on the answers (e.g. --auto-approve runs): batch jobs are billed
+at roughly half the synchronous price and are not subject to the per-minute
+rate limits that throttle 1000+ task runs.
+
+Supported providers:
+  - claude: Anthropic Message Batches (client.messages.batches)
+  - openai: OpenAI Batch API (JSONL file upload + client.batches)
+
+Gemini has no batch endpoint in the google-generativeai SDK; callers should
+check supports_batch() and fall back to concurrent requests.
+
+Both SDKs honor ANTHROPIC_BASE_URL / OPENAI_BASE_URL, so the whole
+submit/poll/collect flow can be exercised offline against
+dev/batch_stub_server.py.
+
+Usage:
+  from api.batch import run_batch
+
+  results = run_batch('claude-sonnet-4-5', [
+      {'custom_id': 'task-1', 'prompt': prompt_1},
+      {'custom_id': 'task-2', 'prompt': prompt_2, 'system_prompt': rubric},
+  ])
+  text, stats = results['task-1']          # or an LLMError instance
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from api.client import (
+    DEFAULT_MAX_TOKENS,
+    LLMError,
+    _anthropic_request,
+    _anthropic_result,
+    _openai_messages,
+    _openai_result,
+    fit_to_context,
+    get_client,
+    resolve_api_provider,
+)
+
+BATCH_PROVIDERS = ('claude', 'openai')
+
+# Seconds between status checks; real batches take minutes to hours
+DEFAULT_POLL_INTERVAL = 30
+
+# Provider limits on requests per batch job (larger lists are split)
+MAX_BATCH_REQUESTS = {
+    'claude': 100000,
+    'openai': 50000,
+}
+
+
+def supports_batch(provider: str) -> bool:
+    """Return True if the (normalized) provider has a batch API."""
+    return provider in BATCH_PROVIDERS
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def submit_anthropic_batch(model: str, requests: list[dict], max_tokens: int) -> str:
+    """Create an Anthropic Message Batch and return its ID."""
+    client = get_client('claude')
+    batch = client.messages.batches.create(requests=[
+        {
+            'custom_id': r['custom_id'],
+            'params': _anthropic_request(model, r['prompt'], max_tokens, r.get('system_prompt')),
+        }
+        for r in requests
+    ])
+    return batch.id
+
+
+def poll_anthropic_batch(batch_id: str) -> tuple[bool, str]:
+    """Return (finished, status description) for an Anthropic batch."""
+    batch = get_client('claude').messages.batches.retrieve(batch_id)
+    counts = batch.request_counts
+    status = (f"{batch.processing_status}: {counts.succeeded} succeeded, "
+              f"{counts.errored} errored, {counts.processing} processing")
+    return batch.processing_status == 'ended', status
+
+
+def collect_anthropic_batch(batch_id: str) -> dict:
+    """Collect results of an ended Anthropic batch keyed by custom_id."""
+    results = {}
+    for entry in get_client('claude').messages.batches.results(batch_id):
+        result = entry.result
+        if result.type == 'succeeded':
+            results[entry.custom_id] = _anthropic_result(result.message)
+        elif result.type == 'errored':
+            results[entry.custom_id] = LLMError(f"Batch request errored: {result.error}", 'claude')
+        else:
+            results[entry.custom_id] = LLMError(f"Batch request {result.type}", 'claude')
+    return results
+
+
+def submit_openai_batch(model: str, requests: list[dict], max_tokens: int) -> str:
+    """Upload a JSONL request file, create an OpenAI batch and return its ID."""
+    client = get_client('openai')
+
+    lines = []
+    for r in requests:
+        lines.append(json.dumps({
+            'custom_id': r['custom_id'],
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': model,
+                'messages': _openai_messages(r['prompt'], r.get('system_prompt')),
+            },
+        }))
+
+    input_file = client.files.create(
+        file=('batch_input.jsonl', ('\n'.join(lines) + '\n').encode('utf-8')),
+        purpose='batch'
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h'
+    )
+    return batch.id
+
+
+def poll_openai_batch(batch_id: str) -> tuple[bool, str]:
+    """Return (finished, status description) for an OpenAI batch."""
+    batch = get_client('openai').batches.retrieve(batch_id)
+    status = batch.status
+    counts = batch.request_counts
+    if counts:
+        status += f": {counts.completed}/{counts.total} completed, {counts.failed} failed"
+    return batch.status in ('completed', 'failed', 'expired', 'cancelled'), status
+
+
+def collect_openai_batch(batch_id: str) -> dict:
+    """Collect results of a finished OpenAI batch keyed by custom_id."""
+    from openai.types.chat import ChatCompletion
+
+    client = get_client('openai')
+    batch = client.batches.retrieve(batch_id)
+    results = {}
+
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get('response') or {}
+            if entry.get('error') or response.get('status_code') != 200:
+                error = entry.get('error') or response.get('body')
+                results[entry['custom_id']] = LLMError(f"Batch request errored: {error}", 'openai')
+            else:
+                completion = ChatCompletion.model_validate(response['body'])
+                results[entry['custom_id']] = _openai_result(completion)
+
+    if not results and batch.status != 'completed':
+        raise LLMError(f"Batch {batch_id} {batch.status}: {batch.errors}", 'openai')
+
+    return results
+
+
+BATCH_BACKENDS = {
+    'claude': (submit_anthropic_batch, poll_anthropic_batch, collect_anthropic_batch),
+    'openai': (submit_openai_batch, poll_openai_batch, collect_openai_batch),
+}
+
+
+def run_batch(model: str, requests: list[dict], provider: str | None = None,
+              max_tokens: int = DEFAULT_MAX_TOKENS, poll_interval: float = DEFAULT_POLL_INTERVAL,
+              on_status=None) -> dict:
+    """Submit requests as provider batch job(s), wait, and return the results.
+
+    Args:
+        model: API model name (provider auto-resolved from models.yaml)
+        requests: Dicts with custom_id, prompt and optional system_prompt.
+                  custom_id must be unique and match ^[a-zA-Z0-9_-]{1,64}$
+        provider: Optional provider override
+        max_tokens: Maximum output tokens per request
+        poll_interval: Seconds between status checks
+        on_status: Optional callback(batch_id, status) called after each poll
+
+    Returns:
+        Dict mapping custom_id to (text, stats) on success or an LLMError.
+        Requests missing from the provider's results, or whose prompt cannot
+        fit the model's context window (see api/tokens.py), map to an LLMError.
+
+    Raises:
+        LLMError: If the provider has no batch API or submission fails
+    """
+    provider = resolve_api_provider(model, provider)
+    if not supports_batch(provider):
+        raise LLMError(f"Provider '{provider}' does not support batch API mode", provider)
+
+    submit, poll, collect = BATCH_BACKENDS[provider]
+
+    # Fit each prompt to the context window; one that cannot fit fails alone
+    preflight = {}
+    results = {}
+    fitted = []
+    for r in requests:
+        try:
+            prompt, preflight[r['custom_id']] = fit_to_context(
+                r['prompt'], r.get('system_prompt'), provider, model, max_tokens)
+        except LLMError as e:
+            results[r['custom_id']] = e
+            continue
+        fitted.append({**r, 'prompt': prompt})
+
+    try:
+        batch_ids = [submit(model, chunk, max_tokens)
+                     for chunk in _chunks(fitted, MAX_BATCH_REQUESTS[provider])]
+
+        pending = list(batch_ids)
+        while pending:
+            time.sleep(poll_interval)
+            for batch_id in list(pending):
+                finished, status = poll(batch_id)
+                if on_status:
+                    on_status(batch_id, status)
+                if finished:
+                    pending.remove(batch_id)
+
+        for batch_id in batch_ids:
+            results.update(collect(batch_id))
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"Batch API call failed: {e}", provider) from e
+
+    for r in requests:
+        result = results.get(r['custom_id'])
+        if result is None:
+            results[r['custom_id']] = LLMError("No result returned for batch request", provider)
+        elif not isinstance(result, LLMError):
+            results[r['custom_id']] = (result[0], {**result[1], **preflight[r['custom_id']]})
+
+    return results
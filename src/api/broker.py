@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+LLM Broker
+
+Optional long-lived process that makes the API calls for a whole marking
+run. Without it every marker/unifier task process imports the provider SDK,
+opens its own HTTPS connection (TCP and TLS handshakes) and applies rate
+limiting, retries and stats writes on its own. With it, task processes send
+their requests over a unix domain socket and the broker:
+
+  - keeps one SDK client per provider, so its keep-alive connection pool
+    stays warm for the whole run
+  - runs every call through api/client.complete(), i.e. the response cache,
+    the RPM/TPM limiter and the retries, in one place (hedged when
+    LLM_HEDGE_MODEL is set, see api/hedge.py)
+  - appends the stats records itself (one writer per stats file)
+
+mark_structured.sh and mark_freeform.sh start the broker with --broker (API
+mode only) and stop it when they exit; the socket path is exported as
+LLM_BROKER_SOCKET. api/client.complete_and_record() (used by run_llm() and
+api/caller.py) sends requests to the broker when that variable is set and
+falls back to an in-process call when the broker cannot be reached.
+
+Protocol: one request per connection, one JSON object per line. The client
+sends {"op": "complete", ...}; the broker answers with "start" (a new
+attempt), "text" (streamed chunks), then "done" (full text and stats) or
+"error". Streamed responses are validated in the broker with the client's
+StreamValidator settings, so a bad generation is aborted and retried there;
+the client writes the chunks to its own <output>.partial file.
+
+Usage:
+  python3 broker.py start --socket /tmp/llm_broker.sock --log broker.log --parent-pid $$
+      (daemonizes, waits until the broker answers, prints its pid)
+  python3 broker.py status --socket /tmp/llm_broker.sock
+  python3 broker.py stop --socket /tmp/llm_broker.sock
+  python3 broker.py serve --socket /tmp/llm_broker.sock      (foreground)
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+from api.client import DEFAULT_MAX_TOKENS, LLMError, append_stats, get_client, resolve_api_provider
+from api.hedge import answered_by, complete_hedged
+from api.streaming import StreamAborted, StreamSink, StreamValidator
+
+SOCKET_ENV = 'LLM_BROKER_SOCKET'
+
+# How often the broker checks that the run that started it is still alive
+PARENT_CHECK_SECONDS = 2.0
+
+# Set once this process has warned that the broker is unreachable
+_warned_unreachable = False
+
+
+class ClientDisconnected(Exception):
+    """The task process went away; its call is abandoned."""
+
+
+class ForwardingSink(StreamSink):
+    """StreamSink that sends each attempt's text to the client as it arrives."""
+
+    def __init__(self, send, validator: StreamValidator | None):
+        super().__init__(None, validator)
+        self.send = send
+        self.disconnected = False
+
+    def emit(self, frame: dict):
+        try:
+            self.send(frame)
+        except OSError as e:
+            self.disconnected = True
+            raise StreamAborted("client disconnected") from e
+
+    def start(self):
+        super().start()
+        self.emit({'type': 'start'})
+
+    def write(self, text: str):
+        if text:
+            self.emit({'type': 'text', 'text': text})
+        super().write(text)
+
+
+def validator_spec(validator: StreamValidator | None) -> dict | None:
+    """StreamValidator settings to send with a request."""
+    if validator is None:
+        return None
+    return {
+        'required_line': validator.required_line,
+        'required_after': validator.required_after,
+        'lookahead': validator.lookahead,
+        'check_refusal': validator.check_refusal,
+    }
+
+
+# ---------------------------------------------------------------- server
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+
+    def send(self, frame: dict):
+        self.wfile.write(json.dumps(frame).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline() or b'{}')
+        except json.JSONDecodeError:
+            self.send({'type': 'error', 'message': 'Malformed broker request'})
+            return
+
+        op = request.get('op')
+        if op == 'complete':
+            self.handle_complete(request)
+        elif op == 'status':
+            self.send({'type': 'status', **self.server.status()})
+        elif op == 'shutdown':
+            self.send({'type': 'status', **self.server.status()})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.send({'type': 'error', 'message': f"Unknown broker op '{op}'"})
+
+    def handle_complete(self, request: dict):
+        server = self.server
+        provider = request.get('provider')
+        spec = request.get('validator')
+        sink = None
+        if request.get('stream'):
+            sink = ForwardingSink(self.send, StreamValidator(**spec) if spec else None)
+
+        def on_retry(error_class, attempt_started):
+            if sink and sink.disconnected:
+                raise ClientDisconnected()
+
+        record = request.get('stats')
+        server.begin()
+        try:
+            text, stats = complete_hedged(request['model'], request['prompt'], request.get('system_prompt'),
+                                          request.get('max_tokens', DEFAULT_MAX_TOKENS), provider,
+                                          on_retry=on_retry, sink=sink,
+                                          stats_file=record.get('file') if record else None,
+                                          stage=record.get('stage', 'unknown') if record else 'unknown')
+        except ClientDisconnected:
+            server.end('abandoned')
+            return
+        except Exception as e:
+            server.end('failed')
+            if not (sink and sink.disconnected):
+                message = str(e) if isinstance(e, LLMError) else f"LLM broker error: {e}"
+                self.send({'type': 'error', 'message': message})
+            return
+
+        if record and record.get('file'):
+            model, answered_provider = answered_by(request['model'], provider, stats)
+            with server.stats_lock:
+                append_stats(record['file'], answered_provider, model, record.get('stage', 'unknown'),
+                             record.get('context', ''), stats)
+        server.end('completed')
+
+        try:
+            self.send({'type': 'done', 'text': text, 'stats': stats})
+        except OSError:
+            pass
+
+
+class BrokerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {'completed': 0, 'failed': 0, 'abandoned': 0}
+        super().__init__(socket_path, BrokerHandler)
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, outcome: str):
+        with self.lock:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+
+    def status(self) -> dict:
+        with self.lock:
+            return {'pid': os.getpid(), 'uptime_seconds': round(time.time() - self.started, 1),
+                    'in_flight': self.in_flight, **self.counts}
+
+
+def serve(socket_path: str, parent_pid: int | None = None, warm_model: str | None = None):
+    """Run the broker in the foreground until stopped (or its parent run exits)."""
+    # Calls made here must not be sent back to the broker
+    os.environ.pop(SOCKET_ENV, None)
+
+    if os.path.exists(socket_path):
+        if ping(socket_path):
+            print(f"✗ A broker is already listening on {socket_path}", file=sys.stderr)
+            sys.exit(1)
+        os.unlink(socket_path)
+
+    # Pay the SDK import and client setup once, before the first task arrives
+    if warm_model:
+        try:
+            get_client(resolve_api_provider(warm_model))
+        except LLMError as e:
+            print(f"Warning: Could not prepare client for {warm_model}: {e}", file=sys.stderr)
+
+    server = BrokerServer(socket_path)
+    os.chmod(socket_path, 0o600)
+
+    if parent_pid:
+        def watch_parent():
+            while True:
+                time.sleep(PARENT_CHECK_SECONDS)
+                try:
+                    os.kill(parent_pid, 0)
+                except ProcessLookupError:
+                    print(f"Parent process {parent_pid} exited; stopping broker", file=sys.stderr)
+                    server.shutdown()
+                    return
+                except PermissionError:
+                    pass
+        threading.Thread(target=watch_parent, daemon=True).start()
+
+    print(f"✓ LLM broker listening on {socket_path} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        Path(socket_path).unlink(missing_ok=True)
+        print(f"LLM broker stopped: {json.dumps(server.status())}", file=sys.stderr)
+
+
+# ---------------------------------------------------------------- client
+
+def _request(socket_path: str, request: dict, timeout: float | None = None):
+    """Open a connection, send one request and return (socket, line reader)."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+    except OSError:
+        conn.close()
+        raise
+    return conn, conn.makefile('rb')
+
+
+def ping(socket_path: str, op: str = 'status', timeout: float = 2.0) -> dict | None:
+    """Status of the broker on socket_path, or None if nothing answers."""
+    try:
+        conn, reader = _request(socket_path, {'op': op}, timeout)
+    except OSError:
+        return None
+    with conn, reader:
+        try:
+            return json.loads(reader.readline() or b'null')
+        except (OSError, json.JSONDecodeError):
+            return None
+
+
+def submit(model: str, prompt: str, system_prompt: str | None, max_tokens: int, provider: str,
+           sink: StreamSink | None = None, stats_file: str | None = None,
+           stats_stage: str = 'unknown', stats_context: str = '',
+           socket_path: str | None = None) -> tuple[str, dict] | None:
+    """
+    Send one call to the broker.
+
+    Returns:
+        (text, stats), or None if no broker is reachable (the caller then
+        makes the call itself)
+
+    Raises:
+        LLMError: If the call failed in the broker (after its retries)
+    """
+    global _warned_unreachable
+    socket_path = socket_path or os.environ.get(SOCKET_ENV)
+    if not socket_path:
+        return None
+
+    request = {
+        'op': 'complete',
+        'model': model,
+        'prompt': prompt,
+        'system_prompt': system_prompt,
+        'max_tokens': max_tokens,
+        'provider': provider,
+        'stream': sink is not None,
+        'validator': validator_spec(sink.validator) if sink else None,
+        'stats': {'file': str(Path(stats_file).resolve()), 'stage': stats_stage,
+                  'context': stats_context} if stats_file else None,
+    }
+    try:
+        conn, reader = _request(socket_path, request)
+    except OSError as e:
+        if not _warned_unreachable:
+            print(f"Warning: LLM broker unreachable ({e}); calling the API directly", file=sys.stderr)
+            _warned_unreachable = True
+        return None
+
+    # The broker validates the stream (and retries bad generations); the
+    # local sink only writes what it is sent
+    validator = sink.validator if sink else None
+    if sink:
+        sink.validator = None
+
+    received = False
+    with conn, reader:
+        try:
+            for line in reader:
+                frame = json.loads(line)
+                received = True
+                kind = frame.get('type')
+                if kind == 'start' and sink:
+                    sink.start()
+                elif kind == 'text' and sink:
+                    sink.write(frame['text'])
+                elif kind == 'done':
+                    if sink:
+                        sink.finish(frame['text'])
+                    return frame['text'], frame['stats']
+                elif kind == 'error':
+                    if sink:
+                        sink.discard()
+                    raise LLMError(frame['message'], provider)
+        except StreamAborted as e:
+            sink.discard()
+            raise LLMError(f"Stream aborted: {e}", provider) from e
+        except (OSError, json.JSONDecodeError) as e:
+            if sink:
+                sink.discard()
+            raise LLMError(f"LLM broker connection failed: {e}", provider) from e
+        finally:
+            if sink:
+                sink.validator = validator
+
+    if sink:
+        sink.discard()
+    if not received:
+        # The broker went away before taking the call
+        return None
+    raise LLMError("LLM broker closed the connection mid-response", provider)
+
+
+def start_daemon(socket_path: str, log_path: str | None = None, parent_pid: int | None = None,
+                 warm_model: str | None = None, timeout: float = 20.0) -> int | None:
+    """Start a detached broker and wait until it answers; returns its pid (None on failure)."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), 'serve', '--socket', socket_path]
+    if parent_pid:
+        cmd += ['--parent-pid', str(parent_pid)]
+    if warm_model:
+        cmd += ['--model', warm_model]
+
+    env = dict(os.environ)
+    env.pop(SOCKET_ENV, None)
+    log = open(log_path, 'a') if log_path else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                   env=env, start_new_session=True)
+    finally:
+        if log_path:
+            log.close()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return None
+        if ping(socket_path):
+            return process.pid
+        time.sleep(0.05)
+    process.terminate()
+    return None
+
+
+def stop(socket_path: str, timeout: float = 10.0) -> dict | None:
+    """Ask the broker to stop and wait for its socket to go away; returns its final status."""
+    status = ping(socket_path, op='shutdown')
+    deadline = time.monotonic() + timeout
+    while status and os.path.exists(socket_path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived LLM broker on a unix domain socket")
+    parser.add_argument("command", choices=['start', 'serve', 'status', 'stop'])
+    parser.add_argument("--socket", required=True, help="Unix socket path")
+    parser.add_argument("--log", help="Log file for the daemon (start)")
+    parser.add_argument("--parent-pid", type=int, help="Stop when this process exits")
+    parser.add_argument("--model", help="API model whose client is prepared at start-up")
+    parser.add_argument("--timeout", type=float, default=20.0, help="Seconds to wait for start-up")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.parent_pid, args.model)
+        return
+
+    if args.command == 'start':
+        pid = start_daemon(args.socket, args.log, args.parent_pid, args.model, args.timeout)
+        if pid is None:
+            print(f"✗ LLM broker did not start{f' (see {args.log})' if args.log else ''}", file=sys.stderr)
+            sys.exit(1)
+        print(pid)
+        return
+
+    if args.command == 'status':
+        status = ping(args.socket)
+        if not status:
+            print(f"✗ No broker on {args.socket}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(status))
+        return
+
+    status = stop(args.socket)
+    if status:
+        print(json.dumps(status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+
+Persistent, content-addressed cache of LLM responses shared by every agent
+and by llm_caller.sh. Re-runs with --no-resume or --clean often send prompts
+that are byte-identical to a previous run (only something downstream
+changed); those calls are answered from the cache instead of the provider.
+
+Entries are keyed on (provider, model, system prompt hash, prompt hash,
+max_tokens) and stored in a SQLite database, which is safe to share between
+the parallel processes of a marking run. The cache is bounded in size;
+least recently used entries are evicted first.
+
+The cache is enabled by setting LLM_CACHE_DIR (the marking scripts point it
+at <assignment>/.llm_cache, outside processed/ so --clean keeps it). The
+size bound comes from LLM_CACHE_MAX_MB or llm_cache_max_mb in
+configs/config.yaml.
+
+Stats records for calls made while the cache is enabled carry
+"response_cache": "hit" or "miss"; hits report zero tokens.
+
+Usage (from llm_caller.sh, prompt on stdin):
+  python3 cache.py get --provider claude --model sonnet [--stats-file F ...] < prompt.txt
+  python3 cache.py put --provider claude --model sonnet --response-file out.txt < prompt.txt
+  python3 cache.py info
+  python3 cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+CACHE_DB_NAME = "responses.sqlite"
+DEFAULT_MAX_MB = 512
+
+# Open caches per process, keyed by directory
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cache_key(provider: str, model: str, prompt: str, system_prompt: str | None = None,
+              max_tokens: int | None = None) -> str:
+    """Return the content address for a request."""
+    parts = [provider, model or '', _sha256(system_prompt or ''), _sha256(prompt), str(max_tokens or '')]
+    return _sha256('\0'.join(parts))
+
+
+def hit_stats() -> dict:
+    """Stats for a call answered from the cache (no tokens consumed)."""
+    return {
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cache_creation_tokens': 0,
+        'cache_read_tokens': 0,
+        'cost_usd': 0,
+        'response_cache': 'hit',
+    }
+
+
+class ResponseCache:
+    """Size-bounded LRU response store backed by SQLite."""
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(str(self.cache_dir / CACHE_DB_NAME), timeout=30,
+                                  check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                text TEXT,
+                stats TEXT,
+                size INTEGER,
+                created REAL,
+                last_used REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response text, or None on a miss."""
+        with self.lock:
+            row = self.db.execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, provider: str, model: str, text: str, stats: dict | None = None):
+        """Store a response and evict least recently used entries over the size bound."""
+        now = time.time()
+        size = len(text.encode('utf-8'))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, text, json.dumps(stats or {}), size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        freed = 0
+        doomed = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def info(self) -> dict:
+        with self.lock:
+            count, total = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+
+
+def get_max_bytes() -> int:
+    """Cache size bound from LLM_CACHE_MAX_MB or config.yaml."""
+    max_mb = os.environ.get('LLM_CACHE_MAX_MB')
+    if not max_mb:
+        try:
+            from system_config import get_llm_cache_max_mb
+            max_mb = get_llm_cache_max_mb()
+        except Exception:
+            max_mb = DEFAULT_MAX_MB
+    return int(float(max_mb) * 1024 * 1024)
+
+
+def get_response_cache(cache_dir: str | None = None) -> ResponseCache | None:
+    """Return the cache for cache_dir (default: $LLM_CACHE_DIR), or None if disabled."""
+    cache_dir = cache_dir or os.environ.get('LLM_CACHE_DIR')
+    if not cache_dir:
+        return None
+
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ResponseCache(cache_dir, get_max_bytes())
+        return _caches[cache_dir]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM response cache (used by llm_caller.sh)')
+    parser.add_argument('action', choices=['get', 'put', 'info', 'clear'])
+    parser.add_argument('--cache-dir', default=os.environ.get('LLM_CACHE_DIR'),
+                        help='Cache directory (default: $LLM_CACHE_DIR)')
+    parser.add_argument('--provider', default='', help='Provider name')
+    parser.add_argument('--model', default='', help='Model name')
+    parser.add_argument('--max-tokens', type=int, help='Max output tokens (part of the key)')
+    parser.add_argument('--prompt-file', help='Read prompt from file (default: stdin)')
+    parser.add_argument('--system-prompt-file', help='Read system prompt from file')
+    parser.add_argument('--response-file', help='Response text to store (put)')
+    parser.add_argument('--stats-file', help='Append a hit record to this stats file (get)')
+    parser.add_argument('--stats-stage', default='unknown', help='Stage name for stats')
+    parser.add_argument('--stats-context', default='', help='Additional context')
+    parser.add_argument('--interface', default='cli', help='Interface recorded in stats')
+    args = parser.parse_args()
+
+    if not args.cache_dir:
+        print("Error: --cache-dir or LLM_CACHE_DIR required", file=sys.stderr)
+        sys.exit(2)
+
+    cache = get_response_cache(args.cache_dir)
+
+    if args.action == 'info':
+        info = cache.info()
+        print(f"Entries: {info['entries']}")
+        print(f"Size:    {info['bytes'] / 1024 / 1024:.1f} MB of {info['max_bytes'] / 1024 / 1024:.0f} MB")
+        return
+
+    if args.action == 'clear':
+        cache.clear()
+        print(f"✓ Cleared response cache: {args.cache_dir}")
+        return
+
+    if args.prompt_file:
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            prompt = f.read()
+    else:
+        prompt = sys.stdin.read()
+
+    system_prompt = None
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, 'r', encoding='utf-8') as f:
+            system_prompt = f.read()
+
+    key = cache_key(args.provider, args.model, prompt, system_prompt, args.max_tokens)
+
+    if args.action == 'get':
+        text = cache.get(key)
+        if text is None:
+            sys.exit(1)
+
+        sys.stdout.write(text)
+        if args.stats_file:
+            sys.path.insert(0, str(Path(__file__).parent.parent))
+            from api.client import append_stats
+            append_stats(args.stats_file, args.provider, args.model, args.stats_stage,
+                         args.stats_context, hit_stats(), interface=args.interface)
+        return
+
+    # put
+    if not args.response_file:
+        print("Error: put requires --response-file", file=sys.stderr)
+        sys.exit(2)
+    with open(args.response_file, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+
+    # CLI tools sometimes exit 0 with a quota message as their answer
+    from quota_detector import is_quota_error
+    if is_quota_error(text, args.provider):
+        return
+
+    cache.put(key, args.provider, args.model, text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,869 @@
+#!/usr/bin/env python3
+"""
+In-Process LLM Client
+
+Importable client for direct API calls to Anthropic, Google, and OpenAI.
+Agents call this module directly instead of spawning
+llm_caller.sh → api/caller.py for every task, so a process imports each
+provider SDK once and reuses a single HTTP client (and its keep-alive
+connections) for all of its calls.
+
+Environment variables for API keys:
+  - CLAUDE_API_KEY (or ANTHROPIC_API_KEY)
+  - GOOGLE_API_KEY (or GEMINI_API_KEY)
+  - OPENAI_API_KEY
+
+Usage:
+  from api.client import complete, append_stats
+
+  text, stats = complete('claude-sonnet-4-5', prompt, system_prompt=rubric)
+  text, stats = await acomplete('claude-sonnet-4-5', prompt)   # asyncio callers
+  append_stats(stats_file, 'claude', 'claude-sonnet-4-5', 'marker', 'Alice/A1', stats)
+
+  # Agents use run_llm(), which calls the API in-process when an API model
+  # is given and falls back to llm_caller.sh for the CLI tools.
+  text = run_llm(prompt, provider='claude', api_model='claude-sonnet-4-5',
+                 system_prompt=rubric, stats_file=stats_file,
+                 stats_stage='marker', stats_context='Alice/A1')
+
+Stats records appended to the stats file keep the same JSONL contract as
+api/caller.py (timestamp, provider, model, stage, context, interface,
+input/output/cache token counts, cost_usd from the pricing table in
+models.yaml, see api/pricing.py).
+
+When LLM_CACHE_DIR is set, complete() and acomplete() answer byte-identical
+requests from the persistent response cache (see api/cache.py). Calls that
+reach the provider first acquire from the cross-process RPM/TPM limiter
+(see api/rate_limiter.py) when models.yaml configures limits for the model.
+Prompts are fitted to the model's context window before they are sent and
+the estimated input tokens are added to the stats (see api/tokens.py).
+Passing a StreamSink (see api/streaming.py) streams the response to disk.
+complete_and_record() sends the call to the LLM broker instead when
+LLM_BROKER_SOCKET is set (see api/broker.py).
+"""
+
+import codecs
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+from api.cache import cache_key, get_response_cache, hit_stats
+from api.pricing import apply_cost
+from api.rate_limiter import actual_tokens, get_limiter
+from api.retry import RetryState, acall_with_retries, call_with_retries
+from api.streaming import StreamAborted, StreamSink, StreamValidator
+from api.tokens import ContextOverflow, fit_prompt
+from model_table import provider_for_model
+from prompt_sections import write_prompt_file
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MODELS_CONFIG = PROJECT_ROOT / "configs" / "models.yaml"
+LLM_CALLER = PROJECT_ROOT / "src" / "llm_caller.sh"
+
+DEFAULT_MAX_TOKENS = 8192
+
+# One SDK client per provider per process, created on first use
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails."""
+
+    def __init__(self, message: str, provider: str | None = None):
+        super().__init__(message)
+        self.provider = provider
+
+
+def normalize_provider(provider: str) -> str:
+    """Normalize provider aliases to claude, gemini, or openai."""
+    provider = provider.lower()
+    if provider in ('anthropic', 'claude'):
+        return 'claude'
+    if provider in ('google', 'gemini'):
+        return 'gemini'
+    if provider in ('openai', 'codex'):
+        return 'openai'
+    return provider
+
+
+def resolve_provider(model: str, models_config: Path = MODELS_CONFIG) -> str | None:
+    """Resolve provider from model name using models.yaml.
+
+    Checks api_models, then cli_models, in the compiled model table
+    (utils/model_table.py), which is only re-parsed when models.yaml changes.
+    """
+    return provider_for_model(model, models_config=models_config)
+
+
+def get_client(provider: str, use_async: bool = False):
+    """Return the shared SDK client for a provider, creating it on first use.
+
+    Args:
+        provider: Normalized provider name (claude, gemini, openai)
+        use_async: Return the asyncio client (AsyncAnthropic, AsyncOpenAI)
+
+    Returns:
+        anthropic.Anthropic/AsyncAnthropic, openai.OpenAI/AsyncOpenAI, or the
+        configured google.generativeai module (which serves both)
+
+    Async clients are bound to the event loop they are first used on, so one
+    process should drive them from a single asyncio.run().
+    """
+    cache_key = (provider, use_async)
+    with _clients_lock:
+        if cache_key in _clients:
+            return _clients[cache_key]
+
+        if provider == 'claude':
+            try:
+                import anthropic
+            except ImportError:
+                raise LLMError("anthropic package not installed. Run: pip install anthropic", provider)
+
+            # Check CLAUDE_API_KEY first, fall back to ANTHROPIC_API_KEY for compatibility
+            api_key = os.environ.get('CLAUDE_API_KEY') or os.environ.get('ANTHROPIC_API_KEY')
+            if not api_key:
+                raise LLMError("CLAUDE_API_KEY (or ANTHROPIC_API_KEY) environment variable not set", provider)
+
+            # Retries are handled (and recorded in stats) by api/retry.py
+            client_class = anthropic.AsyncAnthropic if use_async else anthropic.Anthropic
+            client = client_class(api_key=api_key, max_retries=0)
+
+        elif provider == 'gemini':
+            try:
+                import google.generativeai as genai
+            except ImportError:
+                raise LLMError("google-generativeai package not installed. Run: pip install google-generativeai", provider)
+
+            api_key = os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY')
+            if not api_key:
+                raise LLMError("GOOGLE_API_KEY or GEMINI_API_KEY environment variable not set", provider)
+
+            # GEMINI_BASE_URL points the SDK at another endpoint (e.g. dev/llm_stub_server.py)
+            base_url = os.environ.get('GEMINI_BASE_URL')
+            if base_url:
+                genai.configure(api_key=api_key, transport='rest',
+                                client_options={'api_endpoint': base_url})
+            else:
+                genai.configure(api_key=api_key)
+            client = genai
+
+        elif provider == 'openai':
+            try:
+                import openai
+            except ImportError:
+                raise LLMError("openai package not installed. Run: pip install openai", provider)
+
+            api_key = os.environ.get('OPENAI_API_KEY')
+            if not api_key:
+                raise LLMError("OPENAI_API_KEY environment variable not set", provider)
+
+            client_class = openai.AsyncOpenAI if use_async else openai.OpenAI
+            client = client_class(api_key=api_key, max_retries=0)
+
+        else:
+            raise LLMError(f"Unknown provider '{provider}'", provider)
+
+        _clients[cache_key] = client
+        return client
+
+
+def _empty_stats() -> dict:
+    return {
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cache_creation_tokens': 0,
+        'cache_read_tokens': 0,
+        'cost_usd': 0,
+    }
+
+
+def _anthropic_request(model: str, prompt: str, max_tokens: int,
+                       system_prompt: str | None) -> dict:
+    """Build Messages API request kwargs, marking the system prompt cacheable."""
+    request_kwargs = {
+        'model': model,
+        'max_tokens': max_tokens,
+        'messages': [
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+    # Add system prompt with cache_control if provided
+    if system_prompt:
+        # Use cache_control to enable prompt caching
+        # The "ephemeral" type uses default 5-minute TTL
+        request_kwargs['system'] = [
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+
+    return request_kwargs
+
+
+def _anthropic_result(response) -> tuple[str, dict]:
+    """Extract text and usage stats from a Messages API response."""
+    text = ""
+    for block in response.content:
+        if block.type == "text":
+            text += block.text
+
+    # Extract usage stats including cache info
+    stats = {
+        'input_tokens': response.usage.input_tokens,
+        'output_tokens': response.usage.output_tokens,
+        'cache_creation_tokens': getattr(response.usage, 'cache_creation_input_tokens', 0) or 0,
+        'cache_read_tokens': getattr(response.usage, 'cache_read_input_tokens', 0) or 0,
+        'cost_usd': 0,  # Could calculate from token counts and model pricing
+    }
+
+    return text, stats
+
+
+def _google_model(genai, model: str, system_prompt: str | None):
+    """Create a GenerativeModel, passing static content as system instruction."""
+    # This helps with implicit caching - static content goes in system_instruction
+    if system_prompt:
+        return genai.GenerativeModel(model, system_instruction=system_prompt)
+    return genai.GenerativeModel(model)
+
+
+def _google_result(response) -> tuple[str, dict]:
+    """Extract text and usage stats from a generateContent response."""
+    text = response.text
+
+    # Extract usage stats including cache info (Gemini 2.5 reports cached_content_token_count)
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if not usage_metadata:
+        return text, _empty_stats()
+
+    # Gemini reports cached tokens when implicit caching hits
+    cached_tokens = getattr(usage_metadata, 'cached_content_token_count', 0) or 0
+    stats = {
+        'input_tokens': getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+        # Thinking tokens are billed as output
+        'output_tokens': ((getattr(usage_metadata, 'candidates_token_count', 0) or 0) +
+                          (getattr(usage_metadata, 'thoughts_token_count', 0) or 0)),
+        'cache_creation_tokens': 0,  # Gemini doesn't differentiate creation vs read
+        'cache_read_tokens': cached_tokens,
+        'cost_usd': 0,
+    }
+
+    return text, stats
+
+
+def _openai_messages(prompt: str, system_prompt: str | None) -> list[dict]:
+    """Build chat messages with the static system message first."""
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _openai_result(response) -> tuple[str, dict]:
+    """Extract text and usage stats from a Chat Completions response."""
+    text = response.choices[0].message.content or ""
+    return text, _openai_usage_stats(response.usage)
+
+
+def _openai_usage_stats(usage) -> dict:
+    """Usage stats from a Chat Completions usage object (None if not reported)."""
+    if not usage:
+        return _empty_stats()
+
+    # OpenAI reports cached tokens in prompt_tokens_details
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = 0
+    if prompt_details:
+        cached_tokens = getattr(prompt_details, 'cached_tokens', 0) or 0
+
+    return {
+        'input_tokens': usage.prompt_tokens,
+        'output_tokens': usage.completion_tokens,
+        'cache_creation_tokens': 0,  # OpenAI doesn't differentiate
+        'cache_read_tokens': cached_tokens,
+        'cost_usd': 0,
+    }
+
+
+def call_anthropic(model: str, prompt: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                   system_prompt: str | None = None) -> tuple[str, dict]:
+    """Call Anthropic/Claude API with optional prompt caching.
+
+    Args:
+        model: Model name (e.g., claude-sonnet-4-5)
+        prompt: User prompt (variable content)
+        max_tokens: Maximum output tokens
+        system_prompt: Optional system prompt to cache (static content, min 1024 tokens)
+
+    Claude prompt caching:
+        - System prompt is marked with cache_control for automatic caching
+        - Cached content expires after 5 minutes (default TTL)
+        - Minimum 1024 tokens required for caching
+        - Cache writes cost +25%, cache reads cost only 10% of base price
+    """
+    client = get_client('claude')
+    response = client.messages.create(**_anthropic_request(model, prompt, max_tokens, system_prompt))
+    return _anthropic_result(response)
+
+
+def call_google(model: str, prompt: str, system_prompt: str | None = None) -> tuple[str, dict]:
+    """Call Google Generative AI API with optional system instruction.
+
+    Args:
+        model: Model name (e.g., gemini-2.5-pro)
+        prompt: User prompt (variable content)
+        system_prompt: Optional system instruction (for Gemini's implicit caching)
+
+    Gemini caching (2.5 models):
+        - Implicit caching is automatic (no API changes needed)
+        - System instructions at start of prompt help cache hit rate
+        - Min tokens: 1024 (Flash), 4096 (Pro)
+        - 90% discount on cache hits
+    """
+    genai = get_client('gemini')
+    response = _google_model(genai, model, system_prompt).generate_content(prompt)
+    return _google_result(response)
+
+
+def call_openai(model: str, prompt: str, system_prompt: str | None = None) -> tuple[str, dict]:
+    """Call OpenAI API with optional system message.
+
+    Args:
+        model: Model name (e.g., gpt-5.1)
+        prompt: User prompt (variable content)
+        system_prompt: Optional system message (helps with automatic caching)
+
+    OpenAI caching:
+        - Automatic for prompts > 1024 tokens
+        - System message at start helps cache hit rate
+        - 50% discount on cached input tokens
+        - Cache cleared after 5-10 min inactivity
+    """
+    client = get_client('openai')
+    response = client.chat.completions.create(
+        model=model,
+        messages=_openai_messages(prompt, system_prompt)
+    )
+    return _openai_result(response)
+
+
+async def acall_anthropic(model: str, prompt: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                          system_prompt: str | None = None) -> tuple[str, dict]:
+    """Async variant of call_anthropic using the shared AsyncAnthropic client."""
+    client = get_client('claude', use_async=True)
+    response = await client.messages.create(**_anthropic_request(model, prompt, max_tokens, system_prompt))
+    return _anthropic_result(response)
+
+
+async def acall_google(model: str, prompt: str, system_prompt: str | None = None) -> tuple[str, dict]:
+    """Async variant of call_google using generate_content_async."""
+    genai = get_client('gemini', use_async=True)
+    response = await _google_model(genai, model, system_prompt).generate_content_async(prompt)
+    return _google_result(response)
+
+
+async def acall_openai(model: str, prompt: str, system_prompt: str | None = None) -> tuple[str, dict]:
+    """Async variant of call_openai using the shared AsyncOpenAI client."""
+    client = get_client('openai', use_async=True)
+    response = await client.chat.completions.create(
+        model=model,
+        messages=_openai_messages(prompt, system_prompt)
+    )
+    return _openai_result(response)
+
+
+def stream_anthropic(model: str, prompt: str, max_tokens: int, system_prompt: str | None,
+                     sink: StreamSink) -> tuple[str, dict]:
+    """Streaming variant of call_anthropic; text is passed to sink as it arrives."""
+    client = get_client('claude')
+    with client.messages.stream(**_anthropic_request(model, prompt, max_tokens, system_prompt)) as stream:
+        for text in stream.text_stream:
+            sink.write(text)
+        response = stream.get_final_message()
+    return _anthropic_result(response)
+
+
+def stream_google(model: str, prompt: str, system_prompt: str | None,
+                  sink: StreamSink) -> tuple[str, dict]:
+    """Streaming variant of call_google; text is passed to sink as it arrives."""
+    genai = get_client('gemini')
+    response = _google_model(genai, model, system_prompt).generate_content(prompt, stream=True)
+    for chunk in response:
+        sink.write(chunk.text)
+    return _google_result(response)
+
+
+def stream_openai(model: str, prompt: str, system_prompt: str | None,
+                  sink: StreamSink) -> tuple[str, dict]:
+    """Streaming variant of call_openai; text is passed to sink as it arrives."""
+    client = get_client('openai')
+    usage = None
+    with client.chat.completions.create(
+        model=model,
+        messages=_openai_messages(prompt, system_prompt),
+        stream=True,
+        stream_options={"include_usage": True}
+    ) as stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                sink.write(chunk.choices[0].delta.content)
+            if chunk.usage:
+                usage = chunk.usage
+    return sink.text, _openai_usage_stats(usage)
+
+
+async def astream_anthropic(model: str, prompt: str, max_tokens: int, system_prompt: str | None,
+                            sink: StreamSink) -> tuple[str, dict]:
+    """Async variant of stream_anthropic."""
+    client = get_client('claude', use_async=True)
+    async with client.messages.stream(**_anthropic_request(model, prompt, max_tokens, system_prompt)) as stream:
+        async for text in stream.text_stream:
+            sink.write(text)
+        response = await stream.get_final_message()
+    return _anthropic_result(response)
+
+
+async def astream_google(model: str, prompt: str, system_prompt: str | None,
+                         sink: StreamSink) -> tuple[str, dict]:
+    """Async variant of stream_google."""
+    genai = get_client('gemini', use_async=True)
+    response = await _google_model(genai, model, system_prompt).generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        sink.write(chunk.text)
+    return _google_result(response)
+
+
+async def astream_openai(model: str, prompt: str, system_prompt: str | None,
+                         sink: StreamSink) -> tuple[str, dict]:
+    """Async variant of stream_openai."""
+    client = get_client('openai', use_async=True)
+    usage = None
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=_openai_messages(prompt, system_prompt),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async with stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                sink.write(chunk.choices[0].delta.content)
+            if chunk.usage:
+                usage = chunk.usage
+    return sink.text, _openai_usage_stats(usage)
+
+
+def resolve_api_provider(model: str, provider: str | None = None) -> str:
+    """Resolve and normalize the provider for an API model.
+
+    Raises:
+        LLMError: If the model is not listed in models.yaml and no provider given
+    """
+    if not provider:
+        provider = resolve_provider(model)
+        if not provider:
+            raise LLMError(
+                f"Cannot resolve provider for model '{model}'. "
+                "Add it to configs/models.yaml or use --provider"
+            )
+    return normalize_provider(provider)
+
+
+def lookup_cached(provider: str, model: str, prompt: str, system_prompt: str | None,
+                  max_tokens: int) -> tuple[str, dict] | None:
+    """Return (text, hit stats) from the response cache, or None on a miss or if disabled."""
+    cache = get_response_cache()
+    if not cache:
+        return None
+
+    text = cache.get(cache_key(provider, model, prompt, system_prompt, max_tokens))
+    if text is None:
+        return None
+    return text, hit_stats()
+
+
+def store_cached(provider: str, model: str, prompt: str, system_prompt: str | None,
+                 max_tokens: int, result: tuple[str, dict]) -> tuple[str, dict]:
+    """Store a fresh response in the response cache and tag its stats as a miss."""
+    cache = get_response_cache()
+    if not cache:
+        return result
+
+    text, stats = result
+    cache.put(cache_key(provider, model, prompt, system_prompt, max_tokens), provider, model, text, stats)
+    return text, {**stats, 'response_cache': 'miss'}
+
+
+def fit_to_context(prompt: str, system_prompt: str | None, provider: str, model: str | None,
+                   max_tokens: int) -> tuple[str, dict]:
+    """Estimate the request's input tokens and fit the prompt to the model's
+    context window (see api/tokens.py).
+
+    Returns:
+        (prompt, preflight stats) - the stats are added to the call's record
+
+    Raises:
+        LLMError: If the system prompt alone does not fit (before anything is sent)
+    """
+    try:
+        return fit_prompt(prompt, system_prompt, provider, model, max_tokens)
+    except ContextOverflow as e:
+        raise LLMError(str(e), provider) from e
+
+
+def _call_provider(provider: str, model: str, prompt: str, system_prompt: str | None,
+                   max_tokens: int, sink: StreamSink | None = None) -> tuple[str, dict]:
+    """One API request (streamed into sink if given), with errors wrapped in LLMError."""
+    if provider not in ('claude', 'gemini', 'openai'):
+        raise LLMError(f"Unknown provider '{provider}'", provider)
+
+    try:
+        if sink is None:
+            if provider == 'claude':
+                return call_anthropic(model, prompt, max_tokens, system_prompt)
+            if provider == 'gemini':
+                return call_google(model, prompt, system_prompt)
+            return call_openai(model, prompt, system_prompt)
+
+        sink.start()
+        if provider == 'claude':
+            result = stream_anthropic(model, prompt, max_tokens, system_prompt, sink)
+        elif provider == 'gemini':
+            result = stream_google(model, prompt, system_prompt, sink)
+        else:
+            result = stream_openai(model, prompt, system_prompt, sink)
+        sink.finish()
+        return result
+    except StreamAborted as e:
+        sink.discard()
+        raise LLMError(f"Stream aborted: {e}", provider) from e
+    except Exception as e:
+        if sink:
+            sink.discard()
+        raise LLMError(f"API call failed: {e}", provider) from e
+
+
+async def _acall_provider(provider: str, model: str, prompt: str, system_prompt: str | None,
+                          max_tokens: int, sink: StreamSink | None = None) -> tuple[str, dict]:
+    """Async variant of _call_provider()."""
+    if provider not in ('claude', 'gemini', 'openai'):
+        raise LLMError(f"Unknown provider '{provider}'", provider)
+
+    try:
+        if sink is None:
+            if provider == 'claude':
+                return await acall_anthropic(model, prompt, max_tokens, system_prompt)
+            if provider == 'gemini':
+                return await acall_google(model, prompt, system_prompt)
+            return await acall_openai(model, prompt, system_prompt)
+
+        sink.start()
+        if provider == 'claude':
+            result = await astream_anthropic(model, prompt, max_tokens, system_prompt, sink)
+        elif provider == 'gemini':
+            result = await astream_google(model, prompt, system_prompt, sink)
+        else:
+            result = await astream_openai(model, prompt, system_prompt, sink)
+        sink.finish()
+        return result
+    except StreamAborted as e:
+        sink.discard()
+        raise LLMError(f"Stream aborted: {e}", provider) from e
+    except Exception as e:
+        if sink:
+            sink.discard()
+        raise LLMError(f"API call failed: {e}", provider) from e
+
+
+def _finish_cached(cached: tuple[str, dict], sink: StreamSink | None, provider: str) -> tuple[str, dict]:
+    """Write a cached response through the sink (validated, renamed into place)."""
+    if sink:
+        try:
+            sink.finish(cached[0])
+        except StreamAborted as e:
+            raise LLMError(f"Stream aborted: {e}", provider) from e
+    return cached
+
+
+def complete(model: str, prompt: str, system_prompt: str | None = None,
+             max_tokens: int = DEFAULT_MAX_TOKENS, provider: str | None = None,
+             on_retry=None, sink: StreamSink | None = None) -> tuple[str, dict]:
+    """Send a single prompt to the provider API and return (text, stats).
+
+    Transient failures (rate limits, timeouts, network errors, server
+    errors) are retried with backoff (see api/retry.py); the retry count and
+    backoff time are added to the stats.
+
+    Args:
+        model: API model name (provider auto-resolved from models.yaml)
+        prompt: User prompt (variable content)
+        system_prompt: Optional cacheable static content
+        max_tokens: Maximum output tokens (Anthropic only)
+        provider: Optional provider override
+        on_retry: Optional callback(error_class, attempt_started) before each retry
+        sink: Optional StreamSink (api/streaming.py); the response is streamed
+              into its .partial file, validated as it arrives and renamed into
+              place when complete
+
+    Raises:
+        LLMError: If the provider cannot be resolved or the API call fails
+                  after its retries
+    """
+    provider = resolve_api_provider(model, provider)
+    prompt, preflight = fit_to_context(prompt, system_prompt, provider, model, max_tokens)
+
+    cached = lookup_cached(provider, model, prompt, system_prompt, max_tokens)
+    if cached:
+        return _finish_cached((cached[0], {**cached[1], **preflight}), sink, provider)
+
+    limiter = get_limiter(provider, model)
+    estimated = preflight['estimated_input_tokens']
+
+    def attempt():
+        if limiter:
+            limiter.acquire(estimated)
+        try:
+            return _call_provider(provider, model, prompt, system_prompt, max_tokens, sink)
+        except LLMError:
+            if limiter:
+                limiter.settle(estimated, 0)
+            raise
+
+    started = time.monotonic()
+    (text, stats), retry_stats = call_with_retries(attempt, provider, (LLMError,), on_retry)
+    if limiter:
+        limiter.settle(estimated, actual_tokens(stats))
+
+    latency = {'latency_seconds': round(time.monotonic() - started, 2)}
+    result = (text, {**stats, **retry_stats, **preflight, **latency})
+    return store_cached(provider, model, prompt, system_prompt, max_tokens, result)
+
+
+async def acomplete(model: str, prompt: str, system_prompt: str | None = None,
+                    max_tokens: int = DEFAULT_MAX_TOKENS, provider: str | None = None,
+                    on_retry=None, sink: StreamSink | None = None) -> tuple[str, dict]:
+    """Async variant of complete() for callers running many requests concurrently.
+
+    Raises:
+        LLMError: If the provider cannot be resolved or the API call fails
+                  after its retries
+    """
+    provider = resolve_api_provider(model, provider)
+    prompt, preflight = fit_to_context(prompt, system_prompt, provider, model, max_tokens)
+
+    cached = lookup_cached(provider, model, prompt, system_prompt, max_tokens)
+    if cached:
+        return _finish_cached((cached[0], {**cached[1], **preflight}), sink, provider)
+
+    limiter = get_limiter(provider, model)
+    estimated = preflight['estimated_input_tokens']
+
+    async def attempt():
+        if limiter:
+            await limiter.aacquire(estimated)
+        try:
+            return await _acall_provider(provider, model, prompt, system_prompt, max_tokens, sink)
+        except LLMError:
+            if limiter:
+                limiter.settle(estimated, 0)
+            raise
+
+    started = time.monotonic()
+    (text, stats), retry_stats = await acall_with_retries(attempt, provider, (LLMError,), on_retry)
+    if limiter:
+        limiter.settle(estimated, actual_tokens(stats))
+
+    latency = {'latency_seconds': round(time.monotonic() - started, 2)}
+    result = (text, {**stats, **retry_stats, **preflight, **latency})
+    return store_cached(provider, model, prompt, system_prompt, max_tokens, result)
+
+
+def complete_and_record(model: str, prompt: str, system_prompt: str | None = None,
+                        max_tokens: int = DEFAULT_MAX_TOKENS, provider: str | None = None,
+                        sink: StreamSink | None = None, stats_file: str | None = None,
+                        stats_stage: str = 'unknown', stats_context: str = '') -> tuple[str, dict]:
+    """complete() followed by append_stats(), for callers making one call per process.
+
+    When LLM_BROKER_SOCKET is set the call is made by the LLM broker (see
+    api/broker.py), which keeps warm provider connections for the whole run
+    and writes the stats record itself. Without a reachable broker the call
+    is made in-process. With LLM_HEDGE_MODEL set, a call that outlasts its
+    stage's p95 latency is duplicated to the secondary model (see api/hedge.py).
+
+    Raises:
+        LLMError: If the provider cannot be resolved or the API call fails
+                  after its retries
+    """
+    provider = resolve_api_provider(model, provider)
+
+    if os.environ.get('LLM_BROKER_SOCKET'):
+        from api.broker import submit
+        result = submit(model, prompt, system_prompt, max_tokens, provider, sink,
+                        stats_file, stats_stage, stats_context)
+        if result is not None:
+            return result
+
+    from api.hedge import answered_by, complete_hedged
+    text, stats = complete_hedged(model, prompt, system_prompt, max_tokens, provider, sink=sink,
+                                  stats_file=stats_file, stage=stats_stage)
+    if stats_file:
+        model, provider = answered_by(model, provider, stats)
+        append_stats(stats_file, provider, model, stats_stage, stats_context, stats)
+    return text, stats
+
+
+def append_stats(stats_file: str | Path, provider: str, model: str, stage: str,
+                 context: str, stats: dict, interface: str = 'api'):
+    """Append a stats record to a JSONL stats file (cost from the pricing table)."""
+    stats_entry = {
+        'timestamp': datetime.now().isoformat(),
+        'provider': provider,
+        'model': model,
+        'stage': stage,
+        'context': context,
+        'interface': interface,
+        **apply_cost(provider, model, dict(stats), interface)
+    }
+
+    stats_path = Path(stats_file)
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(stats_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(stats_entry) + '\n')
+
+
+def run_llm(prompt: str, provider: str, model: str | None = None, api_model: str | None = None,
+            stats_file: str | None = None, stats_stage: str = 'unknown',
+            stats_context: str = '', max_tokens: int = DEFAULT_MAX_TOKENS,
+            system_prompt: str | None = None, output_file: str | None = None,
+            validator: StreamValidator | None = None) -> str:
+    """Run a headless LLM call for an agent and return the response text.
+
+    When api_model is given the API is called in-process through the shared
+    client (or by the LLM broker when one is running, see api/broker.py).
+    Otherwise the CLI tool for the provider is invoked through
+    llm_caller.sh (CLI tools are separate programs and need a subprocess).
+
+    system_prompt is the static, cacheable part of the prompt (see
+    utils/prompt_sections.py). llm_caller.sh receives both prompts as files
+    (never on the command line), so prompt size is not limited by ARG_MAX.
+
+    Transient failures are retried with backoff in both modes (see
+    api/retry.py); hard quotas fail immediately.
+
+    The response is streamed in both modes (see api/streaming.py). With
+    output_file it is written to <output_file>.partial as it arrives and
+    renamed into place when complete; a validator aborts (and retries) a
+    generation that is a refusal or is missing a required line.
+
+    Raises:
+        LLMError: If the call fails; the message includes the CLI output so
+                  callers can run quota detection on it
+    """
+    if api_model:
+        sink = StreamSink(output_file, validator)
+        text, _ = complete_and_record(api_model, prompt, system_prompt, max_tokens, sink=sink,
+                                      stats_file=stats_file, stats_stage=stats_stage,
+                                      stats_context=stats_context)
+        return text
+
+    prompt, preflight = fit_to_context(prompt, system_prompt, normalize_provider(provider),
+                                       model, max_tokens)
+    prompt_files = [write_prompt_file(prompt)]
+    cmd = [
+        str(LLM_CALLER),
+        "--prompt-file", prompt_files[0],
+        "--mode", "headless",
+        "--provider", provider,
+        "--stream",
+        "--auto-approve"  # Skip permission prompts for automated operation
+    ]
+
+    if model:
+        cmd.extend(["--model", model])
+
+    if system_prompt:
+        prompt_files.append(write_prompt_file(system_prompt, suffix='.system.txt'))
+        cmd.extend(["--system-prompt-file", prompt_files[-1]])
+
+    if stats_file:
+        cmd.extend([
+            "--stats-file", stats_file,
+            "--stats-stage", stats_stage,
+            "--stats-context", stats_context
+        ])
+
+    # Retry transient CLI failures; the attempt that succeeds records the
+    # retries and the token estimate in its stats entry (extract_llm_stats.py
+    # reads LLM_RETRY_STATS and LLM_PREFLIGHT_STATS)
+    retry_state = RetryState(provider)
+    sink = StreamSink(output_file, validator)
+    try:
+        while True:
+            retry_state.start_attempt()
+            env = dict(os.environ, LLM_RETRY_STATS=json.dumps(retry_state.stats()),
+                       LLM_PREFLIGHT_STATS=json.dumps(preflight))
+            try:
+                return _run_cli(cmd, env, provider, sink)
+            except LLMError as error:
+                delay = retry_state.next_delay(error)
+                if delay is None:
+                    raise
+                print(f"Retrying in {delay:.1f}s after {provider} CLI error", file=sys.stderr)
+                time.sleep(delay)
+    finally:
+        for path in prompt_files:
+            os.unlink(path)
+
+
+def _run_cli(cmd: list, env: dict, provider: str, sink: StreamSink) -> str:
+    """Run one llm_caller.sh attempt, streaming its stdout into sink.
+
+    On a failed validation the CLI process group is killed straight away
+    rather than left to finish a response that will be discarded.
+    """
+    sink.start()
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                   env=env, start_new_session=True)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                chunk = os.read(process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                sink.write(decoder.decode(chunk))
+            sink.write(decoder.decode(b'', final=True))
+        except StreamAborted as e:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+            sink.discard()
+            raise LLMError(f"Stream aborted: {e}", provider) from e
+        finally:
+            process.stdout.close()
+
+        returncode = process.wait()
+        if returncode != 0:
+            sink.discard()
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+            raise LLMError(stderr + sink.text, provider)
+
+    try:
+        return sink.finish()
+    except StreamAborted as e:
+        raise LLMError(f"Stream aborted: {e}", provider) from e
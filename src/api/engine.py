@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+"""
+Async Marking Engine
+
+Runs a whole stage of marker or unifier tasks (Stage 4/7 for structured,
+Stage 3/6 for free-form assignments) inside one Python process in API mode.
+Instead of one process chain per task, tasks are taken from a queue by a
+fixed pool of worker coroutines (as many as the concurrency ceiling) over
+the shared async SDK client, so hundreds of requests share a handful of
+pooled connections and only the prompts of tasks being worked on are in
+memory. The number of in-flight requests is adaptive (utils/concurrency.py):
+it starts at --concurrency, halves when the provider signals a rate limit
+(the request is retried with backoff, see api/retry.py) and grows back while
+requests succeed. The concurrency curve is written to
+<log-dir>/concurrency.jsonl.
+
+Tasks are read from a JSONL file, one object per line:
+
+  {"agent": "marker", "student": "Alice", "submission": "path.ipynb",
+   "activity": "A1", "type": "structured", "criteria": "...",
+   "problem_context": "...", "output": "processed/markings/Alice_A1.md"}
+
+  {"agent": "marker", "student": "Alice", "submission": "path.ipynb",
+   "activities": ["A1", "A2", "A3"], "type": "structured",
+   "output": "processed/markings/Alice_packed.txt"}
+
+  {"agent": "verifier", "student": "Bob", "submission": "path.ipynb",
+   "activity": "A1", "reference_student": "Alice",
+   "reference_submission": "path.ipynb",
+   "reference_marking": "processed/markings/Alice_A1.md",
+   "output": "processed/markings/Bob_A1.md"}
+
+  {"agent": "unifier", "student": "Alice", "submission": "path.ipynb",
+   "scheme": "...", "markings_dir": "...", "type": "structured",
+   "output": "processed/final/Alice_feedback.md"}
+
+  {"agent": "marker", "activity": "A1", "type": "structured",
+   "pack": [<marker task>, <marker task>, ...],
+   "output": "processed/packs/marker_A1_1.txt"}
+
+A marker task with "activities" is packed: one call assesses all the
+listed activities, the response is split into <student>_A<n>.md next to
+its output (marker.py --activities), and activities without a usable
+section are re-queued as separate tasks. A task with "pack" (marker or
+unifier, written by pack_tasks.py) covers several students in one call;
+each student's section goes to that member task's output and members
+without a usable section are re-queued as their own tasks.
+
+A single-activity marker task with "cascade_model" (and optionally
+"cascade_min_confidence") is first sent to that cheaper model with the
+confidence instructions of utils/cascade.py, and only sent to --api-model
+when the cascade marking is not kept. In batch mode the cascade is skipped
+and every task goes to --api-model.
+
+A marker or verifier task with "anonymous": true (its marking is copied to
+identical answers, see dedup_answers.py) is prompted without the student's
+name, as with marker.py --anonymous.
+
+A task is skipped if its output file already exists (for packed tasks: all
+of its activities' markings or its members' outputs; resume, unless --no-resume is given), and outputs are written to the same paths the
+per-task agents use. Responses are streamed to <output>.partial and renamed
+when complete (api/streaming.py), so an interrupted run never leaves an
+output that resume would take for a finished task; refusals and unifier
+responses without a feedback card are aborted early and retried. Failed tasks leave stdout/stderr under --log-dir in the
+layout parallel_runner.sh produces, so review_errors.sh and
+force_complete.py keep working.
+
+With --batch-api all prompts are submitted as one provider batch job
+(Anthropic Message Batches / OpenAI Batch) instead of concurrent requests,
+at roughly half the price; results are written back when the job ends.
+Providers without a batch API fall back to concurrent requests.
+
+With --budget, no new request is started once the cost spent since
+--budget-since plus the projected cost of the requests in flight would
+exceed the budget (utils/budget.py). Until a call has been recorded, each
+request is projected at its pre-flight estimate (estimated prompt tokens at
+the input price plus max_tokens at the output price), in concurrent and
+batch mode alike. Undispatched tasks keep no output, so a later run resumes
+them.
+
+Usage:
+  python3 engine.py --tasks marker_tasks.jsonl --api-model claude-sonnet-4-5 \\
+      --concurrency 16 --stats-file stats/token_usage.jsonl --log-dir logs/marker_logs
+
+  python3 engine.py --tasks marker_tasks.jsonl --api-model claude-sonnet-4-5 --batch-api
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "agents"))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from budget import add_budget_args, budget_from_args
+from cascade import (CASCADE_STAGE, DEFAULT_MAX_ANSWER_TOKENS, DEFAULT_MIN_CONFIDENCE, cascade_prompt,
+                     check_marking, record_decision, strip_verdict)
+from concurrency import AIMDController
+from packing import REQUIRED_HEADING, packed_context, unpack_students
+from prompt_sections import join_prompt
+from quota_detector import is_quota_error, print_quota_warning
+from api.batch import DEFAULT_POLL_INTERVAL, run_batch, supports_batch
+from api.pricing import BATCH_DISCOUNT, estimate_cost
+from api.client import (
+    DEFAULT_MAX_TOKENS,
+    LLMError,
+    append_stats,
+    lookup_cached,
+    resolve_api_provider,
+    store_cached,
+)
+from api.hedge import acomplete_hedged, answered_by
+from api.streaming import FEEDBACK_CARD_LINE, StreamSink, StreamValidator, feedback_card_validator
+from api.tokens import count_tokens, estimate_prompt_tokens
+
+
+def load_tasks(tasks_file: Path) -> list[dict]:
+    """Load task objects from a JSONL file, skipping blank lines."""
+    tasks = []
+    with open(tasks_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                tasks.append(json.loads(line))
+    return tasks
+
+
+def is_packed(task: dict) -> bool:
+    """Whether a task covers several activities or students in one call."""
+    return bool(task.get('activities') or task.get('pack'))
+
+
+def task_students(task: dict) -> list[str]:
+    """Students of a student pack."""
+    return [member['student'] for member in task['pack']]
+
+
+def task_context(task: dict) -> str:
+    """Stats context for a task (student, or student/activity for markers)."""
+    if task.get('pack'):
+        return packed_context(task.get('activity'), task_students(task))
+    if task.get('activities'):
+        return packed_context(task['student'], task['activities'])
+    if task.get('activity'):
+        return f"{task['student']}/{task['activity']}"
+    return task['student']
+
+
+def task_label(task: dict) -> str:
+    """Human-readable task name for log messages."""
+    if task.get('pack'):
+        return f"{', '.join(task_students(task))} ({task.get('activity') or 'pack'})"
+    if task.get('activities'):
+        return f"{task['student']} ({', '.join(task['activities'])})"
+    return f"{task['student']} ({task.get('activity') or 'full submission'})"
+
+
+def task_log_dir(log_dir: Path, task: dict) -> Path:
+    """Per-task log directory, named so error_summary.py can find the student."""
+    student = '+'.join(task_students(task)) if task.get('pack') else task['student']
+    name = f"--student '{student}'"
+    if task.get('activities'):
+        name += f" --activities {','.join(task['activities'])}"
+    elif task.get('activity'):
+        name += f" --activity {task['activity']}"
+    # "1" mirrors the sequence directory GNU parallel creates under --results
+    return log_dir / "1" / name
+
+
+def task_done(task: dict) -> bool:
+    """Whether a task's outputs exist (every activity's or member's output for packed tasks)."""
+    if task.get('pack'):
+        return all(task_done(member) for member in task['pack'])
+    if task.get('activities'):
+        from marker import activity_output
+        return all(activity_output(task['output'], task['student'], activity).exists()
+                   for activity in task['activities'])
+    return Path(task['output']).exists()
+
+
+def unpack_task(task: dict, text: str) -> list[dict]:
+    """Split a packed response; returns separate tasks for the sections that failed."""
+    if task.get('pack'):
+        required = FEEDBACK_CARD_LINE if task['agent'] == 'unifier' else REQUIRED_HEADING
+        return unpack_students(text, task['pack'], required)
+
+    from marker import activity_output, unpack_marking
+    missing = unpack_marking(text, task['student'], task['activities'], task['output'])
+    return [{**{k: v for k, v in task.items() if k != 'activities'}, 'activity': activity,
+             'output': str(activity_output(task['output'], task['student'], activity))}
+            for activity in missing]
+
+
+def uses_cascade(task: dict) -> bool:
+    """Whether a task is first tried on a cheaper cascade model."""
+    return (bool(task.get('cascade_model')) and task['agent'] == 'marker' and bool(task.get('activity'))
+            and not is_packed(task))
+
+
+def task_validator(task: dict) -> StreamValidator:
+    """Streaming checks for a task's response (unifiers must produce a feedback card)."""
+    if task['agent'] == 'unifier' and not task.get('pack'):
+        return feedback_card_validator()
+    return StreamValidator()
+
+
+def build_prompt(task: dict) -> tuple[str, str]:
+    """Build (system_prompt, prompt) for a task with the same code the agent scripts use."""
+    agent = task['agent']
+
+    if agent == 'marker' and task.get('pack'):
+        from marker import build_students_packed_prompt
+        return build_students_packed_prompt(
+            activity=task['activity'],
+            members=task['pack'],
+            criteria_path=task.get('criteria')
+        )
+
+    if agent == 'unifier' and task.get('pack'):
+        from unifier import build_packed_unifier_prompt
+        return build_packed_unifier_prompt(
+            members=task['pack'],
+            scheme_path=task['scheme'],
+            markings_dir=task['markings_dir'],
+            assignment_type=task.get('type', 'structured')
+        )
+
+    if agent == 'marker' and task.get('activities'):
+        from marker import build_packed_marker_prompt, prompt_student
+        return build_packed_marker_prompt(
+            student=prompt_student(task),
+            submission=task['submission'],
+            activities=task['activities'],
+            criteria_path=task.get('criteria')
+        )
+
+    if agent == 'marker':
+        from marker import build_marker_prompt, prompt_student
+        return build_marker_prompt(
+            student=prompt_student(task),
+            submission=task['submission'],
+            activity=task.get('activity'),
+            criteria_path=task.get('criteria'),
+            assignment_type=task.get('type', 'structured'),
+            problem_context_path=task.get('problem_context')
+        )
+
+    if agent == 'verifier':
+        # Near-duplicate answer: confirm or adjust the reference marking,
+        # or mark in full if the reference failed
+        from marker import build_marker_prompt, build_verify_prompt, prompt_student
+        if Path(task['reference_marking']).exists():
+            return build_verify_prompt(
+                student=prompt_student(task),
+                submission=task['submission'],
+                activity=task['activity'],
+                reference_student=task['reference_student'],
+                reference_submission=task['reference_submission'],
+                reference_marking=task['reference_marking'],
+                criteria_path=task.get('criteria')
+            )
+        task['agent'] = 'marker'
+        return build_marker_prompt(
+            student=prompt_student(task),
+            submission=task['submission'],
+            activity=task['activity'],
+            criteria_path=task.get('criteria')
+        )
+
+    if agent == 'unifier':
+        from unifier import build_unifier_prompt
+        return build_unifier_prompt(
+            student=task['student'],
+            submission=task['submission'],
+            scheme_path=task['scheme'],
+            markings_dir=task['markings_dir'],
+            assignment_type=task.get('type', 'structured')
+        )
+
+    raise ValueError(f"Unknown agent '{agent}'")
+
+
+class BudgetReached(Exception):
+    """Raised instead of starting a request once the run budget is spent."""
+
+
+class MarkingEngine:
+    """Dispatches LLM tasks concurrently under an adaptive (AIMD) concurrency limit."""
+
+    def __init__(self, api_model: str, concurrency: int, stats_file: str | None,
+                 log_dir: Path | None, max_concurrency: int | None = None, budget=None):
+        self.api_model = api_model
+        self.provider = resolve_api_provider(api_model)
+        self.stats_file = stats_file
+        self.log_dir = log_dir
+        self.budget = budget
+        self.budget_skipped = 0
+
+        curve_log = log_dir / "concurrency.jsonl" if log_dir else None
+        self.controller = AIMDController(concurrency, max_concurrency, log_file=curve_log)
+        self.capacity = None  # asyncio.Condition, created inside the event loop
+        self.queue = None  # asyncio.Queue of tasks not yet started, created inside the event loop
+        self.in_flight_cost = 0.0  # pre-flight cost estimates of the calls in flight
+
+        self.total = 0
+        self.completed = 0
+        self.errors = 0
+        self.quota_errors = []
+
+    def print_progress(self):
+        message = f"[{self.completed * 100 // self.total}%] {self.completed}/{self.total} tasks"
+        if self.errors:
+            message += f" ({self.errors} errors)"
+        message += f" | concurrency {self.controller.concurrency}"
+        print(f"\r\033[K{message}", end='', file=sys.stderr, flush=True)
+
+    def estimate_cost(self, prompt: str, system_prompt: str, api_model: str | None = None) -> float:
+        """Pre-flight cost of a call: estimated prompt tokens plus the full max_tokens output."""
+        model = api_model or self.api_model
+        provider = resolve_api_provider(api_model) if api_model else self.provider
+        return estimate_cost(model, estimate_prompt_tokens(prompt, system_prompt, provider), DEFAULT_MAX_TOKENS)
+
+    async def complete_adaptive(self, prompt: str, system_prompt: str, sink: StreamSink | None = None,
+                                stage: str = 'unknown', api_model: str | None = None) -> tuple[str, dict]:
+        """Call the API once a slot is free; rate-limited retries shrink the limit.
+
+        With LLM_HEDGE_MODEL set, a call that outlasts the stage's p95 latency
+        is duplicated to the secondary model (see api/hedge.py). api_model
+        replaces the engine's model for this call (cascade calls).
+        """
+        cost = self.estimate_cost(prompt, system_prompt, api_model) if self.budget else 0.0
+
+        def within_budget():
+            return not self.budget or self.budget.allows(self.controller.in_flight, self.in_flight_cost + cost)
+
+        async with self.capacity:
+            # Over budget while calls are in flight: wait for them, as their
+            # recorded costs may project lower than the estimates
+            await self.capacity.wait_for(
+                lambda: self.controller.has_capacity() and (self.controller.in_flight == 0 or within_budget()))
+            if not within_budget():
+                raise BudgetReached(self.budget.summary())
+            self.controller.on_start()
+            self.in_flight_cost += cost
+
+        def on_retry(error_class, attempt_started):
+            if error_class == 'quota':
+                self.controller.on_congestion(attempt_started)
+
+        try:
+            model = api_model or self.api_model
+            provider = resolve_api_provider(api_model) if api_model else self.provider
+            result = await acomplete_hedged(model, prompt, system_prompt,
+                                            provider=provider, on_retry=on_retry, sink=sink,
+                                            stats_file=self.stats_file, stage=stage)
+        except LLMError:
+            self.controller.on_failure()
+            raise
+        else:
+            self.controller.on_success()
+            return result
+        finally:
+            self.in_flight_cost -= cost
+            await self.release()
+
+    async def release(self):
+        async with self.capacity:
+            self.capacity.notify_all()
+
+    def write_log(self, task: dict, stdout: str, stderr: str):
+        if not self.log_dir:
+            return
+        task_dir = task_log_dir(self.log_dir, task)
+        task_dir.mkdir(parents=True, exist_ok=True)
+        (task_dir / "stdout").write_text(stdout, encoding='utf-8')
+        (task_dir / "stderr").write_text(stderr, encoding='utf-8')
+
+    def write_result(self, task: dict, result: tuple[str, dict], interface: str = 'api',
+                     written: bool = False, record: bool = True):
+        """Write a task's response to its output file (unless streamed there) and record stats."""
+        text, stats = result
+        output = Path(task['output'])
+        if not written:
+            StreamSink(output).finish(text)
+
+        if self.stats_file and record:
+            model, provider = answered_by(self.api_model, self.provider, stats)
+            append_stats(self.stats_file, provider, model,
+                         task['agent'], task_context(task), stats, interface=interface)
+
+        self.write_log(task, f"✓ {task['agent'].capitalize()} complete for {task_label(task)}\n  Output: {output}\n", "")
+
+    async def run_task(self, task: dict):
+        output = Path(task['output'])
+
+        try:
+            # Notebook parsing and template rendering are blocking file work
+            system_prompt, prompt = await asyncio.to_thread(build_prompt, task)
+            output.with_suffix('.prompt.txt').write_text(join_prompt(system_prompt, prompt), encoding='utf-8')
+
+            if uses_cascade(task) and await self.run_cascade(task, system_prompt, prompt):
+                self.completed += 1
+                self.print_progress()
+                return
+
+            sink = StreamSink(output, task_validator(task))
+            result = await self.complete_adaptive(prompt, system_prompt, sink, task['agent'])
+
+            self.write_result(task, result, written=True)
+            if is_packed(task):
+                self.run_fallbacks(unpack_task(task, result[0]))
+
+        except BudgetReached:
+            self.budget_skipped += 1
+        except Exception as e:
+            self.record_failure(task, e)
+
+        self.completed += 1
+        self.print_progress()
+
+    async def run_cascade(self, task: dict, system_prompt: str, prompt: str) -> bool:
+        """
+        Try a marker task on its cascade model and record the decision.
+
+        Returns:
+            True if the cascade marking was kept (written to the task's
+            output), False if the task has to go to the engine's model
+        """
+        model = task['cascade_model']
+        answer_tokens = count_tokens(prompt, resolve_api_provider(model))
+        confidence = verdict = None
+        if answer_tokens > DEFAULT_MAX_ANSWER_TOKENS:
+            reason = 'long_answer'
+        else:
+            try:
+                text, stats = await self.complete_adaptive(cascade_prompt(prompt), system_prompt,
+                                                           stage=CASCADE_STAGE, api_model=model)
+            except LLMError as e:
+                print(f"\nWarning: cascade marking failed for {task_label(task)} ({e})", file=sys.stderr)
+                reason = 'error'
+            else:
+                if self.stats_file:
+                    answered_model, provider = answered_by(model, resolve_api_provider(model), stats)
+                    append_stats(self.stats_file, provider, answered_model, CASCADE_STAGE,
+                                 task_context(task), stats)
+                reason, confidence, verdict = check_marking(
+                    text, task.get('cascade_min_confidence', DEFAULT_MIN_CONFIDENCE))
+                if reason is None:
+                    self.write_result(task, (strip_verdict(text), stats), written=False, record=False)
+
+        record_decision(self.stats_file, task['student'], task['activity'], model,
+                        answer_tokens, reason, confidence, verdict)
+        return reason is None
+
+    def run_fallbacks(self, tasks: list[dict]):
+        """Queue the activities or students of a packed task that need separate calls."""
+        self.total += len(tasks)
+        for task in tasks:
+            self.queue.put_nowait(task)
+
+    async def worker(self):
+        while True:
+            task = await self.queue.get()
+            try:
+                await self.run_task(task)
+            finally:
+                self.queue.task_done()
+
+    async def run(self, tasks: list[dict]):
+        self.total = len(tasks)
+        self.capacity = asyncio.Condition()
+        self.queue = asyncio.Queue()
+        for task in tasks:
+            self.queue.put_nowait(task)
+        self.print_progress()
+
+        # A fixed pool of workers, as many as the concurrency ceiling: a task's
+        # prompt is built only when a worker picks it up, so at most that many
+        # prompts are held in memory however long the task list is
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.controller.maximum)]
+        await self.queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.controller.finish()
+        print(file=sys.stderr)
+        print(self.controller.summary())
+
+    def record_failure(self, task: dict, error: Exception):
+        self.errors += 1
+        error_output = str(error)
+        if isinstance(error, LLMError) and is_quota_error(error_output, self.provider):
+            self.quota_errors.append(error_output)
+        self.write_log(task, "", f"Error: {task['agent'].capitalize()} failed for {task_label(task)}: {error_output}\n")
+
+    def run_batch(self, tasks: list[dict], poll_interval: float):
+        """Submit all tasks as one provider batch job and write the results."""
+        self.total = len(tasks)
+        requests = []
+        by_id = {}
+
+        fallbacks = []
+        for index, task in enumerate(tasks):
+            try:
+                system_prompt, prompt = build_prompt(task)
+            except Exception as e:
+                self.record_failure(task, e)
+                continue
+            Path(task['output']).with_suffix('.prompt.txt').write_text(
+                join_prompt(system_prompt, prompt), encoding='utf-8')
+
+            cached = lookup_cached(self.provider, self.api_model, prompt, system_prompt, DEFAULT_MAX_TOKENS)
+            if cached:
+                self.write_result(task, cached, interface='batch')
+                if is_packed(task):
+                    fallbacks.extend(unpack_task(task, cached[0]))
+                continue
+
+            custom_id = f"task-{index}"
+            by_id[custom_id] = task
+            requests.append({'custom_id': custom_id, 'prompt': prompt, 'system_prompt': system_prompt})
+
+        if self.budget and requests:
+            # A batch cannot be stopped part way: submit only what fits, at the
+            # average cost per call or, with none recorded yet, each request's
+            # pre-flight estimate
+            average = self.budget.average_call_cost()
+            remaining = self.budget.limit_usd - self.budget.spent()
+            fits = 0
+            for request in requests:
+                cost = (average or self.estimate_cost(request['prompt'], request['system_prompt'])) * BATCH_DISCOUNT
+                if remaining <= 0 or cost > remaining:
+                    break
+                remaining -= cost
+                fits += 1
+            if fits < len(requests):
+                for request in requests[fits:]:
+                    del by_id[request['custom_id']]
+                self.budget_skipped += len(requests) - fits
+                requests = requests[:fits]
+
+        if requests:
+            self.submit_batch(requests, by_id, poll_interval, fallbacks)
+
+        if fallbacks:
+            # Sections missing from packed responses: separate concurrent requests
+            print(f"Running {len(fallbacks)} tasks separately (no usable packed section)...")
+            asyncio.run(self.run(fallbacks))
+
+    def submit_batch(self, requests: list[dict], by_id: dict, poll_interval: float,
+                     fallbacks: list[dict]):
+        """Run one batch job and write its results; packed tasks add their failed sections to fallbacks."""
+        requests_by_id = {r['custom_id']: r for r in requests}
+        print(f"Submitting {len(requests)} request(s) as a {self.provider} batch job...")
+
+        def on_status(batch_id, status):
+            print(f"\r\033[K  Batch {batch_id}: {status}", end='', file=sys.stderr, flush=True)
+
+        try:
+            results = run_batch(self.api_model, requests, provider=self.provider,
+                                poll_interval=poll_interval, on_status=on_status)
+        except LLMError as e:
+            print(file=sys.stderr)
+            for task in by_id.values():
+                self.record_failure(task, e)
+            return
+        print(file=sys.stderr)
+
+        for custom_id, task in by_id.items():
+            result = results[custom_id]
+            if isinstance(result, LLMError):
+                self.record_failure(task, result)
+                continue
+
+            request = requests_by_id[custom_id]
+            result = store_cached(self.provider, self.api_model, request['prompt'],
+                                  request['system_prompt'], DEFAULT_MAX_TOKENS, result)
+            self.write_result(task, result, interface='batch')
+            if is_packed(task):
+                fallbacks.extend(unpack_task(task, result[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run marker/unifier tasks concurrently in one process (API mode)"
+    )
+    parser.add_argument(
+        "--tasks",
+        required=True,
+        help="JSONL file with one task object per line"
+    )
+    parser.add_argument(
+        "--api-model",
+        required=True,
+        help="Model for direct API calls (provider auto-resolved from models.yaml)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="In-flight requests to start at; adapts to rate limits (default: 16)"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Ceiling for adaptive concurrency (default: 2 x --concurrency)"
+    )
+    parser.add_argument(
+        "--stats-file",
+        help="Path to append token usage stats (JSONL format)"
+    )
+    parser.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="Submit all tasks as one provider batch job (Anthropic/OpenAI, ~50%% cheaper, slower)"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f"Seconds between batch status checks (default: {DEFAULT_POLL_INTERVAL})"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Re-run tasks even if their output file already exists"
+    )
+    parser.add_argument(
+        "--log-dir",
+        help="Directory for per-task stdout/stderr (parallel_runner.sh layout)"
+    )
+    add_budget_args(parser)
+
+    args = parser.parse_args()
+
+    tasks_file = Path(args.tasks)
+    if not tasks_file.exists():
+        print(f"Error: Tasks file not found: {tasks_file}", file=sys.stderr)
+        sys.exit(1)
+
+    all_tasks = load_tasks(tasks_file)
+    if args.no_resume:
+        tasks = all_tasks
+    else:
+        tasks = [t for t in all_tasks if not task_done(t)]
+    skipped = len(all_tasks) - len(tasks)
+
+    mode = "batch API" if args.batch_api else f"concurrency {args.concurrency}"
+    print(f"Async engine: {len(tasks)} task(s), {mode}, model {args.api_model}")
+    if skipped:
+        print(f"  Skipped {skipped} task(s) with existing output")
+
+    if not tasks:
+        return
+
+    try:
+        engine = MarkingEngine(
+            args.api_model,
+            args.concurrency,
+            args.stats_file,
+            Path(args.log_dir) if args.log_dir else None,
+            args.max_concurrency,
+            budget_from_args(args)
+        )
+    except LLMError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.batch_api and not supports_batch(engine.provider):
+        print(f"  Warning: {engine.provider} has no batch API, using concurrent requests", file=sys.stderr)
+        args.batch_api = False
+
+    if args.batch_api:
+        engine.run_batch(tasks, args.poll_interval)
+    else:
+        asyncio.run(engine.run(tasks))
+
+    if engine.quota_errors:
+        print_quota_warning(engine.provider, engine.quota_errors[0])
+        print(f"  {len(engine.quota_errors)} task(s) failed due to quota/rate limits", file=sys.stderr)
+
+    if engine.budget_skipped:
+        print(f"✗ Budget reached ({engine.budget.summary()}): "
+              f"{engine.budget_skipped} task(s) not started; re-run to resume")
+
+    if engine.errors:
+        print(f"✗ {engine.errors}/{len(tasks)} task(s) failed")
+        sys.exit(1)
+
+    if engine.budget_skipped:
+        sys.exit(1)
+
+    print(f"✓ All {len(tasks)} tasks completed successfully")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Hedged LLM Requests
+
+Cuts the tail latency of a stage: when a request is still unanswered after
+the p95 latency observed for its stage, a duplicate is sent to a secondary
+model (or the same model again). The first valid response is used and the
+other request is cancelled.
+
+Hedging is opt-in. Set LLM_HEDGE_MODEL to the secondary model, or to "same"
+to repeat the request on the primary model (mark_structured.sh,
+mark_freeform.sh and batch_mark.sh take --hedge MODEL). The p95 comes from
+the latency_seconds of the stage's live calls in the run's stats file, and
+is refreshed as the file grows; a stage hedges nothing until it has
+MIN_SAMPLES calls to go by.
+
+The winning call's stats record gets:
+
+  hedged               true
+  hedge_model          the secondary model
+  hedge_delay_seconds  the p95 the duplicate was sent after
+  hedge_winner         'primary' or 'hedge' (the record's model is the winner's)
+  hedge_wasted_tokens  estimated input plus streamed output tokens of the
+                       cancelled request
+
+./utils/show_stats.sh reports the hedge rate and wasted tokens per stage.
+
+Usage:
+  from api.hedge import complete_hedged
+
+  text, stats = complete_hedged(model, prompt, system_prompt, sink=sink,
+                                stats_file=stats_file, stage='marker')
+  model, provider = answered_by(model, provider, stats)   # for append_stats
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from api.client import DEFAULT_MAX_TOKENS, LLMError, acomplete, complete, resolve_api_provider
+from api.streaming import StreamAborted, StreamSink
+from api.tokens import count_tokens, estimate_prompt_tokens
+
+HEDGE_ENV = 'LLM_HEDGE_MODEL'
+
+# Live calls of a stage needed before its p95 is trusted
+MIN_SAMPLES = 20
+
+# Seconds a stage's p95 is reused before the stats file is read again
+# (until the stage has MIN_SAMPLES calls the file is read on every call)
+REFRESH_SECONDS = 30
+
+# (stats file, stage) -> (time read, p95)
+_p95_cache = {}
+_p95_lock = threading.Lock()
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a request that lost the race, to stop its retries."""
+
+
+def hedge_model_for(model: str) -> str | None:
+    """Secondary model for a call (None when hedging is off)."""
+    hedge = os.environ.get(HEDGE_ENV, '').strip()
+    if not hedge:
+        return None
+    return model if hedge == 'same' else hedge
+
+
+def read_stage_p95(stats_file: str | Path, stage: str) -> float | None:
+    """p95 of latency_seconds over the stage's live calls (None if too few)."""
+    latencies = []
+    try:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if (entry.get('stage') == stage and entry.get('latency_seconds') is not None
+                        and entry.get('response_cache') != 'hit' and not entry.get('hedged')):
+                    latencies.append(entry['latency_seconds'])
+    except OSError:
+        return None
+
+    if len(latencies) < MIN_SAMPLES:
+        return None
+    latencies.sort()
+    return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def stage_p95(stats_file: str | Path | None, stage: str) -> float | None:
+    """Cached read_stage_p95(), refreshed every REFRESH_SECONDS (too few calls are not cached)."""
+    if not stats_file:
+        return None
+    key = (str(stats_file), stage)
+    now = time.monotonic()
+    with _p95_lock:
+        cached = _p95_cache.get(key)
+        if cached and now - cached[0] < REFRESH_SECONDS:
+            return cached[1]
+    p95 = read_stage_p95(stats_file, stage)
+    if p95 is not None:
+        with _p95_lock:
+            _p95_cache[key] = (now, p95)
+    return p95
+
+
+def answered_by(model: str, provider: str, stats: dict) -> tuple[str, str]:
+    """Model and provider that produced a (possibly hedged) response."""
+    if stats.get('hedge_winner') == 'hedge':
+        return stats['hedge_model'], resolve_api_provider(stats['hedge_model'])
+    return model, provider
+
+
+def _hedge_sink(sink: StreamSink | None) -> StreamSink:
+    """In-memory sink for the duplicate request, with its own copy of the validator."""
+    validator = copy.copy(sink.validator) if sink and sink.validator else None
+    return StreamSink(None, validator)
+
+
+def _wasted_tokens(prompt: str, system_prompt: str | None, provider: str, streamed: str) -> int:
+    return estimate_prompt_tokens(prompt, system_prompt, provider) + count_tokens(streamed, provider)
+
+
+def _hedge_stats(stats: dict, hedge_model: str, delay: float, winner: str, wasted: int,
+                 started: float) -> dict:
+    # latency_seconds covers the whole hedged call, not just the winning request
+    return {**stats, 'latency_seconds': round(time.monotonic() - started, 2),
+            'hedged': True, 'hedge_model': hedge_model,
+            'hedge_delay_seconds': round(delay, 2), 'hedge_winner': winner,
+            'hedge_wasted_tokens': wasted}
+
+
+class _Race:
+    """Decides which request's response is used; the loser is cancelled."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.winner = None
+        self.results = {}
+
+    def claim(self, leg: str) -> bool:
+        with self.lock:
+            if self.winner is None:
+                self.winner = leg
+            return self.winner == leg
+
+    def release(self, leg: str):
+        with self.lock:
+            if self.winner == leg:
+                self.winner = None
+
+    def lost(self, leg: str) -> bool:
+        return self.winner is not None and self.winner != leg
+
+    def finish(self, leg: str, result):
+        with self.lock:
+            self.results[leg] = result
+            self.changed.notify_all()
+
+
+class _LegSink:
+    """Sink for one request of a hedged call: stops streaming once the other
+    request has won, and only completes the output if this request wins."""
+
+    def __init__(self, inner: StreamSink, race: _Race, leg: str):
+        self.inner = inner
+        self.race = race
+        self.leg = leg
+
+    @property
+    def text(self) -> str:
+        return self.inner.text
+
+    @property
+    def validator(self):
+        return self.inner.validator
+
+    # start() and write() hold the race lock, so a request that has just lost
+    # cannot touch the output while the winner's response is written to it
+    def start(self):
+        with self.race.lock:
+            if self.race.lost(self.leg):
+                raise StreamAborted("the hedged request answered first")
+            self.inner.start()
+
+    def write(self, text: str):
+        with self.race.lock:
+            if self.race.lost(self.leg):
+                raise StreamAborted("the hedged request answered first")
+            self.inner.write(text)
+
+    def finish(self, text: str | None = None) -> str:
+        if not self.race.claim(self.leg):
+            raise StreamAborted("the hedged request answered first")
+        try:
+            return self.inner.finish(text)
+        except StreamAborted:
+            self.race.release(self.leg)
+            raise
+
+    def discard(self):
+        # The output of a request that lost belongs to the winner now
+        if not self.race.lost(self.leg):
+            self.inner.discard()
+
+
+def complete_hedged(model: str, prompt: str, system_prompt: str | None = None,
+                    max_tokens: int = DEFAULT_MAX_TOKENS, provider: str | None = None,
+                    on_retry=None, sink: StreamSink | None = None,
+                    stats_file: str | Path | None = None, stage: str = 'unknown') -> tuple[str, dict]:
+    """complete(), with a duplicate request sent once the call outlasts its stage's p95.
+
+    Without LLM_HEDGE_MODEL, or before the stage has enough calls to go by,
+    this is complete().
+
+    Args:
+        stats_file: Stats file the stage's latencies are read from
+        stage: Stats stage of the call (marker, unifier, ...)
+        (others as for complete())
+
+    Raises:
+        LLMError: If every request sent fails
+    """
+    provider = resolve_api_provider(model, provider)
+    hedge_model = hedge_model_for(model)
+    delay = stage_p95(stats_file, stage) if hedge_model else None
+    if delay is None:
+        return complete(model, prompt, system_prompt, max_tokens, provider, on_retry=on_retry, sink=sink)
+
+    started = time.monotonic()
+    race = _Race()
+    sinks = {'primary': _LegSink(sink or StreamSink(), race, 'primary'),
+             'hedge': _LegSink(_hedge_sink(sink), race, 'hedge')}
+    legs = {'primary': (model, provider), 'hedge': (hedge_model, resolve_api_provider(hedge_model))}
+
+    def run(leg: str):
+        leg_model, leg_provider = legs[leg]
+
+        def leg_retry(error_class, attempt_started):
+            if race.lost(leg):
+                raise HedgeCancelled()
+            if on_retry:
+                on_retry(error_class, attempt_started)
+
+        try:
+            result = complete(leg_model, prompt, system_prompt, max_tokens, leg_provider,
+                              on_retry=leg_retry, sink=sinks[leg])
+        except Exception as e:
+            result = e
+        race.finish(leg, result)
+
+    threading.Thread(target=run, args=('primary',), daemon=True).start()
+    with race.lock:
+        race.changed.wait_for(lambda: 'primary' in race.results, timeout=delay)
+        if 'primary' in race.results:
+            return _unwrap(race.results['primary'])
+
+    print(f"Hedging: no response from {model} after {delay:.1f}s (p95 of {stage}), "
+          f"sending a duplicate to {hedge_model}", file=sys.stderr)
+    threading.Thread(target=run, args=('hedge',), daemon=True).start()
+
+    with race.lock:
+        race.changed.wait_for(lambda: any(not isinstance(r, Exception) for r in race.results.values())
+                              or len(race.results) == 2)
+        successes = [leg for leg in ('primary', 'hedge')
+                     if leg in race.results and not isinstance(race.results[leg], Exception)]
+        if not successes:
+            # Report the primary's error (the hedge may only have been cancelled)
+            raise _error(race.results['primary'], provider)
+        winner = successes[0]
+        race.winner = winner
+
+    loser = 'hedge' if winner == 'primary' else 'primary'
+    text, stats = race.results[winner]
+    wasted = _wasted_tokens(prompt, system_prompt, legs[loser][1], sinks[loser].text)
+
+    if winner == 'hedge' and sink:
+        # Replace the primary's partial output with the hedge's response
+        try:
+            with race.lock:
+                sink.finish(text)
+        except StreamAborted as e:
+            raise LLMError(f"Stream aborted: {e}", provider) from e
+
+    return text, _hedge_stats(stats, hedge_model, delay, winner, wasted, started)
+
+
+async def acomplete_hedged(model: str, prompt: str, system_prompt: str | None = None,
+                           max_tokens: int = DEFAULT_MAX_TOKENS, provider: str | None = None,
+                           on_retry=None, sink: StreamSink | None = None,
+                           stats_file: str | Path | None = None,
+                           stage: str = 'unknown') -> tuple[str, dict]:
+    """Async variant of complete_hedged(); the losing request's task is cancelled."""
+    provider = resolve_api_provider(model, provider)
+    hedge_model = hedge_model_for(model)
+    delay = stage_p95(stats_file, stage) if hedge_model else None
+    if delay is None:
+        return await acomplete(model, prompt, system_prompt, max_tokens, provider,
+                               on_retry=on_retry, sink=sink)
+
+    started = time.monotonic()
+    hedge_provider = resolve_api_provider(hedge_model)
+    hedge_sink = _hedge_sink(sink)
+    primary_sink = sink or StreamSink()
+    primary = asyncio.ensure_future(acomplete(model, prompt, system_prompt, max_tokens, provider,
+                                              on_retry=on_retry, sink=primary_sink))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    print(f"Hedging: no response from {model} after {delay:.1f}s (p95 of {stage}), "
+          f"sending a duplicate to {hedge_model}", file=sys.stderr)
+    hedge = asyncio.ensure_future(acomplete(hedge_model, prompt, system_prompt, max_tokens,
+                                            hedge_provider, on_retry=on_retry, sink=hedge_sink))
+
+    pending = {primary, hedge}
+    winner = None
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        # Prefer the primary when both finish together (its output is in place)
+        for task in sorted(done, key=lambda t: t is not primary):
+            if not task.cancelled() and task.exception() is None:
+                winner = task
+                break
+
+    for task in pending:
+        task.cancel()
+    if winner is None:
+        raise primary.exception()
+
+    text, stats = winner.result()
+    if winner is primary:
+        wasted = _wasted_tokens(prompt, system_prompt, hedge_provider, hedge_sink.text)
+        return text, _hedge_stats(stats, hedge_model, delay, 'primary', wasted, started)
+
+    wasted = _wasted_tokens(prompt, system_prompt, provider, primary_sink.text)
+    if sink:
+        # The primary's task was cancelled mid-stream; write the hedge's response
+        sink.discard()
+        try:
+            sink.finish(text)
+        except StreamAborted as e:
+            raise LLMError(f"Stream aborted: {e}", hedge_provider) from e
+    return text, _hedge_stats(stats, hedge_model, delay, 'hedge', wasted, started)
+
+
+def _error(result, provider: str) -> Exception:
+    if isinstance(result, LLMError):
+        return result
+    return LLMError(f"API call failed: {result}", provider)
+
+
+def _unwrap(result):
+    if isinstance(result, Exception):
+        raise result
+    return result
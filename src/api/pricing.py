@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+LLM Pricing
+
+Computes the cost of a call from its token counts and the per-model prices
+under pricing in configs/models.yaml (USD per million tokens):
+
+  pricing:
+    claude-sonnet-4-5: {input: 3.00, output: 15.00, cache_write: 3.75, cache_read: 0.30}
+
+Token counts follow the stats record contract. Anthropic reports
+input_tokens without cached tokens; OpenAI and Gemini include cache reads
+in input_tokens, so those are charged at the cache-read price only. Batch
+API calls (interface "batch") are charged at half price.
+
+Calls to models without a price keep the cost reported by the CLI (Claude
+Code reports one), otherwise 0.
+
+Usage:
+  from api.pricing import compute_cost, estimate_cost
+  stats['cost_usd'] = compute_cost('claude', 'claude-sonnet-4-5', stats)
+  worst_case = estimate_cost('claude-sonnet-4-5', prompt_tokens, max_tokens)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+from model_table import load_model_table
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MODELS_CONFIG = PROJECT_ROOT / "configs" / "models.yaml"
+
+# Batch jobs (Anthropic Message Batches, OpenAI Batch) cost half the list price
+BATCH_DISCOUNT = 0.5
+
+
+def load_pricing(models_config: Path = MODELS_CONFIG) -> dict:
+    """Return {model: {'input': usd, 'output': usd, 'cache_write': usd, 'cache_read': usd}}
+    with prices per million tokens from models.yaml (via the compiled model table)."""
+    return load_model_table(models_config)['pricing']
+
+
+def price_for(model: str | None) -> dict | None:
+    """Prices for a model, or None if models.yaml has none."""
+    if not model:
+        return None
+    return load_pricing().get(model)
+
+
+def compute_cost(provider: str, model: str | None, stats: dict, interface: str = 'api') -> float | None:
+    """
+    Cost in USD of one call.
+
+    Args:
+        provider: LLM provider name (decides how cached tokens are counted)
+        model: Model name to price
+        stats: Stats record with input/output/cache token counts
+        interface: 'batch' for Batch API calls (half price)
+
+    Returns:
+        Cost in USD, or None if the model has no price
+    """
+    prices = price_for(model)
+    if prices is None:
+        return None
+
+    input_tokens = stats.get('input_tokens', 0) or 0
+    cache_read = stats.get('cache_read_tokens', 0) or 0
+    cache_write = stats.get('cache_creation_tokens', 0) or 0
+    if (provider or '').lower() not in ('claude', 'anthropic'):
+        # Cache reads are part of input_tokens for OpenAI and Gemini
+        input_tokens = max(0, input_tokens - cache_read)
+
+    cost = (input_tokens * prices['input'] +
+            (stats.get('output_tokens', 0) or 0) * prices['output'] +
+            cache_write * prices['cache_write'] +
+            cache_read * prices['cache_read']) / 1_000_000
+
+    if interface == 'batch':
+        cost *= BATCH_DISCOUNT
+    return round(cost, 6)
+
+
+def estimate_cost(model: str | None, input_tokens: int, output_tokens: int) -> float:
+    """
+    Pre-flight cost in USD of a call: input tokens at the input price and the
+    output allowance at the output price (0 if the model has no price).
+    """
+    prices = price_for(model)
+    if prices is None:
+        return 0.0
+    return (input_tokens * prices['input'] + output_tokens * prices['output']) / 1_000_000
+
+
+def apply_cost(provider: str, model: str | None, stats: dict, interface: str = 'api') -> dict:
+    """Set stats['cost_usd'] from the pricing table when the model has a price."""
+    cost = compute_cost(provider, model, stats, interface)
+    if cost is not None:
+        stats['cost_usd'] = cost
+    return stats
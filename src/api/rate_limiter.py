@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Cross-Process LLM Rate Limiter
+
+Token buckets for requests per minute (RPM) and tokens per minute (TPM),
+shared by every process on the machine that calls an LLM. A marking run,
+batch_mark.sh and summarize_feedback.py running at the same time each see
+only their own calls; drawing from one shared budget keeps them together
+under the provider's limits.
+
+Limits are configured per model under rate_limits in configs/models.yaml
+(a provider name applies to all of that provider's models without an entry
+of their own). Models without limits are not throttled.
+
+Buckets are keyed on provider, API key fingerprint and model, and stored as
+small JSON files updated under an exclusive file lock (fcntl), so any number
+of processes can share them without a server. The directory defaults to
+<tmp>/notebook-marker-ratelimit-<uid> and can be moved with
+LLM_RATE_LIMIT_DIR.
+
+Each call acquires one request and its estimated tokens (the local tokenizer
+estimate, see api/tokens.py) before it is sent, waiting until both buckets
+have room. Once the stats record is known, the token bucket is corrected by
+the difference between the estimate and the actual usage.
+
+Usage (from llm_caller.sh, prompt on stdin):
+  python3 rate_limiter.py acquire --provider claude --model sonnet < prompt.txt
+      (prints the estimated token count to pass to settle)
+  python3 rate_limiter.py settle --provider claude --model sonnet --estimated 1200 --actual 1530
+  python3 rate_limiter.py status
+"""
+
+import argparse
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+from model_table import load_model_table
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MODELS_CONFIG = PROJECT_ROOT / "configs" / "models.yaml"
+
+# Upper bound on a single sleep while waiting for capacity
+MAX_WAIT_SLICE = 5.0
+
+# API key environment variables per provider (first one set wins)
+API_KEY_ENV = {
+    'claude': ('CLAUDE_API_KEY', 'ANTHROPIC_API_KEY'),
+    'gemini': ('GOOGLE_API_KEY', 'GEMINI_API_KEY'),
+    'openai': ('OPENAI_API_KEY',),
+}
+
+# Limiters per process, keyed by bucket name (None when no limits apply)
+_limiters = {}
+
+
+def _normalize_provider(provider: str) -> str:
+    provider = (provider or '').lower()
+    if provider in ('anthropic', 'claude'):
+        return 'claude'
+    if provider in ('google', 'gemini'):
+        return 'gemini'
+    if provider in ('openai', 'codex'):
+        return 'openai'
+    return provider
+
+
+def actual_tokens(stats: dict) -> int:
+    """Tokens a stats record counts against TPM (input, output and cache writes)."""
+    return (stats.get('input_tokens', 0) + stats.get('output_tokens', 0) +
+            stats.get('cache_creation_tokens', 0))
+
+
+def load_rate_limits(models_config: Path = MODELS_CONFIG) -> dict:
+    """Return {model or provider: {'rpm': n, 'tpm': n}} from models.yaml (via the
+    compiled model table)."""
+    return load_model_table(models_config)['rate_limits']
+
+
+def limits_for(provider: str, model: str | None) -> dict | None:
+    """Limits for a model, falling back to its provider's entry."""
+    limits = load_rate_limits()
+    if model and model in limits:
+        return limits[model]
+
+    provider = _normalize_provider(provider)
+    for name, entry in limits.items():
+        if _normalize_provider(name) == provider:
+            return entry
+    return None
+
+
+def key_fingerprint(provider: str) -> str:
+    """Short hash of the provider's API key ('cli' when no key is set)."""
+    for env_var in API_KEY_ENV.get(_normalize_provider(provider), ()):
+        api_key = os.environ.get(env_var)
+        if api_key:
+            return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+    return 'cli'
+
+
+def limit_dir() -> Path:
+    """Directory holding the shared bucket files."""
+    configured = os.environ.get('LLM_RATE_LIMIT_DIR')
+    if configured:
+        return Path(configured)
+    return Path(tempfile.gettempdir()) / f"notebook-marker-ratelimit-{os.getuid()}"
+
+
+class RateLimiter:
+    """RPM/TPM token buckets for one (provider, API key, model), shared across processes."""
+
+    def __init__(self, bucket: str, rpm: int | None, tpm: int | None):
+        """
+        Args:
+            bucket: Bucket name (file name stem in the limit directory)
+            rpm: Requests per minute, or None for no request limit
+            tpm: Tokens per minute, or None for no token limit
+        """
+        self.bucket = bucket
+        self.rpm = rpm
+        self.tpm = tpm
+
+        directory = limit_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        self.state_file = directory / f"{bucket}.json"
+        self.lock_file = directory / f"{bucket}.lock"
+
+    def _update(self, change):
+        """Apply change(state, now) to the bucket state under the file lock."""
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(self.state_file.read_text())
+                except (OSError, ValueError):
+                    state = {'requests': self.rpm or 0, 'tokens': self.tpm or 0, 'updated': time.time()}
+
+                # Refill both buckets for the time since the last update
+                now = time.time()
+                elapsed = max(0.0, now - state['updated'])
+                if self.rpm:
+                    state['requests'] = min(self.rpm, state['requests'] + elapsed * self.rpm / 60)
+                if self.tpm:
+                    state['tokens'] = min(self.tpm, state['tokens'] + elapsed * self.tpm / 60)
+                state['updated'] = now
+
+                result = change(state)
+
+                tmp_file = self.state_file.with_suffix('.tmp')
+                tmp_file.write_text(json.dumps(state))
+                os.replace(tmp_file, self.state_file)
+                return result
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Take one request and `tokens` tokens if both buckets have room.
+
+        Returns:
+            0 if reserved, otherwise the seconds to wait before trying again
+        """
+        # A request larger than the whole bucket waits for a full bucket
+        needed_tokens = min(tokens, self.tpm) if self.tpm else 0
+
+        def change(state):
+            wait = 0.0
+            if self.rpm and state['requests'] < 1:
+                wait = max(wait, (1 - state['requests']) * 60 / self.rpm)
+            if self.tpm and state['tokens'] < needed_tokens:
+                wait = max(wait, (needed_tokens - state['tokens']) * 60 / self.tpm)
+            if wait == 0:
+                if self.rpm:
+                    state['requests'] -= 1
+                if self.tpm:
+                    state['tokens'] -= tokens
+            return wait
+
+        return self._update(change)
+
+    def acquire(self, tokens: int) -> float:
+        """Block until one request and `tokens` tokens are reserved; returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.reserve(tokens)
+            if wait == 0:
+                return waited
+            wait = min(wait, MAX_WAIT_SLICE)
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, tokens: int) -> float:
+        """Async variant of acquire() that sleeps without blocking the event loop."""
+        waited = 0.0
+        while True:
+            wait = self.reserve(tokens)
+            if wait == 0:
+                return waited
+            wait = min(wait, MAX_WAIT_SLICE)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the actual usage of a call is known."""
+        if not self.tpm or actual == estimated:
+            return
+
+        def change(state):
+            state['tokens'] = min(self.tpm, state['tokens'] + estimated - actual)
+
+        self._update(change)
+
+    def status(self) -> dict:
+        """Current bucket levels (after refill)."""
+        return self._update(lambda state: dict(state))
+
+
+def get_limiter(provider: str, model: str | None) -> RateLimiter | None:
+    """Return the shared limiter for a provider/model, or None if it has no limits."""
+    provider = _normalize_provider(provider)
+    model = model or 'default'
+    bucket = f"{provider}-{key_fingerprint(provider)}-{model}".replace('/', '_')
+    if bucket in _limiters:
+        return _limiters[bucket]
+
+    limits = limits_for(provider, model)
+    limiter = RateLimiter(bucket, limits.get('rpm'), limits.get('tpm')) if limits else None
+    _limiters[bucket] = limiter
+    return limiter
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-process LLM rate limiter')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    acquire_parser = subparsers.add_parser('acquire', help='Wait for capacity (prompt on stdin)')
+    acquire_parser.add_argument('--provider', required=True)
+    acquire_parser.add_argument('--model', default='')
+    acquire_parser.add_argument('--system-prompt-file', help='System prompt sent with the prompt')
+
+    settle_parser = subparsers.add_parser('settle', help='Correct tokens after a call')
+    settle_parser.add_argument('--provider', required=True)
+    settle_parser.add_argument('--model', default='')
+    settle_parser.add_argument('--estimated', type=int, required=True)
+    settle_parser.add_argument('--actual', type=int, required=True)
+
+    subparsers.add_parser('status', help='Show configured limits and bucket levels')
+
+    args = parser.parse_args()
+
+    if args.command == 'acquire':
+        prompt = sys.stdin.read()
+        system_prompt = None
+        if args.system_prompt_file:
+            with open(args.system_prompt_file, 'r') as f:
+                system_prompt = f.read()
+        from tokens import estimate_prompt_tokens
+        estimated = estimate_prompt_tokens(prompt, system_prompt, args.provider)
+
+        limiter = get_limiter(args.provider, args.model)
+        if limiter:
+            waited = limiter.acquire(estimated)
+            if waited:
+                print(f"Rate limiter: waited {waited:.1f}s for {limiter.bucket}", file=sys.stderr)
+        print(estimated)
+
+    elif args.command == 'settle':
+        limiter = get_limiter(args.provider, args.model)
+        if limiter:
+            limiter.settle(args.estimated, args.actual)
+
+    elif args.command == 'status':
+        limits = load_rate_limits()
+        if not limits:
+            print("No rate limits configured (rate_limits in configs/models.yaml)")
+            return
+        print(f"Rate limit directory: {limit_dir()}")
+        for name, entry in limits.items():
+            print(f"  {name}: rpm={entry['rpm'] or '-'} tpm={entry['tpm'] or '-'}")
+        for state_file in sorted(limit_dir().glob('*.json')):
+            try:
+                state = json.loads(state_file.read_text())
+            except (OSError, ValueError):
+                continue
+            print(f"  {state_file.stem}: {state['requests']:.1f} requests, "
+                  f"{state['tokens']:.0f} tokens available (as of last update)")
+
+
+if __name__ == '__main__':
+    main()
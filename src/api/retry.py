@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+LLM Call Retries
+
+Retries transient LLM failures inside the call path, so a single 529
+"overloaded" or a network blip no longer fails the whole task.
+
+Errors are classified with the categories used by utils/error_summary.py
+and utils/quota_detector.py:
+
+  quota        rate limits and overload (429/529, "rate limit", "overloaded")
+  timeout      request timeouts
+  network      connection resets, DNS failures, dropped sockets
+  llm_failure  other server-side failures (5xx, empty or failed responses)
+
+Each class has its own retry budget. The delay before a retry is the
+provider's Retry-After (header or message) when given, otherwise
+exponential backoff with jitter. Hard quotas (daily caps, "resets 3am")
+and client errors (bad request, authentication, missing CLI or SDK) are
+not retried.
+
+Retry counts and total backoff time are returned with the call's stats:
+
+  {"retries": 2, "retry_backoff_seconds": 5.3, "retry_errors": {"quota": 2}}
+
+Used by api/client.py for both API calls and llm_caller.sh CLI calls.
+"""
+
+import asyncio
+import random
+import re
+import sys
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+from quota_detector import is_hard_quota, is_rate_limit_signal
+
+# Retries allowed per error class
+RETRY_BUDGETS = {
+    'quota': 5,
+    'timeout': 3,
+    'network': 4,
+    'llm_failure': 2,
+}
+
+# First backoff delay per error class (doubled on each retry)
+BASE_DELAYS = {
+    'quota': 4.0,
+    'timeout': 2.0,
+    'network': 1.0,
+    'llm_failure': 2.0,
+}
+
+MAX_BACKOFF_SECONDS = 60.0
+
+# Longest Retry-After honoured; anything longer is treated as a quota reset
+MAX_RETRY_AFTER_SECONDS = 300.0
+
+# Client errors that fail the same way every time
+NON_RETRYABLE_PATTERNS = [
+    "invalid_request",
+    "invalid request",
+    "authentication",
+    "invalid api key",
+    "invalid x-api-key",
+    "permission",
+    "access denied",
+    "environment variable not set",
+    "package not installed",
+    "cli not found",
+    "cannot resolve provider",
+    "unknown provider",
+    "prompt is too long",
+    "context length",
+    "context_length_exceeded",
+]
+CLIENT_ERROR_STATUS = re.compile(r'\berror code: (400|401|403|404|413|422)\b')
+
+TIMEOUT_PATTERNS = ["timeout", "timed out", "deadline exceeded"]
+NETWORK_PATTERNS = [
+    "connection",
+    "network",
+    "socket",
+    "name resolution",
+    "temporarily unavailable",
+    "broken pipe",
+    "reset by peer",
+    "remote end closed",
+]
+
+# "Please retry in 12.3s", "retry after 30 seconds", "try again in 20s"
+RETRY_AFTER_TEXT = re.compile(
+    r'(?:retry|try again)(?:[- _]after)?\s*(?:in)?\s*[:=]?\s*(\d+(?:\.\d+)?)\s*(ms|s\b|sec|second)',
+    re.IGNORECASE
+)
+
+
+def classify_error(message: str, provider: str) -> str | None:
+    """
+    Classify an LLM error for retrying.
+
+    Args:
+        message: Error text (exception message or CLI stderr/stdout)
+        provider: LLM provider name
+
+    Returns:
+        'hard_quota', 'quota', 'timeout', 'network' or 'llm_failure', or
+        None for errors that retrying cannot fix
+    """
+    if is_hard_quota(message):
+        return 'hard_quota'
+
+    lower = message.lower()
+    if is_rate_limit_signal(message, provider):
+        return 'quota'
+    if CLIENT_ERROR_STATUS.search(lower) or any(p in lower for p in NON_RETRYABLE_PATTERNS):
+        return None
+    if any(p in lower for p in TIMEOUT_PATTERNS):
+        return 'timeout'
+    if any(p in lower for p in NETWORK_PATTERNS):
+        return 'network'
+    return 'llm_failure'
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """Delay requested by the provider (Retry-After header or message), if any."""
+    for exc in (error, error.__cause__):
+        response = getattr(exc, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            continue
+
+        value = headers.get('retry-after-ms')
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    match = RETRY_AFTER_TEXT.search(str(error))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if match.group(2).lower() == 'ms' else seconds
+    return None
+
+
+def backoff_delay(error_class: str, retry: int, retry_after: float | None = None) -> float:
+    """
+    Seconds to wait before a retry.
+
+    Args:
+        error_class: Class returned by classify_error()
+        retry: Number of earlier retries for this class (0 for the first)
+        retry_after: Delay requested by the provider, if any
+
+    Returns:
+        Retry-After plus a little jitter, or exponential backoff with
+        equal jitter (half fixed, half random)
+    """
+    if retry_after is not None:
+        return min(retry_after, MAX_RETRY_AFTER_SECONDS) + random.uniform(0, 1)
+
+    ceiling = min(MAX_BACKOFF_SECONDS, BASE_DELAYS.get(error_class, 2.0) * 2 ** retry)
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RetryState:
+    """Retry bookkeeping for one logical LLM call."""
+
+    def __init__(self, provider: str, on_retry=None):
+        """
+        Args:
+            provider: LLM provider name (for error classification)
+            on_retry: Optional callback(error_class, attempt_started) run before
+                      each backoff, e.g. to shrink adaptive concurrency
+        """
+        self.provider = provider
+        self.on_retry = on_retry
+        self.counts = {}
+        self.backoff_seconds = 0.0
+        self.attempt_started = None
+
+    def start_attempt(self):
+        self.attempt_started = time.monotonic()
+
+    def next_delay(self, error: BaseException) -> float | None:
+        """
+        Decide whether to retry after an error.
+
+        Returns:
+            Seconds to wait before the next attempt, or None if the error is
+            not retryable or its class has no retries left
+        """
+        error_class = classify_error(str(error), self.provider)
+        if error_class not in RETRY_BUDGETS:
+            return None
+
+        retry = self.counts.get(error_class, 0)
+        if retry >= RETRY_BUDGETS[error_class]:
+            return None
+
+        # A very long Retry-After means a quota reset, not a transient limit
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None and retry_after > MAX_RETRY_AFTER_SECONDS:
+            return None
+
+        delay = backoff_delay(error_class, retry, retry_after)
+        self.counts[error_class] = retry + 1
+        self.backoff_seconds += delay
+
+        if self.on_retry:
+            self.on_retry(error_class, self.attempt_started)
+        return delay
+
+    def stats(self) -> dict:
+        """Stats fields for the call (empty when no retry happened)."""
+        if not self.counts:
+            return {}
+        return {
+            'retries': sum(self.counts.values()),
+            'retry_backoff_seconds': round(self.backoff_seconds, 2),
+            'retry_errors': dict(self.counts),
+        }
+
+
+def call_with_retries(call, provider: str, error_types: tuple = (Exception,), on_retry=None):
+    """
+    Run call() until it succeeds or its error class runs out of retries.
+
+    Args:
+        call: Zero-argument function performing one attempt
+        provider: LLM provider name
+        error_types: Exceptions that count as a failed attempt
+        on_retry: Optional callback(error_class, attempt_started)
+
+    Returns:
+        (result of call(), retry stats dict)
+
+    Raises:
+        The last error, once it is not retryable or its budget is spent
+    """
+    state = RetryState(provider, on_retry)
+    while True:
+        state.start_attempt()
+        try:
+            return call(), state.stats()
+        except error_types as e:
+            delay = state.next_delay(e)
+            if delay is None:
+                raise
+            print(f"Retrying in {delay:.1f}s after error: {str(e)[:200]}", file=sys.stderr)
+            time.sleep(delay)
+
+
+async def acall_with_retries(call, provider: str, error_types: tuple = (Exception,), on_retry=None):
+    """Async variant of call_with_retries(); call() returns an awaitable."""
+    state = RetryState(provider, on_retry)
+    while True:
+        state.start_attempt()
+        try:
+            return await call(), state.stats()
+        except error_types as e:
+            delay = state.next_delay(e)
+            if delay is None:
+                raise
+            print(f"Retrying in {delay:.1f}s after error: {str(e)[:200]}", file=sys.stderr)
+            await asyncio.sleep(delay)
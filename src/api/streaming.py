@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Streaming Output
+
+Helpers for writing an LLM response to disk while it is being generated.
+
+StreamSink appends each piece of text to <output>.partial as it arrives, so
+progress displays can follow a long unifier feedback card, and renames the
+file to <output> atomically once the response is complete. A reader never
+sees a half-written output file, and resume never mistakes one for a
+finished task.
+
+A StreamValidator checks the text as it grows and aborts a generation that
+has already gone wrong, instead of paying for (and holding a concurrency
+slot during) the rest of it:
+
+  - a refusal at the start of the response ("I'm sorry, but I can't ...")
+  - a required line that is missing, e.g. "ASSIGNMENT FEEDBACK -" after the
+    feedback card heading of a unifier response
+
+Usage:
+  sink = StreamSink(output_path, StreamValidator(required_line="ASSIGNMENT FEEDBACK -",
+                                                 required_after="Feedback Card"))
+  sink.start()
+  for text in stream:
+      sink.write(text)       # raises StreamAborted on a bad generation
+  sink.finish()              # validates the whole text, renames .partial
+"""
+
+import os
+import re
+from pathlib import Path
+
+PARTIAL_SUFFIX = ".partial"
+
+# Refusals show up in the first sentence of a response (checked once it is
+# complete, or after REFUSAL_WINDOW characters)
+REFUSAL_WINDOW = 300
+REFUSAL_PATTERN = re.compile(
+    r"^\s*(?:I'm sorry|I am sorry|I apologi[sz]e|Sorry, (?:but )?I|"
+    r"I can(?:no|')t (?:help|assist|comply|provide|do that|complete)|"
+    r"I (?:am|'m) (?:not able|unable) to|I won't be able to|As an AI)",
+    re.IGNORECASE
+)
+FIRST_SENTENCE_END = re.compile(r'[.!?](?:\s|$)|\n')
+
+# Text allowed after the anchor before a missing required line counts as malformed
+DEFAULT_LOOKAHEAD = 400
+
+# Unifier responses end with the student feedback card
+FEEDBACK_CARD_LINE = "ASSIGNMENT FEEDBACK -"
+FEEDBACK_CARD_HEADING = "Feedback Card"
+
+
+class StreamAborted(Exception):
+    """Raised when streamed text shows the generation has failed."""
+
+
+class StreamValidator:
+    """Incremental checks on a response as it is generated."""
+
+    def __init__(self, required_line: str | None = None, required_after: str | None = None,
+                 lookahead: int = DEFAULT_LOOKAHEAD, check_refusal: bool = True):
+        """
+        Args:
+            required_line: Text the response must contain
+            required_after: Anchor after which required_line must follow within
+                            lookahead characters (otherwise only checked at the end)
+            lookahead: Characters allowed between the anchor and required_line
+            check_refusal: Abort on a refusal at the start of the response
+        """
+        self.required_line = required_line
+        self.required_after = required_after
+        self.lookahead = lookahead
+        self.check_refusal = check_refusal
+        self.reset()
+
+    def reset(self):
+        self.refusal_checked = not self.check_refusal
+        self.found_line = self.required_line is None
+        self.anchor_at = None
+        self.scanned = 0
+
+    def check(self, text: str, final: bool = False) -> str | None:
+        """
+        Check the response so far.
+
+        Args:
+            text: All text received so far
+            final: True once the response is complete
+
+        Returns:
+            Reason to abort, or None if the response still looks fine
+        """
+        if not self.refusal_checked and (len(text) >= REFUSAL_WINDOW or final
+                                         or FIRST_SENTENCE_END.search(text.lstrip())):
+            self.refusal_checked = True
+            if REFUSAL_PATTERN.match(text[:REFUSAL_WINDOW]):
+                first_line = text.strip().split('\n', 1)[0][:120]
+                return f"response is a refusal: {first_line!r}"
+
+        if self.found_line:
+            return None
+
+        # Only scan text not seen before (with overlap for split matches)
+        start = max(0, self.scanned - len(self.required_line))
+        if self.required_line in text[start:]:
+            self.found_line = True
+            return None
+
+        if self.required_after and self.anchor_at is None:
+            anchor_start = max(0, self.scanned - len(self.required_after))
+            index = text.find(self.required_after, anchor_start)
+            if index >= 0:
+                self.anchor_at = index
+        self.scanned = len(text)
+
+        if final:
+            return f"response has no '{self.required_line}' line"
+        if self.anchor_at is not None and len(text) - self.anchor_at > self.lookahead:
+            return f"no '{self.required_line}' line after '{self.required_after}'"
+        return None
+
+
+def feedback_card_validator() -> StreamValidator:
+    """Validator for unifier responses (must contain the student feedback card)."""
+    return StreamValidator(required_line=FEEDBACK_CARD_LINE, required_after=FEEDBACK_CARD_HEADING)
+
+
+def partial_path(output_file: str | Path) -> Path:
+    """Path a streamed output is written to until it is complete."""
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.name + PARTIAL_SUFFIX)
+
+
+class StreamSink:
+    """Writes streamed text to <output>.partial and validates it as it arrives."""
+
+    def __init__(self, output_file: str | Path | None = None,
+                 validator: StreamValidator | None = None):
+        """
+        Args:
+            output_file: Final output path (None to only collect and validate)
+            validator: Optional incremental checks; failures raise StreamAborted
+        """
+        self.output_file = Path(output_file) if output_file else None
+        self.validator = validator
+        self.text = ''
+        self.handle = None
+
+    def start(self):
+        """Begin (or restart, on a retry) a response."""
+        self.close()
+        self.text = ''
+        if self.validator:
+            self.validator.reset()
+        if self.output_file:
+            self.output_file.parent.mkdir(parents=True, exist_ok=True)
+            self.handle = open(partial_path(self.output_file), 'w', encoding='utf-8')
+
+    def write(self, text: str):
+        """Append streamed text; raises StreamAborted if the response has gone wrong."""
+        if not text:
+            return
+        self.text += text
+        if self.handle:
+            self.handle.write(text)
+            self.handle.flush()
+
+        if self.validator:
+            reason = self.validator.check(self.text)
+            if reason:
+                raise StreamAborted(reason)
+
+    def finish(self, text: str | None = None) -> str:
+        """
+        Complete the response: validate it and move .partial into place.
+
+        Args:
+            text: Full response if known (e.g. from a cache hit); defaults to
+                  the streamed text
+
+        Raises:
+            StreamAborted: If the complete response fails validation
+        """
+        if text is None:
+            text = self.text
+        if text != self.text or (self.output_file and self.handle is None):
+            self.start()
+            self.text = text
+            if self.handle:
+                self.handle.write(text)
+
+        if self.validator:
+            reason = self.validator.check(text, final=True)
+            if reason:
+                self.discard()
+                raise StreamAborted(reason)
+
+        self.close()
+        if self.output_file:
+            os.replace(partial_path(self.output_file), self.output_file)
+        return text
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+    def discard(self):
+        """Drop an unfinished response."""
+        self.close()
+        if self.output_file:
+            partial_path(self.output_file).unlink(missing_ok=True)
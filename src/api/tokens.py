@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Local Token Estimates and Context-Window Fitting
+
+Counts prompt tokens before a call is sent, without a round trip to the
+provider, and makes oversized prompts fit the model's context window instead
+of letting the provider reject them after the upload.
+
+Estimates come from a local approximation of the providers' BPE tokenizers:
+text is pre-tokenized the way those vocabularies split it (words with their
+leading space, digit groups of up to three, single punctuation marks,
+whitespace runs) and long words count as several tokens. A per-provider
+factor accounts for the different vocabularies (Claude's tokenizer produces
+more tokens for the same text than OpenAI's o200k). When the tiktoken
+package is installed, OpenAI prompts are counted exactly with it.
+
+Context windows are configured per model under context_limits in
+configs/models.yaml (a provider name applies to all of that provider's
+models without an entry of their own). A prompt that does not fit in the
+window minus the output allowance is degraded in this order, each step
+applied only if the previous one was not enough:
+
+  1. Encoded blobs (base64 images and attachments pasted into cells, long
+     unbroken runs of data) are replaced by a short marker
+  2. Long cells (and long sections, e.g. one student's assessment in the
+     normalizer prompt) are cut to their first and last lines with a
+     marker, with a shrinking line cap until the prompt fits
+  3. The middle of the prompt is cut out with a marker
+
+The system prompt (rubric, marking scheme) is never changed. If it alone
+does not fit, the call fails before it is sent. Set LLM_CONTEXT_FIT=off to
+send prompts unchanged.
+
+Estimated and actual token counts are both recorded in the stats file, so
+the estimator can be checked against real usage with the calibrate command.
+
+Usage:
+  python3 tokens.py estimate --provider claude < prompt.txt
+  python3 tokens.py calibrate <assignment>/processed/stats/token_usage.jsonl
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+from model_table import load_model_table
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MODELS_CONFIG = PROJECT_ROOT / "configs" / "models.yaml"
+
+# Pre-tokenizer in the style of the providers' BPE vocabularies: letter runs
+# with their leading space, digit groups of up to three, newline runs, other
+# whitespace runs and single remaining characters (punctuation, non-ASCII)
+PIECES = re.compile(r" ?[A-Za-z]+| ?\d{1,3}|\n+|[ \t]+|[^\sA-Za-z\d]")
+
+# Letters covered by one token of a long word (short words are one token)
+CHARS_PER_WORD_TOKEN = 8
+
+# Tokens per piece for each provider's tokenizer, relative to the estimate
+PROVIDER_FACTORS = {
+    'claude': 1.15,
+    'gemini': 1.0,
+    'openai': 1.0,
+}
+
+# Share of the context window kept free for estimation error
+SAFETY_MARGIN = 0.05
+
+# Encoded data: data URIs and unbroken runs without whitespace
+BLOB_PATTERN = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=\s]{64,}|[A-Za-z0-9+/=]{400,}")
+
+# Lines that start a cell or section in the agents' prompts: "Cell 3 [code]:"
+# (freeform marker, unifier), "[code]" (activity marker) and
+# "## Student 2: Name" (normalizer)
+SECTION_HEADER = re.compile(r"^(?:Cell \d+ \[\w+\]:|\[(?:code|markdown|raw)\]|## Student \d+:.*)$",
+                            re.MULTILINE)
+
+# Line caps tried in turn for long cells/sections (first and last lines kept)
+LINE_CAPS = (400, 200, 100, 50, 20, 8)
+
+# tiktoken encoding, when the package is available (None if not installed)
+_encoding = False
+
+
+class ContextOverflow(ValueError):
+    """Raised when a prompt cannot be made to fit the model's context window."""
+
+
+def _normalize_provider(provider: str | None) -> str:
+    provider = (provider or '').lower()
+    if provider in ('anthropic', 'claude'):
+        return 'claude'
+    if provider in ('google', 'gemini'):
+        return 'gemini'
+    if provider in ('openai', 'codex'):
+        return 'openai'
+    return provider
+
+
+def _tiktoken_encoding():
+    global _encoding
+    if _encoding is False:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def _count_pieces(text: str) -> int:
+    count = 0
+    for match in PIECES.finditer(text):
+        piece = match.group()
+        if piece[-1].isalpha():
+            count += 1 + (len(piece.strip()) - 1) // CHARS_PER_WORD_TOKEN
+        elif piece[0] in ' \t':
+            count += 1 + len(piece) // 16
+        else:
+            count += 1
+    return count
+
+
+def count_tokens(text: str | None, provider: str | None = None) -> int:
+    """
+    Estimated token count of text for a provider's tokenizer.
+
+    Args:
+        text: Text to count
+        provider: claude, gemini or openai (or their aliases); None for no
+                  provider-specific factor
+    """
+    if not text:
+        return 0
+    provider = _normalize_provider(provider)
+    if provider == 'openai':
+        encoding = _tiktoken_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(_count_pieces(text) * PROVIDER_FACTORS.get(provider, 1.0))
+
+
+def estimate_prompt_tokens(prompt: str, system_prompt: str | None, provider: str | None) -> int:
+    """Estimated input tokens of a request (prompt plus system prompt)."""
+    return count_tokens(prompt, provider) + count_tokens(system_prompt, provider)
+
+
+def load_context_limits(models_config: Path = MODELS_CONFIG) -> dict:
+    """Return {model or provider: tokens} from models.yaml (via the compiled model table)."""
+    return load_model_table(models_config).get('context_limits', {})
+
+
+def context_limit(provider: str | None, model: str | None) -> int | None:
+    """Context window for a model, falling back to its provider's entry (None if unknown)."""
+    limits = load_context_limits()
+    if model and model in limits:
+        return limits[model]
+
+    provider = _normalize_provider(provider)
+    for name, tokens in limits.items():
+        if _normalize_provider(name) == provider:
+            return tokens
+    return None
+
+
+def _collapse_blobs(text: str) -> tuple[str, int]:
+    def marker(match):
+        return f"[... {len(match.group())} characters of encoded data removed ...]"
+    return BLOB_PATTERN.subn(marker, text)
+
+
+def _split_sections(text: str) -> list[str]:
+    """Split text before each cell/section header (the first part is the text
+    before the first header, empty if the text starts with one)."""
+    starts = [m.start() for m in SECTION_HEADER.finditer(text)]
+    bounds = [0] + [s for s in starts if s > 0] + [len(text)]
+    if starts and starts[0] == 0:
+        bounds.insert(0, 0)
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def _cap_lines(section: str, max_lines: int) -> tuple[str, bool]:
+    """Keep the header, first and last lines of a section longer than max_lines."""
+    lines = section.split('\n')
+    if len(lines) <= max_lines:
+        return section, False
+    head = max(1, max_lines * 2 // 3)
+    tail = max(1, max_lines - head)
+    removed = len(lines) - head - tail
+    marker = f"[... {removed} lines truncated to fit the model's context window ...]"
+    return '\n'.join(lines[:head] + [marker] + lines[-tail:]), True
+
+
+def _cut_middle(text: str, keep_chars: int) -> str:
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    removed = len(text) - head - tail
+    marker = f"\n[... {removed} characters truncated to fit the model's context window ...]\n"
+    return text[:head] + marker + text[len(text) - tail:]
+
+
+def fit_prompt(prompt: str, system_prompt: str | None, provider: str | None,
+               model: str | None, max_output_tokens: int) -> tuple[str, dict]:
+    """
+    Estimate the input tokens of a request and degrade the prompt if it does
+    not fit the model's context window.
+
+    Args:
+        prompt: User prompt (variable content; the part that may be degraded)
+        system_prompt: System prompt (never changed)
+        provider: Provider name
+        model: Model name (its context_limits entry, else the provider's)
+        max_output_tokens: Output allowance reserved in the window
+
+    Returns:
+        (prompt, stats) where stats has estimated_input_tokens and, when the
+        prompt was degraded, estimated_input_tokens_unfitted and context_fit
+        (the steps applied)
+
+    Raises:
+        ContextOverflow: If the system prompt alone does not fit
+    """
+    estimated = estimate_prompt_tokens(prompt, system_prompt, provider)
+    stats = {'estimated_input_tokens': estimated}
+
+    limit = context_limit(provider, model)
+    if not limit or os.environ.get('LLM_CONTEXT_FIT', '').lower() in ('off', '0', 'false', 'no'):
+        return prompt, stats
+
+    budget = int(limit * (1 - SAFETY_MARGIN)) - max_output_tokens
+    if estimated <= budget:
+        return prompt, stats
+
+    system_tokens = count_tokens(system_prompt, provider)
+    prompt_budget = budget - system_tokens
+    if prompt_budget <= 0:
+        raise ContextOverflow(
+            f"Prompt is too long for {model or provider}: the system prompt alone is "
+            f"~{system_tokens} tokens of a {limit}-token context window "
+            f"({max_output_tokens} reserved for output)"
+        )
+
+    steps = []
+    fitted, blobs = _collapse_blobs(prompt)
+    if blobs:
+        steps.append(f"collapsed {blobs} encoded blobs")
+    prompt_tokens = count_tokens(fitted, provider)
+
+    if prompt_tokens > prompt_budget:
+        sections = _split_sections(fitted)
+        for max_lines in LINE_CAPS:
+            # The text before the first header (task instructions) is kept whole
+            capped = [(sections[0], False)] + [_cap_lines(section, max_lines) for section in sections[1:]]
+            truncated = sum(1 for _, was_capped in capped if was_capped)
+            candidate = ''.join(section for section, _ in capped)
+            if truncated:
+                fitted = candidate
+                prompt_tokens = count_tokens(fitted, provider)
+                if prompt_tokens <= prompt_budget:
+                    break
+        if truncated:
+            steps.append(f"truncated {truncated} cells/sections to {max_lines} lines")
+
+    if prompt_tokens > prompt_budget:
+        # Scale the kept characters by the remaining overshoot until it fits
+        keep_chars = len(fitted)
+        while prompt_tokens > prompt_budget and keep_chars > 0:
+            keep_chars = int(keep_chars * prompt_budget / prompt_tokens * 0.98)
+            candidate = _cut_middle(fitted, keep_chars)
+            prompt_tokens = count_tokens(candidate, provider)
+        steps.append(f"cut {len(fitted) - keep_chars} characters from the middle")
+        fitted = candidate
+
+    stats['estimated_input_tokens_unfitted'] = estimated
+    stats['estimated_input_tokens'] = system_tokens + prompt_tokens
+    stats['context_fit'] = steps
+    print(f"Warning: prompt of ~{estimated} tokens exceeds the {limit}-token context of "
+          f"{model or provider}; {'; '.join(steps)}", file=sys.stderr)
+    return fitted, stats
+
+
+def actual_input_tokens(provider: str, entry: dict) -> int:
+    """Input tokens a stats record reports, including cached tokens."""
+    input_tokens = entry.get('input_tokens', 0) or 0
+    if _normalize_provider(provider) == 'claude':
+        # Anthropic reports cache writes and reads separately from input_tokens
+        input_tokens += (entry.get('cache_creation_tokens', 0) or 0) + (entry.get('cache_read_tokens', 0) or 0)
+    return input_tokens
+
+
+def calibrate(stats_files: list[Path]) -> dict:
+    """
+    Compare estimated and actual input tokens in stats files.
+
+    Returns:
+        {(provider, model): {'calls': n, 'ratios': [actual / estimated, ...]}}
+        for live calls (cache hits and records without an estimate skipped)
+    """
+    results = {}
+    for stats_file in stats_files:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                estimated = entry.get('estimated_input_tokens')
+                if not estimated or entry.get('response_cache') == 'hit':
+                    continue
+                actual = actual_input_tokens(entry.get('provider', ''), entry)
+                if not actual:
+                    continue
+                key = (entry.get('provider', ''), entry.get('model', ''))
+                results.setdefault(key, {'calls': 0, 'ratios': []})
+                results[key]['calls'] += 1
+                results[key]['ratios'].append(actual / estimated)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local token estimates and context fitting')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    estimate_parser = subparsers.add_parser('estimate', help='Estimate the tokens of text on stdin')
+    estimate_parser.add_argument('--provider', default='')
+    estimate_parser.add_argument('--model', default='')
+    estimate_parser.add_argument('--system-prompt-file', help='System prompt sent with the prompt')
+    estimate_parser.add_argument('--max-tokens', type=int, default=8192,
+                                 help='Output allowance (default: 8192)')
+
+    calibrate_parser = subparsers.add_parser('calibrate',
+                                             help='Compare estimated and actual tokens in stats files')
+    calibrate_parser.add_argument('stats_files', nargs='+', type=Path)
+
+    args = parser.parse_args()
+
+    if args.command == 'estimate':
+        prompt = sys.stdin.read()
+        system_prompt = None
+        if args.system_prompt_file:
+            with open(args.system_prompt_file, 'r', encoding='utf-8') as f:
+                system_prompt = f.read()
+        limit = context_limit(args.provider, args.model)
+        try:
+            _, stats = fit_prompt(prompt, system_prompt, args.provider, args.model, args.max_tokens)
+        except ContextOverflow as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        print(f"Estimated input tokens: {stats.get('estimated_input_tokens_unfitted', stats['estimated_input_tokens'])}")
+        print(f"Context window: {limit or 'not configured'}")
+        if 'context_fit' in stats:
+            print(f"Fitted to ~{stats['estimated_input_tokens']} tokens: {'; '.join(stats['context_fit'])}")
+        return
+
+    results = calibrate(args.stats_files)
+    if not results:
+        print("No live calls with token estimates found")
+        return
+    print(f"{'Provider':<10} {'Model':<28} {'Calls':>6} {'Median':>8} {'Min':>6} {'Max':>6}  (actual / estimated)")
+    for (provider, model), entry in sorted(results.items()):
+        ratios = sorted(entry['ratios'])
+        median = ratios[len(ratios) // 2]
+        print(f"{provider:<10} {model:<28} {entry['calls']:>6} {median:>8.2f} "
+              f"{ratios[0]:>6.2f} {ratios[-1]:>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
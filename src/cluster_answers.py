@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate answer clustering for Stage 4 (structured assignments).
+
+Beyond exact duplicates (dedup_answers.py), large classes have groups of
+very similar answers: starter code, a shared tutorial, common LLM output.
+Each activity answer is turned into a set of token shingles and a MinHash
+signature; an LSH index over the signatures finds candidate pairs, whose
+shingle sets are then compared exactly. Answers at or above the similarity
+threshold (Jaccard, default 0.8) are clustered around a representative,
+which gets a full marking. The other members get a short "confirm or adjust
+the representative's marking" prompt (marker.py --reference-marking), which
+can run on a cheaper model.
+
+Cells copied unchanged from the base notebook's section for the activity
+(instructions, starter code) are left out before tokenizing, so shared
+template text does not make different answers look alike; answers with
+fewer than MIN_TOKENS tokens of their own are not clustered.
+
+Everything is computed locally from the notebooks; no embeddings or LLM
+calls are involved.
+
+Outputs:
+  --members    student|A<n>|representative|representative submission per
+               member to verify
+  --clusters   JSON export of every cluster (for instructor review)
+
+Usage:
+  python3 cluster_answers.py --base-notebook lab1.ipynb \\
+      --manifest processed/submissions_manifest.json --name-mapping processed/name_mapping.json --num-activities 7 \\
+      --markings-dir processed/markings --exclude processed/unattempted.txt \\
+      --exclude processed/answer_duplicates.txt \\
+      --members processed/cluster_members.txt --clusters processed/answer_clusters.json
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Set
+
+from dedup_answers import read_task_list
+from activity_bundles import load_activities
+from skip_unattempted import canonical_names, normalize_source
+
+DEFAULT_THRESHOLD = 0.8
+
+# Answers with fewer tokens outside the template cells are marked in full:
+# in a short answer a small change can be the whole difference
+MIN_TOKENS = 30
+
+# Tokens per shingle
+SHINGLE_SIZE = 5
+
+# MinHash permutations, split into LSH bands of BAND_ROWS rows: pairs with a
+# Jaccard similarity of about (1 / bands) ** (1 / rows) = 0.5 or more become
+# candidates, well below any useful threshold
+NUM_PERM = 64
+BAND_ROWS = 4
+
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], 'big') % (_PRIME - 1) + 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], 'big') % _PRIME)
+    for i in range(NUM_PERM)
+]
+
+CODE_TOKEN = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+COMMENT = re.compile(r"#.*$", re.MULTILINE)
+
+
+def answer_tokens(cells: List[Dict], template: Set[str] = frozenset()) -> List[str]:
+    """
+    Tokens of an answer: code without comments, markdown as lower-case words.
+
+    Cells whose normalized source is in template (the base notebook's cells
+    for the activity) are skipped.
+    """
+    tokens = []
+    for cell in cells:
+        if normalize_source(cell['source']) in template:
+            continue
+        if cell['cell_type'] == 'code':
+            tokens.extend(CODE_TOKEN.findall(COMMENT.sub('', cell['source'])))
+        else:
+            tokens.extend(re.findall(r"\w+", cell['source'].lower()))
+    return tokens
+
+
+def shingles(tokens: List[str]) -> set:
+    """Hashed SHINGLE_SIZE-token shingles (one shingle for shorter answers)."""
+    size = min(SHINGLE_SIZE, len(tokens))
+    return {
+        int.from_bytes(hashlib.blake2b('\x00'.join(tokens[i:i + size]).encode('utf-8'),
+                                       digest_size=8).digest(), 'big')
+        for i in range(len(tokens) - size + 1)
+    } if tokens else set()
+
+
+def minhash(shingle_set: set) -> tuple:
+    """MinHash signature of a non-empty shingle set."""
+    return tuple(min((a * h + b) % _PRIME for h in shingle_set) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def similar_pairs(signatures: List[tuple], shingle_sets: List[set], threshold: float) -> Dict[int, Dict[int, float]]:
+    """
+    Pairs of answers with a Jaccard similarity of at least threshold.
+
+    Candidates come from the LSH bands; each is confirmed on the exact
+    shingle sets.
+
+    Returns:
+        Map of answer index to {similar answer index: similarity}
+    """
+    buckets = {}
+    for index, signature in enumerate(signatures):
+        for start in range(0, NUM_PERM, BAND_ROWS):
+            buckets.setdefault((start, signature[start:start + BAND_ROWS]), []).append(index)
+
+    candidates = set()
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                candidates.add((first, second))
+
+    neighbours = {index: {} for index in range(len(signatures))}
+    for first, second in candidates:
+        similarity = jaccard(shingle_sets[first], shingle_sets[second])
+        if similarity >= threshold:
+            neighbours[first][second] = neighbours[second][first] = similarity
+    return neighbours
+
+
+def cluster(answers: List[Dict], neighbours: Dict[int, Dict[int, float]]) -> List[Dict]:
+    """
+    Group answers around representatives.
+
+    Every member is within the threshold of its representative (not merely
+    of another member). The representative is the answer with the most
+    similar answers left, preferring one that is already marked (resume).
+
+    Returns:
+        Clusters of at least two answers: {'representative': index,
+        'members': [(index, similarity)]}
+    """
+    unassigned = set(range(len(answers)))
+    clusters = []
+    while True:
+        degree = {i: sum(1 for j in neighbours[i] if j in unassigned) for i in unassigned}
+        if not degree or max(degree.values()) == 0:
+            return clusters
+        representative = max(degree, key=lambda i: (answers[i]['done'], degree[i], -i))
+        members = sorted(((j, s) for j, s in neighbours[representative].items() if j in unassigned),
+                         key=lambda item: (-item[1], item[0]))
+        unassigned.discard(representative)
+        unassigned.difference_update(j for j, _ in members)
+        clusters.append({'representative': representative, 'members': members})
+
+
+def plan(base_notebook: str, manifest: Dict, names: Dict[str, str], num_activities: int,
+         markings_dir: Path, exclude: set, threshold: float, resume: bool) -> List[Dict]:
+    """
+    Cluster near-duplicate answers of every activity.
+
+    Returns:
+        Clusters as exported: {'activity', 'representative': {'student',
+        'submission'}, 'members': [{'student', 'submission', 'similarity',
+        'verify'}]}; verify is false for members already marked (resume)
+    """
+    base = load_activities(base_notebook)
+    if base is None:
+        raise RuntimeError(f"Cannot read base notebook: {base_notebook}")
+    template = {activity: {normalize_source(c['source']) for c in cells} for activity, cells in base.items()}
+
+    by_activity = {}
+    for submission in manifest.get('submissions', []):
+        path = submission['path']
+        student = names[path]
+        activities = load_activities(path) or {}
+
+        for n in range(1, num_activities + 1):
+            activity = f"A{n}"
+            if f"{student}|{activity}" in exclude or activity not in activities:
+                continue
+            tokens = answer_tokens(activities[activity], template.get(activity, set()))
+            if len(tokens) < MIN_TOKENS:
+                continue
+            shingle_set = shingles(tokens)
+            done = resume and (markings_dir / f"{student}_{activity}.md").exists()
+            by_activity.setdefault(activity, []).append(
+                {'student': student, 'submission': path, 'done': done, 'shingles': shingle_set})
+
+    exported = []
+    for activity, answers in sorted(by_activity.items(), key=lambda item: int(item[0][1:])):
+        sets = [a['shingles'] for a in answers]
+        neighbours = similar_pairs([minhash(s) for s in sets], sets, threshold)
+        for group in cluster(answers, neighbours):
+            representative = answers[group['representative']]
+            exported.append({
+                'activity': activity,
+                'representative': {'student': representative['student'],
+                                   'submission': representative['submission']},
+                'members': [{'student': answers[j]['student'], 'submission': answers[j]['submission'],
+                             'similarity': round(similarity, 3), 'verify': not answers[j]['done']}
+                            for j, similarity in group['members']],
+            })
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate activity answers")
+    parser.add_argument("--base-notebook", required=True, help="Base (template) notebook")
+    parser.add_argument("--manifest", required=True, help="Submissions manifest JSON")
+    parser.add_argument("--name-mapping", help="name_mapping.json from name resolution (optional)")
+    parser.add_argument("--num-activities", type=int, required=True, help="Number of activities")
+    parser.add_argument("--markings-dir", required=True, help="Directory of marking files")
+    parser.add_argument("--exclude", action="append", default=[],
+                        help="student|activity list of tasks to leave out (repeatable)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Jaccard similarity for answers to cluster (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--members", required=True,
+                        help="Output: student|activity|representative|submission per member to verify")
+    parser.add_argument("--clusters", required=True, help="Output: clusters JSON for review")
+    parser.add_argument("--no-resume", action="store_true", help="Also cluster tasks whose marking exists")
+
+    args = parser.parse_args()
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    names = canonical_names(manifest, Path(args.name_mapping) if args.name_mapping else None)
+    exclude = set().union(*(read_task_list(path) for path in args.exclude))
+
+    try:
+        clusters = plan(args.base_notebook, manifest, names, args.num_activities,
+                        Path(args.markings_dir), exclude, args.threshold, resume=not args.no_resume)
+    except RuntimeError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    verify = 0
+    with open(args.members, 'w', encoding='utf-8') as f:
+        for group in clusters:
+            for member in group['members']:
+                if member['verify']:
+                    representative = group['representative']
+                    f.write(f"{member['student']}|{group['activity']}|"
+                            f"{representative['student']}|{representative['submission']}\n")
+                    verify += 1
+    with open(args.clusters, 'w', encoding='utf-8') as f:
+        json.dump({'threshold': args.threshold, 'clusters': clusters}, f, indent=2)
+
+    clustered = sum(len(group['members']) + 1 for group in clusters)
+    print(f"✓ {len(clusters)} clusters of near-duplicate answers ({clustered} answers, "
+          f"similarity >= {args.threshold:.0%}): {verify} marker tasks will verify "
+          f"their representative's marking")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,6 @@ Example:
 """
 
 import argparse
-import json
 import re
 import subprocess
 import sys
@@ -28,6 +27,7 @@ from pathlib import Path
 # Add src/utils to path for imports
 sys.path.insert(0, str(Path(__file__).parent / 'utils'))
 from system_config import resolve_provider_from_model, format_available_models
+from notebook_reader import read_notebook
 
 
 def load_notebook(notebook_path: Path) -> dict:
@@ -38,8 +38,7 @@ def load_notebook(notebook_path: Path) -> dict:
     if not notebook_path.suffix == '.ipynb':
         raise ValueError(f"Not a Jupyter notebook: {notebook_path}")
 
-    with open(notebook_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return read_notebook(str(notebook_path))
 
 
 def get_notebook_summary(notebook: dict) -> str:
@@ -185,10 +184,10 @@ def call_llm(prompt: str, provider: str, model: str = None, api_model: str = Non
     if not llm_caller.exists():
         raise FileNotFoundError(f"llm_caller.sh not found at {llm_caller}")
 
-    # Call llm_caller.sh in headless mode
+    # Call llm_caller.sh in headless mode (prompt on stdin, not in argv)
     cmd = [
         str(llm_caller),
-        "--prompt", prompt,
+        "--prompt-file", "-",
         "--mode", "headless",
         "--provider", provider,
         "--auto-approve"  # Skip permission prompts for automated operation
@@ -203,6 +202,7 @@ def call_llm(prompt: str, provider: str, model: str = None, api_model: str = Non
     try:
         result = subprocess.run(
             cmd,
+            input=prompt,
             capture_output=True,
             text=True,
             check=True,
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Answer-level deduplication for Stage 4 (structured assignments).
+
+Students often submit the same answer for an activity, byte for byte or
+differing only in whitespace and comments. Each extracted activity answer is
+canonicalized and hashed:
+
+  code cells      AST dump (comments, docstrings and formatting dropped);
+                  cells that do not parse (e.g. IPython magics) fall back to
+                  their lines without comments and surplus whitespace
+  markdown cells  lower-cased with whitespace collapsed
+
+Only one marker call is made per unique (activity, hash): one student with
+that answer is marked (the first in the manifest, or on resume one already
+marked), and the marking is copied to the other students with the same
+answer, with its submission path rewritten. Representatives are marked with
+marker.py --anonymous, so the shared marking names no student; which
+students share a marking is recorded only in the groups file.
+
+Commands:
+  plan     Group the answers of the tasks still to run. Writes the skip list
+           (student|A<n> of every non-representative answer), the
+           representatives list (student|A<n> to mark anonymously) and the
+           groups file used by fanout, and records the dedup ratio per
+           activity.
+  fanout   After the marker has run, copy each representative's marking to
+           the other students in its group.
+
+Usage:
+  python3 dedup_answers.py plan --manifest processed/submissions_manifest.json \\
+      --name-mapping processed/name_mapping.json --num-activities 7 \\
+      --markings-dir processed/markings --exclude processed/unattempted.txt \\
+      --skip-list processed/answer_duplicates.txt \\
+      --representatives processed/answer_representatives.txt \\
+      --groups processed/answer_groups.json --report processed/stats/answer_dedup.json
+  python3 dedup_answers.py fanout --groups processed/answer_groups.json \\
+      --markings-dir processed/markings
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from activity_bundles import load_activities
+from skip_unattempted import canonical_names
+
+# IPython magics and shell escapes, which ast cannot parse
+MAGIC_LINE = re.compile(r'^\s*[%!]')
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def canonical_code(source: str) -> str:
+    """Canonical form of a code cell (AST dump without comments and docstrings)."""
+    code = '\n'.join(line for line in source.splitlines() if not MAGIC_LINE.match(line))
+    try:
+        tree = ast.parse(code)
+        return ast.dump(_strip_docstrings(tree), annotate_fields=False) if tree.body else ''
+    except (SyntaxError, ValueError):
+        # Not valid Python: compare the lines without comments and extra spaces
+        lines = (re.sub(r'\s+', ' ', line.split('#', 1)[0]).strip() for line in source.splitlines())
+        return '\n'.join(line for line in lines if line)
+
+
+def canonical_markdown(source: str) -> str:
+    """Canonical form of a markdown cell (whitespace collapsed, lower case)."""
+    return ' '.join(source.split()).lower()
+
+
+def answer_hash(cells: List[Dict]) -> str:
+    """Hash of an activity answer's canonical cells (empty cells ignored)."""
+    parts = []
+    for cell in cells:
+        if cell['cell_type'] == 'code':
+            canonical = canonical_code(cell['source'])
+        else:
+            canonical = canonical_markdown(cell['source'])
+        if canonical:
+            parts.append(f"{cell['cell_type']}:{canonical}")
+    return hashlib.sha256('\n\x00'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def read_task_list(path: Optional[str]) -> set:
+    """student|activity lines of a skip list (empty set if not given)."""
+    if not path or not Path(path).exists():
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def plan(manifest: Dict, names: Dict[str, str], num_activities: int, markings_dir: Path,
+         exclude: set, resume: bool) -> tuple[List[Dict], Dict]:
+    """
+    Group identical answers across students, per activity.
+
+    In resume mode a student whose marking already exists is preferred as
+    the representative of their group (no new call is needed for it) and
+    is not written to again.
+
+    Returns:
+        (groups, report): groups are {'activity', 'hash', 'representative',
+        'members': [{'student', 'submission'}]} for answers shared by more
+        than one student, members being the students still to be marked;
+        report maps activity to answer counts and its dedup ratio
+    """
+    by_answer = {}
+    for submission in manifest.get('submissions', []):
+        path = submission['path']
+        student = names[path]
+        activities = load_activities(path) or {}
+
+        for n in range(1, num_activities + 1):
+            activity = f"A{n}"
+            if f"{student}|{activity}" in exclude or activity not in activities:
+                continue
+            done = resume and (markings_dir / f"{student}_{activity}.md").exists()
+            key = (activity, answer_hash(activities[activity]))
+            by_answer.setdefault(key, []).append({'student': student, 'submission': path, 'done': done})
+
+    groups = []
+    report = {}
+    for (activity, digest), answers in by_answer.items():
+        counts = report.setdefault(activity, {'answers': 0, 'unique': 0})
+        counts['answers'] += len(answers)
+        counts['unique'] += 1
+
+        representative = next((a for a in answers if a['done']), answers[0])
+        members = [a for a in answers if a is not representative and not a['done']]
+        if members:
+            groups.append({'activity': activity, 'hash': digest,
+                           'representative': _student(representative),
+                           'members': [_student(m) for m in members]})
+
+    for counts in report.values():
+        counts['calls_saved'] = counts['answers'] - counts['unique']
+        counts['dedup_ratio'] = round(counts['calls_saved'] / counts['answers'], 4)
+    return groups, dict(sorted(report.items(), key=lambda item: int(item[0][1:])))
+
+
+def _student(answer: Dict) -> Dict:
+    return {'student': answer['student'], 'submission': answer['submission']}
+
+
+def rewrite_marking(text: str, representative: Dict, member: Dict) -> str:
+    """
+    Marking of the representative rewritten for another student.
+
+    The marking was made without the student's name (marker.py --anonymous),
+    so only the submission path is changed.
+    """
+    return text.replace(representative['submission'], member['submission'])
+
+
+def fanout(groups: List[Dict], markings_dir: Path) -> tuple[int, int]:
+    """
+    Copy representatives' markings to the rest of their groups.
+
+    Returns:
+        (markings written, groups whose representative has no marking)
+    """
+    written = missing = 0
+    for group in groups:
+        representative = group['representative']
+        source = markings_dir / f"{representative['student']}_{group['activity']}.md"
+        if not source.exists():
+            missing += 1
+            continue
+        text = source.read_text(encoding='utf-8')
+        for member in group['members']:
+            output = markings_dir / f"{member['student']}_{group['activity']}.md"
+            output.write_text(rewrite_marking(text, representative, member), encoding='utf-8')
+            written += 1
+    return written, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark identical activity answers once")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = subparsers.add_parser('plan', help='Group identical answers before Stage 4')
+    plan_parser.add_argument("--manifest", required=True, help="Submissions manifest JSON")
+    plan_parser.add_argument("--name-mapping", help="name_mapping.json from name resolution (optional)")
+    plan_parser.add_argument("--num-activities", type=int, required=True, help="Number of activities")
+    plan_parser.add_argument("--markings-dir", required=True, help="Directory of marking files")
+    plan_parser.add_argument("--exclude", help="student|activity list of tasks not to mark (e.g. unattempted)")
+    plan_parser.add_argument("--skip-list", required=True, help="Output: student|activity per deduplicated task")
+    plan_parser.add_argument("--representatives",
+                             help="Output: student|activity per representative (marked anonymously)")
+    plan_parser.add_argument("--groups", required=True, help="Output: groups JSON for fanout")
+    plan_parser.add_argument("--report", help="Output: dedup ratio per activity (JSON)")
+    plan_parser.add_argument("--no-resume", action="store_true", help="Also group tasks whose marking exists")
+
+    fanout_parser = subparsers.add_parser('fanout', help='Copy markings to identical answers after Stage 4')
+    fanout_parser.add_argument("--groups", required=True, help="Groups JSON written by plan")
+    fanout_parser.add_argument("--markings-dir", required=True, help="Directory of marking files")
+
+    args = parser.parse_args()
+    markings_dir = Path(args.markings_dir)
+
+    if args.command == 'fanout':
+        try:
+            with open(args.groups, 'r', encoding='utf-8') as f:
+                groups = json.load(f)
+        except (OSError, ValueError):
+            groups = []
+        written, missing = fanout(groups, markings_dir)
+        message = f"✓ Copied {written} markings to students with identical answers"
+        if missing:
+            message += f" ({missing} groups skipped: representative marking missing)"
+        print(message)
+        return
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    names = canonical_names(manifest, Path(args.name_mapping) if args.name_mapping else None)
+    groups, report = plan(manifest, names, args.num_activities, markings_dir,
+                          read_task_list(args.exclude), resume=not args.no_resume)
+
+    with open(args.skip_list, 'w', encoding='utf-8') as f:
+        for group in groups:
+            for member in group['members']:
+                f.write(f"{member['student']}|{group['activity']}\n")
+    if args.representatives:
+        with open(args.representatives, 'w', encoding='utf-8') as f:
+            for group in groups:
+                f.write(f"{group['representative']['student']}|{group['activity']}\n")
+    with open(args.groups, 'w', encoding='utf-8') as f:
+        json.dump(groups, f, indent=2)
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    answers = sum(c['answers'] for c in report.values())
+    saved = sum(c['calls_saved'] for c in report.values())
+    ratio = f" ({saved / answers:.1%})" if answers else ""
+    print(f"✓ {saved} of {answers} marker tasks share an identical answer{ratio}: "
+          f"{answers - saved} marker calls needed")
+    for activity, counts in report.items():
+        if counts['calls_saved']:
+            print(f"  {activity}: {counts['unique']} unique of {counts['answers']} answers "
+                  f"({counts['dedup_ratio']:.1%} of calls saved)")
+
+
+if __name__ == "__main__":
+    main()
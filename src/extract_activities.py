@@ -13,6 +13,9 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import argparse
 
+sys.path.insert(0, str(Path(__file__).parent / 'utils'))
+from notebook_reader import NotebookFormatError, read_notebook
+
 
 class ActivityExtractionError(Exception):
     """Raised when activity extraction fails."""
@@ -50,20 +53,15 @@ class ActivityExtractor:
             True if successful, False otherwise
         """
         try:
-            with open(self.notebook_path, 'r', encoding='utf-8') as f:
-                self.notebook = json.load(f)
-
-            # Validate basic structure
-            if 'cells' not in self.notebook:
-                raise ActivityExtractionError("Notebook missing 'cells' field")
-
+            # Cells without their outputs; read_notebook checks the structure
+            self.notebook = read_notebook(str(self.notebook_path))
             self.cells = self.notebook['cells']
             return True
 
-        except json.JSONDecodeError as e:
-            self.errors.append(f"Invalid JSON: {e}")
+        except NotebookFormatError as e:
+            self.errors.append(str(e))
             if self.strict:
-                raise ActivityExtractionError(f"Invalid JSON: {e}")
+                raise ActivityExtractionError(str(e))
             return False
 
         except Exception as e:
@@ -13,6 +13,9 @@ import sys
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
+sys.path.insert(0, str(Path(__file__).parent / 'utils'))
+from notebook_reader import NotebookFormatError, iter_cells
+
 
 class SubmissionFinder:
     """Find and validate student submissions."""
@@ -198,24 +201,15 @@ class SubmissionFinder:
             if file_size > 50 * 1024 * 1024:  # 50 MB
                 return False, f"File too large ({file_size / 1024 / 1024:.1f} MB)"
 
-            # Try to parse as JSON
-            with open(notebook_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Check basic notebook structure
-            if not isinstance(data, dict):
-                return False, "Not a valid notebook structure"
-
-            if 'cells' not in data:
-                return False, "Missing 'cells' field"
-
-            if not isinstance(data['cells'], list):
-                return False, "'cells' is not a list"
+            # Parse the JSON and check the notebook structure (streamed,
+            # without building the cell outputs)
+            for _ in iter_cells(str(notebook_path)):
+                pass
 
             return True, None
 
-        except json.JSONDecodeError as e:
-            return False, f"Invalid JSON: {e}"
+        except NotebookFormatError as e:
+            return False, str(e)
 
         except Exception as e:
             return False, f"Validation error: {e}"
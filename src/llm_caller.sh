@@ -26,7 +26,21 @@
 #
 # Prompt (one required):
 #   --prompt <text>         Prompt text
-#   --prompt-file <file>    Read prompt from file
+#   --prompt-file <file>    Read prompt from file ('-' for stdin)
+#
+#   Headless calls hand the prompt to the CLI (or API caller) on stdin or as
+#   a file, never on the command line, so prompt size is not limited by
+#   ARG_MAX. Use --prompt-file for large prompts: --prompt itself is an
+#   argument (128 KiB max on Linux). Interactive CLIs take the prompt as an
+#   argument, since their stdin is the terminal.
+#
+# System prompt (optional):
+#   --system-prompt-file <file>
+#                           Static prefix shared by many calls (instructions,
+#                           rubric). Sent as the system prompt (API mode,
+#                           Claude Code --append-system-prompt-file) so
+#                           providers can cache it; prepended to the prompt
+#                           for CLIs without a system prompt option.
 #
 # Optional:
 #   --model <name>          Model to use for CLI calls (passed directly to CLI)
@@ -34,7 +48,11 @@
 #                           instead of CLI for headless calls (requires SDK + API key)
 #   --max-tokens <n>        Max output tokens for API calls (default: 8192)
 #   --mode <mode>           interactive or headless (default: interactive)
-#   --output <file>         Capture output to file
+#   --output <file>         Capture output to file (headless: written to
+#                           <file>.partial and renamed when the call succeeds)
+#   --stream                Headless CLI mode: pass response text through as it
+#                           is generated (Claude Code, Codex) instead of when
+#                           the call ends; API mode always streams --output
 #   --working-dir <dir>     Set working directory for file operations
 #   --auto-approve          Skip all permission prompts (use with caution)
 #   --write-dirs <dirs>     Space-separated list of directories to allow writes
@@ -70,6 +88,7 @@ API_MODEL=""
 MODE="interactive"
 PROMPT=""
 PROMPT_FILE=""
+SYSTEM_PROMPT_FILE=""
 OUTPUT_FILE=""
 WORKING_DIR=""
 AUTO_APPROVE=false
@@ -81,6 +100,8 @@ STATS_CONTEXT=""
 MAX_TOKENS=""
 MODEL_FROM_CLI=false
 API_MODEL_FROM_CLI=false
+CACHE_STATUS=""  # "miss" when the response cache is enabled and missed
+STREAM=false
 
 # Script directory for finding models.yaml
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
@@ -95,6 +116,22 @@ show_help() {
     exit 0
 }
 
+# ============================================================================
+# Compiled model table (src/utils/model_table.py): provider, default model and
+# expensive lookups from models.yaml as case statements, recompiled only when
+# models.yaml is newer than the table
+# ============================================================================
+MODEL_TABLE="$PROJECT_ROOT/configs/.models.compiled.sh"
+
+load_model_table() {
+    if [[ -f "$MODELS_CONFIG" && -f "$MODEL_TABLE" && ! "$MODELS_CONFIG" -nt "$MODEL_TABLE" ]]; then
+        source "$MODEL_TABLE"
+    else
+        eval "$(python3 "$SCRIPT_DIR/utils/model_table.py" shell)"
+    fi
+}
+load_model_table
+
 # ============================================================================
 # Resolve provider from model name using models.yaml (strict validation)
 # Checks both api_models and cli_models sections
@@ -103,118 +140,33 @@ resolve_provider_from_model() {
     local model_name="$1"
     local section="${2:-}"  # Optional: api_models or cli_models
 
-    if [[ ! -f "$MODELS_CONFIG" ]]; then
-        return 1
-    fi
-
-    # Determine which sections to check
-    local sections_to_check
-    if [[ -n "$section" ]]; then
-        sections_to_check="$section"
-    else
-        sections_to_check="api_models cli_models"
-    fi
-
-    for sec in $sections_to_check; do
-        local in_section=false
-        while IFS= read -r line; do
-            if [[ "$line" =~ ^${sec}: ]]; then
-                in_section=true
-            elif [[ "$in_section" == true && "$line" =~ ^[a-z_]+: && ! "$line" =~ ^[[:space:]] ]]; then
-                in_section=false
-            elif [[ "$in_section" == true && "$line" =~ ^[[:space:]]+${model_name}:[[:space:]]*(.+) ]]; then
-                local provider="${BASH_REMATCH[1]}"
-                provider=$(echo "$provider" | tr -d '"' | tr -d "'" | xargs)
-                echo "$provider"
-                return 0
-            fi
-        done < "$MODELS_CONFIG"
-    done
-
     # No fallback - model must be in models.yaml
-    return 1
+    case "$section" in
+        api_models) model_table_api_provider "$model_name" ;;
+        cli_models) model_table_cli_provider "$model_name" ;;
+        *) model_table_api_provider "$model_name" || model_table_cli_provider "$model_name" ;;
+    esac
 }
 
 # ============================================================================
 # Get default model for a provider from models.yaml
 # ============================================================================
 get_default_model_for_provider() {
-    local provider="$1"
-
-    if [[ -f "$MODELS_CONFIG" ]]; then
-        # Look in defaults section
-        local in_defaults=false
-        while IFS= read -r line; do
-            if [[ "$line" =~ ^defaults: ]]; then
-                in_defaults=true
-            elif [[ "$in_defaults" == true && "$line" =~ ^[[:space:]]+${provider}: ]]; then
-                local model
-                model=$(echo "$line" | sed "s/.*${provider}:[[:space:]]*//" | tr -d '"' | tr -d "'")
-                if [[ -n "$model" ]]; then
-                    echo "$model"
-                fi
-                return 0
-            elif [[ "$in_defaults" == true && "$line" =~ ^[a-z]+: ]]; then
-                # New top-level section, stop looking
-                break
-            fi
-        done < "$MODELS_CONFIG"
-    fi
+    model_table_default_model "$1"
 }
 
 # ============================================================================
 # Check if a model is marked as expensive in models.yaml
 # ============================================================================
 is_expensive_model() {
-    local model_name="$1"
-
-    if [[ -z "$model_name" || ! -f "$MODELS_CONFIG" ]]; then
-        return 1  # Not expensive (or can't determine)
-    fi
-
-    # Look in expensive section
-    local in_expensive=false
-    while IFS= read -r line; do
-        if [[ "$line" =~ ^expensive: ]]; then
-            in_expensive=true
-        elif [[ "$in_expensive" == true && "$line" =~ ^[[:space:]]+-[[:space:]]*(.+) ]]; then
-            local expensive_model="${BASH_REMATCH[1]}"
-            expensive_model=$(echo "$expensive_model" | tr -d '"' | tr -d "'" | xargs)
-            if [[ "$expensive_model" == "$model_name" ]]; then
-                return 0  # Is expensive
-            fi
-        elif [[ "$in_expensive" == true && "$line" =~ ^[a-z]+: ]]; then
-            # New top-level section, stop
-            break
-        fi
-    done < "$MODELS_CONFIG"
-
-    return 1  # Not expensive
+    [[ -n "$1" ]] && model_table_is_expensive "$1"
 }
 
 # ============================================================================
 # Get list of expensive models
 # ============================================================================
 get_expensive_models() {
-    if [[ ! -f "$MODELS_CONFIG" ]]; then
-        return
-    fi
-
-    local in_expensive=false
-    local models=""
-    while IFS= read -r line; do
-        if [[ "$line" =~ ^expensive: ]]; then
-            in_expensive=true
-        elif [[ "$in_expensive" == true && "$line" =~ ^[[:space:]]+-[[:space:]]*(.+) ]]; then
-            local model="${BASH_REMATCH[1]}"
-            model=$(echo "$model" | tr -d '"' | tr -d "'" | xargs)
-            models="${models:+$models, }$model"
-        elif [[ "$in_expensive" == true && "$line" =~ ^[a-z]+: ]]; then
-            break
-        fi
-    done < "$MODELS_CONFIG"
-
-    echo "$models"
+    echo "$MODEL_TABLE_EXPENSIVE"
 }
 
 # ============================================================================
@@ -252,41 +204,9 @@ show_available_models() {
         return
     fi
 
-    local in_models=false
-    local claude_models=""
-    local gemini_models=""
-    local codex_models=""
-
-    while IFS= read -r line; do
-        if [[ "$line" =~ ^models: ]]; then
-            in_models=true
-        elif [[ "$in_models" == true && "$line" =~ ^[a-z]+: && ! "$line" =~ ^[[:space:]] ]]; then
-            # New top-level section, stop
-            break
-        elif [[ "$in_models" == true && "$line" =~ ^[[:space:]]+([^:]+):[[:space:]]*(.+) ]]; then
-            local model_name="${BASH_REMATCH[1]}"
-            local provider="${BASH_REMATCH[2]}"
-            # Clean up whitespace and quotes
-            model_name=$(echo "$model_name" | tr -d '"' | tr -d "'" | xargs)
-            provider=$(echo "$provider" | tr -d '"' | tr -d "'" | xargs)
-
-            case "$provider" in
-                claude)
-                    claude_models="${claude_models:+$claude_models, }$model_name"
-                    ;;
-                gemini)
-                    gemini_models="${gemini_models:+$gemini_models, }$model_name"
-                    ;;
-                codex)
-                    codex_models="${codex_models:+$codex_models, }$model_name"
-                    ;;
-            esac
-        fi
-    done < "$MODELS_CONFIG"
-
-    echo "  claude: ${claude_models:-(none configured)}" >&2
-    echo "  gemini: ${gemini_models:-(none configured)}" >&2
-    echo "  codex:  ${codex_models:-(none configured)}" >&2
+    echo "  claude: ${MODEL_TABLE_CLAUDE_MODELS:-(none configured)}" >&2
+    echo "  gemini: ${MODEL_TABLE_GEMINI_MODELS:-(none configured)}" >&2
+    echo "  codex:  ${MODEL_TABLE_CODEX_MODELS:-(none configured)}" >&2
     echo "" >&2
     echo "To add a new model, update configs/models.yaml" >&2
 }
@@ -368,10 +288,18 @@ while [[ $# -gt 0 ]]; do
             PROMPT_FILE="$2"
             shift 2
             ;;
+        --system-prompt-file)
+            SYSTEM_PROMPT_FILE="$2"
+            shift 2
+            ;;
         --output)
             OUTPUT_FILE="$2"
             shift 2
             ;;
+        --stream)
+            STREAM=true
+            shift
+            ;;
         --working-dir)
             WORKING_DIR="$2"
             shift 2
@@ -416,20 +344,45 @@ if [[ -n "$CONFIG_FILE" ]]; then
 fi
 
 # ============================================================================
-# Load prompt from file if specified
+# Prompt transport: the prompt is kept in a file from here on and handed to
+# the provider on stdin (or by path), so it is never copied into argv.
+# --prompt text and a prompt on stdin are written to a temporary file.
 # ============================================================================
-if [[ -n "$PROMPT_FILE" ]]; then
+TEMP_PROMPT_FILE=""
+CACHE_RESPONSE=""
+
+cleanup_temp_files() {
+    [[ -n "$TEMP_PROMPT_FILE" ]] && rm -f "$TEMP_PROMPT_FILE"
+    [[ -n "$CACHE_RESPONSE" ]] && rm -f "$CACHE_RESPONSE"
+    return 0
+}
+trap cleanup_temp_files EXIT
+
+if [[ "$PROMPT_FILE" == "-" ]]; then
+    TEMP_PROMPT_FILE=$(mktemp)
+    cat > "$TEMP_PROMPT_FILE"
+    PROMPT_FILE="$TEMP_PROMPT_FILE"
+elif [[ -n "$PROMPT_FILE" ]]; then
     if [[ ! -f "$PROMPT_FILE" ]]; then
         echo "Error: Prompt file not found: $PROMPT_FILE" >&2
         exit 1
     fi
-    PROMPT="$(cat "$PROMPT_FILE")"
+elif [[ -n "$PROMPT" ]]; then
+    TEMP_PROMPT_FILE=$(mktemp)
+    printf '%s' "$PROMPT" > "$TEMP_PROMPT_FILE"
+    PROMPT_FILE="$TEMP_PROMPT_FILE"
+fi
+PROMPT=""
+
+if [[ -n "$SYSTEM_PROMPT_FILE" && ! -f "$SYSTEM_PROMPT_FILE" ]]; then
+    echo "Error: System prompt file not found: $SYSTEM_PROMPT_FILE" >&2
+    exit 1
 fi
 
 # ============================================================================
 # Validate required arguments
 # ============================================================================
-if [[ -z "$PROMPT" ]]; then
+if [[ -z "$PROMPT_FILE" || ! -s "$PROMPT_FILE" ]]; then
     echo "Error: --prompt or --prompt-file is required" >&2
     exit 1
 fi
@@ -495,6 +448,43 @@ if [[ -n "$WORKING_DIR" ]]; then
     cd "$WORKING_DIR"
 fi
 
+# ============================================================================
+# CLIs without a system prompt option get the static prefix at the start of
+# the prompt (still a stable prefix for the provider's prompt cache)
+# ============================================================================
+
+# Interactive mode: the prompt becomes the CLI's first message argument.
+# Linux caps one argument at 128 KiB, so a larger prompt is left in a file
+# and the agent is asked to read it (interactive agents have file tools).
+INTERACTIVE_PROMPT_ARG_MAX=100000
+
+load_interactive_prompt() {
+    if [[ -n "$SYSTEM_PROMPT_FILE" ]]; then
+        local combined
+        combined=$(mktemp)
+        send_prompt --with-system-prompt > "$combined"
+        [[ -n "$TEMP_PROMPT_FILE" ]] && rm -f "$TEMP_PROMPT_FILE"
+        TEMP_PROMPT_FILE="$combined"
+        PROMPT_FILE="$combined"
+    fi
+
+    if [[ $(wc -c < "$PROMPT_FILE") -gt $INTERACTIVE_PROMPT_ARG_MAX ]]; then
+        PROMPT="Your instructions are in the file $PROMPT_FILE. Read the whole file first, then follow the instructions in it."
+    else
+        PROMPT="$(cat "$PROMPT_FILE")"
+    fi
+}
+
+# Headless mode: write the prompt for the CLI's stdin, after the static
+# prefix when called with --with-system-prompt
+send_prompt() {
+    if [[ "${1:-}" == "--with-system-prompt" && -n "$SYSTEM_PROMPT_FILE" ]]; then
+        cat "$SYSTEM_PROMPT_FILE"
+        printf '\n\n'
+    fi
+    cat "$PROMPT_FILE"
+}
+
 # ============================================================================
 # Claude Code
 # ============================================================================
@@ -515,6 +505,8 @@ call_claude() {
     fi
 
     if [[ "$MODE" == "interactive" ]]; then
+        load_interactive_prompt
+
         # Interactive mode: prompt as positional argument
         if [[ -n "$OUTPUT_FILE" ]]; then
             # Use script command to preserve TTY while capturing output
@@ -530,38 +522,54 @@ call_claude() {
             claude "${cmd_args[@]}" "$PROMPT"
         fi
     else
-        # Headless mode: use -p/--print flag
+        # Headless mode: use -p/--print flag (prompt read from stdin)
         cmd_args+=(--print)
         if [[ "$AUTO_APPROVE" != true ]]; then
             cmd_args+=(--permission-mode bypassPermissions)
         fi
 
+        # Static prefix goes into the system prompt, where Claude Code caches it
+        if [[ -n "$SYSTEM_PROMPT_FILE" ]]; then
+            cmd_args+=(--append-system-prompt-file "$SYSTEM_PROMPT_FILE")
+        fi
+
         if [[ -n "$STATS_FILE" ]]; then
             # Stats tracking: use JSON output and extract text/stats
-            cmd_args+=(--output-format json)
+            local stream_flag=""
+            if [[ "$STREAM" == true ]]; then
+                # Event stream: text deltas are passed through as they arrive
+                cmd_args+=(--output-format stream-json --verbose --include-partial-messages)
+                stream_flag=yes
+            else
+                cmd_args+=(--output-format json)
+            fi
             local extract_script="$SCRIPT_DIR/utils/extract_llm_stats.py"
 
             if [[ -n "$OUTPUT_FILE" ]]; then
-                claude "${cmd_args[@]}" "$PROMPT" 2>/dev/null | \
-                    python3 "$extract_script" --provider claude \
+                send_prompt | claude "${cmd_args[@]}" 2>/dev/null | \
+                    python3 "$extract_script" --provider claude ${stream_flag:+--stream} \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL" > "$OUTPUT_FILE"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"} > "$OUTPUT_FILE"
             else
-                claude "${cmd_args[@]}" "$PROMPT" 2>/dev/null | \
-                    python3 "$extract_script" --provider claude \
+                send_prompt | claude "${cmd_args[@]}" 2>/dev/null | \
+                    python3 "$extract_script" --provider claude ${stream_flag:+--stream} \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"}
             fi
         else
             # No stats tracking: plain text output
             if [[ -n "$OUTPUT_FILE" ]]; then
-                claude "${cmd_args[@]}" "$PROMPT" > "$OUTPUT_FILE" 2>&1
+                send_prompt | claude "${cmd_args[@]}" > "$OUTPUT_FILE" 2>&1
             else
-                claude "${cmd_args[@]}" "$PROMPT"
+                send_prompt | claude "${cmd_args[@]}"
             fi
         fi
     fi
@@ -591,6 +599,8 @@ call_gemini() {
     fi
 
     if [[ "$MODE" == "interactive" ]]; then
+        load_interactive_prompt
+
         # Interactive mode: use -i flag
         if [[ -n "$OUTPUT_FILE" ]]; then
             # Use script command to preserve TTY while capturing output
@@ -603,40 +613,37 @@ call_gemini() {
             gemini "${cmd_args[@]}" -i "$PROMPT"
         fi
     else
-        # Headless mode: use -p flag (or positional with --yolo)
-        local prompt_args=()
-        if [[ "$AUTO_APPROVE" == true ]]; then
-            prompt_args=("$PROMPT")
-        else
-            prompt_args=(-p "$PROMPT")
-        fi
-
+        # Headless mode: a prompt piped to stdin runs non-interactively
         if [[ -n "$STATS_FILE" ]]; then
             # Stats tracking: use JSON output and extract text/stats
             cmd_args+=(--output-format json)
             local extract_script="$SCRIPT_DIR/utils/extract_llm_stats.py"
 
             if [[ -n "$OUTPUT_FILE" ]]; then
-                gemini "${cmd_args[@]}" "${prompt_args[@]}" 2>/dev/null | \
+                send_prompt --with-system-prompt | gemini "${cmd_args[@]}" 2>/dev/null | \
                     python3 "$extract_script" --provider gemini \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL" > "$OUTPUT_FILE"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"} > "$OUTPUT_FILE"
             else
-                gemini "${cmd_args[@]}" "${prompt_args[@]}" 2>/dev/null | \
+                send_prompt --with-system-prompt | gemini "${cmd_args[@]}" 2>/dev/null | \
                     python3 "$extract_script" --provider gemini \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"}
             fi
         else
             # No stats tracking: plain text output
             if [[ -n "$OUTPUT_FILE" ]]; then
-                gemini "${cmd_args[@]}" "${prompt_args[@]}" > "$OUTPUT_FILE" 2>&1
+                send_prompt --with-system-prompt | gemini "${cmd_args[@]}" > "$OUTPUT_FILE" 2>&1
             else
-                gemini "${cmd_args[@]}" "${prompt_args[@]}"
+                send_prompt --with-system-prompt | gemini "${cmd_args[@]}"
             fi
         fi
     fi
@@ -661,6 +668,8 @@ call_codex() {
     fi
 
     if [[ "$MODE" == "interactive" ]]; then
+        load_interactive_prompt
+
         # Interactive mode: prompt as positional argument
         if [[ "$AUTO_APPROVE" == true ]]; then
             cmd_args+=(--dangerously-bypass-approvals-and-sandbox)
@@ -680,7 +689,7 @@ call_codex() {
             codex "${cmd_args[@]}" "$PROMPT"
         fi
     else
-        # Headless mode: use 'exec' subcommand
+        # Headless mode: use 'exec' subcommand ('-' reads the prompt from stdin)
         if [[ "$AUTO_APPROVE" == true ]]; then
             cmd_args+=(--dangerously-bypass-approvals-and-sandbox)
         else
@@ -689,31 +698,38 @@ call_codex() {
 
         if [[ -n "$STATS_FILE" ]]; then
             # Stats tracking: use JSON output and extract text/stats
+            # (with --stream, each agent message is passed through as it arrives)
             cmd_args+=(--json)
+            local stream_flag=""
+            [[ "$STREAM" == true ]] && stream_flag=yes
             local extract_script="$SCRIPT_DIR/utils/extract_llm_stats.py"
 
             if [[ -n "$OUTPUT_FILE" ]]; then
-                codex exec "${cmd_args[@]}" "$PROMPT" 2>/dev/null | \
-                    python3 "$extract_script" --provider codex \
+                send_prompt --with-system-prompt | codex exec "${cmd_args[@]}" - 2>/dev/null | \
+                    python3 "$extract_script" --provider codex ${stream_flag:+--stream} \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL" > "$OUTPUT_FILE"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"} > "$OUTPUT_FILE"
             else
-                codex exec "${cmd_args[@]}" "$PROMPT" 2>/dev/null | \
-                    python3 "$extract_script" --provider codex \
+                send_prompt --with-system-prompt | codex exec "${cmd_args[@]}" - 2>/dev/null | \
+                    python3 "$extract_script" --provider codex ${stream_flag:+--stream} \
                         --stats-file "$STATS_FILE" \
                         --stats-stage "$STATS_STAGE" \
                         --stats-context "$STATS_CONTEXT" \
-                        --model "$MODEL"
+                        --model "$MODEL" \
+                        ${CACHE_STATUS:+--response-cache "$CACHE_STATUS"} \
+                        ${RATE_LIMIT_ESTIMATE:+--rate-limit-estimate "$RATE_LIMIT_ESTIMATE"}
             fi
         else
             # No stats tracking: plain text output
             if [[ -n "$OUTPUT_FILE" ]]; then
                 # Codex has -o for output file
-                codex exec "${cmd_args[@]}" -o "$OUTPUT_FILE" "$PROMPT"
+                send_prompt --with-system-prompt | codex exec "${cmd_args[@]}" -o "$OUTPUT_FILE" -
             else
-                codex exec "${cmd_args[@]}" "$PROMPT"
+                send_prompt --with-system-prompt | codex exec "${cmd_args[@]}" -
             fi
         fi
     fi
@@ -732,7 +748,7 @@ if [[ -n "$API_MODEL" && "$MODE" == "headless" ]]; then
 
     api_args=(
         --model "$API_MODEL"
-        --prompt "$PROMPT"
+        --prompt-file "$PROMPT_FILE"
     )
 
     if [[ -n "$STATS_FILE" ]]; then
@@ -745,46 +761,154 @@ if [[ -n "$API_MODEL" && "$MODE" == "headless" ]]; then
         api_args+=(--max-tokens "$MAX_TOKENS")
     fi
 
+    if [[ -n "$SYSTEM_PROMPT_FILE" ]]; then
+        api_args+=(--system-prompt-file "$SYSTEM_PROMPT_FILE")
+    fi
+
+    # The caller streams into <output>.partial and renames it when complete
     if [[ -n "$OUTPUT_FILE" ]]; then
-        python3 "$API_CALLER" "${api_args[@]}" > "$OUTPUT_FILE"
-    else
-        python3 "$API_CALLER" "${api_args[@]}"
+        api_args+=(--output "$OUTPUT_FILE")
     fi
 
+    python3 "$API_CALLER" "${api_args[@]}"
     exit $?
 fi
 
 # ============================================================================
-# Route to provider (CLI mode)
+# Headless output goes to <output>.partial and is renamed into place only when
+# the call succeeds, so an interrupted call never leaves a truncated output
+# that resume would take for a finished task
 # ============================================================================
-case "$PROVIDER" in
-    claude)
-        if ! command -v claude &> /dev/null; then
-            echo "Error: claude CLI not found. Install from: https://claude.ai/code" >&2
-            exit 1
-        fi
-        call_claude
-        exit $?
-        ;;
-    gemini)
-        if ! command -v gemini &> /dev/null; then
-            echo "Error: gemini CLI not found. Install from: https://github.com/google-gemini/gemini-cli" >&2
-            exit 1
+FINAL_OUTPUT_FILE=""
+if [[ "$MODE" == "headless" && -n "$OUTPUT_FILE" ]]; then
+    FINAL_OUTPUT_FILE="$OUTPUT_FILE"
+    OUTPUT_FILE="$OUTPUT_FILE.partial"
+    rm -f "$OUTPUT_FILE"
+fi
+
+finish_output() {
+    local exit_code="$1"
+    if [[ -n "$FINAL_OUTPUT_FILE" ]]; then
+        if [[ $exit_code -eq 0 && -f "$OUTPUT_FILE" ]]; then
+            mv -f "$OUTPUT_FILE" "$FINAL_OUTPUT_FILE"
+        else
+            rm -f "$OUTPUT_FILE"
         fi
-        call_gemini
-        exit $?
-        ;;
-    codex|openai)
-        if ! command -v codex &> /dev/null; then
-            echo "Error: codex CLI not found. Install from: https://github.com/openai/codex" >&2
-            exit 1
+    fi
+    return "$exit_code"
+}
+
+# ============================================================================
+# Cross-process rate limiter (headless CLI mode): wait for RPM/TPM capacity
+# configured under rate_limits in models.yaml. The estimate is corrected with
+# the actual token count when the stats record is written. API mode acquires
+# inside api/client.py.
+# ============================================================================
+RATE_LIMIT_ESTIMATE=""
+
+has_rate_limits() {
+    [[ "$MODEL_TABLE_HAS_RATE_LIMITS" == true ]]
+}
+
+acquire_rate_limit() {
+    if [[ "$MODE" != "headless" ]] || ! has_rate_limits; then
+        return 0
+    fi
+
+    local limiter_args=(--provider "$PROVIDER" --model "${MODEL:-default}")
+    if [[ -n "$SYSTEM_PROMPT_FILE" ]]; then
+        limiter_args+=(--system-prompt-file "$SYSTEM_PROMPT_FILE")
+    fi
+
+    RATE_LIMIT_ESTIMATE=$(python3 "$SCRIPT_DIR/api/rate_limiter.py" acquire "${limiter_args[@]}" < "$PROMPT_FILE") || RATE_LIMIT_ESTIMATE=""
+}
+
+# ============================================================================
+# Route to provider (CLI mode)
+# ============================================================================
+call_provider() {
+    acquire_rate_limit
+
+    case "$PROVIDER" in
+        claude)
+            if ! command -v claude &> /dev/null; then
+                echo "Error: claude CLI not found. Install from: https://claude.ai/code" >&2
+                return 1
+            fi
+            call_claude
+            ;;
+        gemini)
+            if ! command -v gemini &> /dev/null; then
+                echo "Error: gemini CLI not found. Install from: https://github.com/google-gemini/gemini-cli" >&2
+                return 1
+            fi
+            call_gemini
+            ;;
+        codex|openai)
+            if ! command -v codex &> /dev/null; then
+                echo "Error: codex CLI not found. Install from: https://github.com/openai/codex" >&2
+                return 1
+            fi
+            call_codex
+            ;;
+        *)
+            echo "Error: Unknown provider '$PROVIDER'" >&2
+            echo "Supported providers: claude, gemini, codex" >&2
+            return 1
+            ;;
+    esac
+}
+
+# ============================================================================
+# Response cache (headless CLI mode): when LLM_CACHE_DIR is set, answer
+# byte-identical prompts from the cache and store fresh responses in it.
+# API mode is cached inside api/caller.py.
+# ============================================================================
+if [[ "$MODE" == "headless" && -n "${LLM_CACHE_DIR:-}" ]]; then
+    CACHE_SCRIPT="$SCRIPT_DIR/api/cache.py"
+    cache_args=(--provider "$PROVIDER" --model "${MODEL:-default}")
+    if [[ -n "$SYSTEM_PROMPT_FILE" ]]; then
+        cache_args+=(--system-prompt-file "$SYSTEM_PROMPT_FILE")
+    fi
+
+    # A hit writes its own stats record (zero tokens, response_cache: hit)
+    get_args=("${cache_args[@]}")
+    if [[ -n "$STATS_FILE" ]]; then
+        get_args+=(--stats-file "$STATS_FILE" --stats-stage "$STATS_STAGE" --stats-context "$STATS_CONTEXT")
+    fi
+
+    CACHE_RESPONSE=$(mktemp)
+
+    # Prompt goes through stdin, so prompt size is not limited by ARG_MAX
+    if python3 "$CACHE_SCRIPT" get "${get_args[@]}" < "$PROMPT_FILE" > "$CACHE_RESPONSE"; then
+        if [[ -n "$OUTPUT_FILE" ]]; then
+            cp "$CACHE_RESPONSE" "$OUTPUT_FILE"
+            finish_output 0
+        else
+            cat "$CACHE_RESPONSE"
         fi
-        call_codex
-        exit $?
-        ;;
-    *)
-        echo "Error: Unknown provider '$PROVIDER'" >&2
-        echo "Supported providers: claude, gemini, codex" >&2
-        exit 1
-        ;;
-esac
+        exit 0
+    fi
+
+    CACHE_STATUS="miss"
+    exit_code=0
+    if [[ -n "$OUTPUT_FILE" ]]; then
+        call_provider || exit_code=$?
+        [[ -f "$OUTPUT_FILE" ]] && cp "$OUTPUT_FILE" "$CACHE_RESPONSE"
+    else
+        call_provider > "$CACHE_RESPONSE" || exit_code=$?
+        cat "$CACHE_RESPONSE"
+    fi
+
+    if [[ $exit_code -eq 0 && -s "$CACHE_RESPONSE" ]]; then
+        python3 "$CACHE_SCRIPT" put "${cache_args[@]}" --response-file "$CACHE_RESPONSE" < "$PROMPT_FILE" || true
+    fi
+
+    finish_output "$exit_code" || true
+    exit $exit_code
+fi
+
+exit_code=0
+call_provider || exit_code=$?
+finish_output "$exit_code" || true
+exit $exit_code
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Student packing for marker (Stage 4) and unifier (Stage 7) tasks.
+
+Each marker or unifier call repeats the same instructions, criteria and
+scheme for one student. Packing puts several students into one call: the
+marker tasks of one activity, or the unifier tasks of the stage, are grouped
+in order into packs whose students' work fits a token budget (estimated
+locally with api/tokens.py), and at most as many students as the call's
+max_tokens can answer (utils/packing.py). Each pack becomes one task:
+
+  <packs-dir>/<agent>_<activity|all>_<n>.json   the pack (member tasks)
+  <packs-dir>/<agent>_<activity|all>_<n>.txt    the raw packed response
+
+and the response is split into the members' usual outputs (marker.py /
+unifier.py --pack-file, or the engine in API mode). Members whose section
+is missing or malformed are re-run as separate calls. Tasks that do not
+fit the prompt of a pack (verification, packed activities, different
+problems per student) and packs of one student are left unchanged.
+
+Both task lists are rewritten in place: the JSONL list (engine) and the
+command list (parallel_runner.sh), whose lines correspond one to one.
+
+Usage:
+  python3 pack_tasks.py --tasks processed/marker_tasks.jsonl \\
+      --commands processed/marker_tasks.txt --packs-dir processed/packs \\
+      --budget 8000 --provider claude \\
+      --command "python3 src/agents/marker.py --provider claude --stats-file ..."
+"""
+
+import argparse
+import json
+import shlex
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+sys.path.insert(0, str(Path(__file__).parent / "agents"))
+sys.path.insert(0, str(Path(__file__).parent))
+from packing import OUTPUT_TOKENS_PER_ITEM, pack_groups
+from api.client import DEFAULT_MAX_TOKENS
+from api.tokens import count_tokens
+
+DEFAULT_BUDGET = 8000
+
+# Fields every member of a pack shares, copied to the pack task
+COMMON_FIELDS = {
+    'marker': ('activity', 'criteria', 'type'),
+    'unifier': ('scheme', 'markings_dir', 'type'),
+}
+
+
+def packable(task: Dict) -> bool:
+    """Whether a task can be part of a student pack."""
+    if task['agent'] == 'marker':
+        return bool(task.get('activity')) and not task.get('problem_context')
+    return task['agent'] == 'unifier'
+
+
+def task_tokens(task: Dict, provider: str | None, work_cache: Dict) -> int:
+    """Estimated tokens of a task's student-specific prompt part."""
+    if task['agent'] == 'marker':
+        from marker import load_activities_work
+        if task['submission'] not in work_cache:
+            try:
+                work_cache[task['submission']] = load_activities_work(task['submission'])
+            except RuntimeError:
+                work_cache[task['submission']] = {}
+        return count_tokens(work_cache[task['submission']].get(task['activity'], ''), provider)
+
+    from unifier import load_previous_assessments, load_student_notebook
+    text = load_previous_assessments(Path(task['markings_dir']), task['student'], task.get('type', 'structured'))
+    return count_tokens(text + load_student_notebook(task['submission']), provider)
+
+
+def plan(tasks: List[Dict], budget: int, provider: str | None) -> List[List[int]]:
+    """
+    Group packable tasks into packs.
+
+    Returns:
+        Lists of task indices; every task is in exactly one list, packable
+        tasks of the same group key (agent and activity) in order
+    """
+    by_key = {}
+    for index, task in enumerate(tasks):
+        if packable(task):
+            key = (task['agent'],) + tuple(task.get(field) for field in COMMON_FIELDS[task['agent']])
+            by_key.setdefault(key, []).append(index)
+
+    work_cache = {}
+    packed = {}
+    for key, indices in by_key.items():
+        agent = key[0]
+        sizes = [task_tokens(tasks[i], provider, work_cache) for i in indices]
+        max_items = max(1, DEFAULT_MAX_TOKENS // OUTPUT_TOKENS_PER_ITEM[agent])
+        for group in pack_groups(sizes, budget, max_items):
+            members = [indices[i] for i in group]
+            packed[members[0]] = members
+
+    groups, seen = [], set()
+    for index in range(len(tasks)):
+        if index in seen:
+            continue
+        members = packed.get(index, [index])
+        seen.update(members)
+        groups.append(members)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack several students into one marker or unifier call")
+    parser.add_argument("--tasks", required=True, help="Task list (JSONL, rewritten in place)")
+    parser.add_argument("--commands", help="Command list matching --tasks line by line (rewritten in place)")
+    parser.add_argument("--command", help="Agent command without task arguments, for pack commands")
+    parser.add_argument("--packs-dir", required=True, help="Directory for pack files and packed responses")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                        help=f"Most estimated student-work tokens per pack (default: {DEFAULT_BUDGET})")
+    parser.add_argument("--provider", help="Provider whose tokenizer the estimates follow")
+
+    args = parser.parse_args()
+    if args.commands and not args.command:
+        parser.error("--command is required with --commands")
+
+    tasks_file = Path(args.tasks)
+    tasks = [json.loads(line) for line in tasks_file.read_text(encoding='utf-8').splitlines() if line.strip()]
+    commands = []
+    if args.commands:
+        commands = [line for line in Path(args.commands).read_text(encoding='utf-8').splitlines() if line.strip()]
+        if len(commands) != len(tasks):
+            print(f"✗ {args.commands} has {len(commands)} commands for {len(tasks)} tasks; not packing",
+                  file=sys.stderr)
+            sys.exit(1)
+
+    packs_dir = Path(args.packs_dir)
+    packs_dir.mkdir(parents=True, exist_ok=True)
+
+    new_tasks, new_commands = [], []
+    packs = packed_tasks = 0
+    for group in plan(tasks, args.budget, args.provider):
+        if len(group) == 1:
+            new_tasks.append(tasks[group[0]])
+            if commands:
+                new_commands.append(commands[group[0]])
+            continue
+
+        members = [tasks[i] for i in group]
+        agent = members[0]['agent']
+        packs += 1
+        packed_tasks += len(members)
+        name = f"{agent}_{members[0].get('activity') or 'all'}_{packs}"
+        pack = {'agent': agent,
+                **{field: members[0][field] for field in COMMON_FIELDS[agent] if field in members[0]},
+                'pack': members,
+                'output': str(packs_dir / f"{name}.txt")}
+        pack_file = packs_dir / f"{name}.json"
+        pack_file.write_text(json.dumps(pack, indent=2), encoding='utf-8')
+
+        new_tasks.append(pack)
+        if commands:
+            new_commands.append(f"{args.command} --pack-file {shlex.quote(str(pack_file))} "
+                                f"--output {shlex.quote(pack['output'])}")
+
+    tasks_file.write_text(''.join(json.dumps(task) + '\n' for task in new_tasks), encoding='utf-8')
+    if commands:
+        Path(args.commands).write_text(''.join(command + '\n' for command in new_commands), encoding='utf-8')
+
+    print(f"✓ Packed {packed_tasks} of {len(tasks)} tasks into {packs} calls "
+          f"(budget {args.budget} tokens): {len(new_tasks)} calls instead of {len(tasks)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,15 @@
 # Parallel Task Runner - Execute tasks in parallel with configurable concurrency
 # Usage: parallel_runner.sh --tasks tasks.txt --concurrency N --output-dir dir [--command "cmd {}"]
 #
+# By default tasks run through adaptive_runner.py: concurrency starts at N,
+# halves on rate-limit signals (rate-limited tasks are re-queued) and grows
+# back additively while tasks succeed. --no-adaptive (or --force-xargs)
+# uses a fixed job count with GNU parallel/xargs.
+#
+# --budget USD (with --budget-since and --budget-stats-file) stops the
+# adaptive runner from starting new tasks once spent plus projected cost
+# would exceed the budget (see src/utils/budget.py).
+#
 
 set -euo pipefail
 
@@ -13,6 +22,12 @@ OUTPUT_DIR=""
 COMMAND=""
 VERBOSE=false
 FORCE_XARGS=false
+ADAPTIVE=true
+MAX_CONCURRENCY=""
+PROVIDER=""
+BUDGET=""
+BUDGET_SINCE=""
+BUDGET_STATS_FILE=""
 
 # Parse arguments
 while [[ $# -gt 0 ]]; do
@@ -41,6 +56,30 @@ while [[ $# -gt 0 ]]; do
             FORCE_XARGS=true
             shift
             ;;
+        --no-adaptive)
+            ADAPTIVE=false
+            shift
+            ;;
+        --max-concurrency)
+            MAX_CONCURRENCY="$2"
+            shift 2
+            ;;
+        --provider)
+            PROVIDER="$2"
+            shift 2
+            ;;
+        --budget)
+            BUDGET="$2"
+            shift 2
+            ;;
+        --budget-since)
+            BUDGET_SINCE="$2"
+            shift 2
+            ;;
+        --budget-stats-file)
+            BUDGET_STATS_FILE="$2"
+            shift 2
+            ;;
         *)
             echo "Unknown option: $1" >&2
             exit 1
@@ -78,6 +117,44 @@ if [[ $VERBOSE == true ]]; then
     echo ""
 fi
 
+# Adaptive (AIMD) concurrency: default unless a fixed job count was requested
+if [[ $ADAPTIVE == true && $FORCE_XARGS == false ]] && command -v python3 &> /dev/null; then
+    SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+    ADAPTIVE_ARGS=(--tasks "$TASKS_FILE" --concurrency "$CONCURRENCY")
+
+    if [[ -n "$MAX_CONCURRENCY" ]]; then
+        ADAPTIVE_ARGS+=(--max-concurrency "$MAX_CONCURRENCY")
+    fi
+    if [[ -n "$OUTPUT_DIR" ]]; then
+        ADAPTIVE_ARGS+=(--output-dir "$OUTPUT_DIR")
+    fi
+    if [[ -n "$COMMAND" ]]; then
+        ADAPTIVE_ARGS+=(--command "$COMMAND")
+    fi
+    if [[ -n "$PROVIDER" ]]; then
+        ADAPTIVE_ARGS+=(--provider "$PROVIDER")
+    fi
+    if [[ -n "$BUDGET" ]]; then
+        ADAPTIVE_ARGS+=(--budget "$BUDGET" --budget-since "$BUDGET_SINCE")
+        if [[ -n "$BUDGET_STATS_FILE" ]]; then
+            ADAPTIVE_ARGS+=(--budget-stats-file "$BUDGET_STATS_FILE")
+        fi
+    fi
+    if [[ $VERBOSE == true ]]; then
+        echo "Using adaptive concurrency (start $CONCURRENCY, halves on rate limits)"
+        echo ""
+        ADAPTIVE_ARGS+=(--verbose)
+    fi
+
+    EXIT_CODE=0
+    python3 "$SCRIPT_DIR/adaptive_runner.py" "${ADAPTIVE_ARGS[@]}" || EXIT_CODE=$?
+    exit $EXIT_CODE
+fi
+
+if [[ -n "$BUDGET" ]]; then
+    echo "Warning: --budget is not enforced per task with a fixed job count (GNU parallel/xargs)" >&2
+fi
+
 # Function to execute a single task
 execute_task() {
     local task="$1"
@@ -366,8 +443,8 @@ check_quota_errors() {
         return 0
     fi
 
-    # Search for quota error patterns in stderr files
-    for stderr_file in "$output_dir"/*/stderr; do
+    # Search for quota error patterns in stderr files (GNU parallel: <dir>/1/<task>/stderr)
+    for stderr_file in "$output_dir"/*/stderr "$output_dir"/*/*/stderr; do
         if [[ -f "$stderr_file" && -s "$stderr_file" ]]; then
             local content=$(cat "$stderr_file" 2>/dev/null)
             # Check for quota patterns
@@ -426,18 +503,11 @@ if [[ $VERBOSE == true ]]; then
             echo "  • All completed work ($success_count tasks) has been preserved"
             echo ""
             echo -e "\033[1;33mTo continue:\033[0m"
-            echo "  1. Wait for quota reset (typically resets hourly/daily, or 3am for Codex)"
-            echo "  2. Re-run the same command - resume will pick up where it left off"
-            echo "  3. Only the $quota_count failed tasks will be re-processed"
-            echo ""
-            echo -e "\033[1;33mAlternative options:\033[0m"
-            echo "  • Upgrade your LLM provider plan for higher limits"
-            echo "  • Switch to a different provider by editing overview.md"
-            echo ""
-            echo -e "\033[1;33mExample:\033[0m"
-            echo "  # Wait for reset, then simply re-run:"
-            echo "  ./mark_structured.sh assignments/your-assignment"
-            echo "  # Output: \"Generated $quota_count tasks (skipped $success_count already completed)\""
+            echo "  • This run used a fixed job count (--no-adaptive or --force-xargs)"
+            echo "  • Re-run without those flags: the adaptive runner halves concurrency on"
+            echo "    rate limits and re-queues the affected tasks instead of failing them"
+            echo "  • Resume will only re-process the $quota_count failed tasks"
+            echo "  • Daily caps (e.g. \"resets 3am\") still require waiting for the reset"
             echo ""
             echo -e "\033[1;31m========================================================================================================\033[0m"
             echo ""
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Detect unattempted activities before Stage 4 (structured assignments).
+
+Compares each student's `*Start student input* ↓` sections with the same
+sections of the base notebook (both extracted with ActivityExtractor). An
+activity counts as not attempted when the student's section is blank or
+contains nothing but the template's own cells (unchanged, or with template
+cells deleted). Such activities get a deterministic "no attempt" marking in
+processed/markings/ instead of a marker LLM call.
+
+Activities missing from a student notebook are left to the marker, which
+reports the schema problem.
+
+Outputs:
+  <markings-dir>/<student>_A<n>.md    "no attempt" markings
+  --skip-list                         student|A<n> lines, one per skipped task
+  --report                            JSON with the skipped tasks and reasons
+
+Usage:
+  python3 skip_unattempted.py --base-notebook lab1.ipynb \\
+      --manifest processed/submissions_manifest.json \\
+      --name-mapping processed/name_mapping.json \\
+      --markings-dir processed/markings --num-activities 7 \\
+      --skip-list processed/unattempted.txt --report processed/unattempted.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from activity_bundles import load_activities
+
+NO_ATTEMPT_MARKING = """# Marking for {student} - Activity {activity}
+
+### Summary
+No attempt: the student's answer for {activity} is {reason_text}.
+
+### Completeness
+- [✗] No work submitted for this activity
+
+### Mistakes Found
+1. The student did not attempt this activity; the answer section is {reason_text}.
+   - Severity: Critical
+   - Location: Student input section for {activity}
+   - Impact: No marks can be awarded for this activity
+
+### Positive Points
+None identified (no attempt).
+
+### Understanding Assessment
+Cannot be assessed; no work was submitted for this activity.
+
+### Potential Academic Integrity Concerns
+No concerns identified
+
+### Recommendation
+Attempt every activity; partial answers can still earn marks.
+
+---
+*Auto-generated: no attempt detected by comparison with the base notebook (no LLM call was made)*
+"""
+
+REASON_TEXT = {
+    'blank': 'blank',
+    'unchanged': 'unchanged from the template in the base notebook',
+}
+
+
+def normalize_source(source: str) -> str:
+    """Cell source with trailing whitespace and blank lines removed."""
+    lines = [line.rstrip() for line in source.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def classify_answer(student_cells: List[Dict], template_cells: List[Dict]) -> Optional[str]:
+    """
+    Decide whether an activity answer was attempted.
+
+    Returns:
+        'blank' (no content), 'unchanged' (only cells copied from the
+        template) or None (attempted)
+    """
+    student = [normalize_source(c['source']) for c in student_cells]
+    student = [s for s in student if s]
+    if not student:
+        return 'blank'
+
+    template = {normalize_source(c['source']) for c in template_cells}
+    if all(s in template for s in student):
+        return 'unchanged'
+    return None
+
+
+def canonical_names(manifest: Dict, name_mapping_path: Optional[Path]) -> Dict[str, str]:
+    """Map submission path to the name used for marking files (as in mark_structured.sh)."""
+    mapping = {}
+    if name_mapping_path and name_mapping_path.exists():
+        try:
+            with open(name_mapping_path, 'r', encoding='utf-8') as f:
+                mapping = json.load(f).get('name_mapping', {}) or {}
+        except (OSError, ValueError):
+            mapping = {}
+
+    return {s['path']: mapping.get(s['path']) or s['student_name'] for s in manifest.get('submissions', [])}
+
+
+def find_unattempted(base_notebook: str, manifest: Dict, names: Dict[str, str],
+                     num_activities: int) -> List[Dict]:
+    """
+    Find (student, activity) pairs that were not attempted.
+
+    Returns:
+        List of {'student', 'activity', 'submission', 'reason'} dicts
+    """
+    template = load_activities(base_notebook)
+    if template is None:
+        raise RuntimeError(f"Cannot read base notebook: {base_notebook}")
+
+    skipped = []
+    for submission in manifest.get('submissions', []):
+        path = submission['path']
+        activities = load_activities(path)
+        if activities is None:
+            continue  # Unreadable notebooks are reported by the marker
+
+        for n in range(1, num_activities + 1):
+            activity = f"A{n}"
+            if activity not in activities:
+                continue
+            reason = classify_answer(activities[activity], template.get(activity, []))
+            if reason:
+                skipped.append({'student': names[path], 'activity': activity,
+                                'submission': path, 'reason': reason})
+    return skipped
+
+
+def write_marking(markings_dir: Path, entry: Dict, overwrite: bool) -> bool:
+    """Write a "no attempt" marking; False if a marking already exists and is kept."""
+    output = markings_dir / f"{entry['student']}_{entry['activity']}.md"
+    if output.exists() and not overwrite:
+        return False
+    output.write_text(NO_ATTEMPT_MARKING.format(
+        student=entry['student'], activity=entry['activity'],
+        reason_text=REASON_TEXT[entry['reason']]), encoding='utf-8')
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write 'no attempt' markings for blank or unchanged activity answers"
+    )
+    parser.add_argument("--base-notebook", required=True, help="Base (template) notebook")
+    parser.add_argument("--manifest", required=True, help="Submissions manifest JSON")
+    parser.add_argument("--name-mapping", help="name_mapping.json from name resolution (optional)")
+    parser.add_argument("--markings-dir", required=True, help="Directory for marking files")
+    parser.add_argument("--num-activities", type=int, required=True, help="Number of activities")
+    parser.add_argument("--skip-list", required=True, help="Output: student|activity per skipped task")
+    parser.add_argument("--report", help="Output: JSON report of skipped tasks")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Overwrite existing markings for unattempted activities")
+
+    args = parser.parse_args()
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    names = canonical_names(manifest, Path(args.name_mapping) if args.name_mapping else None)
+
+    try:
+        skipped = find_unattempted(args.base_notebook, manifest, names, args.num_activities)
+    except RuntimeError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    markings_dir = Path(args.markings_dir)
+    markings_dir.mkdir(parents=True, exist_ok=True)
+    written = sum(write_marking(markings_dir, entry, args.no_resume) for entry in skipped)
+
+    with open(args.skip_list, 'w', encoding='utf-8') as f:
+        for entry in skipped:
+            f.write(f"{entry['student']}|{entry['activity']}\n")
+
+    total = len(manifest.get('submissions', [])) * args.num_activities
+    blank = sum(1 for e in skipped if e['reason'] == 'blank')
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'total_tasks': total, 'skipped': len(skipped), 'blank': blank,
+                       'unchanged': len(skipped) - blank, 'tasks': skipped}, f, indent=2)
+
+    share = f" ({len(skipped) / total:.1%})" if total else ""
+    print(f"✓ {len(skipped)} of {total} marker tasks not attempted{share}: "
+          f"{blank} blank, {len(skipped) - blank} unchanged from the template "
+          f"({written} no-attempt markings written)")
+
+
+if __name__ == "__main__":
+    main()
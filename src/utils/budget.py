@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Run Budget
+
+Hard cost cap for a marking run (--budget USD on mark_structured.sh,
+mark_freeform.sh and batch_mark.sh).
+
+Spent cost is the sum of cost_usd in the assignment stats file(s) for
+records written since the run started (see api/pricing.py for how costs
+are computed). Before a task is dispatched, the projected cost of the calls
+already in flight plus the new one (at the average cost per call so far) is
+added to the spent cost; once that would exceed the budget no new tasks are
+dispatched. Until the first call has been recorded there is no average, and
+callers that can price their calls pass a pre-flight estimate instead
+(api/pricing.py estimate_cost: estimated prompt tokens at the input price
+plus the max_tokens allowance at the output price). Tasks already running finish and keep their outputs, so a later
+run resumes where this one stopped.
+
+Usage:
+  python3 budget.py check --budget 5 --since 2025-01-31T09:00:00 --stats-file token_usage.jsonl
+      (exit 1 with a message when the budget is exhausted)
+  python3 budget.py spent --since 2025-01-31T09:00:00 --stats-file a.jsonl --stats-file b.jsonl
+      (prints the cost spent since the timestamp)
+  python3 budget.py remaining --budget 20 --since 2025-01-31T09:00:00 --stats-file a.jsonl ...
+      (prints the budget left, used by batch_mark.sh to budget each assignment)
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+class RunBudget:
+    """Tracks spending against a budget from one or more JSONL stats files."""
+
+    def __init__(self, limit_usd: float, stats_files: list, since: str = ''):
+        """
+        Args:
+            limit_usd: Budget in USD
+            stats_files: Stats files the run appends to
+            since: ISO timestamp of the run start; earlier records are ignored
+        """
+        self.limit_usd = limit_usd
+        self.stats_files = [Path(f) for f in stats_files]
+        self.since = since
+        self.offsets = {}
+        self.spent_usd = 0.0
+        self.calls = 0
+
+    def refresh(self):
+        """Read records appended to the stats files since the last refresh."""
+        for stats_file in self.stats_files:
+            if not stats_file.exists():
+                continue
+            with open(stats_file, 'r', encoding='utf-8') as f:
+                f.seek(self.offsets.get(stats_file, 0))
+                while True:
+                    line = f.readline()
+                    if not line.endswith('\n'):
+                        break  # Record still being written
+                    self.offsets[stats_file] = f.tell()
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get('timestamp', '') < self.since:
+                        continue
+                    self.spent_usd += record.get('cost_usd', 0) or 0
+                    if record.get('response_cache') != 'hit':
+                        self.calls += 1
+
+    def spent(self) -> float:
+        self.refresh()
+        return self.spent_usd
+
+    def average_call_cost(self) -> float:
+        self.refresh()
+        return self.spent_usd / self.calls if self.calls else 0.0
+
+    def projected(self, in_flight: int = 0, estimate: float | None = None) -> float:
+        """
+        Spent cost plus the expected cost of in-flight calls and one more.
+
+        Args:
+            in_flight: Calls dispatched and not yet recorded
+            estimate: Pre-flight cost of the in-flight calls and the new one,
+                used while no call has been recorded
+        """
+        spent = self.spent()
+        if not self.calls and estimate is not None:
+            return spent + estimate
+        return spent + (in_flight + 1) * self.average_call_cost()
+
+    def allows(self, in_flight: int = 0, estimate: float | None = None) -> bool:
+        """True if another task can be dispatched within the budget."""
+        return self.projected(in_flight, estimate) <= self.limit_usd
+
+    def summary(self) -> str:
+        return f"${self.spent():.2f} spent of ${self.limit_usd:.2f} budget"
+
+
+def add_budget_args(parser: argparse.ArgumentParser):
+    """Add the --budget options shared by the task runners."""
+    parser.add_argument(
+        "--budget",
+        type=float,
+        help="Stop dispatching new tasks once spent plus projected cost (USD) would exceed this"
+    )
+    parser.add_argument(
+        "--budget-since",
+        default='',
+        help="ISO timestamp of the run start (stats records before it are not counted)"
+    )
+    parser.add_argument(
+        "--budget-stats-file",
+        action='append',
+        default=[],
+        help="Stats file whose cost_usd counts against the budget (repeatable)"
+    )
+
+
+def budget_from_args(args) -> RunBudget | None:
+    """RunBudget for parsed --budget options, or None without --budget."""
+    if args.budget is None:
+        return None
+    return RunBudget(args.budget, args.budget_stats_file, args.budget_since)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check spending against a run budget")
+    parser.add_argument("command", choices=['check', 'spent', 'remaining'])
+    parser.add_argument("--budget", type=float, help="Budget in USD (for check and remaining)")
+    parser.add_argument("--since", default='', help="ISO timestamp of the run start")
+    parser.add_argument("--stats-file", action='append', default=[], help="Stats file (repeatable)")
+    args = parser.parse_args()
+
+    budget = RunBudget(args.budget or 0.0, args.stats_file, args.since)
+
+    if args.command == 'spent':
+        print(f"{budget.spent():.4f}")
+        return
+
+    if args.budget is None:
+        parser.error(f"{args.command} requires --budget")
+
+    if args.command == 'remaining':
+        print(f"{max(0.0, args.budget - budget.spent()):.4f}")
+        return
+
+    if not budget.allows():
+        print(f"✗ Budget reached: {budget.summary()}")
+        sys.exit(1)
+    print(f"✓ Within budget: {budget.summary()}")
+
+
+if __name__ == "__main__":
+    main()
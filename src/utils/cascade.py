@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Model Cascade
+
+Most marker calls are routine. With a cascade model configured
+(--cascade-model on mark_structured.sh), each activity marking is first
+made by that cheaper model, which must end its assessment with a
+self-reported confidence (0-100) and verdict (prompts/marker_cascade.md).
+The marking is re-made with the stage's main model when:
+
+  long_answer     the student-specific prompt part is longer than
+                  DEFAULT_MAX_ANSWER_TOKENS (the cheap call is not made)
+  invalid         the response lacks a required heading or the confidence
+                  section
+  error           the cheap call failed (quota errors are raised as usual)
+  low_confidence  the confidence is below the threshold (default 70), or
+                  the verdict is Unclear
+
+An accepted marking is written without its confidence section, so later
+stages see the usual marking format. Every decision is appended to
+cascade.jsonl next to the stats file; show_stats.sh reports the escalation
+rate per activity. Cheap calls are recorded under the "cascade" stage.
+"""
+
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_MIN_CONFIDENCE = 70
+DEFAULT_MAX_ANSWER_TOKENS = 1500
+
+CASCADE_STAGE = "cascade"
+
+# Headings every marker assessment must contain (prompts/marker_structured.md)
+REQUIRED_HEADINGS = ("### Summary", "### Mistakes Found", "### Positive Points", "### Recommendation")
+
+CONFIDENCE_SECTION = re.compile(r"^#+\s*Confidence\s*$.*", re.MULTILINE | re.DOTALL)
+CONFIDENCE_LINE = re.compile(r"^\**Confidence\**:\**\s*(\d{1,3})", re.MULTILINE)
+VERDICT_LINE = re.compile(r"^\**Verdict\**:\**\s*([A-Za-z][A-Za-z ]*)", re.MULTILINE)
+
+
+def load_instructions() -> str:
+    """Confidence instructions appended to the marker prompt of cascade calls."""
+    return (Path(__file__).parent.parent / "prompts" / "marker_cascade.md").read_text(encoding='utf-8')
+
+
+def cascade_prompt(prompt: str) -> str:
+    """Marker prompt (student-specific part) with the confidence instructions."""
+    return f"{prompt.rstrip()}\n\n{load_instructions()}"
+
+
+def parse_verdict(text: str) -> tuple[int | None, str | None]:
+    """Confidence and verdict of a cascade response (None where missing)."""
+    section = CONFIDENCE_SECTION.search(text)
+    if not section:
+        return None, None
+    confidence = CONFIDENCE_LINE.search(section.group(0))
+    verdict = VERDICT_LINE.search(section.group(0))
+    return (min(int(confidence.group(1)), 100) if confidence else None,
+            verdict.group(1).strip() if verdict else None)
+
+
+def strip_verdict(text: str) -> str:
+    """Marking without its confidence section."""
+    return CONFIDENCE_SECTION.sub('', text).rstrip() + "\n"
+
+
+def check_marking(text: str, min_confidence: int = DEFAULT_MIN_CONFIDENCE) -> tuple[str | None, int | None, str | None]:
+    """
+    Decide whether a cascade marking can be kept.
+
+    Returns:
+        Tuple of (escalation reason or None to accept, confidence, verdict)
+    """
+    confidence, verdict = parse_verdict(text)
+    if confidence is None or any(heading not in text for heading in REQUIRED_HEADINGS):
+        return 'invalid', confidence, verdict
+    if confidence < min_confidence or (verdict or '').lower() == 'unclear':
+        return 'low_confidence', confidence, verdict
+    return None, confidence, verdict
+
+
+def cascade_file(stats_file: str | Path) -> Path:
+    """Decision log next to the stats file."""
+    return Path(stats_file).parent / "cascade.jsonl"
+
+
+def record_decision(stats_file: str | Path | None, student: str, activity: str, model: str,
+                    answer_tokens: int, reason: str | None, confidence: int | None = None,
+                    verdict: str | None = None):
+    """Append one cascade decision (escalated when reason is set) to cascade.jsonl."""
+    if not stats_file:
+        return
+    entry = {
+        'timestamp': datetime.now().isoformat(),
+        'student': student,
+        'activity': activity,
+        'cascade_model': model,
+        'answer_tokens': answer_tokens,
+        'confidence': confidence,
+        'verdict': verdict,
+        'escalated': reason is not None,
+        'reason': reason,
+    }
+    path = cascade_file(stats_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency Control
+
+AIMD (additive increase, multiplicative decrease) controller for the number
+of in-flight LLM tasks. A run starts at the target concurrency (--parallel);
+every rate-limit signal (quota_detector.is_rate_limit_signal: HTTP 429/529,
+"overloaded", "rate limit", "resource_exhausted") halves the limit, and each
+round of successful tasks raises it by one, up to a ceiling. The limit
+therefore settles just below the point where the provider starts
+throttling instead of being fixed up front.
+
+Tasks that were already in flight when the limit was cut were dispatched
+under the old limit, so their rate-limit failures do not cut it again (one
+decrease per congestion event).
+
+Every change (and a periodic sample) is appended to a JSONL log together
+with throughput, so the concurrency curve of a run can be inspected
+afterwards:
+
+  {"timestamp": "...", "elapsed": 12.3, "event": "decrease", "concurrency": 8,
+   "in_flight": 16, "completed": 40, "failed": 0, "throughput_per_min": 195.1}
+
+Used by src/adaptive_runner.py (CLI mode) and src/api/engine.py (API mode).
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+# Throughput is measured over this sliding window
+THROUGHPUT_WINDOW_SECONDS = 60
+
+# A curve point is also written at least this often while tasks complete
+SAMPLE_INTERVAL_SECONDS = 30
+
+# Times a rate-limited task is re-queued before it counts as failed
+DEFAULT_MAX_REQUEUE = 3
+
+
+def requeue_delay(attempt: int) -> float:
+    """Seconds before a rate-limited task is dispatched again (jittered)."""
+    return min(60.0, 2.0 ** attempt) + random.uniform(0, 1)
+
+
+class AIMDController:
+    """Thread-safe AIMD concurrency limit with a JSONL concurrency curve."""
+
+    def __init__(self, initial: int, maximum: int | None = None, minimum: int = 1,
+                 decrease_factor: float = 0.5, log_file: str | Path | None = None):
+        """
+        Args:
+            initial: Target concurrency to start at
+            maximum: Ceiling for additive increase (default: 2 x initial)
+            minimum: Floor for multiplicative decrease
+            decrease_factor: Multiplier applied on a rate-limit signal
+            log_file: Optional JSONL file for the concurrency curve
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial * 2)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.log_file = Path(log_file) if log_file else None
+
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.last_decrease = None
+        self.last_log = self.start_time
+        self.completions = deque()
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.decreases = 0
+        self.peak = self.concurrency
+        self.low = self.concurrency
+
+        if self.log_file:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._log('start')
+
+    @property
+    def concurrency(self) -> int:
+        """Current number of tasks allowed in flight."""
+        return max(self.minimum, int(self.limit))
+
+    def has_capacity(self) -> bool:
+        """True if another task may be dispatched now."""
+        return self.in_flight < self.concurrency
+
+    def on_start(self) -> float:
+        """Record a dispatched task; returns its start time for on_rate_limit()."""
+        with self.lock:
+            self.in_flight += 1
+        return time.monotonic()
+
+    def on_success(self):
+        """A task succeeded: grow by one task per round of successes."""
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.completions.append(time.monotonic())
+
+            old = self.concurrency
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            if self.concurrency != old:
+                self.peak = max(self.peak, self.concurrency)
+                self._log('increase')
+            elif time.monotonic() - self.last_log >= SAMPLE_INTERVAL_SECONDS:
+                self._log('sample')
+
+    def on_failure(self):
+        """A task failed for a reason other than rate limiting (limit unchanged)."""
+        with self.lock:
+            self.in_flight -= 1
+            self.failed += 1
+
+    def on_rate_limit(self, started_at: float | None = None, requeued: bool = True) -> bool:
+        """
+        A task hit a rate limit: halve the limit once per congestion event.
+
+        Args:
+            started_at: Value returned by on_start() for the failed task
+            requeued: Whether the task will be retried (otherwise counts as failed)
+
+        Returns:
+            True if the limit was decreased
+        """
+        with self.lock:
+            self.in_flight -= 1
+            if not requeued:
+                self.failed += 1
+            return self._decrease(started_at)
+
+    def on_congestion(self, started_at: float | None = None) -> bool:
+        """
+        A request of a task that is still in flight (retrying) hit a rate limit.
+
+        Args:
+            started_at: monotonic time the rate-limited request was sent
+
+        Returns:
+            True if the limit was decreased
+        """
+        with self.lock:
+            return self._decrease(started_at)
+
+    def _decrease(self, started_at: float | None) -> bool:
+        # Dispatched before the last cut: already accounted for
+        if self.last_decrease is not None and started_at is not None and started_at < self.last_decrease:
+            return False
+
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        self.last_decrease = time.monotonic()
+        self.decreases += 1
+        self.low = min(self.low, self.concurrency)
+        self._log('decrease')
+        return True
+
+    def throughput(self) -> float:
+        """Completed tasks per minute over the last THROUGHPUT_WINDOW_SECONDS."""
+        now = time.monotonic()
+        while self.completions and now - self.completions[0] > THROUGHPUT_WINDOW_SECONDS:
+            self.completions.popleft()
+        window = min(THROUGHPUT_WINDOW_SECONDS, now - self.start_time)
+        if window <= 0:
+            return 0.0
+        return len(self.completions) * 60 / window
+
+    def finish(self):
+        """Write the final curve point."""
+        with self.lock:
+            self._log('end')
+
+    def summary(self) -> str:
+        """One-line description of the concurrency curve for end-of-run output."""
+        elapsed = time.monotonic() - self.start_time
+        overall = self.completed * 60 / elapsed if elapsed > 0 else 0.0
+        return (f"Concurrency: final {self.concurrency} (range {self.low}-{self.peak}, "
+                f"{self.decreases} rate-limit decrease(s)), "
+                f"throughput {overall:.1f} tasks/min")
+
+    def _log(self, event: str):
+        self.last_log = time.monotonic()
+        if not self.log_file:
+            return
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'elapsed': round(time.monotonic() - self.start_time, 2),
+            'event': event,
+            'concurrency': self.concurrency,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'throughput_per_min': round(self.throughput(), 1),
+        }
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
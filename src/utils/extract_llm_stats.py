@@ -4,9 +4,18 @@ Extract text response and token stats from LLM CLI JSON output.
 
 Supports Claude, Gemini, and Codex JSON formats.
 Outputs text to stdout, appends stats to file if --stats-file provided.
+Cost is computed from the pricing table in configs/models.yaml when the
+model has a price (api/pricing.py); otherwise the CLI's reported cost is
+kept. With --rate-limit-estimate, corrects the shared rate limiter's token bucket
+(api/rate_limiter.py) by the actual token count.
+
+With --stream, input is read line by line and response text is written as
+it arrives: Claude stream-json text deltas (claude --output-format
+stream-json --include-partial-messages) and each Codex agent message.
 """
 
 import json
+import os
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -34,28 +43,77 @@ def extract_gemini(data: dict) -> tuple[str, dict]:
     # Aggregate stats across all models used
     total_input = 0
     total_output = 0
+    total_cached = 0
     models_stats = data.get('stats', {}).get('models', {})
 
     for model_name, model_stats in models_stats.items():
         tokens = model_stats.get('tokens', {})
         total_input += tokens.get('prompt', 0)
-        total_output += tokens.get('candidates', 0)
+        # Thinking tokens are billed as output
+        total_output += tokens.get('candidates', 0) + tokens.get('thoughts', 0)
+        total_cached += tokens.get('cached', 0)
 
     stats = {
         'input_tokens': total_input,
         'output_tokens': total_output,
         'cache_creation_tokens': 0,
-        'cache_read_tokens': 0,
-        'cost_usd': 0,  # Gemini doesn't report cost
+        'cache_read_tokens': total_cached,
+        'cost_usd': 0,  # Gemini doesn't report cost (priced from models.yaml)
     }
     return text, stats
 
 
-def extract_codex(lines: list[str]) -> tuple[str, dict]:
-    """Extract text and stats from Codex JSONL output."""
+def extract_claude_stream(lines, on_text) -> tuple[str, dict]:
+    """
+    Extract text and stats from Claude stream-json output.
+
+    Args:
+        lines: Iterable of JSONL event lines
+        on_text: Callback receiving each text delta as it arrives
+
+    Raises:
+        KeyError: If the stream has no result event
+    """
+    text_parts = []
+    result = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        if data.get('type') == 'stream_event':
+            event = data.get('event', {})
+            delta = event.get('delta', {})
+            if event.get('type') == 'content_block_delta' and delta.get('type') == 'text_delta':
+                text_parts.append(delta.get('text', ''))
+                on_text(text_parts[-1])
+        elif data.get('type') == 'result':
+            result = data
+
+    if result is None:
+        raise KeyError('result')
+
+    _, stats = extract_claude(result)
+    return ''.join(text_parts), stats
+
+
+def extract_codex(lines, on_text=None) -> tuple[str, dict]:
+    """Extract text and stats from Codex JSONL output.
+
+    Args:
+        lines: Iterable of JSONL event lines
+        on_text: Optional callback receiving each agent message (with its
+                 separator) as it completes
+    """
     text_parts = []
     total_input = 0
     total_output = 0
+    total_cached = 0
 
     for line in lines:
         line = line.strip()
@@ -69,6 +127,8 @@ def extract_codex(lines: list[str]) -> tuple[str, dict]:
             if event_type == 'item.completed':
                 item = data.get('item', {})
                 if item.get('type') == 'agent_message':
+                    if on_text:
+                        on_text(('\n' if text_parts else '') + item.get('text', ''))
                     text_parts.append(item.get('text', ''))
 
             # Extract usage from turn.completed
@@ -76,6 +136,7 @@ def extract_codex(lines: list[str]) -> tuple[str, dict]:
                 usage = data.get('usage', {})
                 total_input += usage.get('input_tokens', 0)
                 total_output += usage.get('output_tokens', 0)
+                total_cached += usage.get('cached_input_tokens', 0)
         except json.JSONDecodeError:
             continue
 
@@ -83,12 +144,62 @@ def extract_codex(lines: list[str]) -> tuple[str, dict]:
         'input_tokens': total_input,
         'output_tokens': total_output,
         'cache_creation_tokens': 0,
-        'cache_read_tokens': 0,
-        'cost_usd': 0,  # Codex doesn't report cost
+        'cache_read_tokens': total_cached,
+        'cost_usd': 0,  # Codex doesn't report cost (priced from models.yaml)
     }
     return '\n'.join(text_parts), stats
 
 
+def extract_buffered(provider: str) -> tuple[str | None, dict | None]:
+    """Parse complete JSON output from stdin; returns (text, stats), or (None, None)
+    after writing the raw input as text when it is not valid JSON."""
+    raw_input = sys.stdin.read()
+
+    try:
+        if provider == 'codex':
+            # Codex outputs JSONL (multiple lines)
+            lines = raw_input.strip().split('\n')
+            return extract_codex(lines)
+
+        # Claude and Gemini output single JSON object
+        data = json.loads(raw_input)
+        if provider == 'claude':
+            return extract_claude(data)
+        return extract_gemini(data)
+    except (json.JSONDecodeError, KeyError) as e:
+        # If JSON parsing fails, output raw input as text
+        print(raw_input, end='')
+        print(f"Warning: Failed to parse JSON: {e}", file=sys.stderr)
+        return None, None
+
+
+def extract_streamed(provider: str) -> tuple[str | None, dict | None]:
+    """Write text from a JSONL event stream on stdin as it arrives; returns (text, stats)."""
+    raw_lines = []
+    emitted = []
+
+    def lines():
+        for line in sys.stdin:
+            raw_lines.append(line)
+            yield line
+
+    def on_text(text):
+        emitted.append(text)
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    try:
+        if provider == 'codex':
+            return extract_codex(lines(), on_text)
+        return extract_claude_stream(lines(), on_text)
+    except KeyError as e:
+        # Not an event stream (e.g. a plain error message): output it as text
+        if not emitted:
+            print(''.join(raw_lines), end='')
+        print(f"Warning: Failed to parse JSON: {e}", file=sys.stderr)
+        return None, None
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Extract LLM response text and stats')
@@ -97,31 +208,28 @@ def main():
     parser.add_argument('--stats-stage', default='unknown', help='Stage name for stats')
     parser.add_argument('--stats-context', default='', help='Additional context (e.g., student name)')
     parser.add_argument('--model', default='', help='Model name used')
+    parser.add_argument('--response-cache', choices=['hit', 'miss'],
+                        help='Response cache status to record (when the cache is enabled)')
+    parser.add_argument('--rate-limit-estimate', type=int,
+                        help='Tokens reserved from the rate limiter for this call')
+    parser.add_argument('--stream', action='store_true',
+                        help='Write response text as it arrives (claude stream-json, codex)')
     args = parser.parse_args()
 
-    # Read JSON from stdin
-    raw_input = sys.stdin.read()
+    if args.stream and args.provider != 'gemini':
+        text, stats = extract_streamed(args.provider)
+    else:
+        text, stats = extract_buffered(args.provider)
+        if text is not None:
+            # Output text to stdout
+            print(text, end='')
 
-    try:
-        if args.provider == 'codex':
-            # Codex outputs JSONL (multiple lines)
-            lines = raw_input.strip().split('\n')
-            text, stats = extract_codex(lines)
-        else:
-            # Claude and Gemini output single JSON object
-            data = json.loads(raw_input)
-            if args.provider == 'claude':
-                text, stats = extract_claude(data)
-            else:
-                text, stats = extract_gemini(data)
-    except (json.JSONDecodeError, KeyError) as e:
-        # If JSON parsing fails, output raw input as text
-        print(raw_input, end='')
-        print(f"Warning: Failed to parse JSON: {e}", file=sys.stderr)
+    if text is None:
         sys.exit(0)
 
-    # Output text to stdout
-    print(text, end='')
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from api.pricing import apply_cost
+    apply_cost(args.provider, args.model, stats, interface='cli')
 
     # Append stats to file if requested
     if args.stats_file:
@@ -133,6 +241,18 @@ def main():
             'context': args.stats_context,
             **stats
         }
+        if args.response_cache:
+            stats_entry['response_cache'] = args.response_cache
+
+        # Retries made by the caller before this successful attempt (api/retry.py)
+        # and its local token estimate (api/tokens.py)
+        for env_var in ('LLM_RETRY_STATS', 'LLM_PREFLIGHT_STATS'):
+            caller_stats = os.environ.get(env_var)
+            if caller_stats:
+                try:
+                    stats_entry.update(json.loads(caller_stats))
+                except json.JSONDecodeError:
+                    pass
 
         stats_path = Path(args.stats_file)
         stats_path.parent.mkdir(parents=True, exist_ok=True)
@@ -140,6 +260,13 @@ def main():
         with open(stats_path, 'a', encoding='utf-8') as f:
             f.write(json.dumps(stats_entry) + '\n')
 
+    if args.rate_limit_estimate is not None:
+        from api.rate_limiter import actual_tokens, get_limiter
+
+        limiter = get_limiter(args.provider, args.model)
+        if limiter:
+            limiter.settle(args.rate_limit_estimate, actual_tokens(stats))
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Model Table
+
+Compiled form of configs/models.yaml, shared by llm_caller.sh and the Python
+modules, so model/provider resolution does not re-parse the YAML on every
+call:
+
+  configs/.models.compiled.json   Read by Python (system_config, api/client,
+                                  api/pricing, api/rate_limiter, api/tokens).
+                                  Keyed on the mtime and size of models.yaml.
+  configs/.models.compiled.sh     Sourced by llm_caller.sh: case-statement
+                                  lookup functions, no subprocesses per call.
+
+Both files are regenerated whenever models.yaml changes: Python consumers
+compare the recorded mtime and size, llm_caller.sh recompiles when
+models.yaml is newer than the shell table. If configs/ is not writable the
+table is compiled in memory (Python) or printed for eval (bash) instead.
+
+Usage:
+  python3 model_table.py compile          (write both snapshots)
+  python3 model_table.py shell            (print the shell table, compiling if stale)
+  python3 model_table.py provider gpt-5.1 [--section api_models]
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MODELS_CONFIG = PROJECT_ROOT / "configs" / "models.yaml"
+
+COMPILED_SUFFIX = ".compiled"
+PROVIDERS = ('claude', 'gemini', 'codex')
+PRICE_FIELDS = ('input', 'output', 'cache_write', 'cache_read')
+MODEL_SECTIONS = ('api_models', 'cli_models')
+
+# Bump when the compiled layout changes, so old snapshots are recompiled
+TABLE_VERSION = 2
+
+# Table for the last models.yaml seen in this process, by (path, mtime, size)
+_loaded = {}
+
+
+def snapshot_paths(models_config: Path = MODELS_CONFIG) -> tuple[Path, Path]:
+    """Paths of the JSON and shell snapshots for a models.yaml."""
+    base = f".{models_config.stem}{COMPILED_SUFFIX}"
+    return models_config.with_name(base + '.json'), models_config.with_name(base + '.sh')
+
+
+def source_key(models_config: Path) -> dict | None:
+    """mtime and size of models.yaml (None if it does not exist)."""
+    try:
+        st = models_config.stat()
+    except OSError:
+        return None
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def _clean(value) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def compile_table(models_config: Path = MODELS_CONFIG) -> dict:
+    """
+    Parse models.yaml into the lookup table.
+
+    Returns:
+        Dict with api_models and cli_models ({model: provider}), defaults
+        ({provider: model}, '' when unset), expensive (list), pricing
+        ({model: {field: usd per million tokens}}), rate_limits
+        ({model or provider: {'rpm': n, 'tpm': n}}) and context_limits
+        ({model or provider: tokens})
+    """
+    table = {
+        'version': TABLE_VERSION,
+        'source': source_key(models_config),
+        'api_models': {},
+        'cli_models': {},
+        'defaults': {},
+        'expensive': [],
+        'pricing': {},
+        'rate_limits': {},
+        'context_limits': {},
+    }
+    if table['source'] is None:
+        return table
+
+    try:
+        import yaml
+        with open(models_config, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except Exception as e:
+        print(f"Warning: Failed to load models.yaml: {e}", file=sys.stderr)
+        return table
+
+    for section in MODEL_SECTIONS:
+        for model, provider in (config.get(section) or {}).items():
+            if _clean(provider):
+                table[section][_clean(model)] = _clean(provider)
+
+    # A provider with only a comment ("claude:  # e.g., ...") has no default
+    for provider, model in (config.get('defaults') or {}).items():
+        table['defaults'][_clean(provider)] = _clean(model)
+
+    table['expensive'] = [_clean(m) for m in (config.get('expensive') or []) if _clean(m)]
+
+    for model, prices in (config.get('pricing') or {}).items():
+        if isinstance(prices, dict):
+            table['pricing'][_clean(model)] = {
+                field: float(prices.get(field) or 0) for field in PRICE_FIELDS
+            }
+
+    for name, limits in (config.get('rate_limits') or {}).items():
+        if isinstance(limits, dict) and (limits.get('rpm') or limits.get('tpm')):
+            table['rate_limits'][_clean(name)] = {'rpm': limits.get('rpm'), 'tpm': limits.get('tpm')}
+
+    for name, tokens in (config.get('context_limits') or {}).items():
+        if tokens:
+            table['context_limits'][_clean(name)] = int(tokens)
+
+    return table
+
+
+def _case_function(name: str, mapping: dict, miss: str = 'return 1') -> list:
+    import shlex
+    lines = [f"{name}() {{", '    case "$1" in']
+    for key, value in mapping.items():
+        lines.append(f"        {shlex.quote(key)}) echo {shlex.quote(value)} ;;")
+    lines.append(f"        *) {miss} ;;")
+    lines.append('    esac')
+    lines.append('}')
+    return lines
+
+
+def shell_table(table: dict) -> str:
+    """
+    Render the table as bash for llm_caller.sh (bash 3.2 compatible).
+
+    Defines model_table_api_provider / model_table_cli_provider <model>,
+    model_table_default_model <provider>, model_table_is_expensive <model>,
+    MODEL_TABLE_EXPENSIVE, MODEL_TABLE_<PROVIDER>_MODELS (comma-separated,
+    for messages) and MODEL_TABLE_HAS_RATE_LIMITS.
+    """
+    import shlex
+    lines = [
+        "# Generated from configs/models.yaml by src/utils/model_table.py - do not edit",
+    ]
+    lines += _case_function('model_table_api_provider', table['api_models'])
+    lines += _case_function('model_table_cli_provider', table['cli_models'])
+    defaults = {p: m for p, m in table['defaults'].items() if m}
+    lines += _case_function('model_table_default_model', defaults, miss='return 0')
+
+    lines.append('model_table_is_expensive() {')
+    lines.append('    case "$1" in')
+    if table['expensive']:
+        patterns = '|'.join(shlex.quote(m) for m in table['expensive'])
+        lines.append(f"        {patterns}) return 0 ;;")
+    lines.append('        *) return 1 ;;')
+    lines.append('    esac')
+    lines.append('}')
+
+    lines.append(f"MODEL_TABLE_EXPENSIVE={shlex.quote(', '.join(table['expensive']))}")
+    for provider in PROVIDERS:
+        models = []
+        for section in MODEL_SECTIONS:
+            for model, model_provider in table[section].items():
+                if model_provider == provider and model not in models:
+                    models.append(model)
+        lines.append(f"MODEL_TABLE_{provider.upper()}_MODELS={shlex.quote(', '.join(models))}")
+    lines.append(f"MODEL_TABLE_HAS_RATE_LIMITS={'true' if table['rate_limits'] else 'false'}")
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path: Path, text: str):
+    import tempfile
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def write_snapshots(table: dict, models_config: Path = MODELS_CONFIG) -> bool:
+    """Write the JSON and shell snapshots; False if configs/ is not writable."""
+    json_path, shell_path = snapshot_paths(models_config)
+    try:
+        _write_atomic(json_path, json.dumps(table, indent=1))
+        _write_atomic(shell_path, shell_table(table))
+    except OSError:
+        return False
+    return True
+
+
+def load_model_table(models_config: Path = MODELS_CONFIG) -> dict:
+    """
+    The compiled table for models.yaml.
+
+    Costs one stat() when models.yaml is unchanged since the last call in
+    this process; reads the JSON snapshot on the first call; recompiles (and
+    rewrites both snapshots) only when models.yaml has changed.
+    """
+    key = source_key(models_config)
+    cache_key = str(models_config)
+    cached = _loaded.get(cache_key)
+    if cached is not None and cached['source'] == key:
+        return cached
+
+    json_path, _ = snapshot_paths(models_config)
+    table = None
+    if key is not None:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            if table.get('version') != TABLE_VERSION or table.get('source') != key:
+                table = None
+        except (OSError, ValueError):
+            table = None
+
+    if table is None:
+        table = compile_table(models_config)
+        if key is not None:
+            write_snapshots(table, models_config)
+
+    _loaded[cache_key] = table
+    return table
+
+
+def provider_for_model(model: str, section: str | None = None,
+                       models_config: Path = MODELS_CONFIG) -> str | None:
+    """
+    Provider for a model listed in models.yaml (None if not listed).
+
+    Args:
+        model: Model name
+        section: 'api_models' or 'cli_models'; None checks api_models, then cli_models
+    """
+    table = load_model_table(models_config)
+    for sec in ([section] if section else MODEL_SECTIONS):
+        provider = table.get(sec, {}).get(model)
+        if provider:
+            return provider
+    return None
+
+
+def default_model_for_provider(provider: str, models_config: Path = MODELS_CONFIG) -> str:
+    """Default model for a provider ('' if none is configured)."""
+    return load_model_table(models_config)['defaults'].get(provider, '')
+
+
+def expensive_models(models_config: Path = MODELS_CONFIG) -> list:
+    return load_model_table(models_config)['expensive']
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile configs/models.yaml into lookup tables")
+    parser.add_argument("command", choices=['compile', 'shell', 'provider'])
+    parser.add_argument("model", nargs='?', help="Model name (for provider)")
+    parser.add_argument("--section", choices=list(MODEL_SECTIONS), help="Section to look in")
+    parser.add_argument("--models-config", type=Path, default=MODELS_CONFIG, help="models.yaml path")
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        table = compile_table(args.models_config)
+        if not write_snapshots(table, args.models_config):
+            print(f"✗ Cannot write {snapshot_paths(args.models_config)[0].parent}", file=sys.stderr)
+            sys.exit(1)
+        for path in snapshot_paths(args.models_config):
+            print(f"✓ Wrote {path}")
+        return
+
+    if args.command == 'shell':
+        # llm_caller.sh evals this when its shell snapshot is stale; compile
+        # (and write) from the YAML so the next call can source the file
+        table = compile_table(args.models_config)
+        if table['source'] is not None:
+            write_snapshots(table, args.models_config)
+        _loaded[str(args.models_config)] = table
+        print(shell_table(table), end='')
+        return
+
+    if not args.model:
+        parser.error("provider requires a model name")
+    provider = provider_for_model(args.model, args.section, args.models_config)
+    if not provider:
+        sys.exit(1)
+    print(provider)
+
+
+if __name__ == "__main__":
+    main()
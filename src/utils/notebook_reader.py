@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Streaming Notebook Reader
+
+Submissions can come close to the 50 MB limit, almost all of it base64 plot
+images and other cell outputs that no stage of the marking pipeline reads.
+This reader parses an .ipynb incrementally, in fixed-size chunks, and keeps
+only what the tools use:
+
+  cells            each cell's cell_type and source
+  nbformat         format version fields (nbformat, nbformat_minor)
+
+Every other value (cell outputs, attachments, cell and notebook metadata)
+is skipped by scanning its brackets and strings without building it, so
+memory stays at a few chunks however large the outputs are. Skipped values
+are checked for balanced brackets and terminated strings only; kept values
+are parsed by the json module.
+
+Usage:
+    from notebook_reader import read_notebook, NotebookFormatError
+
+    notebook = read_notebook(path)   # {'cells': [...], 'nbformat': 4, ...}
+"""
+
+import json
+import re
+from typing import Dict, Iterator, Optional
+
+CHUNK_SIZE = 1 << 16
+
+KEPT_CELL_FIELDS = frozenset({'cell_type', 'source'})
+KEPT_NOTEBOOK_FIELDS = frozenset({'nbformat', 'nbformat_minor'})
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_LITERAL = re.compile(r'[^\s,:"\[\]{}]+')
+_CLOSERS = {'[': ']', '{': '}'}
+
+
+class NotebookFormatError(ValueError):
+    """Raised when a file is not valid JSON or not a notebook."""
+    pass
+
+
+class _Scanner:
+    """Chunked cursor over a JSON text file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0  # characters dropped from the front of buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size: int = CHUNK_SIZE) -> bool:
+        """Read more of the file; False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > CHUNK_SIZE:
+            self.offset += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def error(self, message: str):
+        raise NotebookFormatError(f"Invalid JSON: {message} (char {self.offset + self.pos})")
+
+    def peek(self) -> str:
+        """Next non-whitespace character, not consumed ('' at end of file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            self.error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def value(self):
+        """Parse the next value in full."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Value may continue past the buffer; read as much again
+                if self.fill(max(CHUNK_SIZE, len(self.buf) - self.pos)):
+                    continue
+                self.error(e.msg)
+            # A number at the end of the buffer may have more digits
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Skip the next value without building it."""
+        closers = []
+        while True:
+            char = self.peek()
+            if not char:
+                self.error("Unexpected end of file")
+            if char == '"':
+                self.skip_string()
+            elif char in _CLOSERS:
+                closers.append(_CLOSERS[char])
+                self.pos += 1
+                continue
+            elif char in ']}':
+                if not closers or closers.pop() != char:
+                    self.error(f"Unexpected '{char}'")
+                self.pos += 1
+            elif char in ',:':
+                if not closers:
+                    self.error(f"Unexpected '{char}'")
+                self.pos += 1
+                continue
+            else:
+                self.skip_literal()
+            if not closers:
+                return
+
+    def skip_string(self):
+        self.pos += 1
+        while True:
+            quote = self.buf.find('"', self.pos)
+            if quote == -1:
+                # Keep a trailing run of backslashes: it may escape the next quote
+                end = len(self.buf)
+                while end > self.pos and self.buf[end - 1] == '\\':
+                    end -= 1
+                self.pos = end
+                if not self.fill():
+                    self.error("Unterminated string")
+                continue
+            backslashes = 0
+            while quote - backslashes > self.pos and self.buf[quote - backslashes - 1] == '\\':
+                backslashes += 1
+            self.pos = quote + 1
+            if backslashes % 2 == 0:
+                return
+
+    def skip_literal(self):
+        while True:
+            match = _LITERAL.match(self.buf, self.pos)
+            if not match:
+                self.error("Expecting value")
+            if match.end() < len(self.buf) or not self.fill():
+                self.pos = match.end()
+                return
+
+    def members(self) -> Iterator[str]:
+        """Keys of the object at the cursor; the caller consumes each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                self.error("Expecting property name enclosed in double quotes")
+            key = self.value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                self.pos -= 1
+                self.error("Expecting ',' delimiter")
+
+    def elements(self) -> Iterator[None]:
+        """Positions the cursor at each element of the array at the cursor."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                self.pos -= 1
+                self.error("Expecting ',' delimiter")
+
+
+def _read_cell(scanner: _Scanner):
+    if scanner.peek() != '{':
+        return scanner.value()
+    cell = {}
+    for key in scanner.members():
+        if key in KEPT_CELL_FIELDS:
+            cell[key] = scanner.value()
+        else:
+            scanner.skip()
+    return cell
+
+
+def iter_cells(notebook_path: str, fields: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Yield a notebook's cells one at a time, with only cell_type and source.
+
+    Args:
+        notebook_path: Path to the .ipynb file
+        fields: If given, receives the kept top-level fields (nbformat, ...)
+
+    Raises:
+        NotebookFormatError: Invalid JSON, or not a notebook (checked as the
+            file is read, so after some cells may have been yielded)
+        OSError: File cannot be read
+    """
+    with open(notebook_path, 'r', encoding='utf-8') as f:
+        scanner = _Scanner(f)
+        if scanner.peek() != '{':
+            if scanner.peek():
+                scanner.value()  # report invalid JSON as such
+            raise NotebookFormatError("Not a valid notebook structure")
+
+        has_cells = False
+        for key in scanner.members():
+            if key == 'cells':
+                if scanner.peek() != '[':
+                    scanner.skip()
+                    raise NotebookFormatError("'cells' is not a list")
+                has_cells = True
+                for _ in scanner.elements():
+                    yield _read_cell(scanner)
+            elif key in KEPT_NOTEBOOK_FIELDS and fields is not None:
+                fields[key] = scanner.value()
+            else:
+                scanner.skip()
+
+        if scanner.peek():
+            scanner.error("Extra data")
+        if not has_cells:
+            raise NotebookFormatError("Missing 'cells' field")
+
+
+def read_notebook(notebook_path: str) -> Dict:
+    """
+    Read a notebook without its outputs, attachments or metadata.
+
+    Returns:
+        Dictionary with 'cells' (each with cell_type and source) and the
+        nbformat fields present in the file
+
+    Raises:
+        NotebookFormatError: Invalid JSON, or not a notebook
+        OSError: File cannot be read
+    """
+    fields = {}
+    cells = list(iter_cells(notebook_path, fields))
+    return {**fields, 'cells': cells}
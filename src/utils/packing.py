@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Packed Responses
+
+A packed call assesses several items in one request, so the instructions,
+criteria and scheme are sent once for all of them:
+
+  activities   all activities of one student (marker.py --activities)
+  students     one activity of several students (marker.py --pack-file), or
+               the final feedback of several students (unifier.py --pack-file);
+               groups are formed by pack_tasks.py within a token budget
+
+The prompt asks for one delimited section per item:
+
+    <<<BEGIN A1>>>
+    ### Summary
+    ...
+    <<<END A1>>>
+
+Students are keyed S1, S2, ... in the order of the pack. split_sections()
+cuts the response back into per-item texts, which are written to the same
+files the unpacked calls produce, so later stages are unaffected. A section
+that is missing, unterminated (e.g. a response cut off at max_tokens) or
+lacks the required heading is left out; the caller re-runs those items as
+separate calls.
+
+Stats records of packed calls have one context per call with the items
+joined by '+' (e.g. "Alice/A1+A2+A3" or "A1/Alice+Bob"), which
+show_stats.sh uses to report packed and unpacked calls separately.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List
+
+REQUIRED_HEADING = "### Summary"
+
+# Output tokens one item's section is expected to take; a pack holds no more
+# items than fit in the call's max_tokens
+OUTPUT_TOKENS_PER_ITEM = {
+    'marker': 1000,
+    'unifier': 3000,
+}
+
+
+def section_begin(key: str) -> str:
+    return f"<<<BEGIN {key}>>>"
+
+
+def section_end(key: str) -> str:
+    return f"<<<END {key}>>>"
+
+
+def student_key(index: int) -> str:
+    """Section key of the index-th (0-based) student of a pack."""
+    return f"S{index + 1}"
+
+
+def format_instructions(keys: List[str]) -> str:
+    """Output-format lines telling the model how to delimit each item."""
+    lines = [f"{section_begin(key)}\n[assessment for {key}]\n{section_end(key)}" for key in keys]
+    return "\n\n".join(lines)
+
+
+def split_sections(text: str, keys: List[str], required_heading: str = REQUIRED_HEADING) -> Dict[str, str]:
+    """
+    Split a packed response into per-item texts.
+
+    Args:
+        text: Packed response
+        keys: Items the response should contain
+        required_heading: Heading every valid section contains
+
+    Returns:
+        Map of key to section text for the valid sections only
+    """
+    sections = {}
+    for key in keys:
+        match = re.search(rf"^\s*{re.escape(section_begin(key))}\s*$(.*?)^\s*{re.escape(section_end(key))}\s*$",
+                          text, re.MULTILINE | re.DOTALL)
+        if not match:
+            continue
+        body = match.group(1).strip()
+        if required_heading in body:
+            sections[key] = body + "\n"
+    return sections
+
+
+def unpack_students(text: str, members: List[Dict], required_heading: str = REQUIRED_HEADING) -> List[Dict]:
+    """
+    Write the sections of a student-packed response to the members' outputs.
+
+    Args:
+        text: Packed response
+        members: Tasks of the pack, in prompt order (each with 'output')
+        required_heading: Heading every valid section contains
+
+    Returns:
+        Members without a valid section (to be run separately)
+    """
+    keys = [student_key(index) for index in range(len(members))]
+    sections = split_sections(text, keys, required_heading)
+    missing = []
+    for key, member in zip(keys, members):
+        if key in sections:
+            Path(member['output']).write_text(sections[key], encoding='utf-8')
+        else:
+            missing.append(member)
+    return missing
+
+
+def pack_groups(sizes: List[int], budget: int, max_items: int) -> List[List[int]]:
+    """
+    Group items (in order) into packs within a token budget.
+
+    Args:
+        sizes: Estimated prompt tokens of each item
+        budget: Most item tokens one pack may hold
+        max_items: Most items one pack may hold
+
+    Returns:
+        Lists of item indices; an item larger than the budget is a pack of its own
+    """
+    groups = []
+    current, total = [], 0
+    for index, size in enumerate(sizes):
+        if current and (total + size > budget or len(current) >= max_items):
+            groups.append(current)
+            current, total = [], 0
+        current.append(index)
+        total += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def packed_context(prefix: str | None, keys: List[str]) -> str:
+    """Stats context of a packed call (items joined by '+')."""
+    items = '+'.join(keys)
+    return f"{prefix}/{items}" if prefix else items
+
+
+def context_items(context: str) -> int:
+    """Number of items a stats context covers (1 for unpacked calls)."""
+    return context.rsplit('/', 1)[-1].count('+') + 1
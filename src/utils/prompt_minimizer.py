@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Prompt Minimisation for Student Work
+
+Student cells go into marker and unifier prompts as the student left them:
+pasted dataframes, printed arrays, long commented-out experiments and the
+instructor's own markdown copied back into the notebook. These steps shrink
+the cells before they are rendered into prompts, in this order:
+
+  collapse_blobs     encoded data (base64 images), runs of data lines
+                     (pasted tables, printed arrays), very long data lines
+                     and long commented-out blocks are cut to their first
+                     lines with a marker
+  strip_whitespace   trailing whitespace is removed, runs of blank lines
+                     become one, and leading/trailing blank lines go
+  strip_template     markdown cells identical to a markdown cell of the
+                     base notebook keep only the start of their first line
+                     (the heading or activity marker)
+  cap_cells          cells longer than max_cell_lines or max_cell_chars are
+                     cut to their first and last lines with a marker
+
+Every cut leaves an explicit "[... N lines ... elided ...]" marker, so the
+model can tell work was shortened rather than missing. Steps and caps are
+configured under prompt_minimize in configs/config.yaml.
+
+Usage:
+    from prompt_minimizer import load_options, minimize_steps, template_texts
+
+    for step, cells in minimize_steps(cells, load_options(), template_texts(base_cells)):
+        ...
+"""
+
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from api.tokens import BLOB_PATTERN
+
+STEPS = ('collapse_blobs', 'strip_whitespace', 'strip_template', 'cap_cells')
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    'collapse_blobs': True,
+    'strip_whitespace': True,
+    'strip_template': True,
+    'cap_cells': True,
+    'max_cell_lines': 150,
+    'max_cell_chars': 8000,
+}
+
+# Consecutive data lines (or commented-out lines) before a run is collapsed,
+# and how many of its first lines are kept
+DATA_RUN_LINES = 8
+COMMENT_RUN_LINES = 15
+RUN_KEEP_LINES = 3
+
+# A single data line longer than this is cut to its first DATA_LINE_KEEP characters
+DATA_LINE_CHARS = 1000
+DATA_LINE_KEEP = 200
+
+# Characters of a template cell's first line that are kept
+TEMPLATE_LINE_CHARS = 120
+
+# Share of a line's fields that must be numbers for it to count as data
+DATA_FIELD_SHARE = 0.5
+
+_FIELD_SEPARATORS = re.compile(r"[\s,;|]+")
+_NUMBER = re.compile(r"[(\[{'\"]*[-+]?(?:\d[\d_]*\.?\d*(?:[eE][-+]?\d+)?|\.\d+|nan|NaN|inf|None|True|False)"
+                     r"[)\]}'\"]*:?")
+
+
+def load_options(config: Optional[Dict] = None) -> Dict:
+    """
+    Minimisation options: DEFAULT_OPTIONS overridden by prompt_minimize in
+    configs/config.yaml (or the given mapping).
+    """
+    if config is None:
+        from system_config import get_prompt_minimize
+        config = get_prompt_minimize()
+    options = dict(DEFAULT_OPTIONS)
+    options.update({key: value for key, value in (config or {}).items() if key in DEFAULT_OPTIONS})
+    return options
+
+
+def _text(cell: Dict) -> str:
+    source = cell.get('source', '')
+    return ''.join(source) if isinstance(source, list) else str(source)
+
+
+def _normalize(text: str) -> str:
+    """Text with trailing whitespace and blank-line runs removed."""
+    lines = [line.rstrip() for line in text.split('\n')]
+    kept = [line for i, line in enumerate(lines) if line or (i > 0 and lines[i - 1])]
+    return '\n'.join(kept).strip('\n')
+
+
+def template_texts(base_cells: List[Dict]) -> Set[str]:
+    """Normalised text of the base notebook's non-empty markdown cells."""
+    return {_normalize(_text(cell)) for cell in base_cells
+            if cell.get('cell_type') == 'markdown' and _text(cell).strip()}
+
+
+def _is_data_line(line: str) -> bool:
+    fields = [field for field in _FIELD_SEPARATORS.split(line.strip()) if field]
+    if len(fields) < 2:
+        return False
+    numbers = sum(1 for field in fields if _NUMBER.fullmatch(field))
+    return numbers / len(fields) >= DATA_FIELD_SHARE
+
+
+def _is_comment_line(line: str) -> bool:
+    return line.lstrip().startswith('#')
+
+
+def _collapse_runs(lines: List[str], matches, min_run: int, label: str) -> List[str]:
+    """Cut each run of at least min_run matching lines to its first lines and a marker."""
+    result, run = [], []
+    for line in lines + [None]:
+        if line is not None and matches(line):
+            run.append(line)
+            continue
+        if len(run) >= min_run:
+            result.extend(run[:RUN_KEEP_LINES])
+            result.append(f"[... {len(run) - RUN_KEEP_LINES} {label} elided ...]")
+        else:
+            result.extend(run)
+        run = []
+        if line is not None:
+            result.append(line)
+    return result
+
+
+def _collapse_blobs(text: str, cell_type: str) -> str:
+    text = BLOB_PATTERN.sub(lambda m: f"[... {len(m.group())} characters of encoded data elided ...]", text)
+    lines = text.split('\n')
+    lines = [line[:DATA_LINE_KEEP] + f" [... {len(line) - DATA_LINE_KEEP} characters of data elided ...]"
+             if len(line) > DATA_LINE_CHARS and _is_data_line(line) else line
+             for line in lines]
+    lines = _collapse_runs(lines, _is_data_line, DATA_RUN_LINES, "lines of data")
+    if cell_type == 'code':
+        lines = _collapse_runs(lines, _is_comment_line, COMMENT_RUN_LINES, "commented-out lines")
+    return '\n'.join(lines)
+
+
+def _strip_template(text: str, template: Set[str]) -> str:
+    normalized = _normalize(text)
+    if normalized not in template:
+        return text
+    first, _, rest = normalized.partition('\n')
+    if not rest and len(first) <= TEMPLATE_LINE_CHARS:
+        return first
+    return f"{first[:TEMPLATE_LINE_CHARS]}\n[... instructor template text elided ...]"
+
+
+def _cap_cell(text: str, max_lines: int, max_chars: int) -> str:
+    lines = text.split('\n')
+    if len(lines) > max_lines:
+        head = max(1, max_lines * 2 // 3)
+        tail = max(1, max_lines - head)
+        lines = lines[:head] + [f"[... {len(lines) - head - tail} lines elided ...]"] + lines[-tail:]
+        text = '\n'.join(lines)
+    if len(text) > max_chars:
+        head = max_chars * 2 // 3
+        tail = max_chars - head
+        text = (f"{text[:head]}\n[... {len(text) - head - tail} characters elided ...]\n"
+                f"{text[len(text) - tail:]}")
+    return text
+
+
+def _apply(step: str, cell: Dict, options: Dict, template: Set[str]) -> str:
+    text = _text(cell)
+    cell_type = cell.get('cell_type', 'unknown')
+    if step == 'collapse_blobs':
+        return _collapse_blobs(text, cell_type)
+    if step == 'strip_whitespace':
+        return _normalize(text)
+    if step == 'strip_template':
+        return _strip_template(text, template) if cell_type == 'markdown' else text
+    return _cap_cell(text, int(options['max_cell_lines']), int(options['max_cell_chars']))
+
+
+def minimize_steps(cells: List[Dict], options: Dict,
+                   template: Optional[Set[str]] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    Apply the enabled steps in order.
+
+    Args:
+        cells: Cells with cell_type and source (other fields are kept)
+        options: Options from load_options()
+        template: Markdown texts of the base notebook (template_texts())
+
+    Yields:
+        (step, cells) after each enabled step; cells are new dicts with the
+        source as one string
+    """
+    if not options.get('enabled'):
+        return
+    for step in STEPS:
+        if not options.get(step) or (step == 'strip_template' and not template):
+            continue
+        cells = [{**cell, 'source': _apply(step, cell, options, template or set())} for cell in cells]
+        yield step, cells
+
+
+def minimize_cells(cells: List[Dict], options: Dict, template: Optional[Set[str]] = None) -> List[Dict]:
+    """Cells after all enabled steps."""
+    for _, cells in minimize_steps(cells, options, template):
+        pass
+    return cells
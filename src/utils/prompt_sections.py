@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Prompt Sections
+
+Agent prompt templates (src/prompts/*.md) are split by a marker line into a
+static prefix (role, constraints, rubric/criteria, output format) and a
+variable suffix (student name, student work, assessments). The prefix is
+identical for every call of a stage and is sent as the system prompt, so
+providers can serve it from their prompt cache (Claude cache_control,
+Gemini implicit caching, OpenAI automatic caching); only the suffix is
+billed at the full input price.
+
+Placeholders in the prefix must only take values that are the same for
+every call of the stage (e.g. activity_id, marking_criteria); per-student
+values belong below the marker.
+
+Prompts reach llm_caller.sh as files (--prompt-file, --system-prompt-file),
+never as command-line arguments, which the OS caps (ARG_MAX, and 128 KiB per
+argument on Linux).
+"""
+
+import tempfile
+
+VARIABLE_SECTION_MARKER = "<!-- VARIABLE CONTENT: everything above this line is the static, cacheable prefix -->"
+
+
+def render_prompt(template: str, **values) -> tuple[str, str]:
+    """
+    Fill a prompt template and split it into (system_prompt, prompt).
+
+    Args:
+        template: Template text containing VARIABLE_SECTION_MARKER
+        **values: Values for the template placeholders
+
+    Returns:
+        Tuple of (static prefix, variable suffix). Templates without the
+        marker return an empty prefix and the whole filled template.
+    """
+    if VARIABLE_SECTION_MARKER not in template:
+        return "", template.format(**values)
+
+    static, variable = template.split(VARIABLE_SECTION_MARKER, 1)
+    return static.format(**values).strip() + "\n", variable.format(**values).strip() + "\n"
+
+
+def join_prompt(system_prompt: str, prompt: str) -> str:
+    """Combine prefix and suffix into one prompt (debug files, tools without a system prompt)."""
+    if not system_prompt:
+        return prompt
+    return f"{system_prompt}\n{prompt}"
+
+
+def write_prompt_file(text: str, suffix: str = '.prompt.txt') -> str:
+    """Write a prompt to a temporary file for llm_caller.sh; the caller deletes it."""
+    with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as f:
+        f.write(text)
+    return f.name
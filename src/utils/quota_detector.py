@@ -6,6 +6,7 @@ Detects when LLM API calls fail due to quota or rate limit exhaustion
 and provides clear, actionable warnings to instructors.
 """
 
+import re
 import sys
 
 
@@ -76,6 +77,71 @@ def is_quota_error(error_output: str, provider: str) -> bool:
     return False
 
 
+# Quotas that will not recover within a run (retrying or slowing down is pointless)
+HARD_QUOTA_PATTERNS = [
+    "5-hour limit reached",
+    "resets 3am",
+    "/upgrade to max",
+    "/extra-usage",
+    "daily limit",
+    "usage cap",
+    "exhausted your capacity",
+    "insufficient_quota",
+    "credit balance is too low",
+]
+
+# Transient throttling signals (HTTP 429 / 529 and their provider messages)
+RATE_LIMIT_STATUS = re.compile(r'\b(429|529)\b')
+RATE_LIMIT_PATTERNS = [
+    "overloaded",
+    "too many requests",
+    "rate limit",
+    "rate_limit",
+    "resource_exhausted",
+    "resource exhausted",
+]
+
+
+def is_hard_quota(error_output: str) -> bool:
+    """
+    Detect quota exhaustion that only resets after hours (daily caps, plan limits).
+
+    Args:
+        error_output: Combined stderr and stdout from LLM call
+
+    Returns:
+        True if the error will not clear by waiting a few seconds
+    """
+    error_lower = error_output.lower()
+    return any(pattern in error_lower for pattern in HARD_QUOTA_PATTERNS)
+
+
+def is_rate_limit_signal(error_output: str, provider: str) -> bool:
+    """
+    Detect a transient rate-limit/overload signal that warrants backing off.
+
+    Hard quotas are excluded: slowing down does not help once a daily cap
+    is reached.
+
+    Args:
+        error_output: Combined stderr and stdout from LLM call
+        provider: LLM provider name (claude, gemini, codex)
+
+    Returns:
+        True if the caller should reduce its request rate and retry later
+    """
+    if is_hard_quota(error_output):
+        return False
+
+    error_lower = error_output.lower()
+    if RATE_LIMIT_STATUS.search(error_lower):
+        return True
+    if any(pattern in error_lower for pattern in RATE_LIMIT_PATTERNS):
+        return True
+
+    return is_quota_error(error_output, provider)
+
+
 def print_quota_warning(provider: str, error_output: str):
     """
     Print a clear, visible warning about quota exhaustion.
@@ -100,6 +100,28 @@ def get_api_max_parallel():
     return config.get("api_max_parallel", 32)
 
 
+def get_llm_cache_max_mb():
+    """
+    Get the size bound of the LLM response cache from system config.
+
+    Returns:
+        int: Maximum cache size in MB (defaults to 512 if not configured).
+    """
+    config = load_system_config()
+    return config.get("llm_cache_max_mb", 512)
+
+
+def get_prompt_minimize():
+    """
+    Get the prompt minimisation settings from system config.
+
+    Returns:
+        dict: The prompt_minimize section (empty if not configured).
+    """
+    config = load_system_config()
+    return config.get("prompt_minimize") or {}
+
+
 def is_verbose():
     """
     Get the verbose setting from system config.
@@ -133,6 +155,18 @@ def load_models_config():
         return {}
 
 
+def load_model_table():
+    """
+    Compiled lookups from models.yaml (see model_table.py): api_models,
+    cli_models, defaults, expensive. Re-parses the YAML only when it changes.
+    """
+    try:
+        from model_table import load_model_table as load_table
+    except ImportError:
+        from .model_table import load_model_table as load_table
+    return load_table(get_models_config_path())
+
+
 def get_available_models(section: str = None):
     """
     Get all available models grouped by provider.
@@ -143,7 +177,7 @@ def get_available_models(section: str = None):
     Returns:
         dict: Dictionary mapping provider names to lists of model names.
     """
-    config = load_models_config()
+    config = load_model_table()
 
     # Group models by provider
     by_provider = {'claude': [], 'gemini': [], 'codex': []}
@@ -170,7 +204,7 @@ def format_available_models():
     Returns:
         str: Formatted string listing all available models by provider.
     """
-    config = load_models_config()
+    config = load_model_table()
     lines = ["Available models (from configs/models.yaml):"]
 
     # API models
@@ -226,7 +260,7 @@ def resolve_provider_from_model(model_name: str, section: str = None) -> str | N
     Returns:
         str or None: The provider name, or None if model not found in models.yaml.
     """
-    config = load_models_config()
+    config = load_model_table()
 
     # Determine which sections to check
     if section:
@@ -251,8 +285,7 @@ def get_expensive_models() -> list:
     Returns:
         list: List of model names that are marked as expensive.
     """
-    config = load_models_config()
-    return config.get('expensive', [])
+    return load_model_table()['expensive']
 
 
 def is_expensive_model(model_name: str) -> bool:
@@ -200,6 +200,13 @@ Model/Provider (at least one required):
   --provider NAME     LLM provider (claude, gemini, or codex)
                       Only needed if model is not specified or unrecognized
   --api-model NAME    Use direct API calls for headless stages (requires API key)
+  --batch-api         Submit marker/unifier calls as provider batch jobs
+                      (Anthropic/OpenAI, ~50% cheaper, slower; needs --api-model)
+  --no-cache          Bypass the LLM response cache (always call the provider)
+  --broker            Route each assignment's API calls through one LLM broker
+                      process with warm provider connections (needs --api-model)
+  --hedge MODEL       Resend API calls slower than their stage's p95 to MODEL
+                      ('same' for the --api-model itself)
 
 Options:
   --parallel N        Override max parallel tasks for all assignments
@@ -207,6 +214,8 @@ Options:
   --start-round N     Start from round N (1-5, default: 1)
   --auto-approve      Skip interactive stages (pattern design, dashboard approval)
   --force-complete    Generate zero-mark feedback for failed students and continue
+  --budget USD        Cost cap for the whole batch; each assignment gets what is
+                      left, and no new LLM tasks start once it is spent
   --help              Show this help message
 
 Automatic Workflow (5 rounds - runs continuously):
@@ -267,9 +276,14 @@ NO_RESUME=false
 PROVIDER=""
 MODEL=""
 API_MODEL=""
+BATCH_API=false
+NO_CACHE=false
+USE_BROKER=false
+HEDGE_MODEL=""
 START_ROUND=1
 AUTO_APPROVE=false
 FORCE_COMPLETE=false
+BUDGET=""
 
 while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -289,6 +303,22 @@ while [[ $# -gt 0 ]]; do
             API_MODEL="$2"
             shift 2
             ;;
+        --batch-api)
+            BATCH_API=true
+            shift
+            ;;
+        --no-cache)
+            NO_CACHE=true
+            shift
+            ;;
+        --broker)
+            USE_BROKER=true
+            shift
+            ;;
+        --hedge)
+            HEDGE_MODEL="$2"
+            shift 2
+            ;;
         --no-resume)
             NO_RESUME=true
             shift
@@ -305,6 +335,10 @@ while [[ $# -gt 0 ]]; do
             FORCE_COMPLETE=true
             shift
             ;;
+        --budget)
+            BUDGET="$2"
+            shift 2
+            ;;
         --help)
             usage
             ;;
@@ -434,9 +468,19 @@ fi
 if [[ -n "$API_MODEL" ]]; then
     log_info "API Model: $API_MODEL (headless stages will use direct API calls)"
 fi
+if [[ "$BATCH_API" == true ]]; then
+    if [[ -z "$API_MODEL" ]]; then
+        log_error "--batch-api requires --api-model"
+        exit 1
+    fi
+    log_info "Batch API: ENABLED (marker/unifier calls submitted as provider batch jobs)"
+fi
 if [[ -z "$PROVIDER" && -z "$MODEL" && -n "$API_MODEL" ]]; then
     log_info "CLI fallback: per-assignment overview.md defaults"
 fi
+if [[ -n "$BUDGET" ]]; then
+    log_info "Budget: \$$BUDGET for the whole batch"
+fi
 if [[ "$START_ROUND" -gt 1 ]]; then
     log_info "Starting from round: $START_ROUND"
 fi
@@ -532,6 +576,27 @@ else
     echo
 fi
 
+# ============================================================================
+# HELPER FUNCTION: Budget left for the batch (--budget minus the cost of all
+# assignments' LLM calls since the batch started)
+# ============================================================================
+
+BATCH_STARTED="$(date +%Y-%m-%dT%H:%M:%S)"
+
+remaining_budget() {
+    local budget_args=(remaining --budget "$BUDGET" --since "$BATCH_STARTED")
+    local entry entry_dir
+    for entry in "${ASSIGNMENTS[@]}"; do
+        if [[ "$entry" = /* ]]; then
+            entry_dir="$entry"
+        else
+            entry_dir="$PROJECT_ROOT/$entry"
+        fi
+        budget_args+=(--stats-file "$entry_dir/processed/stats/token_usage.jsonl")
+    done
+    python3 "$PROJECT_ROOT/src/utils/budget.py" "${budget_args[@]}"
+}
+
 # ============================================================================
 # HELPER FUNCTION: Run a stage for all assignments
 # ============================================================================
@@ -611,6 +676,22 @@ run_stage_for_all() {
             cmd+=("--api-model" "$API_MODEL")
         fi
 
+        if [[ "$BATCH_API" == true ]]; then
+            cmd+=("--batch-api")
+        fi
+
+        if [[ "$NO_CACHE" == true ]]; then
+            cmd+=("--no-cache")
+        fi
+
+        if [[ "$USE_BROKER" == true ]]; then
+            cmd+=("--broker")
+        fi
+
+        if [[ -n "$HEDGE_MODEL" ]]; then
+            cmd+=("--hedge" "$HEDGE_MODEL")
+        fi
+
         if [[ "$NO_RESUME" == true ]]; then
             cmd+=("--no-resume")
         fi
@@ -623,6 +704,17 @@ run_stage_for_all() {
             cmd+=("--force-complete")
         fi
 
+        if [[ -n "$BUDGET" ]]; then
+            local budget_left
+            budget_left=$(remaining_budget)
+            if [[ "$budget_left" == "0.0000" ]]; then
+                log_error "Batch budget of \$$BUDGET reached - skipping $assignment"
+                failed+=("$assignment (budget reached)")
+                continue
+            fi
+            cmd+=("--budget" "$budget_left")
+        fi
+
         # Execute marking script
         if "${cmd[@]}"; then
             log_success "Completed: $assignment"
@@ -824,6 +916,22 @@ if [[ "$START_ROUND" -le 5 ]]; then
             cmd+=("--api-model" "$API_MODEL")
         fi
 
+        if [[ "$BATCH_API" == true ]]; then
+            cmd+=("--batch-api")
+        fi
+
+        if [[ "$NO_CACHE" == true ]]; then
+            cmd+=("--no-cache")
+        fi
+
+        if [[ "$USE_BROKER" == true ]]; then
+            cmd+=("--broker")
+        fi
+
+        if [[ -n "$HEDGE_MODEL" ]]; then
+            cmd+=("--hedge" "$HEDGE_MODEL")
+        fi
+
         if [[ "$AUTO_APPROVE" == true ]]; then
             cmd+=("--auto-approve")
         fi
@@ -832,6 +940,16 @@ if [[ "$START_ROUND" -le 5 ]]; then
             cmd+=("--force-complete")
         fi
 
+        if [[ -n "$BUDGET" ]]; then
+            budget_left=$(remaining_budget)
+            if [[ "$budget_left" == "0.0000" ]]; then
+                log_error "Batch budget of \$$BUDGET reached - skipping $assignment"
+                failed+=("$assignment (budget reached)")
+                continue
+            fi
+            cmd+=("--budget" "$budget_left")
+        fi
+
         # Always resume in round 5
         # (don't pass --no-resume even if it was set initially)
 
@@ -128,20 +128,25 @@ total_cache_read = sum(s.get('cache_read_tokens', 0) for s in stats)
 total_cost = sum(s.get('cost_usd', 0) for s in stats)
 
 # By stage
-by_stage = defaultdict(lambda: {'input': 0, 'output': 0, 'count': 0})
+by_stage = defaultdict(lambda: {'input': 0, 'output': 0, 'count': 0, 'cost': 0.0})
 for s in stats:
     stage = s.get('stage', 'unknown')
     by_stage[stage]['input'] += s.get('input_tokens', 0)
     by_stage[stage]['output'] += s.get('output_tokens', 0)
     by_stage[stage]['count'] += 1
+    by_stage[stage]['cost'] += s.get('cost_usd', 0) or 0
 
 # By provider
-by_provider = defaultdict(lambda: {'input': 0, 'output': 0, 'count': 0})
+by_provider = defaultdict(lambda: {'input': 0, 'output': 0, 'count': 0, 'cost': 0.0})
 for s in stats:
     provider = s.get('provider', 'unknown')
     by_provider[provider]['input'] += s.get('input_tokens', 0)
     by_provider[provider]['output'] += s.get('output_tokens', 0)
     by_provider[provider]['count'] += 1
+    by_provider[provider]['cost'] += s.get('cost_usd', 0) or 0
+
+def cost_column(cost):
+    return f"  |  \${cost:,.4f}" if total_cost > 0 else ""
 
 # Print report
 print()
@@ -159,21 +164,172 @@ if total_cache_creation > 0:
 if total_cache_read > 0:
     print(f"  Cache Read:          {total_cache_read:,}")
 if total_cost > 0:
-    print(f"  Estimated Cost:      \${total_cost:.4f}")
+    print(f"  Cost:                \${total_cost:.4f}")
 print()
 
 print(f"\033[1mBy Stage:\033[0m")
-for stage in ['marker', 'normalizer', 'unifier', 'pattern_designer', 'aggregator', 'unknown']:
+for stage in ['cascade', 'marker', 'verifier', 'normalizer', 'unifier', 'pattern_designer', 'aggregator', 'unknown']:
     if stage in by_stage:
         s = by_stage[stage]
-        print(f"  {stage:20s}  {s['count']:4d} calls  |  {s['input']:>10,} in  |  {s['output']:>8,} out")
+        print(f"  {stage:20s}  {s['count']:4d} calls  |  {s['input']:>10,} in  |  {s['output']:>8,} out{cost_column(s['cost'])}")
 print()
 
 print(f"\033[1mBy Provider:\033[0m")
 for provider, p in sorted(by_provider.items()):
-    print(f"  {provider:10s}  {p['count']:4d} calls  |  {p['input']:>10,} in  |  {p['output']:>8,} out")
+    print(f"  {provider:10s}  {p['count']:4d} calls  |  {p['input']:>10,} in  |  {p['output']:>8,} out{cost_column(p['cost'])}")
 print()
 
+# Provider prompt caching per stage (static prefix sent as system prompt)
+def prompt_tokens(s):
+    # Anthropic reports cache reads/writes separately from input_tokens;
+    # OpenAI and Gemini include cached tokens in input_tokens
+    if s.get('provider') in ('claude', 'anthropic'):
+        return s.get('input_tokens', 0) + s.get('cache_creation_tokens', 0) + s.get('cache_read_tokens', 0)
+    return s.get('input_tokens', 0)
+
+cache_by_stage = defaultdict(lambda: {'prompt': 0, 'creation': 0, 'read': 0})
+for s in stats:
+    stage = s.get('stage', 'unknown')
+    cache_by_stage[stage]['prompt'] += prompt_tokens(s)
+    cache_by_stage[stage]['creation'] += s.get('cache_creation_tokens', 0)
+    cache_by_stage[stage]['read'] += s.get('cache_read_tokens', 0)
+
+if total_cache_creation or total_cache_read:
+    print(f"\033[1mPrompt Cache by Stage:\033[0m")
+    for stage, c in sorted(cache_by_stage.items()):
+        if not c['prompt']:
+            continue
+        print(f"  {stage:20s}  {c['read']:>10,} read  |  {c['creation']:>10,} written  |  "
+              f"{c['read'] / c['prompt']:6.1%} of prompt tokens")
+    print()
+
+# Response cache (only recorded while the cache is enabled)
+cache_hits = sum(1 for s in stats if s.get('response_cache') == 'hit')
+cache_misses = sum(1 for s in stats if s.get('response_cache') == 'miss')
+if cache_hits or cache_misses:
+    print(f"\033[1mResponse Cache:\033[0m")
+    print(f"  Hits:                {cache_hits:,}")
+    print(f"  Misses:              {cache_misses:,}")
+    print(f"  Hit Rate:            {cache_hits / (cache_hits + cache_misses):.1%}")
+    print()
+
+# Retries of transient failures (only recorded when a call needed them)
+retried = [s for s in stats if s.get('retries')]
+if retried:
+    retry_errors = defaultdict(int)
+    for s in retried:
+        for error_class, count in (s.get('retry_errors') or {}).items():
+            retry_errors[error_class] += count
+    print(f"\033[1mRetries:\033[0m")
+    print(f"  Calls retried:       {len(retried):,} of {len(stats):,}")
+    print(f"  Total retries:       {sum(s['retries'] for s in retried):,}")
+    print(f"  Backoff time:        {sum(s.get('retry_backoff_seconds', 0) for s in retried):,.1f}s")
+    if retry_errors:
+        print(f"  By error class:      " + ", ".join(f"{k} {v}" for k, v in sorted(retry_errors.items())))
+    print()
+
+# Hedged requests (only recorded when LLM_HEDGE_MODEL / --hedge is set)
+hedged = [s for s in stats if s.get('hedged')]
+if hedged:
+    print(f"\033[1mHedged Requests:\033[0m")
+    live_by_stage = defaultdict(int)
+    for s in stats:
+        if s.get('latency_seconds') is not None and s.get('response_cache') != 'hit':
+            live_by_stage[s.get('stage', 'unknown')] += 1
+    hedged_by_stage = defaultdict(list)
+    for s in hedged:
+        hedged_by_stage[s.get('stage', 'unknown')].append(s)
+    for stage, entries in sorted(hedged_by_stage.items()):
+        hedge_wins = sum(1 for s in entries if s.get('hedge_winner') == 'hedge')
+        wasted = sum(s.get('hedge_wasted_tokens', 0) for s in entries)
+        live = live_by_stage[stage] or len(entries)
+        print(f"  {stage:20s}  {len(entries):>5,} hedged ({len(entries) / live:5.1%} of calls)  |  "
+              f"hedge won {hedge_wins:,}  |  {wasted:>10,} tokens wasted")
+    print()
+
+# Student work minimised before prompting (structured Stage 2.5)
+minimize_file = "$ASSIGNMENT_DIR/processed/stats/prompt_minimize.json"
+try:
+    with open(minimize_file, 'r') as f:
+        minimized = json.load(f)
+except (OSError, ValueError):
+    minimized = {}
+minimized_stages = [stage for stage in ('marker', 'unifier') if minimized.get(stage, {}).get('before')]
+if minimized_stages:
+    print(f"\033[1mPrompt Minimisation (estimated tokens of student work):\033[0m")
+    for stage in minimized_stages:
+        m = minimized[stage]
+        print(f"  {stage:20s}  {m['before']:>10,} -> {m['after']:>10,}  |  {m['saved'] / m['before']:6.1%} saved")
+        for step, saved in m.get('steps', {}).items():
+            print(f"    {step:18s}  {saved:>10,} tokens")
+    print()
+
+# Identical answers marked once (structured Stage 4)
+dedup_file = "$ASSIGNMENT_DIR/processed/stats/answer_dedup.json"
+try:
+    with open(dedup_file, 'r') as f:
+        dedup = json.load(f)
+except (OSError, ValueError):
+    dedup = {}
+if any(d.get('calls_saved') for d in dedup.values()):
+    answers = sum(d['answers'] for d in dedup.values())
+    saved = sum(d['calls_saved'] for d in dedup.values())
+    print(f"\033[1mIdentical Answers:\033[0m")
+    print(f"  Marker calls saved:  {saved:,} of {answers:,} ({saved / answers:.1%})")
+    for activity, d in dedup.items():
+        print(f"  {activity:20s}  {d['unique']:>5,} unique of {d['answers']:>5,} answers  |  "
+              f"{d['dedup_ratio']:6.1%} deduplicated")
+    print()
+
+# Model cascade (--cascade-model): markings kept from the cheap model vs escalated
+cascade_file = "$ASSIGNMENT_DIR/processed/stats/cascade.jsonl"
+decisions = []
+try:
+    with open(cascade_file, 'r') as f:
+        decisions = [json.loads(line) for line in f if line.strip()]
+except (OSError, ValueError):
+    pass
+if decisions:
+    escalated = [d for d in decisions if d.get('escalated')]
+    print(f"\033[1mModel Cascade:\033[0m")
+    print(f"  Escalated:           {len(escalated):,} of {len(decisions):,} ({len(escalated) / len(decisions):.1%})")
+    reasons = defaultdict(int)
+    for d in escalated:
+        reasons[d.get('reason') or 'unknown'] += 1
+    if reasons:
+        print(f"  By reason:           " + ", ".join(f"{k} {v}" for k, v in sorted(reasons.items())))
+    by_activity = defaultdict(list)
+    for d in decisions:
+        by_activity[d.get('activity') or 'unknown'].append(d)
+    for activity, entries in sorted(by_activity.items(), key=lambda item: (len(item[0]), item[0])):
+        count = sum(1 for d in entries if d.get('escalated'))
+        print(f"  {activity:20s}  {count:>5,} of {len(entries):>5,} escalated  |  {count / len(entries):6.1%}")
+    print()
+
+# Packed calls (--pack-activities / --pack-students): contexts join their items with '+'
+def context_items(s):
+    return str(s.get('context') or '').rsplit('/', 1)[-1].count('+') + 1
+
+packed_stages = sorted({s.get('stage', 'unknown') for s in stats if context_items(s) > 1})
+if packed_stages:
+    print(f"\033[1mPacked vs Unpacked (tokens, cost and latency per item):\033[0m")
+    for stage in packed_stages:
+        for label, packed in (('packed', True), ('unpacked', False)):
+            entries = [s for s in stats if s.get('stage', 'unknown') == stage and (context_items(s) > 1) == packed]
+            if not entries:
+                continue
+            items = sum(context_items(s) for s in entries)
+            tokens = sum(s.get('input_tokens', 0) + s.get('cache_creation_tokens', 0) + s.get('cache_read_tokens', 0)
+                         + s.get('output_tokens', 0) for s in entries)
+            timed = [s for s in entries if s.get('latency_seconds') is not None]
+            timed_items = sum(context_items(s) for s in timed)
+            latency = (f"  |  {sum(s['latency_seconds'] for s in timed) / timed_items:6.1f}s"
+                       if timed_items else "")
+            cost = f"  |  \${sum(s.get('cost_usd', 0) or 0 for s in entries) / items:.4f}" if total_cost > 0 else ""
+            print(f"  {stage + ' ' + label:20s}  {len(entries):>5,} calls  |  {items:>5,} items  |  "
+                  f"{tokens / items:>8,.0f} tokens{cost}{latency}")
+    print()
+
 # Time range
 timestamps = [s.get('timestamp') for s in stats if s.get('timestamp')]
 if timestamps: